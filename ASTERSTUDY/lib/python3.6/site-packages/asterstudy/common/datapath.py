@@ -0,0 +1,588 @@
+"""
+Data-path benchmarks
+--------------------
+
+Measure the parsers, converters and readers of the heavy files
+(``.frd``, ``.unv``, MED, VTU series, solver logs) on the synthetic
+inputs of `synthetic`, and detect regressions.
+
+Each scenario is run in its own process: the modules are imported
+first, then the scenario is repeated and the best and median times are
+recorded with the throughput (MB/s of input, items/s) and the memory
+growth. On Linux the high-water mark of the resident memory is reset
+after the imports (``/proc/self/clear_refs``) and read from ``VmHWM``:
+``ru_maxrss`` is kept across ``execve`` and would start from the peak of
+the parent. Elsewhere ``ru_maxrss`` is used.
+
+The inputs are generated once per scale in a work directory and reused
+by the next runs (the generators are deterministic). They are generated
+in a child process too, so that the memory of the generation is not
+inherited by the measures. The scenarios whose
+dependencies are missing (MEDLoader, ParaView, matplotlib) are reported
+as skipped.
+
+The results are written as JSON; they can be compared with a baseline
+(``ASTERSTUDY_BENCH_BASELINE``, ``~/.asterstudy/datapath-baseline.json``
+by default): a scenario regresses if it is slower (or uses more memory)
+than the baseline by more than the tolerance.
+
+Example::
+
+    python3 -m asterstudy.common.datapath run --scale small --save-baseline
+    python3 -m asterstudy.common.datapath run -o results.json
+    python3 -m asterstudy.common.datapath compare results.json
+"""
+
+import contextlib
+import hashlib
+import importlib
+import importlib.util
+import io
+import json
+import os
+import os.path as osp
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from . import synthetic
+
+
+BASELINE_ENV = 'ASTERSTUDY_BENCH_BASELINE'
+
+# Multiplier of the sizes of the inputs
+SCALES = OrderedDict([('small', 0.1), ('medium', 1.), ('large', 10.)])
+
+# Relative tolerances of a regression (time and memory growth)
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.25
+
+# Absolute differences ignored: noise of short scenarios (s, MB)
+TIME_NOISE = 0.01
+MEMORY_NOISE = 5.
+
+SCENARIOS = OrderedDict()
+
+
+class Scenario():
+    """
+    A measured data path.
+
+    Arguments:
+        name (str): Name of the scenario.
+        func (callable): Function called with the path of the input,
+            returns the number of items processed (nodes, steps...).
+        kind (str): Generator of the input (see `synthetic.GENERATORS`).
+        params (dict): Arguments of the generator at the medium scale.
+        scaled (list[str]): Arguments multiplied by the scale.
+        modules (list[str]): Modules imported before the measure; the
+            scenario is skipped if one of them is missing.
+    """
+
+    def __init__(self, name, func, kind, params, scaled, modules):
+        self.name = name
+        self.func = func
+        self.kind = kind
+        self.params = params
+        self.scaled = scaled
+        self.modules = modules
+        self.doc = (func.__doc__ or '').strip().splitlines()[0]
+
+    def arguments(self, scale):
+        """Return the arguments of the generator at a scale."""
+        factor = SCALES.get(scale, scale)
+        return OrderedDict(
+            (key, max(1, int(round(value * float(factor))))
+             if key in self.scaled else value)
+            for key, value in sorted(self.params.items()))
+
+    def missing(self):
+        """Return the first missing module or *None*."""
+        for name in self.modules:
+            try:
+                if importlib.util.find_spec(name) is None:
+                    return name
+            except (ImportError, ValueError):
+                return name
+        return None
+
+
+def scenario(kind, scaled=('nodes',), modules=(), **params):
+    """Decorator that registers a scenario named as the function."""
+    def _register(func):
+        SCENARIOS[func.__name__] = Scenario(func.__name__, func, kind, params,
+                                            scaled, modules)
+        return func
+    return _register
+
+
+@contextlib.contextmanager
+def _workdir():
+    """Work in a temporary directory (converters writing in cwd)."""
+    folder = tempfile.mkdtemp(prefix='datapath-')
+    cwd = os.getcwd()
+    try:
+        os.chdir(folder)
+        yield folder
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+FRD = 'asterstudy.gui.hexinjisuan.FRDParser'
+UNV = 'asterstudy.gui.hexinjisuan.inpgen.UNVParser'
+PREVIEW = 'asterstudy.gui.truss_bridge.preview'
+
+
+@scenario('frd', modules=(FRD,), nodes=50000, steps=4)
+def frd_parse(path):
+    """Parse a CalculiX result file (FRDParser)."""
+    from ..gui.hexinjisuan.FRDParser import Parse01
+    parser = Parse01(path, 0)
+    parser.exeparse(0)
+    return parser.node_block.numnod * (1 + len(parser.result_blocks))
+
+
+@scenario('frd', modules=(FRD, 'asterstudy.gui.hexinjisuan.VTUWriter'),
+          nodes=50000, steps=4)
+def frd_to_vtu(path):
+    """Convert a CalculiX result file to VTU steps (FRDParser, VTUWriter)."""
+    from ..gui.hexinjisuan.FRDParser import Parse01
+    from ..gui.hexinjisuan.VTUWriter import writeVTU
+    parser = Parse01(path, 0)
+    parser.exeparse(0)
+    steps = sorted(set(block.numstep for block in parser.result_blocks))
+    with _workdir() as folder:
+        for step in steps:
+            writeVTU(parser, osp.join(folder, 'step.%d.vtu' % step), step)
+    return parser.node_block.numnod * len(steps)
+
+
+@scenario('unv', modules=(UNV,), nodes=50000)
+def unv_parse(path):
+    """Parse a universal mesh file (UNVParser)."""
+    from ..gui.hexinjisuan.inpgen.UNVParser import UNVParser
+    fem = UNVParser(path).parse()
+    return len(fem.nodes) + len(fem.elements)
+
+
+@scenario('unv', nodes=50000,
+          modules=(UNV, 'asterstudy.gui.hexinjisuan.inpgen.INPWriter'))
+def unv_to_inp(path):
+    """Convert a universal mesh file to a CalculiX input (INPWriter)."""
+    from ..gui.hexinjisuan.inpgen.UNVParser import UNVParser
+    from ..gui.hexinjisuan.inpgen import INPWriter
+    fem = UNVParser(path).parse()
+    with _workdir() as folder, contextlib.redirect_stdout(io.StringIO()):
+        INPWriter.write(fem, 'mesh', folder)
+    return len(fem.nodes) + len(fem.elements)
+
+
+@scenario('med', modules=(PREVIEW, 'h5py'), nodes=50000)
+def med_mesh_read(path):
+    """Read the mesh of a MED file (preview.read_med)."""
+    from ..gui.truss_bridge.preview import read_med
+    return len(read_med(path, 'mesh').coords)
+
+
+@scenario('med', scaled=('nodes', 'steps'), modules=(PREVIEW, 'h5py'),
+          nodes=50000, steps=4)
+def med_field_read(path):
+    """Read the steps of the fields of a MED result (read_med_field)."""
+    from ..gui.truss_bridge.preview import read_med_field
+    return sum(len(values) for field in ('DEPL', 'SIPO_NOEU')
+               for _, values in read_med_field(path, synthetic.RESULT_NAME +
+                                               field))
+
+
+@scenario('med', modules=('asterstudy.common.extfiles', 'MEDLoader'),
+          nodes=50000)
+def med_groups(path):
+    """List the groups of a MED mesh (extfiles, MEDLoader)."""
+    from .extfiles import MESH_CACHE, MeshElemType, get_medfile_groups_by_type
+    MESH_CACHE.clear_cache()
+    return len(get_medfile_groups_by_type(
+        path, 'mesh', [MeshElemType.ENode, MeshElemType.E1D,
+                       MeshElemType.E2D]))
+
+
+@scenario('vtu', scaled=('nodes', 'steps'),
+          modules=('asterstudy.post.compare',), nodes=20000, steps=10)
+def vtu_series_read(path):
+    """Read all the steps of a VTU series (compare.PvdSeries)."""
+    from ..post.compare import PvdSeries
+    series = PvdSeries(osp.join(path, 'tank.pvd'))
+    try:
+        return sum(len(values) for index in range(len(series))
+                   for values in series.read(index).values())
+    finally:
+        series.close()
+
+
+@scenario('vtu', scaled=('nodes',), modules=('pvsimple',),
+          nodes=20000, steps=2)
+def post_array_range(path):
+    """Compute the range of a stress of a VTU step (ParaView)."""
+    import pvsimple
+    from ..post.utils import get_array_range
+    source = pvsimple.XMLUnstructuredGridReader(
+        FileName=[osp.join(path, 'tank.1.vtu')])
+    get_array_range(source, 'S', -1)
+    return 1
+
+
+@scenario('mess', scaled=('commands',), modules=(PREVIEW,),
+          commands=5000, modes=50)
+def log_mess(path):
+    """Read the frequencies of a message file (read_mess_frequencies)."""
+    from ..gui.truss_bridge.preview import read_mess_frequencies
+    return len(read_mess_frequencies(path))
+
+
+@scenario('foamlog', scaled=('steps',),
+          modules=('asterstudy.gui.parameterset.meshplan',), steps=20000)
+def log_foam(path):
+    """Read the step times of a solver log (meshplan.solver_step_time)."""
+    from ..gui.parameterset.meshplan import solver_step_time
+    return solver_step_time(path)[1]
+
+
+@scenario('dat', modules=('asterstudy.gui.hexinjisuan.dat2txt', 'pylab'),
+          nodes=20000, steps=4)
+def dat_report(path):
+    """Convert a CalculiX .dat file to the report tables (Dat2txt)."""
+    from ..gui.hexinjisuan.dat2txt import Dat2txt
+    with _workdir() as folder:
+        os.mkdir('Solid')
+        shutil.copy(path, osp.join('Solid', 'tank.dat'))
+        Dat2txt()
+        return len(os.listdir(folder)) - 1
+
+
+def inputs(workdir, scene, scale):
+    """Return the input of a scenario, generated if needed.
+
+    Returns:
+        dict: Path, size (bytes), generator arguments and SHA1 of the
+        input.
+    """
+    args = scene.arguments(scale)
+    key = hashlib.sha1(json.dumps([scene.kind, args]).encode()).hexdigest()
+    path = osp.join(workdir, '{}-{}'.format(scene.kind, key[:12]))
+    if scene.kind != 'vtu':
+        path += '.' + scene.kind
+    stamp = path + '.json'
+    if osp.isfile(stamp):
+        with open(stamp) as stream:
+            return json.load(stream)
+    os.makedirs(workdir, exist_ok=True)
+    info = synthetic.GENERATORS[scene.kind](path, **args)
+    digest = hashlib.sha1()
+    files = [path] if osp.isfile(path) else \
+        [osp.join(path, name) for name in sorted(os.listdir(path))]
+    for name in files:
+        with open(name, 'rb') as stream:
+            for block in iter(lambda: stream.read(1 << 20), b''):
+                digest.update(block)
+    info = {'path': path, 'size': info['size'], 'args': args,
+            'sha1': digest.hexdigest()}
+    with open(stamp, 'w') as stream:
+        json.dump(info, stream)
+    return info
+
+
+def _reset_peak():
+    """Reset the high-water mark of the resident memory (Linux only).
+
+    Returns:
+        bool: *False* if it can not be reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as stream:
+            stream.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def _peak():
+    """Return the peak resident memory of the process (MB)."""
+    try:
+        with open('/proc/self/status') as stream:
+            for line in stream:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.
+    except (OSError, ValueError, IndexError):
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024. * 1024 if sys.platform == 'darwin' else 1024.)
+
+
+def measure(name, path, repeat=3):
+    """Run a scenario in the current process.
+
+    Returns:
+        dict: Times (s), number of items, peak memory and its growth
+        during the scenario (MB).
+    """
+    scene = SCENARIOS[name]
+    for module in scene.modules:
+        importlib.import_module(module)
+    _reset_peak()
+    before = _peak()
+    times = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = scene.func(path)
+        times.append(time.perf_counter() - start)
+    peak = _peak()
+    times.sort()
+    return {'times': times, 'time': times[0], 'median': times[len(times) // 2],
+            'items': items, 'peak_mb': peak, 'delta_mb': peak - before}
+
+
+def _spawn(args, timeout=None):
+    """Run an action of this module in a child process.
+
+    Returns:
+        dict: JSON output of the action, with its 'status' ('ok' or
+        'error' with a 'reason').
+    """
+    root = osp.dirname(osp.dirname(osp.dirname(osp.abspath(__file__))))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    handle, output = tempfile.mkstemp(suffix='.json')
+    os.close(handle)
+    try:
+        proc = subprocess.run(
+            [sys.executable, '-m', 'asterstudy.common.datapath'] +
+            [str(arg) for arg in args] + [output], env=env, timeout=timeout,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if proc.returncode:
+            error = proc.stderr.decode(errors='replace').strip()
+            return {'status': 'error',
+                    'reason': error.splitlines()[-1] if error else
+                              'exit code {}'.format(proc.returncode)}
+        with open(output) as stream:
+            result = json.load(stream)
+        result['status'] = 'ok'
+        return result
+    except subprocess.TimeoutExpired:
+        return {'status': 'error', 'reason': 'timeout'}
+    finally:
+        os.remove(output)
+
+
+def run_child(name, path, repeat, timeout=None):
+    """Run a scenario in a child process (see `measure`)."""
+    return _spawn(['_child', name, path, repeat], timeout)
+
+
+def inputs_child(workdir, name, scale):
+    """Generate the input of a scenario in a child process (see
+    `inputs`)."""
+    return _spawn(['_inputs', workdir, name, scale])
+
+
+def run(names=None, scale='small', workdir=None, repeat=3, callback=None):
+    """Generate the inputs and run the scenarios.
+
+    Arguments:
+        names (Optional[list[str]]): Scenarios, all if *None*.
+        scale (str|float): Name in `SCALES` or multiplier of the sizes.
+        workdir (Optional[str]): Directory of the inputs (kept between
+            runs), a temporary directory if *None*.
+        repeat (int): Number of runs of each scenario.
+        callback (Optional[callable]): Called with the name and the
+            result of each scenario.
+
+    Returns:
+        dict: Description of the host and results by scenario.
+    """
+    temporary = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='datapath-inputs-')
+    results = OrderedDict()
+    try:
+        for name in names or SCENARIOS:
+            scene = SCENARIOS[name]
+            missing = scene.missing()
+            if missing:
+                result = {'status': 'skipped',
+                          'reason': 'no module {}'.format(missing)}
+            else:
+                data = inputs_child(workdir, name, scale)
+                if data['status'] != 'ok':
+                    results[name] = data
+                    if callback:
+                        callback(name, data)
+                    continue
+                result = run_child(name, data['path'], repeat)
+                result['input'] = {key: data[key]
+                                   for key in ('size', 'args', 'sha1')}
+                if result['status'] == 'ok':
+                    mbytes = data['size'] / 1e6
+                    result['mb_per_s'] = mbytes / max(result['time'], 1e-9)
+                    result['items_per_s'] = \
+                        result['items'] / max(result['time'], 1e-9)
+            results[name] = result
+            if callback:
+                callback(name, result)
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return OrderedDict([
+        ('date', time.strftime('%Y-%m-%d %H:%M:%S')),
+        ('host', platform.node()), ('platform', platform.platform()),
+        ('python', platform.python_version()), ('cpus', os.cpu_count()),
+        ('scale', scale), ('repeat', repeat), ('scenarios', results)])
+
+
+def baseline_path():
+    """Return the path of the baseline results."""
+    return os.getenv(BASELINE_ENV) or osp.join(
+        osp.expanduser('~'), '.asterstudy', 'datapath-baseline.json')
+
+
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE,
+            memory_tolerance=MEMORY_TOLERANCE):
+    """Compare results with a baseline.
+
+    Returns:
+        list[(str, str, float, float)]: Scenario, measure ('time' or
+        'memory'), baseline and current values of the regressions.
+    """
+    if results.get('scale') != baseline.get('scale'):
+        raise ValueError('scales differ: {} and {}'.format(
+            results.get('scale'), baseline.get('scale')))
+    regressions = []
+    for name, current in results['scenarios'].items():
+        reference = baseline['scenarios'].get(name)
+        if current.get('status') != 'ok' or not reference or \
+                reference.get('status') != 'ok':
+            continue
+        if current['input']['sha1'] != reference['input']['sha1']:
+            continue
+        checks = (('time', current['time'], reference['time'],
+                   time_tolerance, TIME_NOISE),
+                  ('memory', current['delta_mb'], reference['delta_mb'],
+                   memory_tolerance, MEMORY_NOISE))
+        for measure_, value, ref, tolerance, noise in checks:
+            if value > ref * (1. + tolerance) and value - ref > noise:
+                regressions.append((name, measure_, ref, value))
+    return regressions
+
+
+def _print_result(name, result):
+    if result['status'] != 'ok':
+        print('{:<18s} {:>8s}  {}'.format(name, result['status'],
+                                         result['reason']))
+        return
+    print('{:<18s} {:8.3f} s {:8.1f} MB/s {:10.0f} items/s {:7.1f} MB '
+          '(+{:.1f})'.format(name, result['time'], result['mb_per_s'],
+                             result['items_per_s'], result['peak_mb'],
+                             result['delta_mb']))
+
+
+def _print_regressions(regressions):
+    for name, measure_, ref, value in regressions:
+        unit = 's' if measure_ == 'time' else 'MB'
+        print('REGRESSION {}: {} {:.3f} {} -> {:.3f} {} ({:+.0%})'.format(
+            name, measure_, ref, unit, value, unit,
+            value / ref - 1. if ref else 1.))
+
+
+def _load(path):
+    with open(path) as stream:
+        return json.load(stream)
+
+
+def _save(path, results):
+    if osp.dirname(path):
+        os.makedirs(osp.dirname(path), exist_ok=True)
+    with open(path, 'w') as stream:
+        json.dump(results, stream, indent=1)
+
+
+def main(argv=None):
+    """Run the data-path benchmarks."""
+    import argparse
+    parser = argparse.ArgumentParser(description='Data-path benchmarks.')
+    sub = parser.add_subparsers(dest='command')
+    prun = sub.add_parser('run', help='run the scenarios')
+    prun.add_argument('names', nargs='*', help='scenarios (default: all)')
+    prun.add_argument('--scale', default='small',
+                      help='{} or a multiplier'.format('/'.join(SCALES)))
+    prun.add_argument('--repeat', type=int, default=3)
+    prun.add_argument('--workdir', help='directory of the generated inputs')
+    prun.add_argument('-o', '--output', help='write the results (JSON)')
+    prun.add_argument('--baseline', default=None)
+    prun.add_argument('--save-baseline', action='store_true')
+    prun.add_argument('--tolerance', type=float, default=TIME_TOLERANCE)
+    sub.add_parser('list', help='list the scenarios')
+    pcmp = sub.add_parser('compare', help='compare results with a baseline')
+    pcmp.add_argument('results')
+    pcmp.add_argument('--baseline', default=None)
+    pcmp.add_argument('--tolerance', type=float, default=TIME_TOLERANCE)
+    pchild = sub.add_parser('_child')
+    pchild.add_argument('name')
+    pchild.add_argument('path')
+    pchild.add_argument('repeat', type=int)
+    pchild.add_argument('output')
+    pinputs = sub.add_parser('_inputs')
+    pinputs.add_argument('workdir')
+    pinputs.add_argument('name')
+    pinputs.add_argument('scale')
+    pinputs.add_argument('output')
+    args = parser.parse_args(argv)
+
+    if args.command == '_child':
+        _save(args.output, measure(args.name, args.path, args.repeat))
+        return 0
+    if args.command == '_inputs':
+        scale = args.scale if args.scale in SCALES else float(args.scale)
+        _save(args.output, inputs(args.workdir, SCENARIOS[args.name], scale))
+        return 0
+    if args.command == 'list':
+        for name, scene in SCENARIOS.items():
+            missing = scene.missing()
+            print('{:<18s} {}{}'.format(
+                name, scene.doc,
+                ' [no module {}]'.format(missing) if missing else ''))
+        return 0
+    if args.command == 'compare':
+        results = _load(args.results)
+    elif args.command == 'run':
+        scale = args.scale if args.scale in SCALES else float(args.scale)
+        results = run(args.names, scale, args.workdir, args.repeat,
+                      _print_result)
+        if args.output:
+            _save(args.output, results)
+        if args.save_baseline:
+            _save(args.baseline or baseline_path(), results)
+            return 0
+    else:
+        parser.print_help()
+        return 1
+    path = args.baseline or baseline_path()
+    if not osp.isfile(path):
+        print('no baseline ({})'.format(path))
+        return 0
+    try:
+        regressions = compare(results, _load(path), args.tolerance)
+    except ValueError as exc:
+        print('not compared: {}'.format(exc))
+        return 0
+    _print_regressions(regressions)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Import profiler
+---------------
+
+Measurement of the time spent importing modules at startup.
+
+Python 3.6 has no ``-X importtime`` option: `ImportProfiler` wraps
+``builtins.__import__`` and records a tree of the imports that really
+loaded new modules, with their cumulative and self times. Milestones
+of the startup (workspace created, first interactive window...) are
+recorded with `mark_startup()`.
+
+The profiler is enabled when the module is loaded by SALOME with the
+environment variable ``ASTERSTUDY_IMPORT_PROFILE`` set to the path of
+the report::
+
+    ASTERSTUDY_IMPORT_PROFILE=/tmp/startup.txt salome
+
+A JSON version of the report is written next to it (``.json``).
+
+The cost of importing a module in a fresh interpreter can also be
+measured from the command line, for example before and after a
+change::
+
+    python3 -m asterstudy.common.importprofile --runs 5 \\
+        asterstudy.gui.truss_bridge.truss_bridge
+"""
+
+
+import builtins
+import importlib.util
+import json
+import os
+import sys
+import time
+
+
+PROFILE_ENV = 'ASTERSTUDY_IMPORT_PROFILE'
+
+
+class ImportNode:
+    """Import of a module and of the modules it imported.
+
+    Arguments:
+        name (str): Absolute name of the imported module.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.cumulative = 0.
+        self.loaded = 0
+        self.children = []
+
+    @property
+    def self_time(self):
+        """float: Time spent in this import only, in seconds."""
+        return self.cumulative - sum(child.cumulative
+                                     for child in self.children)
+
+    def as_dict(self):
+        """Return the subtree as a dict (for JSON export)."""
+        return {'name': self.name,
+                'cumulative': self.cumulative,
+                'self': self.self_time,
+                'loaded': self.loaded,
+                'children': [child.as_dict() for child in self.children]}
+
+
+class ImportProfiler:
+    """Record the cost of the imports done while it is installed."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.root = ImportNode('<startup>')
+        self.marks = []
+        self._stack = [self.root]
+        self._import = None
+
+    def install(self):
+        """Start recording."""
+        if self._import is None:
+            self._import = builtins.__import__
+            builtins.__import__ = self._profiled_import
+
+    def uninstall(self):
+        """Stop recording."""
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+        self.root.cumulative = sum(child.cumulative
+                                   for child in self.root.children)
+
+    def mark(self, label):
+        """Record a milestone, in seconds since the start of profiling."""
+        self.marks.append((label, time.perf_counter() - self.start))
+
+    def _profiled_import(self, name, globals=None, locals=None,
+                         fromlist=(), level=0):
+        # pragma pylint: disable=redefined-builtin
+        absname = name
+        if level > 0:
+            package = (globals or {}).get('__package__') or \
+                (globals or {}).get('__name__', '')
+            try:
+                absname = importlib.util.resolve_name('.' * level + name,
+                                                      package)
+            except (ImportError, ValueError):
+                pass
+        if not self._is_new(absname, fromlist):
+            return self._import(name, globals, locals, fromlist, level)
+
+        node = ImportNode(absname)
+        parent = self._stack[-1]
+        self._stack.append(node)
+        before = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            node.cumulative = time.perf_counter() - start
+            node.loaded = len(sys.modules) - before
+            self._stack.pop()
+            if node.loaded > 0 or node.children:
+                parent.children.append(node)
+
+    @staticmethod
+    def _is_new(name, fromlist):
+        """Tell if importing *name* may load a module."""
+        module = sys.modules.get(name)
+        if module is None:
+            return True
+        for item in fromlist or ():
+            if item != '*' and not hasattr(module, item) \
+                    and name + '.' + item not in sys.modules:
+                return True
+        return False
+
+    def flat(self):
+        """Return the self time of each imported module.
+
+        Returns:
+            list[(str, float, float)]: Module names, self and cumulative
+            times in seconds, sorted by decreasing self time.
+        """
+        costs = {}
+
+        def _walk(node):
+            for child in node.children:
+                selft, cumul = costs.get(child.name, (0., 0.))
+                costs[child.name] = (selft + child.self_time,
+                                     cumul + child.cumulative)
+                _walk(child)
+        _walk(self.root)
+        return sorted(((name, value[0], value[1])
+                       for name, value in costs.items()),
+                      key=lambda item: -item[1])
+
+    def report(self, threshold=0.005, top=30):
+        """Return a text report.
+
+        Arguments:
+            threshold (Optional[float]): Imports cheaper than that (in
+                seconds) are not detailed in the tree.
+            top (Optional[int]): Number of modules listed by self time.
+
+        Returns:
+            str: Report.
+        """
+        lines = ['Startup milestones (s since profiling started):']
+        lines.extend('  {:8.3f}  {}'.format(value, label)
+                     for label, value in self.marks)
+        lines.append('')
+        lines.append('Import tree (cumulative ms / self ms / modules):')
+
+        def _walk(node, indent):
+            for child in sorted(node.children,
+                                key=lambda item: -item.cumulative):
+                if child.cumulative < threshold:
+                    continue
+                lines.append('{:9.1f} {:9.1f} {:5d}  {}{}'.format(
+                    child.cumulative * 1000., child.self_time * 1000.,
+                    child.loaded, '  ' * indent, child.name))
+                _walk(child, indent + 1)
+        _walk(self.root, 0)
+        lines.append('')
+        lines.append('Most expensive modules (self ms / cumulative ms):')
+        lines.extend('{:9.1f} {:9.1f}  {}'.format(selft * 1000.,
+                                                  cumul * 1000., name)
+                     for name, selft, cumul in self.flat()[:top])
+        return '\n'.join(lines) + '\n'
+
+    def as_dict(self):
+        """Return the whole profile as a dict (for JSON export)."""
+        return {'marks': [{'label': label, 'time': value}
+                          for label, value in self.marks],
+                'imports': self.root.as_dict()}
+
+    def write(self, path):
+        """Write the text report to *path* and the JSON one next to it."""
+        with open(path, 'w') as report:
+            report.write(self.report())
+        with open(os.path.splitext(path)[0] + '.json', 'w') as report:
+            json.dump(self.as_dict(), report, indent=1)
+
+
+_PROFILER = None
+
+
+def enable_import_profile():
+    """Install the import profiler if ``ASTERSTUDY_IMPORT_PROFILE`` is set.
+
+    Returns:
+        ImportProfiler: Active profiler, *None* if profiling is disabled.
+    """
+    global _PROFILER # pragma pylint: disable=global-statement
+    if _PROFILER is None and os.getenv(PROFILE_ENV):
+        _PROFILER = ImportProfiler()
+        _PROFILER.install()
+    return _PROFILER
+
+
+def mark_startup(label):
+    """Record a startup milestone (no-op if profiling is disabled)."""
+    if _PROFILER is not None:
+        _PROFILER.mark(label)
+
+
+def finish_import_profile(label='interactive'):
+    """Record the last milestone, stop profiling and write the report."""
+    global _PROFILER # pragma pylint: disable=global-statement
+    if _PROFILER is None:
+        return
+    _PROFILER.mark(label)
+    _PROFILER.uninstall()
+    _PROFILER.write(os.getenv(PROFILE_ENV))
+    _PROFILER = None
+
+
+_MEASURE = r"""
+import importlib.util, json, sys
+# load the profiler alone, without the asterstudy packages
+spec = importlib.util.spec_from_file_location('_importprofile', sys.argv[3])
+profile = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(profile)
+profiler = profile.ImportProfiler()
+profiler.install()
+try:
+    __import__(sys.argv[1])
+    error = None
+except Exception as exc:
+    error = repr(exc)
+profiler.uninstall()
+print(json.dumps({'total': profiler.root.cumulative, 'error': error,
+                  'flat': profiler.flat()[:int(sys.argv[2])]}))
+"""
+
+
+def measure_import(module, runs=5, top=10):
+    """Measure the import of *module* in fresh interpreters.
+
+    Arguments:
+        module (str): Name of the module.
+        runs (Optional[int]): Number of interpreters started.
+        top (Optional[int]): Number of expensive modules returned.
+
+    Returns:
+        dict: Median total time in seconds, all the totals, the error
+        raised by the import (if any) and the most expensive modules of
+        the median run.
+    """
+    import subprocess
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + [path for path in [env.get('PYTHONPATH')] if path])
+    results = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', _MEASURE, module, str(top),
+             os.path.abspath(__file__)], env=env)
+        results.append(json.loads(output.decode().splitlines()[-1]))
+    results.sort(key=lambda item: item['total'])
+    median = results[len(results) // 2]
+    return {'module': module, 'median': median['total'],
+            'totals': [item['total'] for item in results],
+            'error': median['error'], 'flat': median['flat']}
+
+
+def main():
+    """Print the import cost of some modules."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Measure the import time of modules.')
+    parser.add_argument('modules', nargs='+', help='modules to import')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='number of fresh interpreters per module')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of expensive modules listed')
+    args = parser.parse_args()
+
+    for module in args.modules:
+        res = measure_import(module, args.runs, args.top)
+        print('%s: median %.1f ms over %d runs%s'
+              % (module, res['median'] * 1000., args.runs,
+                 ' (failed: %s)' % res['error'] if res['error'] else ''))
+        for name, selft, cumul in res['flat']:
+            print('  %9.1f %9.1f  %s' % (selft * 1000., cumul * 1000., name))
+
+
+if __name__ == '__main__':
+    main()
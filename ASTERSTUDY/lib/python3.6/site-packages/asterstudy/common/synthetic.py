@@ -0,0 +1,506 @@
+"""
+Synthetic input files
+---------------------
+
+Deterministic generators of the files read and written by the heavy
+data paths, at any scale:
+
+- `write_frd`: CalculiX results (``.frd``: nodes, 8-node bricks, DISP
+  and STRESS blocks of each step) as read by `FRDParser`,
+- `write_unv`: I-DEAS universal mesh (datasets 2411, 2412 and 2467)
+  as read by `UNVParser`,
+- `write_med`: truss bridge mesh (`preview.truss_mesh`) with code_aster
+  nodal result fields, in the MED layout of ``static_res.rmed``,
+- `write_vtu_series`: ASCII VTU steps and their PVD file, as written
+  by `VTUWriter` and `Frd2pvd`,
+- `write_mess`, `write_foam_log`, `write_dat`, `write_watchpoint`:
+  code_aster message file, OpenFOAM solver log, CalculiX ``.dat``
+  file and preCICE watch point log.
+
+The content only depends on the arguments and on *seed*: two calls
+write the same bytes, so that the benchmarks (`datapath`) always time
+the same inputs.
+
+Example::
+
+    python3 -m asterstudy.common.synthetic frd /tmp/big.frd --nodes 100000
+    python3 -m asterstudy.common.synthetic vtu /tmp/series --steps 50
+"""
+
+import io
+import math
+import os
+import os.path as osp
+import sys
+
+import numpy
+
+
+# Component names of the stress written by VTUWriter (FRDParser adds
+# the equivalent and principal stresses)
+STRESS_COMPONENTS = ('xx', 'yy', 'zz', 'xy', 'yz', 'zx', 'Mises',
+                     'Min Principal', 'Mid Principal', 'Max Principal')
+
+# Prefix of the result fields written by code_aster (8 characters)
+RESULT_NAME = 'reslin__'
+
+
+def box_mesh(nodes):
+    """Return a structured mesh of hexahedra with about *nodes* nodes.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): Coordinates (nodes, 3) and
+        connectivity (cells, 8), 0-based, in the VTK/CalculiX order.
+    """
+    side = max(2, int(round(nodes ** (1. / 3))))
+    axis = numpy.linspace(0., 1., side)
+    xyz = numpy.stack(numpy.meshgrid(axis, axis, axis, indexing='ij'),
+                      axis=-1).reshape(-1, 3)
+    ijk = numpy.arange(side ** 3).reshape(side, side, side)
+    ijk = ijk[:-1, :-1, :-1].ravel()
+    dx, dy = side * side, side
+    hexa = numpy.stack([ijk, ijk + dx, ijk + dx + dy, ijk + dy, ijk + 1,
+                        ijk + dx + 1, ijk + dx + dy + 1, ijk + dy + 1],
+                       axis=1)
+    return xyz, hexa
+
+
+def displacement(xyz, value, rng):
+    """Return a smooth displacement field with a little noise."""
+    return 1e-3 * value * numpy.sin(numpy.pi * xyz) + \
+        1e-7 * rng.standard_normal(xyz.shape)
+
+
+def stress(xyz, value):
+    """Return a smooth stress field (xx, yy, zz, xy, yz, zx)."""
+    return 1e6 * value * numpy.cos(numpy.pi * xyz[:, [0, 1, 2, 0, 1, 2]]) * \
+        numpy.array([1., .8, .6, .3, .2, .1])
+
+
+def _text(array, fmt):
+    """Format the rows of an array."""
+    stream = io.StringIO()
+    numpy.savetxt(stream, array.reshape(len(array), -1), fmt=fmt)
+    return stream.getvalue()
+
+
+def _result(path, **info):
+    info['size'] = osp.getsize(path)
+    return info
+
+
+# CalculiX -------------------------------------------------------------------
+
+def frd_header(xyz, hexa):
+    """Return the header of a ``.frd`` file (nodes and elements)."""
+    nums = numpy.arange(1, len(xyz) + 1)
+    ones = numpy.ones(len(hexa), int)
+    rows = numpy.column_stack([numpy.arange(1, len(hexa) + 1), ones,
+                               0 * ones, ones, hexa + 1])
+    return ''.join([
+        '    1Csynthetic\n    1UUSER\n',
+        '    2C{:>30d}{:>37d}\n'.format(len(xyz), 1),
+        _text(numpy.column_stack([nums, xyz]), ' -1%10d%12.5E%12.5E%12.5E'),
+        ' -3\n',
+        '    3C{:>30d}{:>37d}\n'.format(len(hexa), 1),
+        _text(rows, ' -1%10d%5d%5d%5d\n -2' + '%10d' * 8),
+        ' -3\n'])
+
+
+def frd_step(step, value, xyz, rng):
+    """Return the DISP and STRESS blocks of an increment of a ``.frd``
+    file."""
+    nums = numpy.arange(1, len(xyz) + 1)
+    head = '  100CL  101{:12.5E}{:12d}                     0{:5d}' \
+        '           1\n'.format(value, len(xyz), step)
+    text = ['    1PSTEP{:>25d}{:>12d}{:>12d}\n'.format(step, 1, step),
+            head, ' -4  DISP        4    1\n']
+    for i, name in enumerate(('D1', 'D2', 'D3'), 1):
+        text.append(' -5  {:<8s}    1    2{:5d}    0\n'.format(name, i))
+    text.append(' -5  ALL         1    2    0    0    1ALL\n')
+    text.append(_text(numpy.column_stack([nums, displacement(xyz, value,
+                                                             rng)]),
+                      ' -1%10d%12.5E%12.5E%12.5E'))
+    text.extend([' -3\n', head, ' -4  STRESS      6    1\n'])
+    for name, (i, j) in zip(('SXX', 'SYY', 'SZZ', 'SXY', 'SYZ', 'SZX'),
+                            ((1, 1), (2, 2), (3, 3), (1, 2), (2, 3),
+                             (3, 1))):
+        text.append(' -5  {:<8s}    1    4{:5d}{:5d}\n'.format(name, i, j))
+    text.append(_text(numpy.column_stack([nums, stress(xyz, value)]),
+                      ' -1%10d' + '%12.5E' * 6))
+    text.append(' -3\n')
+    return ''.join(text)
+
+
+def write_frd(path, nodes=10000, steps=4, seed=0):
+    """Write a CalculiX result file.
+
+    Arguments:
+        path (str): Path of the ``.frd`` file.
+        nodes (int): Approximate number of nodes.
+        steps (int): Number of increments (DISP and STRESS each).
+
+    Returns:
+        dict: Numbers of nodes, cells and steps, size of the file.
+    """
+    rng = numpy.random.RandomState(seed)
+    xyz, hexa = box_mesh(nodes)
+    with open(path, 'w') as frd:
+        frd.write(frd_header(xyz, hexa))
+        for step in range(1, steps + 1):
+            frd.write(frd_step(step, 0.1 * step, xyz, rng))
+        frd.write(' 9999\n')
+    return _result(path, nodes=len(xyz), cells=len(hexa), steps=steps)
+
+
+def write_dat(path, nodes=10000, steps=4, seed=0):
+    """Write a CalculiX ``.dat`` file (displacements of each step)."""
+    rng = numpy.random.RandomState(seed)
+    xyz, _ = box_mesh(nodes)
+    nums = numpy.arange(1, len(xyz) + 1)
+    with open(path, 'w') as dat:
+        for step in range(1, steps + 1):
+            value = 0.1 * step
+            dat.write('\n displacements (vx,vy,vz) for set NALL and time  '
+                      '{:.7E}\n\n'.format(value))
+            dat.write(_text(numpy.column_stack(
+                [nums, displacement(xyz, value, rng)]),
+                            '%10d %13.6E %13.6E %13.6E'))
+    return _result(path, nodes=len(xyz), steps=steps)
+
+
+# Meshes ---------------------------------------------------------------------
+
+def write_unv(path, nodes=10000, groups=6, seed=0):
+    """Write a universal mesh file of hexahedra with node and element
+    groups.
+
+    Arguments:
+        path (str): Path of the ``.unv`` file.
+        nodes (int): Approximate number of nodes.
+        groups (int): Number of groups (slices along X, alternately of
+            nodes and of elements).
+
+    Returns:
+        dict: Numbers of nodes, cells and groups, size of the file.
+    """
+    rng = numpy.random.RandomState(seed)
+    xyz, hexa = box_mesh(nodes)
+    xyz = xyz + 1e-4 * rng.standard_normal(xyz.shape)
+    flag = '    -1\n'
+    ones = numpy.ones(len(xyz), int)
+    with open(path, 'w') as unv:
+        unv.write(flag + '  2411\n')
+        rows = numpy.column_stack([numpy.arange(1, len(xyz) + 1), ones, ones,
+                                   11 * ones, xyz])
+        unv.write(_text(rows, '%10d%10d%10d%10d\n%25.16E%25.16E%25.16E'))
+        unv.write(flag + flag + '  2412\n')
+        ones = numpy.ones(len(hexa), int)
+        rows = numpy.column_stack([numpy.arange(1, len(hexa) + 1),
+                                   115 * ones, ones, ones, 7 * ones,
+                                   8 * ones, hexa + 1])
+        unv.write(_text(rows, '%10d' * 6 + '\n' + '%10d' * 8))
+        unv.write(flag + flag + '  2467\n')
+        centers = xyz[hexa].mean(axis=1)
+        for num in range(groups):
+            low, high = num / float(groups), (num + 1) / float(groups)
+            kind, coords = (8, centers) if num % 2 else (7, xyz)
+            items = numpy.nonzero((coords[:, 0] >= low) &
+                                  (coords[:, 0] < high))[0] + 1
+            unv.write(('{:10d}' * 8 + '\n').format(num + 1, 0, 0, 0, 0, 0, 0,
+                                                   len(items)))
+            unv.write('GROUP_{}\n'.format(num + 1))
+            entries = numpy.zeros((len(items), 4), int)
+            entries[:, 0] = kind
+            entries[:, 1] = items
+            even = len(items) // 2 * 2
+            if even:
+                unv.write(_text(entries[:even].reshape(-1, 8), '%10d' * 8))
+            if len(items) % 2:
+                unv.write(('{:10d}' * 4 + '\n').format(*entries[-1]))
+        unv.write(flag)
+    return _result(path, nodes=len(xyz), cells=len(hexa), groups=groups)
+
+
+# Components of the nodal fields of `write_med`
+MED_FIELDS = {'DEPL': ('DX', 'DY', 'DZ', 'DRX', 'DRY', 'DRZ'),
+              'SIPO_NOEU': ('SN', 'SVY', 'SVZ', 'SMT', 'SMFY', 'SMFZ'),
+              'EFGE_NOEU': ('N', 'VY', 'VZ', 'MT', 'MFY', 'MFZ'),
+              'REAC_NODA': ('DX', 'DY', 'DZ', 'DRX', 'DRY', 'DRZ')}
+
+
+def write_med(path, nodes=10000, steps=1, sections=8, seed=0,
+              fields=('DEPL', 'SIPO_NOEU')):
+    """Write a MED result of the truss bridge.
+
+    The mesh is `preview.truss_mesh` refined to about *nodes* nodes,
+    the fields are the nodal displacements (``DEPL``, 6 components) and
+    generalized stresses (``SIPO_NOEU``) of each step, or the *fields*
+    of `MED_FIELDS` (the forces are stress-like).
+
+    Returns:
+        dict: Numbers of nodes, cells and steps, size of the file.
+    """
+    import h5py
+    from ..gui.truss_bridge.preview import truss_mesh, write_med as _mesh
+    rng = numpy.random.RandomState(seed)
+    # about 0.2 (sections x divisions)^2 nodes on the deck
+    divisions = max(1, int(round(math.sqrt(nodes / 0.2) / sections)))
+    mesh = truss_mesh(sections=sections, divisions=divisions)
+    name = 'mesh'
+    _mesh(mesh, path, name)
+    coords = numpy.asarray(mesh.coords, float)
+    scaled = (coords - coords.min(axis=0)) / numpy.ptp(coords, axis=0).clip(1.)
+    with h5py.File(path, 'a') as med:
+        for field in fields:
+            components = MED_FIELDS[field]
+            group = med.create_group('CHA/' + RESULT_NAME + field)
+            group.attrs['MAI'] = numpy.bytes_(name.encode())
+            group.attrs['NCO'] = numpy.int32(len(components))
+            group.attrs['NOM'] = numpy.bytes_(''.join(
+                '{:<16s}'.format(comp) for comp in components).encode())
+            group.attrs['TYP'] = numpy.int32(6)
+            group.attrs['UNI'] = numpy.bytes_(b' ' * 16 * len(components))
+            group.attrs['UNT'] = numpy.bytes_(b'')
+            for step in range(1, steps + 1):
+                value = float(step) / steps
+                if field == 'DEPL':
+                    data = numpy.hstack([displacement(scaled, value, rng),
+                                         1e-3 * displacement(scaled, value,
+                                                             rng)])
+                else:
+                    data = stress(scaled, value)
+                item = group.create_group('%020d%020d' % (step, 1))
+                for key, val in (('NDT', step), ('NOR', 1), ('RDT', -1),
+                                 ('ROR', -1)):
+                    item.attrs[key] = numpy.int32(val)
+                item.attrs['PDT'] = numpy.float64(value)
+                noe = item.create_group('NOE')
+                noe.attrs['GAU'] = numpy.bytes_(b'')
+                noe.attrs['PFL'] = numpy.bytes_(b'MED_NO_PROFILE_INTERNAL')
+                values = noe.create_group('MED_NO_PROFILE_INTERNAL')
+                values.attrs['GAU'] = numpy.bytes_(b'')
+                values.attrs['NBR'] = numpy.int32(len(coords))
+                values.attrs['NGA'] = numpy.int32(1)
+                # all the values of a component, then the next one
+                values.create_dataset('CO', data=data.T.ravel())
+    return _result(path, nodes=len(coords),
+                   cells=len(mesh.segs) + len(mesh.quads), steps=steps)
+
+
+# VTU series -----------------------------------------------------------------
+
+def write_vtu_series(folder, nodes=10000, steps=10, name='tank', seed=0):
+    """Write ASCII VTU steps (``<name>.<step>.vtu``) and their PVD file.
+
+    The files are formatted as the ones of `VTUWriter` (displacement
+    ``U`` and stress ``S`` with its equivalent and principal values),
+    the PVD file has the ``fname`` and ``currentposition`` elements of
+    `Frd2pvd`.
+
+    Returns:
+        dict: Numbers of nodes, cells and steps, size of the files,
+        path of the PVD file.
+    """
+    rng = numpy.random.RandomState(seed)
+    xyz, hexa = box_mesh(nodes)
+    os.makedirs(folder, exist_ok=True)
+    geometry = (
+        '\t\t\t<Points>\n\t\t\t\t<DataArray type="Float64" '
+        'NumberOfComponents="3" format="ascii">\n' +
+        _text(xyz, '\t\t\t\t' + '\t% .8E' * 3) +
+        '\n\t\t\t\t</DataArray>\n\t\t\t</Points>\n\t\t\t<Cells>\n'
+        '\t\t\t\t<DataArray type="Int32" Name="connectivity" '
+        'format="ascii">\n\t\t\t\t\t' +
+        ' '.join(map(str, hexa.ravel())) + ' \n\t\t\t\t</DataArray>\n'
+        '\t\t\t\t<DataArray type="Int32" Name="offsets" format="ascii">\n'
+        '\t\t\t\t\t' + ' '.join(map(str, range(8, 8 * len(hexa) + 1, 8))) +
+        ' \n\t\t\t\t</DataArray>\n\t\t\t\t<DataArray type="UInt8" '
+        'Name="types" format="ascii">\n\t\t\t\t\t' + '12 ' * len(hexa) +
+        '\n\t\t\t\t</DataArray>\n\t\t\t</Cells>\n')
+    names = ' '.join('ComponentName{}="{}"'.format(i, comp)
+                     for i, comp in enumerate(STRESS_COMPONENTS))
+    files = []
+    size = 0
+    for step in range(1, steps + 1):
+        value = 0.1 * step
+        sig = stress(xyz, value)
+        tensors = sig[:, [0, 3, 5, 3, 1, 4, 5, 4, 2]].reshape(-1, 3, 3)
+        mises = numpy.sqrt(0.5 * ((sig[:, 0] - sig[:, 1]) ** 2 +
+                                  (sig[:, 1] - sig[:, 2]) ** 2 +
+                                  (sig[:, 2] - sig[:, 0]) ** 2) +
+                           3. * (sig[:, 3:] ** 2).sum(axis=1))
+        sig = numpy.column_stack([sig, mises, numpy.linalg.eigvalsh(tensors)])
+        files.append('{}.{}.vtu'.format(name, step))
+        path = osp.join(folder, files[-1])
+        with open(path, 'w') as vtu:
+            vtu.write('<?xml version="1.0"?>\n<VTKFile type="UnstructuredGrid"'
+                      ' version="0.1" byte_order="LittleEndian">\n'
+                      '\t<UnstructuredGrid>\n\t\t<Piece NumberOfPoints="{}" '
+                      'NumberOfCells="{}">\n'.format(len(xyz), len(hexa)))
+            vtu.write(geometry)
+            vtu.write('\t\t\t<PointData>\n\t\t\t\t<DataArray type="Float32" '
+                      'Name="U" NumberOfComponents="3" ComponentName0="D1" '
+                      'ComponentName1="D2" ComponentName2="D3" '
+                      'format="ascii">\n')
+            vtu.write(_text(displacement(xyz, value, rng),
+                            '\t\t\t\t' + '\t% .8E' * 3))
+            vtu.write('\t\t\t\t</DataArray>\n\t\t\t\t<DataArray '
+                      'type="Float32" Name="S" NumberOfComponents="{}" {} '
+                      'format="ascii">\n'
+                      .format(len(STRESS_COMPONENTS), names))
+            vtu.write(_text(sig, '\t\t\t\t' + '\t% .8E' * sig.shape[1]))
+            vtu.write('\t\t\t\t</DataArray>\n\t\t\t</PointData>\n\t\t</Piece>'
+                      '\n\t</UnstructuredGrid>\n</VTKFile>')
+        size += osp.getsize(path)
+    pvd = osp.join(folder, name + '.pvd')
+    with open(pvd, 'w') as stream:
+        stream.write('<?xml version="1.0"?>\n<VTKFile type="Collection" '
+                     'version="0.1" byte_order="LittleEndian">\n'
+                     '\t<Collection>\n')
+        for step, fname in enumerate(files, 1):
+            stream.write('\t\t<DataSet timestep="{}" file="{}"/>\n'.format(
+                0.1 * step, fname))
+        stream.write('\t</Collection>\n\t<fname>\n\t{}.frd\n\t</fname>\n'
+                     '\t<currentposition>\n\t0\n\t</currentposition>\n'
+                     '</VTKFile>'.format(name))
+    return {'nodes': len(xyz), 'cells': len(hexa), 'steps': steps,
+            'size': size + osp.getsize(pvd), 'pvd': pvd}
+
+
+# Logs -----------------------------------------------------------------------
+
+def write_mess(path, commands=200, modes=10, seed=0):
+    """Write a code_aster message file: *commands* command reports, the
+    table of the frequencies of *modes* modes and the time summary."""
+    rng = numpy.random.RandomState(seed)
+    with open(path, 'w', encoding='utf-8') as mess:
+        mess.write('-- CODE_ASTER -- VERSION : EXPLOITATION (stable) --\n\n')
+        for num in range(1, commands + 1):
+            mess.write(
+                '  # ---------------------------------------------------'
+                '---------------------------------------\n'
+                '  # Commande No :  {:04d}            Concept de type : '
+                'cham_no_sdaster\n  # ------------------------------------'
+                '------------------------------------------------------\n'
+                '  resu = CALC_CHAMP(RESULTAT=reslin,\n'
+                '                    CONTRAINTE=(\'SIPO_NOEU\',))\n\n'
+                '  # Mémoire (Mo) :  {:7.2f} /  {:7.2f} /    49.98 /    38.51'
+                ' (VmPeak / VmSize / Optimum / Minimum)\n'
+                '  # Fin commande No : {:04d}   user+syst:        {:.2f}s '
+                '(syst:        0.01s, elaps:        {:.2f}s)\n'.format(
+                    num, 1900 + rng.rand(), 1900 + rng.rand(), num,
+                    rng.rand(), rng.rand()))
+        frequencies = numpy.sort(1. + 3. * rng.rand(modes))
+        mess.write('-' * 72 + '\n     Calcul modal : Méthode d\'itération '
+                   'simultanée\n                    Méthode de Sorensen\n\n'
+                   'numéro    fréquence (HZ)     norme d\'erreur\n')
+        for num, freq in enumerate(frequencies, 1):
+            mess.write('{:5d}       {:.5E}        {:.5E}\n'.format(
+                num, freq, 1e-10 * rng.rand()))
+        mess.write('\n  Norme d\'erreur moyenne   :  1.08663E-10\n' +
+                   '-' * 72 + '\n\n' + '*' * 80 + '\n')
+        mess.write(' * TOTAL_JOB                :       2.90 :       0.43 :'
+                   '       3.33 :       2.25 *\n' + '*' * 80 + '\n')
+    return _result(path, commands=commands, modes=modes)
+
+
+def foam_step(step, rng, delta=1e-4):
+    """Return the output of a time step of interFoam."""
+    res = rng.rand(6) * 1e-3
+    return (
+        'Courant Number mean: {0:.6g} max: {1:.6g}\n'
+        'Interface Courant Number mean: 0 max: 0\n'
+        'deltaT = {9:g}\nTime = {2:.4f}\n\n'
+        'PIMPLE: iteration 1\n'
+        'smoothSolver:  Solving for alpha.water, Initial residual = '
+        '{3:.6g}, Final residual = {4:.6g}, No Iterations 1\n'
+        'Phase-1 volume fraction = 0.5  Min(alpha.water) = 0  '
+        'Max(alpha.water) = 1\n'
+        'DICPCG:  Solving for p_rgh, Initial residual = {5:.6g}, '
+        'Final residual = {6:.6g}, No Iterations 12\n'
+        'time step continuity errors : sum local = 1e-09, global = '
+        '1e-12, cumulative = 1e-10\n'
+        'ExecutionTime = {7:.2f} s  ClockTime = {8:d} s\n\n'.format(
+            res[0], 10 * res[1], delta * step, res[2], 1e-3 * res[2],
+            res[3], 1e-3 * res[3], 0.05 * step, int(0.05 * step), delta))
+
+
+FOAM_BANNER = ('/*---------------------------------------------------------'
+               '------------------*\\\n  =========                 |\n'
+               'Build  : v2006\nExec   : interFoam -parallel\n\n'
+               'Starting time loop\n\n')
+
+
+def write_foam_log(path, steps=1000, seed=0):
+    """Write an interFoam solver log of *steps* time steps."""
+    rng = numpy.random.RandomState(seed)
+    with open(path, 'w') as log:
+        log.write(FOAM_BANNER)
+        for step in range(1, steps + 1):
+            log.write(foam_step(step, rng))
+        log.write('End\n\n')
+    return _result(path, steps=steps)
+
+
+WATCHPOINT_NAMES = ('Time', 'Coordinate0', 'Coordinate1', 'Coordinate2',
+                    'Forces00', 'Forces01', 'Forces02', 'Displacements00',
+                    'Displacements01', 'Displacements02')
+
+# Format of a row of a watch point log
+WATCHPOINT_FORMAT = '  %20.10e' * len(WATCHPOINT_NAMES)
+
+
+def watchpoint_rows(steps, rng, delta=1e-3):
+    """Return the rows of a preCICE watch point log (steps, columns)."""
+    rows = numpy.zeros((steps, len(WATCHPOINT_NAMES)))
+    rows[:, 0] = delta * numpy.arange(1, steps + 1)
+    rows[:, 1:4] = (0.5, 0.25, 1.)
+    rows[:, 4:] = numpy.cumsum(rng.standard_normal((steps, 6)), axis=0)
+    rows[:, 7:] *= 1e-6
+    return rows
+
+
+def watchpoint_header():
+    """Return the header line of a preCICE watch point log."""
+    return '  '.join('{:>20s}'.format(name)
+                     for name in WATCHPOINT_NAMES) + '\n'
+
+
+def write_watchpoint(path, steps=1000, seed=0):
+    """Write a preCICE watch point log of *steps* time steps."""
+    rng = numpy.random.RandomState(seed)
+    with open(path, 'w') as log:
+        log.write(watchpoint_header())
+        log.write(_text(watchpoint_rows(steps, rng), WATCHPOINT_FORMAT))
+    return _result(path, steps=steps)
+
+
+GENERATORS = {'frd': write_frd, 'dat': write_dat, 'unv': write_unv,
+              'med': write_med, 'vtu': write_vtu_series, 'mess': write_mess,
+              'foamlog': write_foam_log, 'watchpoint': write_watchpoint}
+
+
+def main(argv=None):
+    """Write a synthetic file."""
+    import argparse
+    parser = argparse.ArgumentParser(description='Write synthetic inputs.')
+    parser.add_argument('kind', choices=sorted(GENERATORS))
+    parser.add_argument('path', help='file (directory for vtu)')
+    parser.add_argument('--nodes', type=int, default=None)
+    parser.add_argument('--steps', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    kwargs = {'seed': args.seed}
+    if args.nodes is not None:
+        kwargs['commands' if args.kind == 'mess' else 'nodes'] = args.nodes
+    if args.steps is not None:
+        kwargs['modes' if args.kind == 'mess' else 'steps'] = args.steps
+    info = GENERATORS[args.kind](args.path, **kwargs)
+    print(', '.join('{}: {}'.format(key, value)
+                    for key, value in sorted(info.items())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
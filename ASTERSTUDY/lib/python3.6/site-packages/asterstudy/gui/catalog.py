@@ -0,0 +1,982 @@
+"""
+Case catalog
+------------
+
+Searchable index of the runs found under the project folders.
+
+The runs are only identified by their directories: finding "the bridge
+with 12 sections whose first frequency is below 2 Hz" meant opening the
+results one by one. `Catalog` scans project roots and keeps, in a local
+SQLite database, for each run directory:
+
+- its kind: ``bridge`` (truss bridge directory: ``Mesh_*.med``,
+  ``fre.set``, command files), ``design`` (design of a sweep,
+  ``result.json``, see `truss_bridge.sweep`) or ``tank`` (Tanksimulator
+  case, ``savedata.json``),
+- its parameters: the mesh parameters of the ``Mesh_*.med`` names, the
+  parameters of the command files and of ``fre.set``, the design of a
+  sweep, the scalar values of ``savedata.json``,
+- its key results: maximum displacement of ``static_res.rmed``,
+  frequencies and elapsed times of the message files, maxima of a
+  design, accounting of the local executor (``log.job.<stage>.json``),
+  time reached by the fluid solver,
+- the inventory of its files (name, size, modification time).
+
+The scans are incremental: a directory whose modification time did not
+change is not listed again and a run is extracted again only when the
+modification time of one of the files it was extracted from changed.
+
+Runs are searched with conditions on their parameters and results
+(`Catalog.query`)::
+
+    sections=12 freq_1<2 kind=bridge path~tank
+
+`CatalogPanel` is the query panel of the GUI, it rescans the roots in a
+background thread (`IndexerThread`). The roots are given by the
+``ASTERSTUDY_CATALOG_ROOTS`` environment variable (separated by
+``os.pathsep``), the database is ``~/.asterstudy/catalog.db`` or
+``ASTERSTUDY_CATALOG``.
+
+Example::
+
+    python3 -m asterstudy.gui.catalog scan ~/Tanksimulator /data/bridges
+    python3 -m asterstudy.gui.catalog query "sections=12 freq_1<2"
+    python3 -m asterstudy.gui.catalog bench --runs 10000
+"""
+
+import fnmatch
+import json
+import os
+import os.path as osp
+import re
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+
+from PyQt5 import Qt as Q
+
+
+CATALOG_ENV = 'ASTERSTUDY_CATALOG'
+ROOTS_ENV = 'ASTERSTUDY_CATALOG_ROOTS'
+
+SCHEMA_VERSION = 1
+
+# Depth of the run directories below a root
+MAX_DEPTH = 6
+
+# Directories never scanned
+SKIPPED = ('.*', '__pycache__', 'processor*', 'postProcessing')
+
+# Files identifying a run directory, by kind (first match wins)
+MARKERS = OrderedDict([
+    ('tank', ('savedata.json',)),
+    ('design', ('result.json',)),
+    ('bridge', ('fre.set', 'Mesh_*.med', 'static.comm', 'modes.comm')),
+])
+
+# Columns shown by default in the query panel
+DEFAULT_COLUMNS = ('sections', 'max_disp', 'freq_1')
+
+MESH_NAME = re.compile(r'Mesh_([-\d.e]+)_([-\d.e]+)_([-\d.e]+)_(\d+)_([-\d.e]+)'
+                       r'\.med$')
+MESH_PARAMETERS = ('width', 'height', 'length', 'sections', 'spacing')
+
+TOTAL_JOB = re.compile(r'\*\s*TOTAL_JOB\s*:.*:\s*([\d.]+)\s*\*')
+
+CONDITION = re.compile(r'\s*([A-Za-z_][\w.]*)\s*(<=|>=|!=|=|<|>|~)\s*'
+                       r'("[^"]*"|\S+)')
+
+
+def default_roots():
+    """Return the project roots of ``ASTERSTUDY_CATALOG_ROOTS``, or the
+    Tanksimulator projects of the user."""
+    roots = os.getenv(ROOTS_ENV)
+    if roots:
+        return [root for root in roots.split(os.pathsep) if root]
+    return [osp.join(osp.expanduser('~'), 'Tanksimulator')]
+
+
+def _number(value):
+    """Return *value* as a float, *None* if it is not a number."""
+    if isinstance(value, bool):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def run_kind(names):
+    """Return the kind of a directory from its file names (*None* if
+    it is not a run)."""
+    for kind, patterns in MARKERS.items():
+        for pattern in patterns:
+            if any(fnmatch.fnmatchcase(name, pattern) for name in names):
+                return kind
+    return None
+
+
+# Extraction -----------------------------------------------------------------
+
+def _flatten(data, prefix=()):
+    """Yield the (path, value) of the scalar values of a JSON tree."""
+    for key, value in data.items():
+        path = prefix + (str(key),)
+        if isinstance(value, dict):
+            for item in _flatten(value, path):
+                yield item
+        elif isinstance(value, (str, int, float, bool)):
+            yield path, value
+
+
+def _short_names(paths):
+    """Return the shortest unique dotted suffix of each path."""
+    names = {}
+    for path in paths:
+        for size in range(1, len(path) + 1):
+            name = '.'.join(path[-size:])
+            if sum(1 for other in paths
+                   if '.'.join(other[-size:]) == name) == 1:
+                break
+        names[path] = name
+    return names
+
+
+def _read_json(path):
+    with open(path) as fobj:
+        return json.load(fobj, object_pairs_hook=OrderedDict)
+
+
+def _mess_elapsed(path):
+    """Return the elapsed time of a code_aster message file."""
+    elapsed = None
+    with open(path, errors='replace') as mess:
+        for line in mess:
+            match = TOTAL_JOB.search(line)
+            if match:
+                elapsed = float(match.group(1))
+    return elapsed
+
+
+def _rmed_displacement(path):
+    """Return the maximum displacement (norm and DZ) of a MED result."""
+    import h5py
+    import numpy
+    with h5py.File(path, 'r') as med:
+        names = [name for name in med['CHA'] if name.endswith('DEPL')]
+        if not names:
+            return {}
+        data = med['CHA'][names[0]]
+        ncomp = int(data.attrs['NCO'])
+        step = data[sorted(data)[-1]]
+        noe = step['NOE']
+        values = noe[noe.attrs['PFL'].decode()]['CO'][()].reshape(ncomp, -1)
+    return {'max_disp': float(numpy.sqrt((values[:3] ** 2).sum(axis=0))
+                              .max()),
+            'max_dz': float(numpy.abs(values[2]).max())}
+
+
+def _extract_bridge(path, entries, params, results, tracked):
+    from .truss_bridge.preview import read_mess_frequencies
+    from .truss_bridge.sweep import command_parameters
+    meshes = sorted((entries[name].st_mtime, name) for name in entries
+                    if MESH_NAME.match(name))
+    if meshes:
+        values = MESH_NAME.match(meshes[-1][1]).groups()
+        for name, value in zip(MESH_PARAMETERS, values):
+            params[name] = int(value) if name == 'sections' else float(value)
+    for name in ('static.comm', 'modes.comm'):
+        if name in entries:
+            tracked.append(name)
+            with open(osp.join(path, name), errors='replace') as comm:
+                params.update(command_parameters(comm.read()))
+    if 'fre.set' in entries:
+        tracked.append('fre.set')
+        with open(osp.join(path, 'fre.set')) as fre:
+            value = _number(fre.read().strip())
+        if value is not None:
+            params['modes'] = int(value)
+    for stage in ('static', 'modes'):
+        name = stage + '.mess'
+        if name in entries:
+            tracked.append(name)
+            results['elapsed_' + stage] = _mess_elapsed(osp.join(path, name))
+            if stage == 'modes':
+                frequencies = read_mess_frequencies(osp.join(path, name))
+                for i, value in enumerate(frequencies):
+                    results['freq_%d' % (i + 1)] = value
+    if 'static_res.rmed' in entries:
+        tracked.append('static_res.rmed')
+        try:
+            results.update(_rmed_displacement(osp.join(path,
+                                                       'static_res.rmed')))
+        except (OSError, KeyError, ValueError):
+            pass
+
+
+def _extract_design(path, entries, params, results, tracked):
+    tracked.append('result.json')
+    result = _read_json(osp.join(path, 'result.json'))
+    params.update(result.get('design', {}))
+    params['study'] = osp.basename(osp.dirname(osp.dirname(path)))
+    for key, value in result.items():
+        if key == 'frequencies':
+            for i, fre in enumerate(value):
+                results['freq_%d' % (i + 1)] = fre
+        elif key not in ('design', 'key') and \
+                isinstance(value, (str, int, float)):
+            results[key] = value
+
+
+def _extract_tank(path, entries, params, results, tracked):
+    tracked.append('savedata.json')
+    values = list(_flatten(_read_json(osp.join(path, 'savedata.json'))))
+    names = _short_names([item[0] for item in values])
+    for key, value in values:
+        params[names[key]] = value
+    for name in sorted(entries):
+        match = re.match(r'log\.job\.(\w+)\.json$', name)
+        if not match:
+            continue
+        tracked.append(name)
+        record = _read_json(osp.join(path, name))
+        stage = match.group(1)
+        results['state_' + stage] = record.get('state')
+        results['wall_' + stage] = record.get('wall')
+        results['maxrss_' + stage] = record.get('maxrss_kb')
+    processor = osp.join('Fluid', 'processor0')
+    try:
+        times = [_number(name) for name in os.listdir(osp.join(path,
+                                                               processor))]
+    except OSError:
+        return
+    tracked.append(processor)
+    times = [value for value in times if value is not None]
+    if times:
+        results['fluid_time'] = max(times)
+        end = _number(params.get('Runtimesh'))
+        if end:
+            results['progress'] = max(times) / end
+
+
+EXTRACTORS = {'bridge': _extract_bridge, 'design': _extract_design,
+              'tank': _extract_tank}
+
+
+def extract(path, entries, kind=None):
+    """Describe a run directory.
+
+    Arguments:
+        path (str): Run directory.
+        entries (dict): `os.stat_result` of its entries by name.
+        kind (Optional[str]): Kind of the run, from its entries if
+            *None*.
+
+    Returns:
+        dict: ``kind``, ``params`` and ``results`` (ordered dicts),
+        ``tracked`` (paths, relative to the run, of the files read),
+        ``error`` (message if the extraction failed).
+    """
+    kind = kind or run_kind(entries)
+    run = dict(kind=kind, params=OrderedDict(), results=OrderedDict(),
+               tracked=[], error=None)
+    try:
+        EXTRACTORS[kind](path, entries, run['params'], run['results'],
+                         run['tracked'])
+    except Exception as exc: # pragma pylint: disable=broad-except
+        run['error'] = '{}: {}'.format(type(exc).__name__, exc)
+    return run
+
+
+def _signature(path, dir_mtime, tracked):
+    """Return the modification times of a run and of its tracked files."""
+    mtimes = [dir_mtime]
+    for name in tracked:
+        try:
+            mtimes.append(os.stat(osp.join(path, name)).st_mtime)
+        except OSError:
+            mtimes.append(None)
+    return json.dumps(mtimes)
+
+
+# Catalog --------------------------------------------------------------------
+
+class Catalog:
+    """SQLite catalog of the runs.
+
+    Arguments:
+        path (Optional[str]): Database, ``ASTERSTUDY_CATALOG`` or
+            ``~/.asterstudy/catalog.db`` by default.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(CATALOG_ENV) or osp.join(
+            osp.expanduser('~'), '.asterstudy', 'catalog.db')
+        if self.path != ':memory:':
+            os.makedirs(osp.dirname(osp.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self._create()
+
+    def _create(self):
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            with self.db:
+                for table in ('dirs', 'runs', 'props', 'files'):
+                    self.db.execute('DROP TABLE IF EXISTS ' + table)
+        with self.db:
+            self.db.executescript('''
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY, root TEXT, mtime REAL,
+                    subdirs TEXT);
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY, path TEXT UNIQUE, root TEXT,
+                    kind TEXT, mtime REAL, tracked TEXT, signature TEXT,
+                    indexed REAL, error TEXT);
+                CREATE TABLE IF NOT EXISTS props (
+                    run INTEGER, category TEXT, name TEXT, num REAL,
+                    text TEXT);
+                CREATE INDEX IF NOT EXISTS props_name ON props (name, num);
+                CREATE INDEX IF NOT EXISTS props_run ON props (run);
+                CREATE TABLE IF NOT EXISTS files (
+                    run INTEGER, name TEXT, size INTEGER, mtime REAL);
+                CREATE INDEX IF NOT EXISTS files_run ON files (run);
+            ''')
+            self.db.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def close(self):
+        """Close the database."""
+        self.db.close()
+
+    # scan
+
+    def scan(self, roots=None, full=False, callback=None):
+        """Index the runs under project roots.
+
+        Arguments:
+            roots (Optional[list[str]]): Project roots, `default_roots`
+                if *None*.
+            full (Optional[bool]): Extract all the runs again, whatever
+                their modification times.
+            callback (Optional[callable]): Called with the number of
+                runs seen, every 100 runs.
+
+        Returns:
+            dict: Number of directories listed, of runs seen, new,
+            updated, unchanged and removed, elapsed time (s).
+        """
+        start = time.time()
+        stats = dict(listed=0, runs=0, new=0, updated=0, unchanged=0,
+                     removed=0)
+        dirs = {row[0]: row[1:] for row in self.db.execute(
+            'SELECT path, mtime, subdirs FROM dirs')}
+        runs = {row[0]: row[1:] for row in self.db.execute(
+            'SELECT path, id, mtime, tracked, signature FROM runs')}
+        seen_dirs, seen_runs = set(), set()
+        changes = []
+
+        def _visit(path, root, depth):
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                return
+            run = runs.get(path)
+            if not full and run is not None and run[1] == mtime:
+                seen_runs.add(path)
+                self._check_run(path, root, mtime, run, stats, changes)
+                return
+            cached = dirs.get(path)
+            if not full and cached is not None and cached[0] == mtime:
+                seen_dirs.add(path)
+                subdirs = json.loads(cached[1])
+            else:
+                stats['listed'] += 1
+                entries, subdirs = {}, []
+                try:
+                    with os.scandir(path) as items:
+                        for item in items:
+                            try:
+                                entries[item.name] = item.stat()
+                            except OSError:
+                                continue
+                            if item.is_dir() and not any(
+                                    fnmatch.fnmatchcase(item.name, pattern)
+                                    for pattern in SKIPPED):
+                                subdirs.append(item.name)
+                except OSError:
+                    return
+                kind = run_kind(entries)
+                if kind is not None:
+                    seen_runs.add(path)
+                    stats['runs'] += 1
+                    stats['new' if run is None else 'updated'] += 1
+                    changes.append((path, root, mtime, kind, entries))
+                    self._report(stats, callback)
+                    return
+                seen_dirs.add(path)
+                changes.append((path, root, mtime, None, sorted(subdirs)))
+            if depth < MAX_DEPTH:
+                for name in subdirs:
+                    _visit(osp.join(path, name), root, depth + 1)
+
+        for root in (default_roots() if roots is None else roots):
+            root = osp.abspath(root)
+            _visit(root, root, 0)
+            self._write(changes)
+            changes = []
+            self._report(stats, callback)
+            prefix = root.rstrip(os.sep) + os.sep
+            gone = [path for path in runs if path not in seen_runs and
+                    (path == root or path.startswith(prefix))]
+            stats['removed'] += len(gone)
+            with self.db:
+                self._remove([runs[path][0] for path in gone])
+                self.db.executemany('DELETE FROM dirs WHERE path = ?', [
+                    (path,) for path in dirs if path not in seen_dirs and
+                    (path == root or path.startswith(prefix))])
+                self.db.executemany('DELETE FROM runs WHERE path = ?',
+                                    [(path,) for path in gone])
+        stats['elapsed'] = time.time() - start
+        return stats
+
+    @staticmethod
+    def _report(stats, callback):
+        if callback is not None and not stats['runs'] % 100:
+            callback(stats['runs'])
+
+    def _check_run(self, path, root, mtime, run, stats, changes):
+        """Extract a run again if one of its tracked files changed."""
+        stats['runs'] += 1
+        tracked = json.loads(run[2])
+        if _signature(path, mtime, tracked) == run[3]:
+            stats['unchanged'] += 1
+            return
+        entries = {}
+        try:
+            with os.scandir(path) as items:
+                for item in items:
+                    try:
+                        entries[item.name] = item.stat()
+                    except OSError:
+                        continue
+        except OSError:
+            return
+        stats['listed'] += 1
+        stats['updated'] += 1
+        changes.append((path, root, mtime, run_kind(entries), entries))
+        if len(changes) >= 500:
+            self._write(changes)
+            del changes[:]
+
+    def _remove(self, ids):
+        for table, column in (('props', 'run'), ('files', 'run')):
+            self.db.executemany(
+                'DELETE FROM {} WHERE {} = ?'.format(table, column),
+                [(run,) for run in ids])
+
+    def _write(self, changes):
+        """Write the directories listed and the runs extracted."""
+        now = time.time()
+        with self.db:
+            for path, root, mtime, kind, content in changes:
+                if kind is None:
+                    self.db.execute(
+                        'INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)',
+                        (path, root, mtime, json.dumps(content)))
+                    continue
+                self.db.execute('DELETE FROM dirs WHERE path = ?', (path,))
+                run = extract(path, content, kind)
+                row = self.db.execute('SELECT id FROM runs WHERE path = ?',
+                                      (path,)).fetchone()
+                values = (root, kind, mtime, json.dumps(run['tracked']),
+                          _signature(path, mtime, run['tracked']), now,
+                          run['error'])
+                if row is None:
+                    run_id = self.db.execute(
+                        'INSERT INTO runs (path, root, kind, mtime, tracked, '
+                        'signature, indexed, error) VALUES '
+                        '(?, ?, ?, ?, ?, ?, ?, ?)', (path,) + values).lastrowid
+                else:
+                    run_id = row[0]
+                    self._remove([run_id])
+                    self.db.execute(
+                        'UPDATE runs SET root = ?, kind = ?, mtime = ?, '
+                        'tracked = ?, signature = ?, indexed = ?, error = ? '
+                        'WHERE id = ?', values + (run_id,))
+                props = []
+                for category in ('params', 'results'):
+                    for name, value in run[category].items():
+                        props.append((run_id, category[:-1], name,
+                                      _number(value),
+                                      None if isinstance(value, (int, float))
+                                      else str(value)))
+                self.db.executemany('INSERT INTO props VALUES (?, ?, ?, ?, ?)',
+                                    props)
+                self.db.executemany(
+                    'INSERT INTO files VALUES (?, ?, ?, ?)',
+                    [(run_id, name, stat.st_size, stat.st_mtime)
+                     for name, stat in sorted(content.items())])
+
+    # query
+
+    @staticmethod
+    def parse(text):
+        """Parse the conditions of a query.
+
+        Arguments:
+            text (str): Conditions separated by spaces: ``name op value``
+                with op in ``= != < <= > >=`` or ``~`` (contains).
+
+        Returns:
+            list[(str, str, str)]: Name, operator and value.
+        """
+        conditions = []
+        pos = 0
+        text = text.strip()
+        while pos < len(text):
+            match = CONDITION.match(text, pos)
+            if not match:
+                raise ValueError('invalid condition: {!r}'.format(
+                    text[pos:].split()[0]))
+            value = match.group(3)
+            if value.startswith('"'):
+                value = value[1:-1]
+            conditions.append((match.group(1), match.group(2), value))
+            pos = match.end()
+            while pos < len(text) and text[pos].isspace():
+                pos += 1
+        return conditions
+
+    def query(self, text='', order='path', limit=None):
+        """Return the runs matching the conditions of a query.
+
+        Arguments:
+            text (str): Conditions, see `parse`. ``kind``, ``path`` and
+                ``root`` apply to the runs, the other names to their
+                parameters and results.
+            order (Optional[str]): Column or parameter to sort by.
+            limit (Optional[int]): Maximum number of runs.
+
+        Returns:
+            list[dict]: ``id``, ``path``, ``kind``, ``mtime`` and
+            ``error`` of the runs.
+        """
+        where, args = [], []
+        for name, oper, value in self.parse(text):
+            number = _number(value)
+            if oper == '~':
+                oper, value = 'LIKE', '%' + value + '%'
+            if name in ('kind', 'path', 'root'):
+                where.append('runs.{} {} ?'.format(name, oper))
+                args.append(value)
+            elif number is not None and oper != 'LIKE':
+                where.append('runs.id IN (SELECT run FROM props WHERE '
+                             'name = ? AND num {} ?)'.format(oper))
+                args.extend((name, number))
+            else:
+                where.append('runs.id IN (SELECT run FROM props WHERE '
+                             'name = ? AND COALESCE(text, num) {} ?)'
+                             .format(oper))
+                args.extend((name, value))
+        sql = 'SELECT id, path, kind, mtime, error FROM runs'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if order in ('path', 'kind', 'mtime'):
+            sql += ' ORDER BY ' + order
+        elif order:
+            sql += (' ORDER BY (SELECT num FROM props WHERE props.run = '
+                    'runs.id AND props.name = ?)')
+            args.append(order)
+        if limit:
+            sql += ' LIMIT %d' % int(limit)
+        return [dict(zip(('id', 'path', 'kind', 'mtime', 'error'), row))
+                for row in self.db.execute(sql, args)]
+
+    def values(self, runs, names=None):
+        """Return the parameters and results of runs.
+
+        Arguments:
+            runs (list[int]): Identifiers of the runs.
+            names (Optional[list[str]]): Names of the values, all if
+                *None*.
+
+        Returns:
+            dict: Values by name (ordered as extracted) by run.
+        """
+        values = {run: OrderedDict() for run in runs}
+        for start in range(0, len(runs), 500):
+            chunk = runs[start:start + 500]
+            sql = 'SELECT run, name, num, text FROM props WHERE run IN ({})' \
+                .format(','.join('?' * len(chunk)))
+            args = list(chunk)
+            if names:
+                sql += ' AND name IN ({})'.format(','.join('?' * len(names)))
+                args.extend(names)
+            for run, name, num, text in self.db.execute(sql + ' ORDER BY '
+                                                        'rowid', args):
+                if text is None and num is not None and num.is_integer():
+                    num = int(num)
+                values[run][name] = text if text is not None else num
+        return values
+
+    def find(self, path):
+        """Return the identifier of the run of a directory (or *None*)."""
+        row = self.db.execute('SELECT id FROM runs WHERE path = ?',
+                              (osp.abspath(path),)).fetchone()
+        return row[0] if row else None
+
+    def files(self, run):
+        """Return the inventory (name, size, mtime) of a run."""
+        return self.db.execute('SELECT name, size, mtime FROM files WHERE '
+                               'run = ? ORDER BY name', (run,)).fetchall()
+
+    def count(self):
+        """Return the number of runs by kind."""
+        return OrderedDict(self.db.execute(
+            'SELECT kind, COUNT(*) FROM runs GROUP BY kind ORDER BY kind'))
+
+
+# GUI ------------------------------------------------------------------------
+
+class IndexerThread(Q.QThread):
+    """Scan of the project roots in a background thread (the thread has
+    its own connection to the catalog).
+
+    Arguments:
+        path (str): Database of the catalog.
+        roots (list[str]): Project roots.
+        full (Optional[bool]): Extract all the runs again.
+    """
+
+    progress = Q.pyqtSignal(int)
+    scanned = Q.pyqtSignal(dict)
+
+    def __init__(self, path, roots, full=False, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.roots = roots
+        self.full = full
+
+    def run(self):
+        catalog = Catalog(self.path)
+        try:
+            stats = catalog.scan(self.roots, self.full,
+                                 callback=self.progress.emit)
+        except Exception as exc: # pragma pylint: disable=broad-except
+            stats = dict(error=str(exc))
+        finally:
+            catalog.close()
+        self.scanned.emit(stats)
+
+
+class CatalogPanel(Q.QWidget):
+    """Query panel of the catalog.
+
+    The roots are rescanned in the background when the panel is shown;
+    a double click on a run emits `runSelected` with its directory.
+
+    Arguments:
+        catalog (Optional[Catalog]): Catalog, the default one if *None*.
+        roots (Optional[list[str]]): Project roots.
+    """
+
+    runSelected = Q.pyqtSignal(str)
+
+    def __init__(self, catalog=None, roots=None, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog or Catalog()
+        self.roots = default_roots() if roots is None else roots
+        self._thread = None
+        self._rows = []
+        self.setWindowTitle('算例目录')
+        self.query_edit = Q.QLineEdit(self)
+        self.query_edit.setPlaceholderText('例如: sections=12 freq_1<2 '
+                                           'kind=bridge path~tank')
+        self.query_edit.returnPressed.connect(self.search)
+        search = Q.QPushButton('查询', self)
+        search.clicked.connect(self.search)
+        self.scan_button = Q.QPushButton('重新扫描', self)
+        self.scan_button.clicked.connect(lambda: self.rescan())
+        self.table = Q.QTableWidget(self)
+        self.table.setEditTriggers(Q.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(Q.QAbstractItemView.SelectRows)
+        self.table.setSortingEnabled(True)
+        self.table.cellDoubleClicked.connect(self._selected)
+        self.status = Q.QLabel(self)
+        top = Q.QHBoxLayout()
+        top.addWidget(self.query_edit)
+        top.addWidget(search)
+        top.addWidget(self.scan_button)
+        layout = Q.QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addWidget(self.table)
+        layout.addWidget(self.status)
+        self.resize(900, 500)
+        self.search()
+
+    def showEvent(self, event):
+        """Rescan the roots when the panel is shown."""
+        super().showEvent(event)
+        self.rescan()
+
+    def rescan(self, full=False):
+        """Scan the roots in the background (incremental by default)."""
+        if self._thread is not None or not self.roots:
+            return
+        self.scan_button.setEnabled(False)
+        self.status.setText('扫描中...')
+        self._thread = IndexerThread(self.catalog.path, self.roots, full,
+                                     self)
+        self._thread.progress.connect(
+            lambda count: self.status.setText('扫描中: %d 个算例' % count))
+        self._thread.scanned.connect(self._scanned)
+        self._thread.start()
+
+    def _scanned(self, stats):
+        self._thread.wait()
+        self._thread = None
+        self.scan_button.setEnabled(True)
+        self.search()
+        if 'error' in stats:
+            self.status.setText('扫描失败: %s' % stats['error'])
+        else:
+            self.status.setText(
+                '%d 个算例 (新增 %d, 更新 %d, 删除 %d), 扫描用时 %.1f s' % (
+                    stats['runs'], stats['new'], stats['updated'],
+                    stats['removed'], stats['elapsed']))
+
+    def search(self):
+        """Show the runs matching the query."""
+        text = self.query_edit.text()
+        try:
+            conditions = Catalog.parse(text)
+            self._rows = self.catalog.query(text)
+        except (ValueError, sqlite3.Error) as exc:
+            self.status.setText('查询错误: %s' % exc)
+            return
+        names = []
+        for name in [cond[0] for cond in conditions] + list(DEFAULT_COLUMNS):
+            if name not in names and name not in ('kind', 'path', 'root'):
+                names.append(name)
+        values = self.catalog.values([row['id'] for row in self._rows], names)
+        headers = ['目录', '类型', '修改时间'] + names
+        self.table.setSortingEnabled(False)
+        self.table.clear()
+        self.table.setColumnCount(len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setRowCount(len(self._rows))
+        for i, row in enumerate(self._rows):
+            cells = [row['path'], row['kind'],
+                     time.strftime('%Y-%m-%d %H:%M',
+                                   time.localtime(row['mtime']))]
+            cells += [values[row['id']].get(name) for name in names]
+            for j, value in enumerate(cells):
+                item = Q.QTableWidgetItem()
+                if isinstance(value, float):
+                    item.setData(Q.Qt.DisplayRole, float('%.6g' % value))
+                else:
+                    item.setText('' if value is None else str(value))
+                if j == 0:
+                    item.setData(Q.Qt.UserRole, row['path'])
+                    if row['error']:
+                        item.setToolTip(row['error'])
+                self.table.setItem(i, j, item)
+        self.table.setSortingEnabled(True)
+        self.table.resizeColumnsToContents()
+        self.status.setText('%d 个算例' % len(self._rows))
+
+    def _selected(self, row, _):
+        item = self.table.item(row, 0)
+        if item is not None:
+            self.runSelected.emit(item.data(Q.Qt.UserRole))
+
+
+# Benchmark ------------------------------------------------------------------
+
+def synthetic_runs(folder, count, seed=0):
+    """Write *count* run directories of the three kinds (a third each)
+    in projects of 100 runs.
+
+    Returns:
+        list[str]: Run directories.
+    """
+    import random
+    from .truss_bridge.preview import HERE
+    rng = random.Random(seed)
+    with open(osp.join(HERE, 'static.comm')) as comm:
+        static = comm.read()
+    with open(osp.join(HERE, 'modes.comm')) as comm:
+        modes = comm.read()
+    with open(osp.join(HERE, 'static.mess'), errors='replace') as mess:
+        static_mess = mess.read()
+    with open(osp.join(HERE, 'modes.mess'), errors='replace') as mess:
+        modes_mess = mess.read()
+    paths = []
+    for i in range(count):
+        project = osp.join(folder, 'Project-%03d' % (i // 100))
+        kind = ('bridge', 'design', 'tank')[i % 3]
+        if kind == 'design':
+            path = osp.join(project, 'sweep', 'designs', '%012x' % i)
+        else:
+            path = osp.join(project, 'case-%05d' % i)
+        os.makedirs(path)
+        paths.append(path)
+        sections = rng.choice((8, 10, 12, 16))
+        if kind == 'bridge':
+            name = 'Mesh_8.0_5.0_40.0_{}_{:.2f}.med'.format(sections,
+                                                            40. / sections)
+            open(osp.join(path, name), 'w').close()
+            with open(osp.join(path, 'static.comm'), 'w') as fobj:
+                fobj.write(static)
+            with open(osp.join(path, 'modes.comm'), 'w') as fobj:
+                fobj.write(modes)
+            with open(osp.join(path, 'fre.set'), 'w') as fobj:
+                fobj.write('10')
+            with open(osp.join(path, 'static.mess'), 'w') as fobj:
+                fobj.write(static_mess)
+            with open(osp.join(path, 'modes.mess'), 'w') as fobj:
+                fobj.write(modes_mess)
+        elif kind == 'design':
+            result = OrderedDict([
+                ('key', osp.basename(path)), ('solver', 'preview'),
+                ('status', 'ok'), ('max_disp', rng.uniform(0.01, 0.1)),
+                ('max_stress', rng.uniform(1e7, 2e8)),
+                ('frequencies', sorted(rng.uniform(1., 10.)
+                                       for _ in range(10))),
+                ('wall', rng.uniform(1., 5.)),
+                ('design', OrderedDict([('sections', sections),
+                                        ('height', rng.uniform(4., 6.))]))])
+            with open(osp.join(path, 'result.json'), 'w') as fobj:
+                json.dump(result, fobj, indent=1)
+        else:
+            data = {'fluid': {'globalValue': {
+                'Liquidratio': '%.2f' % rng.uniform(0.2, 0.9),
+                'Acceleration': '1', 'Dyne': '0', 'Gravity': '9.81'}},
+                    'solid': {'Youngmodulus': '2e11', 'Possinratio': '0.3',
+                              'Solidrho': '7850'},
+                    'couple': {'Writetime': '0.1', 'Runtimeac': '1',
+                               'Runtimesh': '10', 'Monpoint': '0'},
+                    'BOUNDARY': ['fix']}
+            with open(osp.join(path, 'savedata.json'), 'w') as fobj:
+                json.dump(data, fobj, indent=4)
+            with open(osp.join(path, 'log.job.fluid.json'), 'w') as fobj:
+                json.dump({'state': 'done', 'wall': rng.uniform(100, 1000),
+                           'maxrss_kb': rng.randint(10 ** 5, 10 ** 7)}, fobj)
+            for step in range(rng.randint(1, 5)):
+                os.makedirs(osp.join(path, 'Fluid', 'processor0', str(step)))
+    return paths
+
+
+def benchmark(folder, count=10000):
+    """Measure the full and incremental scans of synthetic runs.
+
+    Returns:
+        dict: Statistics of the full scan, of an incremental scan
+        without change and of an incremental scan after changing 1% of
+        the runs, duration of a query.
+    """
+    runs = synthetic_runs(osp.join(folder, 'runs'), count)
+    catalog = Catalog(osp.join(folder, 'catalog.db'))
+    result = OrderedDict()
+    result['full'] = catalog.scan([osp.join(folder, 'runs')])
+    result['unchanged'] = catalog.scan([osp.join(folder, 'runs')])
+    later = time.time() + 10
+    for path in runs[::100]:
+        for name in os.listdir(path):
+            if name.endswith(('.json', '.set')):
+                os.utime(osp.join(path, name), (later, later))
+    result['touched'] = catalog.scan([osp.join(folder, 'runs')])
+    start = time.time()
+    found = catalog.query('sections=12 freq_1<2')
+    result['query'] = dict(elapsed=time.time() - start, runs=len(found))
+    result['size'] = os.path.getsize(catalog.path)
+    catalog.close()
+    return result
+
+
+def main(argv=None):
+    """Scan, query or measure the catalog."""
+    import argparse
+    parser = argparse.ArgumentParser(description='Catalog of the runs.')
+    parser.add_argument('--db', default=None, help='catalog database')
+    sub = parser.add_subparsers(dest='command')
+    scan = sub.add_parser('scan', help='index the runs under roots')
+    scan.add_argument('roots', nargs='*')
+    scan.add_argument('--full', action='store_true')
+    query = sub.add_parser('query', help='search the runs')
+    query.add_argument('conditions', nargs='?', default='')
+    query.add_argument('--show', action='append', default=[],
+                       help='value to print')
+    query.add_argument('--order', default='path')
+    query.add_argument('--limit', type=int, default=None)
+    show = sub.add_parser('show', help='values and files of a run')
+    show.add_argument('path')
+    sub.add_parser('panel', help='open the query panel')
+    bench = sub.add_parser('bench', help='scan synthetic runs')
+    bench.add_argument('--runs', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        import shutil
+        import tempfile
+        folder = tempfile.mkdtemp(prefix='catalog')
+        try:
+            start = time.time()
+            res = benchmark(folder, args.runs)
+            print('%d runs created and scanned in %.1f s' % (
+                args.runs, time.time() - start))
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        for name in ('full', 'unchanged', 'touched'):
+            item = res[name]
+            print('%-9s scan: %7.2f s, %5d dirs listed, %5d new, %5d updated, '
+                  '%5d unchanged' % (name, item['elapsed'], item['listed'],
+                                     item['new'], item['updated'],
+                                     item['unchanged']))
+        print('query "sections=12 freq_1<2": %d runs in %.1f ms' % (
+            res['query']['runs'], res['query']['elapsed'] * 1e3))
+        print('catalog: %.1f MB' % (res['size'] / 2 ** 20))
+        return 0
+    catalog = Catalog(args.db)
+    if args.command == 'scan':
+        stats = catalog.scan(args.roots or None, args.full)
+        print('%(runs)d runs (%(new)d new, %(updated)d updated, '
+              '%(removed)d removed) in %(elapsed).2f s' % stats)
+    elif args.command == 'query':
+        try:
+            rows = catalog.query(args.conditions, args.order, args.limit)
+        except ValueError as exc:
+            print('error: {}'.format(exc))
+            return 1
+        names = [cond[0] for cond in Catalog.parse(args.conditions)
+                 if cond[0] not in ('kind', 'path', 'root')] + args.show
+        values = catalog.values([row['id'] for row in rows], names)
+        for row in rows:
+            print('%-6s %s %s' % (row['kind'], row['path'], ' '.join(
+                '%s=%s' % (name, values[row['id']][name]) for name in names
+                if name in values[row['id']])))
+        print('%d runs' % len(rows))
+    elif args.command == 'show':
+        run = catalog.find(args.path)
+        if run is None:
+            print('not in the catalog: ' + args.path)
+            return 1
+        for name, value in catalog.values([run])[run].items():
+            print('%-24s %s' % (name, value))
+        for name, size, mtime in catalog.files(run):
+            print('  %-30s %10d %s' % (name, size, time.strftime(
+                '%Y-%m-%d %H:%M', time.localtime(mtime))))
+    elif args.command == 'panel':
+        app = Q.QApplication(sys.argv)
+        panel = CatalogPanel(catalog)
+        panel.show()
+        return app.exec_()
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,6 +9,8 @@ from ..guodu import BackgroundLoading
 
 from pvsimple import *
 from .ccx2paraview import Frd2pvd
+from .outputreader import ProcessOutputReader
+from .executor import get_executor, start
 from .inpgen.unv2ccx import Unv2ccx
 from .inpgen.solidsetup import solidinp,restartinp
 # from .paraviewpreload import Preload
@@ -23,6 +25,9 @@ import pvsimple
 
 #from functools import partial
 
+#算例模板目录
+TEMPLATE = "/home/export/online3/amd_share/SALOME-9.4.0-CO7-SRC/INSTALL/ASTERSTUDY/lib/python3.6/site-packages/asterstudy/template"
+
 class KeyboardWidget(Q.QWidget):
     keyPressed = Q.pyqtSignal(str)
 
@@ -139,15 +144,15 @@ class Maincontrol(Q.QWidget):
         self.alllayout.setSpacing(20)
         self.leftlayout.setSpacing(20)
 
-        self.solidtextview = Q.QTextBrowser()
+        self.solidtextview = Q.QPlainTextEdit()
         self.solidtextview.setMinimumSize(Q.QSize(380,180))
         self.solidtextview.setReadOnly(True)
 
-        self.fluidtextview = Q.QTextBrowser()
+        self.fluidtextview = Q.QPlainTextEdit()
         self.fluidtextview.setMinimumSize(Q.QSize(380,180))
         self.fluidtextview.setReadOnly(True)
 
-        self.temptextview = Q.QTextBrowser()
+        self.temptextview = Q.QPlainTextEdit()
         self.temptextview.setMinimumSize(Q.QSize(300,100))
         self.temptextview.setReadOnly(True)
 
@@ -261,27 +266,32 @@ class Maincontrol(Q.QWidget):
         
         # QProcess object for external app
         self.process = Q.QProcess(self)
-        self.process.readyRead.connect(self.dataReady)
         self.process.started.connect(lambda: self.bt1.setEnabled(False))
         self.process.finished.connect(lambda: self.bt1.setEnabled(True))
         self.process.setProcessChannelMode(Q.QProcess.MergedChannels)
 
         # QProcess object for external app
         self.processfluid = Q.QProcess(self)
-        self.processfluid.readyRead.connect(self.dataReady)
         self.processfluid.started.connect(lambda: self.bt1.setEnabled(False))
         self.processfluid.started.connect(lambda: self.btFluidpre.setEnabled(False))
         self.processfluid.finished.connect(lambda: self.bt1.setEnabled(True))
         self.processfluid.finished.connect(lambda: self.btFluidpre.setEnabled(True))
+        self.processfluid.finished.connect(self.recordmeshplan)
         self.processfluid.setProcessChannelMode(Q.QProcess.MergedChannels)
 
         self.tempprocess = Q.QProcess(self)
-        self.tempprocess.readyRead.connect(self.dataReady)
         self.tempprocess.started.connect(lambda: self.bt4.setEnabled(False))
         self.tempprocess.finished.connect(lambda: self.bt4.setEnabled(True))
         #self.tempprocess.finished.connect(lambda: self.opendocx())
         self.tempprocess.setProcessChannelMode(Q.QProcess.MergedChannels)
 
+        # 每个进程独立读取新增输出,限频刷新控制台,完整日志写入磁盘
+        self.solidreader = ProcessOutputReader(self.process, self.solidtextview)
+        self.fluidreader = ProcessOutputReader(self.processfluid, self.fluidtextview)
+        self.tempreader = ProcessOutputReader(self.tempprocess, self.temptextview)
+        # 作业提交方式: 集群(csub/bkill)或本机运行(TANKSIM_EXECUTOR=local)
+        self.executor = get_executor()
+
         # 准备一个 过度时间的 过场效果
         self._loader = BackgroundLoading(self,msg='正在载入App,请稍候...')
         # self._loader.start()
@@ -366,6 +376,7 @@ class Maincontrol(Q.QWidget):
         shellpath = os.path.dirname(os.path.abspath(__file__))
         self.processfluid.setWorkingDirectory(shellpath)
         self.process.setWorkingDirectory(shellpath)
+        self.spoolconsole()
         
         if self.solidid:
             #未知原因???? gsn17上必须encoding="ISO-8859-1"
@@ -374,11 +385,13 @@ class Maincontrol(Q.QWidget):
                 text = f.read()
             if len(text)>30000:
                 text=text[-30000:]
-            self.solidtextview.setPlainText(text)
+            self.solidreader.reset(text)
             print('self.solidid:',self.solidid)
 
-            cmdsolid='env -i '+'./reconnectsolid '+self.currentpath+' '+self.solidid
-            self.process.start(cmdsolid)
+            # 集群作业用 reconnectsolid(bonline), 本机作业跟踪其输出直到结束
+            cmdsolid = self.executor.reconnect_command('solid', self.currentpath,
+                                                       self.solidid)
+            start(self.process, cmdsolid)
 
         if self.fluidid:
             #未知原因???? gsn17上必须encoding="ISO-8859-1"
@@ -387,7 +400,7 @@ class Maincontrol(Q.QWidget):
                 text = f.read()
             if len(text)>30000:
                 text=text[-30000:]                
-            self.fluidtextview.setPlainText(text)
+            self.fluidreader.reset(text)
             print('self.fluidid:',self.fluidid)
             #self.processfluid.start('env -i /usr/sw-mpp/bin/bonline '+self.fluidid)
             with open (self.currentpath+'/savedata.json') as f:
@@ -402,8 +415,9 @@ class Maincontrol(Q.QWidget):
             MaxT1 = coupledata['Runtimeac']
             MaxT2 = coupledata['Runtimesh']
 
-            cmdfluid='env -i '+'./reconnectfluid '+self.currentpath+' '+self.fluidid+' '+str(MaxT1)+' '+str(MaxT2)
-            self.processfluid.start(cmdfluid)
+            cmdfluid = self.executor.reconnect_command('fluid', self.currentpath,
+                                                       self.fluidid, MaxT1, MaxT2)
+            start(self.processfluid, cmdfluid)
 
     def addcase(self):
         #pass
@@ -425,7 +439,7 @@ class Maincontrol(Q.QWidget):
             return False
         else:        
             # src = "/home/export/online3/amd_share/SALOME-9.4.0-CO7-SRC/template"
-            src = "/home/export/online3/amd_share/SALOME-9.4.0-CO7-SRC/INSTALL/ASTERSTUDY/lib/python3.6/site-packages/asterstudy/template"
+            src = TEMPLATE
             #TODO 替换 copy 为通过交互生成
             
             print('destination = shutil.copytree(src, self.currentpath)')
@@ -481,7 +495,12 @@ class Maincontrol(Q.QWidget):
             
             #生成precicexml
             from .xmlgen import xmlgen
-            xmlgen(DeltaT,str(MaxT),str(MaxT2),Watchpoints,self.currentpath)
+            from .preciceconfig import PreciceConfigError, coupling_summary
+            try:
+                preciceconfigs = xmlgen(DeltaT,str(MaxT),str(MaxT2),Watchpoints,self.currentpath)
+            except PreciceConfigError as exc:
+                Q.QMessageBox.warning(self, 'preCICE配置', 'preCICE配置文件校验失败：\n'+str(exc), Q.QMessageBox.Yes)
+                return False
             #xmlgen(DeltaT,MaxT,Watchpoints,self.currentpath)
             #利用固体前处理标签页中的信息，在计算目录下生成主要.inp和*mesh.inp
             solidinp(thickdic,stldic,TotalFGroup,BOUNDARY,self.currentpath+'/Solid',youngs,posson,DENSITY,DeltaT,MaxT)
@@ -489,46 +508,77 @@ class Maincontrol(Q.QWidget):
             restartinp(thickdic,stldic,TotalFGroup,BOUNDARY,self.currentpath+'/Solid',youngs,posson,DENSITY,DeltaT,MaxT2)
             unvfilename = medfilename[0:-4]+'.unv'
             Unv2ccx(unvfilename,os.path.join(self.currentpath,'Solid'))
+            #耦合窗口数、每个窗口的交换数据量及观察点输出量(显示在固体控制台)
+            self.solidreader.append(coupling_summary(self.currentpath,preciceconfigs)+'\n')
             # Unv2ccx(unvfilename,os.path.join(self.currentpath,'Solidpre'))
             #print(unvfilename,medfilename,self.currentpath,self.currentpath/Path(medfilename).name)
             if medfilename!=str(Path(self.currentpath)/Path(medfilename).name):
                 shutil.copyfile(medfilename,Path(self.currentpath)/Path(medfilename).name)
             if unvfilename!=str(Path(self.currentpath)/Path(unvfilename).name):
                 shutil.copyfile(unvfilename,Path(self.currentpath)/Path(unvfilename).name)
-            minmax6 = self.Solidgroup.minmax6
-            print('minmax6 = ',minmax6)
-            xmin = minmax6[0]
-            ymin = minmax6[1]
-            zmin = minmax6[2]
-            xmax = minmax6[3]
-            ymax = minmax6[4]
-            zmax = minmax6[5]
-
             #生成流体配置文件
-            from ..parameterset.fluidinitial import Fluidinitial
-
-            bundaryname = list(stldic.keys())
-            param_fluid = dict(coordrang = [xmin,xmax,ymin,ymax,zmin,zmax],
-                               boundname = bundaryname,
-                               acc=self.para.ui.le_Acceleration.text(),
-                               liquidratio = self.para.ui.le_Liquidratio.text(),
-                               gravity = self.para.ui.le_Gravit.text(),
-                               sigma = self.para.ui.le_dyne.text(),
-                               mp_rho = self.para.ui.le_mprho.text(),
-                               mp_nu = self.para.ui.le_mpnu.text(),
-                               sp_rho = self.para.ui.le_sprho.text(),
-                               sp_nu = self.para.ui.le_spnu.text(),
-                               writetime = self.para.ui.le_writetime.text(),
-                               runtimeac = self.para.ui.le_runtimeac.text(),
-                               runtimesh = self.para.ui.le_runtimesh.text()
-                               )
-            casefluid = Fluidinitial(src,self.currentpath,**param_fluid)
-            casefluid.meshinitial()
-            casefluid.siminitial()
+            casefluid = self.fluidcase(src,list(stldic.keys()))
+
+            #记录网格规模、内存及计算耗时的预估(由流体前处理在写文件前确认)
+            from ..parameterset.meshplan import plan_case, save_plan
+            plan = plan_case(casefluid, self.mpicores.currentText())
+            save_plan(plan, self.currentpath)
+            #仅重新生成输入有变化的文件
+            casefluid.report(casefluid.setupcase())
+            #根据预估网格数及可用核数确定子区域数及分解方法(显示在流体控制台)
+            from ..parameterset.decompose import plan_case as plan_decomposition
+            decomposition = plan_decomposition(self.currentpath, plan.cells, self.availablecores(),
+                                               (casefluid.xmax-casefluid.xmin,
+                                                casefluid.ymax-casefluid.ymin,
+                                                casefluid.zmax-casefluid.zmin))
+            self.fluidreader.append(decomposition.summary()+'\n')
 
             return True
             # Q.QMessageBox.information(self, 'Title', '计算文件已成功生成！位于：'+self.currentpath, Q.QMessageBox.Yes)
             
+    def fluidcase(self,src,bundaryname):
+        """Fluid case of the current parameters, nothing is written."""
+        from ..parameterset.fluidinitial import Fluidinitial
+        minmax6 = self.Solidgroup.minmax6
+        print('minmax6 = ',minmax6)
+        xmin = minmax6[0]
+        ymin = minmax6[1]
+        zmin = minmax6[2]
+        xmax = minmax6[3]
+        ymax = minmax6[4]
+        zmax = minmax6[5]
+
+        param_fluid = dict(coordrang = [xmin,xmax,ymin,ymax,zmin,zmax],
+                           boundname = bundaryname,
+                           acc=self.para.ui.le_Acceleration.text(),
+                           liquidratio = self.para.ui.le_Liquidratio.text(),
+                           gravity = self.para.ui.le_Gravit.text(),
+                           sigma = self.para.ui.le_dyne.text(),
+                           mp_rho = self.para.ui.le_mprho.text(),
+                           mp_nu = self.para.ui.le_mpnu.text(),
+                           sp_rho = self.para.ui.le_sprho.text(),
+                           sp_nu = self.para.ui.le_spnu.text(),
+                           writetime = self.para.ui.le_writetime.text(),
+                           runtimeac = self.para.ui.le_runtimeac.text(),
+                           runtimesh = self.para.ui.le_runtimesh.text()
+                           )
+        return Fluidinitial(src,self.currentpath,**param_fluid)
+
+    def confirmmeshplan(self):
+        """Show the predicted fluid mesh before the case is written, returns False if the user cancels."""
+        if self.Solidgroup.minmax6 is None:
+            #前处理未完成, 由 addcase 提示
+            return True
+        from ..parameterset.meshplan import plan_case
+        #壁面与 genstlwall 相同, 尚未写出的 .stl 按包围盒估算
+        casefluid = self.fluidcase(TEMPLATE,list(self.Solidgroup.getthick().keys()))
+        plan = plan_case(casefluid, self.mpicores.currentText())
+        reply = Q.QMessageBox.question(self, '流体网格预估',
+                                       plan.summary()+'\n\n是否继续生成流体计算文件？',
+                                       Q.QMessageBox.Yes | Q.QMessageBox.No,
+                                       Q.QMessageBox.Yes)
+        return reply == Q.QMessageBox.Yes
+
     def addproject(self):
         #pass
         i = self.projects.count()
@@ -557,47 +607,44 @@ class Maincontrol(Q.QWidget):
         else:
             Q.QMessageBox.information(self, 'Title', '工程目录未发现计算结果！', Q.QMessageBox.Yes)
 
-    def dataReady(self):
-
-        self.keyboardWidget = KeyboardWidget()
-        #self.keyboardWidget.keyPressed.connect(self.keyCounter)
-
-        SolidOutput = self.solidtextview.textCursor()
-        processStdout = bytearray(self.process.readAllStandardOutput())
-        processStdout = processStdout.decode(encoding='UTF-8',errors='strict')
-
-        newCursor1 = self.solidtextview.textCursor()
-        newCursor1.movePosition(Q.QTextCursor.End)
-        self.solidtextview.setTextCursor(newCursor1)
-        SolidOutput = self.solidtextview.textCursor()
-
-        SolidOutput.insertText(processStdout)
-        #self.solidtextview.ensureCursorVisible()
-
-        FluidOutput = self.fluidtextview.textCursor()
-        FluidStdout = bytearray(self.processfluid.readAllStandardOutput())
-        FluidStdout = FluidStdout.decode(encoding='UTF-8',errors='strict')
-        #FluidOutput.movePosition(Q.QTextCursor.End)
-        newCursor = self.fluidtextview.textCursor()
-        newCursor.movePosition(Q.QTextCursor.End)
-        self.fluidtextview.setTextCursor(newCursor)
-        FluidOutput = self.fluidtextview.textCursor()
-
-        FluidOutput.insertText(FluidStdout)
-        #self.fluidtextview.ensureCursorVisible()
-
-        TempOutput = self.temptextview.textCursor()
-        TempStdout = bytearray(self.tempprocess.readAllStandardOutput())
-        TempStdout = TempStdout.decode(encoding='UTF-8',errors='strict')
-        #TempOutput.movePosition(Q.QTextCursor.End)
-        newCursor3 = self.temptextview.textCursor()
-        newCursor3.movePosition(Q.QTextCursor.End)
-        self.temptextview.setTextCursor(newCursor3)
-        TempOutput = self.temptextview.textCursor()
-        
-        TempOutput.insertText(TempStdout)
-        #self.temptextview.ensureCursorVisible()
-
+    def recordmeshplan(self):
+        """Record the mesh, costs and step time of a local fluid run to calibrate the mesh and decomposition planners."""
+        if self.executor.name != 'local' or not self.currentpath:
+            return
+        from ..parameterset.meshplan import Calibration, measure_case
+        from ..parameterset.decompose import DecompositionHistory, measure_decomposition
+        sample = measure_case(self.currentpath)
+        if sample is not None:
+            Calibration().add(sample)
+        sample = measure_decomposition(self.currentpath)
+        if sample is not None:
+            DecompositionHistory().add(sample)
+
+    def availablecores(self):
+        """Return the cores usable by the fluid solver (one local core is kept for the solid)."""
+        cores = int(self.mpicores.currentText())
+        if self.executor.name == 'local':
+            cores = min(cores, max(1, self.executor.allocator.max_cores - 1))
+        return cores
+
+    def fluidcores(self):
+        """Return the number of subdomains planned for the case, used as cores of the fluid stages."""
+        from ..parameterset.decompose import read_decomposition
+        decomposition = read_decomposition(self.currentpath)
+        if decomposition is None:
+            return self.mpicores.currentText()
+        return decomposition['subdomains']
+
+    def spoolconsole(self):
+        """Spool the full console output of the processes to the case directory."""
+        if not self.currentpath or not os.path.isdir(self.currentpath):
+            return
+        for reader, name in ((self.solidreader, 'solid'),
+                             (self.fluidreader, 'fluid'),
+                             (self.tempreader, 'other')):
+            path = os.path.join(self.currentpath, 'log.console.' + name)
+            if reader.spool_path != path:
+                reader.set_spool(path)
 
     def showreact(self):
             sender = self.sender()
@@ -606,19 +653,20 @@ class Maincontrol(Q.QWidget):
                     Q.QMessageBox.information(self, 'Title', '需要先保存工程文件！', Q.QMessageBox.Yes)
                     return
 
-                self.addcase()
+                if not self.confirmmeshplan() or not self.addcase():
+                    return
 
                 shellpath = os.path.dirname(os.path.abspath(__file__))
                 self.processfluid.setWorkingDirectory(shellpath)
                 self.process.setWorkingDirectory(shellpath)
+                self.spoolconsole()
                 
-                cmdfluidpre = '/opt/skyformai/bin/csub -I -A Tanksimulator-MeshGenerate -Jd '+os.path.basename(self.currentpath)
-                cmdfluidpre += ' -n '+self.mpicores.currentText()
-                cmdfluidpre += ' -q '+self.queue.currentText()
-                cmdfluidpre += ' ./fluidprepare '+self.currentpath
+                cmdfluidpre = self.executor.command('fluidprepare', self.currentpath,
+                                                    self.fluidcores(),
+                                                    self.queue.currentText())
                 #/home/export/online1/systest/swrh/Tanksimulator/final01/Fluid/constant/polyMesh/sets
                 if not os.path.exists(self.currentpath+'/Fluid/constant/polyMesh/sets'):
-                    self.processfluid.start(cmdfluidpre)
+                    start(self.processfluid, cmdfluidpre)
                 else: 
                     self.processfluid.start('echo 直接利用之前保存的流体网格!网格生成步骤已跳过!')
 
@@ -635,10 +683,9 @@ class Maincontrol(Q.QWidget):
                 else:
                     # cmdsolid='env -i '+'./solidrun '+self.currentpath
                     # cmdsolid='/opt/skyformai/bin/csub -I -A Tanksimulator-Calculix -Jd '+os.path.basename(self.currentpath)+' env -i ./solidrun '+self.currentpath
-                    cmdsolid='/opt/skyformai/bin/csub -I -A Tanksimulator-Calculix -Jd '+os.path.basename(self.currentpath)
-                    cmdsolid += ' -n '+self.mpicores.currentText()
-                    cmdsolid += ' -q '+self.queue.currentText()
-                    cmdsolid += ' ./solidrun '+self.currentpath
+                    cmdsolid = self.executor.command('solid', self.currentpath,
+                                                     self.mpicores.currentText(),
+                                                     self.queue.currentText())
 
                     with open (self.currentpath+'/savedata.json') as f:
                         casedata = json.load(f)
@@ -652,17 +699,18 @@ class Maincontrol(Q.QWidget):
 
 
                     # cmdfluid='env -i '+'./fluidrun '+self.currentpath+' '+'TODO'+' '+str(MaxT1)+' '+str(MaxT2)
-                    cmdfluid='/opt/skyformai/bin/csub -I -A Tanksimulator-Openfoam -Jd '+os.path.basename(self.currentpath)
-                    cmdfluid += ' -n '+self.mpicores.currentText()
-                    cmdfluid += ' -q '+self.queue.currentText()
-                    cmdfluid += ' ./fluidrun '+self.currentpath+' '+'TODO'+' '+str(MaxT1)+' '+str(MaxT2)
+                    cmdfluid = self.executor.command('fluid', self.currentpath,
+                                                     self.fluidcores(),
+                                                     self.queue.currentText(),
+                                                     'TODO', MaxT1, MaxT2)
 
                     shellpath = os.path.dirname(os.path.abspath(__file__))
                     self.processfluid.setWorkingDirectory(shellpath)
                     self.process.setWorkingDirectory(shellpath)
+                    self.spoolconsole()
 
-                    self.process.start(cmdsolid)
-                    self.processfluid.start(cmdfluid)
+                    start(self.process, cmdsolid)
+                    start(self.processfluid, cmdfluid)
 
             if sender == self.btboth:
 
@@ -693,6 +741,7 @@ class Maincontrol(Q.QWidget):
                 # self.paravis.activateaster()
 
                 self.tempprocess.setWorkingDirectory(os.path.dirname(os.path.abspath(__file__)))
+                self.spoolconsole()
                 #os.system("./WordShell")
                 self.tempprocess.start("env -i ./WordShell "+self.currentpath) #&& /usr/bin/libreoffice demo.docx")
                  
@@ -707,22 +756,19 @@ class Maincontrol(Q.QWidget):
                 self.tempprocess.kill()
 
                 fenge = '*'*22
-                SolidOutput = self.solidtextview.textCursor()
-                FluidOutput = self.fluidtextview.textCursor()
-                TempOutput = self.temptextview.textCursor()
 
                 if self.currentpath:
                     self.solidid = self.getjobid(self.currentpath+'/log.ccx_preCICE')
                     self.fluidid = self.getjobid(self.currentpath+'/log.interFoam')
 
                 if self.solidid:
-                    self.process.start('env -i /usr/sw-mpp/bin/bkill '+self.solidid)
+                    start(self.process, self.executor.cancel_command(self.solidid))
 
                 if self.fluidid:
-                    self.processfluid.start('env -i /usr/sw-mpp/bin/bkill '+self.fluidid)
+                    start(self.processfluid, self.executor.cancel_command(self.fluidid))
 
-                SolidOutput.insertText(fenge+'即将停止固体计算！'+fenge)
-                FluidOutput.insertText(fenge+'即将停止流体计算！'+fenge)
+                self.solidreader.append(fenge+'即将停止固体计算！'+fenge)
+                self.fluidreader.append(fenge+'即将停止流体计算！'+fenge)
 
 def copytree(src, dst, symlinks=False, ignore=None):
     if not os.path.exists(dst):
@@ -0,0 +1,866 @@
+"""
+Job executors
+-------------
+
+Pluggable backends used to run the calculation stages of the
+Tanksimulator (fluid preparation, solid and fluid calculations) and the
+code_aster runs of the truss bridge designer.
+
+- `ClusterExecutor` keeps the historical behaviour: the stages are
+  submitted with ``csub`` and cancelled with ``bkill``.
+
+- `LocalExecutor` runs the stages on the current Linux machine. Every
+  stage is started through a small wrapper (this module run as a
+  script) that waits in a first-in first-out queue until enough cores
+  are free, binds the stage to its cores, forwards cancellation to the
+  whole process group and records the resources used by the stage
+  (wall time, user/system CPU time, maximum resident set size).
+  A local job is cancelled by signalling its process group and
+  reconnected by following its output until its wrapper ends (the
+  ``cancel`` and ``follow`` actions of this module).
+
+The queue is shared by all the wrappers of the user (GUI and scripts)
+through a small state file protected by a lock, see `CoreAllocator`.
+The solid and fluid stages of a case are coupled by preCICE and must
+run together: the first one started reserves the cores of its partner
+(or the partner passes the queue), so that they never wait for each
+other behind other jobs.
+
+The command lines are quoted for the shell; they are started with
+`start()` so that paths with spaces are preserved.
+
+The backend is selected with the ``TANKSIM_EXECUTOR`` environment
+variable: ``cluster`` (default) or ``local``; ``TANKSIM_MAX_CORES``
+limits the number of cores used by the local backend.
+
+Example of a complete local workflow::
+
+    from asterstudy.gui.hexinjisuan.executor import run_workflow
+    for record in run_workflow('/path/to/case', cores=4):
+        print(record)
+"""
+
+import fcntl
+import json
+import os
+import os.path as osp
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+EXECUTOR_ENV = 'TANKSIM_EXECUTOR'
+MAX_CORES_ENV = 'TANKSIM_MAX_CORES'
+STATE_ENV = 'TANKSIM_LOCAL_STATE'
+
+SHELLPATH = osp.dirname(osp.abspath(__file__))
+
+CSUB = ('/opt/skyformai/bin/csub -I -A {account} -Jd {jobname}'
+        ' -n {cores} -q {queue}')
+BKILL = 'env -i /usr/sw-mpp/bin/bkill {jobid}'
+# Reconnection to a running cluster job (bonline), per stage
+RECONNECT = {'solid': 'env -i ./reconnectsolid {case} {jobid}',
+             'fluid': 'env -i ./reconnectfluid {case} {jobid}'}
+
+# Seconds left to a cancelled stage before it is killed
+KILL_DELAY = 10.
+# Period (seconds) of the polling of a reconnected local job
+FOLLOW_PERIOD = 0.5
+
+
+class Stage:
+    """Definition of a calculation stage.
+
+    Arguments:
+        name (str): Name of the stage.
+        cluster (str): Template of the cluster command.
+        local (list[str]): Template of the command line run locally.
+        account (Optional[str]): Accounting name used by ``csub``.
+        cores (Optional[int]): Number of cores used locally if not
+            requested explicitly (*None* means the requested number).
+        partner (Optional[str]): Stage coupled with this one, both run
+            at the same time.
+    """
+
+    def __init__(self, name, cluster, local, account=None, cores=None,
+                 partner=None):
+        self.name = name
+        self.cluster = cluster
+        self.local = local
+        self.account = account
+        self.cores = cores
+        self.partner = partner
+
+    def local_argv(self, case, args):
+        """Return the local command line for the *case* directory."""
+        params = dict(case=case, asrun=os.getenv('ASRUN', 'as_run'))
+        return [arg.format(**params) for arg in self.local] + list(args)
+
+
+STAGES = {
+    'fluidprepare': Stage('fluidprepare',
+                          CSUB + ' ./fluidprepare {case}',
+                          ['bash', './localfluidprepare', '{case}'],
+                          account='Tanksimulator-MeshGenerate'),
+    # ccx_preCICE is a serial program: one core is enough locally
+    'solid': Stage('solid',
+                   CSUB + ' ./solidrun {case}',
+                   ['bash', './localsolidrun', '{case}'],
+                   account='Tanksimulator-Calculix', cores=1,
+                   partner='fluid'),
+    'fluid': Stage('fluid',
+                   CSUB + ' ./fluidrun {case}',
+                   ['bash', './localfluidrun', '{case}'],
+                   account='Tanksimulator-Openfoam', partner='solid'),
+    'static': Stage('static',
+                    'sh {case}/submit.sh',
+                    ['{asrun}', '{case}/static.export']),
+    'modes': Stage('modes',
+                   'sh {case}/submit2.sh',
+                   ['{asrun}', '{case}/modes.export']),
+}
+
+
+def available_cpus(max_cores=None):
+    """Return the identifiers of the CPUs usable by the local backend.
+
+    Arguments:
+        max_cores (Optional[int]): Maximum number of cores, defaults to
+            ``TANKSIM_MAX_CORES`` or all the CPUs of the process.
+
+    Returns:
+        list[int]: CPU identifiers.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    if max_cores is None:
+        try:
+            max_cores = int(os.getenv(MAX_CORES_ENV))
+        except (TypeError, ValueError):
+            max_cores = len(cpus)
+    return cpus[:max(1, max_cores)]
+
+
+def _alive(pid):
+    """Tell if the process *pid* exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class CoreAllocator:
+    """First-in first-out allocation of cores shared between processes.
+
+    The state (queued and running stages, cores reserved for coupled
+    partners) is stored in a JSON file; each access is protected by an
+    exclusive lock on a companion file. The entries of dead processes
+    are discarded.
+
+    Arguments:
+        path (Optional[str]): State file, defaults to
+            ``TANKSIM_LOCAL_STATE`` or ``~/.tanksimulator/localjobs.json``.
+        max_cores (Optional[int]): Number of cores managed.
+    """
+
+    def __init__(self, path=None, max_cores=None):
+        self.path = path or os.getenv(STATE_ENV) or osp.join(
+            osp.expanduser('~'), '.tanksimulator', 'localjobs.json')
+        self.cpus = available_cpus(max_cores)
+
+    @property
+    def max_cores(self):
+        """int: Number of cores managed by the allocator."""
+        return len(self.cpus)
+
+    @contextmanager
+    def _state(self):
+        """Context manager giving the locked state, saved at exit."""
+        os.makedirs(osp.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.path) as fobj:
+                    state = json.load(fobj)
+            except (OSError, ValueError):
+                state = {}
+            state.setdefault('queue', [])
+            state.setdefault('running', {})
+            state.setdefault('reserved', {})
+            state['queue'] = [entry for entry in state['queue']
+                              if _alive(entry['owner'])]
+            state['running'] = {key: entry for key, entry
+                                in state['running'].items()
+                                if _alive(entry['owner'])}
+            state['reserved'] = {key: entry for key, entry
+                                 in state['reserved'].items()
+                                 if _alive(entry['owner'])}
+            yield state
+            with open(self.path + '.tmp', 'w') as fobj:
+                json.dump(state, fobj, indent=1)
+            os.replace(self.path + '.tmp', self.path)
+
+    def clamp(self, cores, reserve=0):
+        """Return the number of cores really granted for a request.
+
+        *reserve* cores are left to the coupled partner of the stage if
+        there are enough cores for both.
+        """
+        limit = self.max_cores
+        if limit > reserve:
+            limit -= reserve
+        return max(1, min(int(cores), limit))
+
+    def enqueue(self, ticket, name, cores, group=None, partner=None,
+                reserve=0):
+        """Append a request at the end of the queue.
+
+        Arguments:
+            ticket (str): Unique identifier of the request.
+            name (str): Name of the stage.
+            cores (int): Number of cores requested.
+            group (Optional[str]): Coupled job of the stage (case).
+            partner (Optional[str]): Stage coupled with this one.
+            reserve (Optional[int]): Cores reserved for the partner
+                when this stage starts first.
+        """
+        reserve = reserve if group and partner else 0
+        with self._state() as state:
+            state['queue'].append(dict(ticket=ticket, owner=os.getpid(),
+                                       name=name,
+                                       cores=self.clamp(cores, reserve),
+                                       group=group, partner=partner,
+                                       reserve=reserve,
+                                       submitted=time.time()))
+
+    def try_acquire(self, ticket):
+        """Grant the cores to *ticket* if it is first in the queue.
+
+        A coupled stage takes the cores reserved by its partner, or
+        passes the queue when its partner is running; when it starts
+        first, it reserves the cores of its partner.
+
+        Returns:
+            list[int]: Allocated CPUs, *None* if the request must wait.
+        """
+        with self._state() as state:
+            queue = state['queue']
+            index = [i for i, entry in enumerate(queue)
+                     if entry['ticket'] == ticket]
+            if not index:
+                return None
+            entry = queue[index[0]]
+            group = entry.get('group')
+            reserved = state['reserved'].get(group) if group else None
+            if reserved is not None and reserved['name'] == entry['name']:
+                del state['reserved'][group]
+                return self._start(state, entry, reserved['cpus'])
+            partnered = group is not None and any(
+                other.get('group') == group and
+                other['name'] == entry.get('partner')
+                for other in state['running'].values())
+            if index[0] != 0 and not partnered:
+                return None
+            busy = set()
+            for other in state['running'].values():
+                busy.update(other['cpus'])
+            for other in state['reserved'].values():
+                busy.update(other['cpus'])
+            free = [cpu for cpu in self.cpus if cpu not in busy]
+            reserve = 0 if partnered else entry.get('reserve', 0)
+            # a machine too small for both stages shares the cores
+            shared = entry['cores'] + reserve > self.max_cores
+            if len(free) < entry['cores'] + (0 if shared else reserve):
+                return None
+            cpus = free[:entry['cores']]
+            if reserve:
+                state['reserved'][group] = dict(
+                    name=entry['partner'], owner=entry['owner'],
+                    by=ticket, cpus=cpus[:reserve] if shared else
+                    free[entry['cores']:entry['cores'] + reserve])
+            return self._start(state, entry, cpus)
+
+    @staticmethod
+    def _start(state, entry, cpus):
+        """Move *entry* from the queue to the running stages."""
+        state['queue'].remove(entry)
+        entry['cpus'] = cpus
+        entry['started'] = time.time()
+        state['running'][entry['ticket']] = entry
+        return cpus
+
+    def acquire(self, ticket, name, cores, poll=0.2, cancelled=None,
+                **coupling):
+        """Queue a request and wait for its cores.
+
+        Arguments:
+            ticket (str): Unique identifier of the request.
+            name (str): Name of the stage (for information).
+            cores (int): Number of cores requested.
+            poll (Optional[float]): Polling period in seconds.
+            cancelled (Optional[callable]): Returns *True* to abandon
+                the request.
+            coupling: *group*, *partner* and *reserve* of a coupled
+                stage (see `enqueue`).
+
+        Returns:
+            list[int]: Allocated CPUs, *None* if cancelled.
+        """
+        self.enqueue(ticket, name, cores, **coupling)
+        while True:
+            cpus = self.try_acquire(ticket)
+            if cpus is not None:
+                return cpus
+            if cancelled is not None and cancelled():
+                self.release(ticket)
+                return None
+            time.sleep(poll)
+
+    def release(self, ticket):
+        """Release the cores (or the queue position) of *ticket*."""
+        with self._state() as state:
+            state['queue'] = [entry for entry in state['queue']
+                              if entry['ticket'] != ticket]
+            state['running'].pop(ticket, None)
+            # a reservation not taken by the partner is given back
+            state['reserved'] = {key: entry for key, entry
+                                 in state['reserved'].items()
+                                 if entry['by'] != ticket}
+
+    def status(self):
+        """Return the queued, running and reserved requests."""
+        with self._state() as state:
+            return dict(queue=list(state['queue']),
+                        running=dict(state['running']),
+                        reserved=dict(state['reserved']))
+
+
+class StageRun:
+    """Run one stage under the control of a `CoreAllocator`.
+
+    This is what the wrapper process does; the accounting is available
+    with `record()` once `run()` returned.
+
+    Arguments:
+        name (str): Name of the stage.
+        argv (list[str]): Command line of the stage.
+        cores (int): Number of cores requested.
+        allocator (Optional[CoreAllocator]): Shared allocator.
+        coupling: *group*, *partner* and *reserve* of a coupled stage
+            (see `CoreAllocator.enqueue`).
+    """
+
+    def __init__(self, name, argv, cores, allocator=None, **coupling):
+        self.name = name
+        self.argv = argv
+        self.allocator = allocator or CoreAllocator()
+        self.coupling = coupling
+        self.cores = self.allocator.clamp(cores,
+                                          coupling.get('reserve', 0))
+        self.ticket = '%d@%s' % (os.getpid(), name)
+        self.state = 'queued'
+        self.cpus = []
+        self.child = None
+        self.returncode = None
+        self.rusage = None
+        self.times = dict(submitted=time.time(), started=None, ended=None)
+        self._cancelled = False
+
+    def cancel(self, *_):
+        """Cancel the stage: leave the queue or terminate the children."""
+        self._cancelled = True
+        if self.child is None or self.child.returncode is not None:
+            return
+        if os.getpgid(0) == os.getpid():
+            # the wrapper leads the process group of the stage
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            os.killpg(os.getpid(), signal.SIGTERM)
+        else:
+            self.child.terminate()
+        timer = threading.Timer(KILL_DELAY, self._kill)
+        timer.daemon = True
+        timer.start()
+
+    def _kill(self):
+        if self.child is not None and self.child.returncode is None:
+            try:
+                self.child.kill()
+            except ProcessLookupError:
+                pass
+
+    def run(self, **popen_args):
+        """Wait for the cores, run the stage and return its exit code."""
+        cpus = self.allocator.acquire(self.ticket, self.name, self.cores,
+                                      cancelled=lambda: self._cancelled,
+                                      **self.coupling)
+        if cpus is None:
+            self.state = 'cancelled'
+            self.returncode = -signal.SIGTERM
+            return self.returncode
+        self.cpus = cpus
+        try:
+            if hasattr(os, 'sched_setaffinity'):
+                # inherited by all the processes started by the stage
+                os.sched_setaffinity(0, cpus)
+            env = dict(popen_args.pop('env', None) or os.environ)
+            env.update(TANKSIM_JOBID=str(os.getpid()),
+                       TANKSIM_NPROCS=str(len(cpus)),
+                       OMP_NUM_THREADS=str(len(cpus)))
+            self.state = 'running'
+            self.times['started'] = time.time()
+            self.child = subprocess.Popen(self.argv, env=env, **popen_args)
+            _, status, self.rusage = os.wait4(self.child.pid, 0)
+            self.returncode = (-os.WTERMSIG(status)
+                               if os.WIFSIGNALED(status)
+                               else os.WEXITSTATUS(status))
+            self.child.returncode = self.returncode
+        finally:
+            self.times['ended'] = time.time()
+            self.allocator.release(self.ticket)
+        if self._cancelled:
+            self.state = 'cancelled'
+        else:
+            self.state = 'done' if self.returncode == 0 else 'failed'
+        return self.returncode
+
+    def record(self):
+        """Return the accounting of the stage.
+
+        Returns:
+            dict: State, exit code, cores, CPUs, times in the queue and
+            in execution (seconds), user and system CPU times (seconds)
+            and maximum resident set size (kilobytes).
+        """
+        times = self.times
+        record = dict(name=self.name, argv=self.argv, state=self.state,
+                      returncode=self.returncode, jobid=os.getpid(),
+                      cores=self.cores, cpus=self.cpus,
+                      queued=None, wall=None,
+                      cpu_user=None, cpu_sys=None, maxrss_kb=None)
+        if times['started'] is not None:
+            record['queued'] = times['started'] - times['submitted']
+            record['wall'] = times['ended'] - times['started']
+        if self.rusage is not None:
+            record['cpu_user'] = self.rusage.ru_utime
+            record['cpu_sys'] = self.rusage.ru_stime
+            record['maxrss_kb'] = self.rusage.ru_maxrss
+        return record
+
+
+class Executor:
+    """Base class of the executors."""
+
+    name = None
+
+    @property
+    def max_cores(self):
+        """int: Number of cores a stage may use."""
+        return os.cpu_count() or 1
+
+    def command(self, stage, case, cores, queue, *args):
+        """Return the command line starting *stage* (see `start()`).
+
+        Arguments:
+            stage (str): Name of the stage (see `STAGES`).
+            case (str): Case directory.
+            cores (int|str): Number of cores requested.
+            queue (str): Cluster queue.
+            args (str): Additional arguments of the stage script.
+
+        Returns:
+            str: Shell command line, run from the directory of this
+            module.
+        """
+        raise NotImplementedError
+
+    def cancel_command(self, jobid):
+        """Return the command cancelling the job *jobid*."""
+        raise NotImplementedError
+
+    def reconnect_command(self, stage, case, jobid, *args):
+        """Return the command following the running job *jobid*.
+
+        Arguments:
+            stage (str): Name of the stage ('solid' or 'fluid').
+            case (str): Case directory.
+            jobid (int|str): Identifier of the job (see
+                `Maincontrol.getjobid`).
+            args (str): Additional arguments of the reconnection script.
+
+        Returns:
+            str: Shell command line, run from the directory of this
+            module.
+        """
+        raise NotImplementedError
+
+
+class ClusterExecutor(Executor):
+    """Submission to the cluster scheduler with ``csub``."""
+
+    name = 'cluster'
+
+    def command(self, stage, case, cores, queue, *args):
+        stage = STAGES[stage]
+        quote = shlex.quote
+        cmd = stage.cluster.format(account=quote(str(stage.account)),
+                                   jobname=quote(osp.basename(case)),
+                                   cores=quote(str(cores)),
+                                   queue=quote(str(queue)),
+                                   case=quote(case))
+        return ' '.join([cmd] + [quote(str(arg)) for arg in args])
+
+    def cancel_command(self, jobid):
+        return BKILL.format(jobid=jobid)
+
+    def reconnect_command(self, stage, case, jobid, *args):
+        quote = shlex.quote
+        cmd = RECONNECT[stage].format(case=quote(case),
+                                      jobid=quote(str(jobid)))
+        return ' '.join([cmd] + [quote(str(arg)) for arg in args])
+
+
+class LocalExecutor(Executor):
+    """Execution of the stages on the local machine.
+
+    `command()` returns the wrapper command used by the GUI; `submit()`
+    starts the wrapper directly, for scripted workflows.
+
+    Arguments:
+        max_cores (Optional[int]): Number of cores usable by all the
+            stages together.
+        state (Optional[str]): State file of the `CoreAllocator`.
+    """
+
+    name = 'local'
+
+    def __init__(self, max_cores=None, state=None):
+        self.allocator = CoreAllocator(state, max_cores)
+        self.jobs = []
+
+    @property
+    def max_cores(self):
+        return self.allocator.max_cores
+
+    def _wrapper(self, stage, case, cores, args):
+        """Return the wrapper command line for *stage*."""
+        spec = STAGES[stage]
+        if spec.cores is not None:
+            cores = spec.cores
+        report = osp.join(case, 'log.job.%s.json' % stage)
+        argv = [sys.executable, osp.abspath(__file__), 'run',
+                '--name', stage, '--cores', str(cores),
+                '--max-cores', str(self.allocator.max_cores),
+                '--state', self.allocator.path, '--report', report]
+        if spec.partner is not None:
+            # the partner of a serial stage reserves its core
+            argv += ['--group', osp.realpath(case),
+                     '--partner', spec.partner,
+                     '--reserve', str(STAGES[spec.partner].cores or 0)]
+        argv.append('--')
+        return argv + spec.local_argv(case, [str(arg) for arg in args])
+
+    def command(self, stage, case, cores, queue, *args):
+        return ' '.join(shlex.quote(arg)
+                        for arg in self._wrapper(stage, case, cores, args))
+
+    def _action(self, *args):
+        """Return the command line running an action of this module."""
+        return ' '.join(shlex.quote(str(arg)) for arg in
+                        (sys.executable, osp.abspath(__file__)) + args)
+
+    def cancel_command(self, jobid):
+        # the wrapper and its children share the process group *jobid*
+        # (signalled from Python, 'kill --' is not portable to dash)
+        return self._action('cancel', int(jobid))
+
+    def reconnect_command(self, stage, case, jobid, *args):
+        # the output of the wrapper is written in log.job.<stage>
+        return self._action('follow', int(jobid),
+                            osp.join(case, 'log.job.%s' % stage))
+
+    def submit(self, stage, case, cores=1, *args):
+        """Start a stage in background.
+
+        Arguments:
+            stage (str): Name of the stage (see `STAGES`).
+            case (str): Case directory.
+            cores (Optional[int]): Number of cores requested.
+            args (str): Additional arguments of the stage script.
+
+        Returns:
+            LocalJob: Handle of the submitted stage.
+        """
+        job = LocalJob(stage, case, self._wrapper(stage, case, cores, args))
+        self.jobs.append(job)
+        return job
+
+    def cancel(self, job):
+        """Cancel a queued or running job."""
+        job.cancel()
+
+    def wait(self, jobs=None):
+        """Wait for the end of *jobs* (all by default).
+
+        Returns:
+            list[dict]: Accounting records of the jobs.
+        """
+        jobs = self.jobs if jobs is None else jobs
+        return [job.wait() for job in jobs]
+
+
+class LocalJob:
+    """Handle of a stage started in background by `LocalExecutor`.
+
+    Arguments:
+        stage (str): Name of the stage.
+        case (str): Case directory, where the output is written in
+            ``log.job.<stage>`` and the accounting in
+            ``log.job.<stage>.json``.
+        argv (list[str]): Wrapper command line.
+    """
+
+    def __init__(self, stage, case, argv):
+        self.stage = stage
+        self.report = osp.join(case, 'log.job.%s.json' % stage)
+        if osp.exists(self.report):
+            os.remove(self.report)
+        self.log = osp.join(case, 'log.job.%s' % stage)
+        with open(self.log, 'wb') as output:
+            self.process = subprocess.Popen(argv, cwd=SHELLPATH,
+                                            stdout=output,
+                                            stderr=subprocess.STDOUT)
+
+    @property
+    def jobid(self):
+        """int: Identifier of the job (pid of the wrapper)."""
+        return self.process.pid
+
+    def done(self):
+        """Tell if the job is finished."""
+        return self.process.poll() is not None
+
+    def cancel(self):
+        """Cancel the job."""
+        if not self.done():
+            self.process.send_signal(signal.SIGTERM)
+
+    def wait(self, timeout=None):
+        """Wait for the end of the job and return its accounting."""
+        self.process.wait(timeout)
+        try:
+            with open(self.report) as fobj:
+                return json.load(fobj)
+        except (OSError, ValueError):
+            return dict(name=self.stage, state='failed',
+                        returncode=self.process.returncode)
+
+
+def cancel_group(pid):
+    """Send SIGTERM to the process group led by *pid*.
+
+    Returns:
+        bool: *False* if the group does not exist.
+    """
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def follow(pid, log, period=FOLLOW_PERIOD, output=None):
+    """Print the new lines of *log* until the process *pid* ends.
+
+    Used to reconnect to a running local job: its output written so far
+    is already shown, only what is appended afterwards is printed. The
+    log is read again from its beginning if it is replaced.
+
+    Arguments:
+        pid (int): Process of the job (its wrapper).
+        log (str): Output file of the job.
+        period (Optional[float]): Polling period in seconds.
+        output (Optional[file]): Destination, defaults to stdout.
+    """
+    output = output or sys.stdout
+    fobj = None
+    skip = True
+    try:
+        while True:
+            running = _alive(pid)
+            if fobj is None and osp.exists(log):
+                fobj = open(log, 'rb')
+                if skip:
+                    fobj.seek(0, os.SEEK_END)
+            skip = False
+            if fobj is not None:
+                data = fobj.read()
+                if data:
+                    output.write(data.decode(errors='replace'))
+                    output.flush()
+                try:
+                    stat = os.stat(log)
+                except OSError:
+                    stat = None
+                if stat is None or stat.st_size < fobj.tell() or \
+                        stat.st_ino != os.fstat(fobj.fileno()).st_ino:
+                    fobj.close()
+                    fobj = None
+                    continue
+            if not running:
+                break
+            time.sleep(period)
+    finally:
+        if fobj is not None:
+            fobj.close()
+
+
+def start(process, command):
+    """Start a command line of `Executor.command` in a `QProcess`."""
+    process.start('/bin/sh', ['-c', command])
+
+
+def get_executor(name=None):
+    """Return the executor selected by *name* or ``TANKSIM_EXECUTOR``."""
+    name = name or os.getenv(EXECUTOR_ENV) or ClusterExecutor.name
+    if name == LocalExecutor.name:
+        return LocalExecutor()
+    if name == ClusterExecutor.name:
+        return ClusterExecutor()
+    raise ValueError('unknown executor: {!r}'.format(name))
+
+
+def coupling_times(case):
+    """Return the end times of the two coupled phases of a case."""
+    with open(osp.join(case, 'savedata.json')) as fobj:
+        couple = json.load(fobj)['couple']
+    return couple['Runtimeac'], couple['Runtimesh']
+
+
+def run_workflow(case, cores=None, executor=None, prepare=True):
+    """Run the whole Tanksimulator workflow of *case* locally.
+
+    The fluid preparation runs first, then the solid and fluid
+    participants run together (they are coupled by preCICE).
+
+    Arguments:
+        case (str): Case directory, prepared by the GUI.
+        cores (Optional[int]): Cores of the fluid stages, defaults to
+            all the cores but one (kept for the solid participant).
+        executor (Optional[LocalExecutor]): Executor to use.
+        prepare (Optional[bool]): Run the fluid preparation.
+
+    Returns:
+        list[dict]: Accounting records of the stages.
+    """
+    executor = executor or LocalExecutor()
+    if cores is None:
+        cores = max(1, executor.allocator.max_cores - 1)
+    records = []
+    if prepare:
+        records.extend(executor.wait([executor.submit('fluidprepare',
+                                                      case, cores)]))
+        if records[-1]['returncode'] != 0:
+            return records
+    maxt1, maxt2 = coupling_times(case)
+    jobs = [executor.submit('solid', case, 1),
+            executor.submit('fluid', case, cores, 'TODO', maxt1, maxt2)]
+    records.extend(executor.wait(jobs))
+    return records
+
+
+def main(argv=None):
+    """Entry point of the wrapper running one local stage."""
+    import argparse
+    parser = argparse.ArgumentParser(description='Run a local stage.')
+    subparsers = parser.add_subparsers(dest='action')
+    run = subparsers.add_parser('run', help='run one stage')
+    run.add_argument('--name', required=True, help='name of the stage')
+    run.add_argument('--cores', type=int, default=1,
+                     help='number of cores requested')
+    run.add_argument('--max-cores', type=int, default=None,
+                     help='number of cores shared by the local stages')
+    run.add_argument('--state', default=None,
+                     help='state file of the local queue')
+    run.add_argument('--report', default=None,
+                     help='JSON file receiving the accounting')
+    run.add_argument('--group', default=None,
+                     help='coupled job of the stage (case directory)')
+    run.add_argument('--partner', default=None,
+                     help='stage coupled with this one')
+    run.add_argument('--reserve', type=int, default=0,
+                     help='cores reserved for the partner stage')
+    run.add_argument('command', nargs=argparse.REMAINDER)
+    subparsers.add_parser('status', help='show the local queue')
+    cancel = subparsers.add_parser('cancel', help='cancel a local job')
+    cancel.add_argument('pid', type=int,
+                        help='job identifier (process group)')
+    follower = subparsers.add_parser(
+        'follow', help='show the output of a running local job')
+    follower.add_argument('pid', type=int, help='job identifier')
+    follower.add_argument('log', help='output file of the job')
+    args = parser.parse_args(argv)
+
+    if args.action == 'status':
+        print(json.dumps(CoreAllocator().status(), indent=2))
+        return 0
+    if args.action == 'cancel':
+        if not cancel_group(args.pid):
+            print('Local job {} not found'.format(args.pid))
+            return 1
+        return 0
+    if args.action == 'follow':
+        print('Following local job {}'.format(args.pid), flush=True)
+        follow(args.pid, args.log)
+        print('Local job {} ended'.format(args.pid), flush=True)
+        return 0
+    if args.action != 'run':
+        parser.print_help()
+        return 1
+
+    try:
+        # lead a process group so that the stage can be cancelled as a
+        # whole, even if the wrapper itself has been killed
+        os.setpgid(0, 0)
+    except OSError:
+        pass
+    command = args.command[1:] if args.command[:1] == ['--'] \
+        else args.command
+    stage = StageRun(args.name, command, args.cores,
+                     CoreAllocator(args.state, args.max_cores),
+                     group=args.group, partner=args.partner,
+                     reserve=args.reserve)
+    signal.signal(signal.SIGTERM, stage.cancel)
+    signal.signal(signal.SIGINT, stage.cancel)
+    # the third word is the job identifier read by Maincontrol.getjobid
+    print('Local job {} queued: {} on {} core(s)'.format(
+        os.getpid(), args.name, stage.cores), flush=True)
+    returncode = stage.run()
+    record = stage.record()
+    if args.report:
+        with open(args.report, 'w') as fobj:
+            json.dump(record, fobj, indent=4)
+    print('Local job {} {}: wall {} s, cpu {} s, max rss {} kB'.format(
+        os.getpid(), record['state'],
+        _fmt(record['wall']),
+        _fmt((record['cpu_user'] or 0.) + (record['cpu_sys'] or 0.)),
+        record['maxrss_kb']), flush=True)
+    return 0 if returncode is None else (returncode if returncode >= 0
+                                         else 128 - returncode)
+
+
+def _fmt(value):
+    """Format a number of seconds."""
+    return '-' if value is None else '{:.1f}'.format(value)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
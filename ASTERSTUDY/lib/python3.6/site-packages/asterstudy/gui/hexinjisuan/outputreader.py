@@ -0,0 +1,346 @@
+"""
+Process output readers
+----------------------
+
+Incremental, rate-limited display of `QProcess` output for the job
+controller (`controltab.Maincontrol`).
+
+Each process gets its own `ProcessOutputReader`: only the bytes that
+arrived since the last `readyRead` are read and decoded (with an
+incremental decoder, so that multi-byte characters split between two
+chunks are not lost), the complete raw output is spooled to a log file
+on disk and the console is refreshed at most `DEFAULT_INTERVAL` times
+per second with a bounded number of lines.
+
+The bounded tail is kept on the Python side: removing the first blocks
+of a `QTextDocument` (what `maximumBlockCount` does) costs more than
+rebuilding the whole console, so the console is allowed to grow up to
+`TRIM_RATIO` times its size and is then reset with the retained tail.
+
+`measure_latency()` starts a chatty fake solver and reports the GUI
+event-loop latency while its output is displayed::
+
+    python3 outputreader.py --rate 10000 --duration 5
+"""
+
+import codecs
+import os
+from collections import deque
+import sys
+import time
+
+from PyQt5 import Qt as Q
+
+
+# Minimum delay between two console refreshes, in milliseconds (10 Hz)
+DEFAULT_INTERVAL = 100
+# Maximum number of lines kept in a console
+DEFAULT_MAX_BLOCKS = 5000
+# The console is rebuilt when it holds that many times the maximum
+TRIM_RATIO = 1.5
+
+
+class ProcessOutputReader(Q.QObject):
+    """Read the output of a `QProcess` chunk by chunk into a text view.
+
+    Arguments:
+        process (QProcess): Process to read; its channels are expected
+            to be merged.
+        view (QPlainTextEdit): Console where the output is displayed.
+        interval (Optional[int]): Minimum delay between two refreshes
+            of the console, in milliseconds.
+        max_blocks (Optional[int]): Maximum number of lines kept in the
+            console, older lines are dropped.
+    """
+
+    def __init__(self, process, view, interval=DEFAULT_INTERVAL,
+                 max_blocks=DEFAULT_MAX_BLOCKS):
+        super().__init__(view)
+        self.process = process
+        self.view = view
+        self.max_blocks = max_blocks
+        self.nbytes = 0
+        self.nflush = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._pending = []
+        self._spool = None
+        self._spool_path = None
+        self._lines = deque(maxlen=max_blocks)
+        self._shown = 0
+
+        self._timer = Q.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.flush)
+
+        process.readyRead.connect(self.read)
+        process.finished.connect(self.finish)
+
+    @property
+    def spool_path(self):
+        """str: Path of the file receiving the full output (if any)."""
+        return self._spool_path
+
+    def set_spool(self, path):
+        """Spool the complete output of the process to *path*.
+
+        The file is opened in append mode so that the output of several
+        successive runs (preparation, calculation, reconnection...) is
+        kept. Pass *None* to stop spooling.
+
+        Arguments:
+            path (str): Path of the log file.
+        """
+        self.close_spool()
+        if path:
+            self._spool = open(path, 'ab')
+            self._spool_path = path
+
+    def close_spool(self):
+        """Close the spool file."""
+        if self._spool is not None:
+            self._spool.close()
+        self._spool = None
+        self._spool_path = None
+
+    def read(self):
+        """Read the bytes that arrived since the previous call."""
+        data = bytes(self.process.readAllStandardOutput())
+        if not data:
+            return
+        self.nbytes += len(data)
+        if self._spool is not None:
+            self._spool.write(data)
+        text = self._decoder.decode(data)
+        if text:
+            self._pending.append(text)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def reset(self, text=''):
+        """Replace the content of the console.
+
+        Arguments:
+            text (Optional[str]): New content (only the last lines are
+                kept).
+        """
+        self._pending = []
+        self._lines.clear()
+        self._store(text)
+        self._redraw()
+
+    def append(self, text):
+        """Append a message to the console, after the pending output.
+
+        Arguments:
+            text (str): Message to display.
+        """
+        self._pending.append(text)
+        self.flush()
+
+    def flush(self):
+        """Display the pending output in the console."""
+        self._timer.stop()
+        if self._spool is not None:
+            self._spool.flush()
+        if not self._pending:
+            return
+        text = ''.join(self._pending)
+        self._pending = []
+        nbnew = self._store(text)
+
+        if self._shown + nbnew > TRIM_RATIO * self.max_blocks:
+            self._redraw()
+        else:
+            scrollbar = self.view.verticalScrollBar()
+            follow = scrollbar.value() >= scrollbar.maximum()
+            cursor = Q.QTextCursor(self.view.document())
+            cursor.movePosition(Q.QTextCursor.End)
+            cursor.insertText(text)
+            self._shown += nbnew
+            if follow:
+                scrollbar.setValue(scrollbar.maximum())
+        self.nflush += 1
+
+    def _store(self, text):
+        """Add *text* to the retained tail, return the number of lines."""
+        lines = text.splitlines(True)
+        if not lines:
+            return 0
+        nbnew = len(lines)
+        if self._lines and not self._lines[-1].endswith('\n'):
+            # complete the last partial line
+            self._lines[-1] += lines.pop(0)
+            nbnew -= 1
+        self._lines.extend(lines)
+        return nbnew
+
+    def _redraw(self):
+        """Display the retained tail only."""
+        self.view.setPlainText(''.join(self._lines))
+        self._shown = len(self._lines)
+        scrollbar = self.view.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+    def finish(self):
+        """Flush the remaining output once the process has finished."""
+        self.read()
+        tail = self._decoder.decode(b'', True)
+        if tail:
+            self._pending.append(tail)
+        self._decoder.reset()
+        self.flush()
+
+
+class EventLoopProbe(Q.QObject):
+    """Measure the latency of the event loop with a periodic timer.
+
+    The lateness of each timeout compared to the expected period is
+    recorded; a busy event loop delays the timeouts.
+
+    Arguments:
+        period (Optional[int]): Timer period, in milliseconds.
+    """
+
+    def __init__(self, period=10, parent=None):
+        super().__init__(parent)
+        self.period = period
+        self.samples = []
+        self._last = None
+        self._timer = Q.QTimer(self)
+        self._timer.setTimerType(Q.Qt.PreciseTimer)
+        self._timer.setInterval(period)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        """Start sampling."""
+        self.samples = []
+        self._last = time.perf_counter()
+        self._timer.start()
+
+    def stop(self):
+        """Stop sampling."""
+        self._timer.stop()
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.samples.append(max(0., (now - self._last) * 1000. - self.period))
+        self._last = now
+
+    def summary(self):
+        """Return statistics about the recorded latencies.
+
+        Returns:
+            dict: Number of samples, mean, median, 95th percentile and
+            maximum latency in milliseconds.
+        """
+        values = sorted(self.samples)
+        if not values:
+            return {'samples': 0}
+        nbv = len(values)
+        return {'samples': nbv,
+                'mean': sum(values) / nbv,
+                'p50': values[nbv // 2],
+                'p95': values[min(nbv - 1, int(nbv * 0.95))],
+                'max': values[-1]}
+
+
+CHATTY_SOLVER = r"""
+import sys, time
+rate, duration = int(sys.argv[1]), float(sys.argv[2])
+batch = max(1, rate // 100)
+start = time.time()
+line = 0
+while time.time() - start < duration:
+    out = []
+    for _ in range(batch):
+        line += 1
+        out.append('Time = %d  Courant Number mean: 0.0012 max: 0.4187 '
+                   'smoothSolver: Solving for Ux, residual = 1e-06\n' % line)
+    sys.stdout.write(''.join(out))
+    sys.stdout.flush()
+    time.sleep(0.01)
+"""
+
+
+def _legacy_reader(process, view):
+    """Return a slot reproducing the former `Maincontrol.dataReady`."""
+    def _read():
+        text = bytearray(process.readAllStandardOutput()).decode('utf-8')
+        cursor = view.textCursor()
+        cursor.movePosition(Q.QTextCursor.End)
+        view.setTextCursor(cursor)
+        view.textCursor().insertText(text)
+    return _read
+
+
+def measure_latency(rate=10000, duration=5., buffered=True, spool=None):
+    """Measure the event-loop latency while displaying a chatty process.
+
+    Arguments:
+        rate (Optional[int]): Number of lines written per second.
+        duration (Optional[float]): Duration of the run in seconds.
+        buffered (Optional[bool]): Use `ProcessOutputReader` with a
+            `QPlainTextEdit` if *True*, the former direct insertion into
+            a `QTextBrowser` otherwise.
+        spool (Optional[str]): Log file used with the buffered reader.
+
+    Returns:
+        dict: Latency statistics (see `EventLoopProbe.summary()`) plus
+        the number of bytes read and of console refreshes.
+    """
+    app = Q.QApplication.instance() or Q.QApplication(sys.argv[:1])
+    view = Q.QPlainTextEdit() if buffered else Q.QTextBrowser()
+    view.show()
+    process = Q.QProcess()
+    process.setProcessChannelMode(Q.QProcess.MergedChannels)
+    reader = None
+    if buffered:
+        reader = ProcessOutputReader(process, view)
+        reader.set_spool(spool)
+    else:
+        process.readyRead.connect(_legacy_reader(process, view))
+
+    probe = EventLoopProbe()
+    loop = Q.QEventLoop()
+    process.finished.connect(loop.quit)
+    probe.start()
+    process.start(sys.executable,
+                  ['-c', CHATTY_SOLVER, str(rate), str(duration)])
+    loop.exec_()
+    probe.stop()
+
+    stats = probe.summary()
+    stats['lines'] = view.document().blockCount()
+    if reader is not None:
+        reader.close_spool()
+        stats['bytes'] = reader.nbytes
+        stats['refreshes'] = reader.nflush
+    view.close()
+    app.processEvents()
+    return stats
+
+
+def main():
+    """Compare the legacy and buffered readers on a chatty process."""
+    import argparse
+    import tempfile
+    parser = argparse.ArgumentParser(
+        description='Measure the console latency with a chatty process.')
+    parser.add_argument('--rate', type=int, default=10000,
+                        help='lines per second written by the fake solver')
+    parser.add_argument('--duration', type=float, default=5.,
+                        help='duration of each run in seconds')
+    args = parser.parse_args()
+
+    spool = os.path.join(tempfile.mkdtemp(), 'log.console')
+    for buffered in (False, True):
+        stats = measure_latency(args.rate, args.duration, buffered, spool)
+        print('%-8s %s' % ('buffered' if buffered else 'legacy',
+                           ', '.join('%s=%.2f' % (key, stats[key])
+                                     for key in sorted(stats))))
+    print('full log spooled to', spool)
+
+
+if __name__ == '__main__':
+    main()
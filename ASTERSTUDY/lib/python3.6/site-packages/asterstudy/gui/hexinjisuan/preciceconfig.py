@@ -0,0 +1,761 @@
+"""
+preCICE configuration
+---------------------
+
+Generation and validation of the ``precice-config_*.xml`` files of a
+Tanksimulator case.
+
+The templates (``template/precice-config_{parallel,serial}{,2}.xml``)
+are parsed into an element tree (`PreciceConfig`) instead of being
+rewritten line by line: the time window, the end time and the
+watch-points are set on the model, then the configuration is checked
+before being written:
+
+- data, meshes and participants referenced by the meshes, the
+  participants, the mappings, the watch-points, the communications
+  and the coupling scheme are declared,
+- the meshes and data exchanged with the adapters
+  (``Fluid/precice-adapter-config.yml`` for OpenFOAM, ``config.yml``
+  for CalculiX) are provided, read and written by the right
+  participants.
+
+`PreciceConfig.cost` summarizes what the coupling will cost: number
+of coupling windows, data exchanged per window (for the number of
+vertices of the solid interface, see `count_inp_nodes`), size of the
+watch-point logs and memory of the acceleration.
+
+preCICE tags use namespace prefixes (``data:vector``, ``m2n:sockets``,
+...) that are not declared, so the files are read with expat without
+namespace processing.
+
+Every variant can be generated in a temporary directory, parsed again
+and validated with::
+
+    python3 -m asterstudy.gui.hexinjisuan.preciceconfig check
+    python3 -m asterstudy.gui.hexinjisuan.preciceconfig show case/precice-config.xml
+"""
+
+import math
+import os.path as osp
+import re
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from xml.parsers import expat
+
+
+TEMPLATE = osp.join(osp.dirname(osp.dirname(osp.dirname(
+    osp.abspath(__file__)))), 'template')
+
+# (file name, stage): the second stage restarts from the first one
+VARIANTS = [('precice-config_parallel.xml', 1),
+            ('precice-config_parallel2.xml', 2),
+            ('precice-config_serial.xml', 1),
+            ('precice-config_serial2.xml', 2)]
+
+# Adapter configurations of a case (relative to the case directory)
+ADAPTERS = [osp.join('Fluid', 'precice-adapter-config.yml'), 'config.yml']
+
+# Bytes per exchanged value and characters per value in the logs
+VALUE_BYTES = 8
+LOG_CHARS = 16
+
+
+class PreciceConfigError(ValueError):
+    """Invalid preCICE configuration."""
+
+    def __init__(self, errors):
+        if isinstance(errors, str):
+            errors = [errors]
+        self.errors = list(errors)
+        super().__init__('\n'.join(self.errors))
+
+
+def parse_config(text):
+    """Parse a preCICE configuration, comments are kept.
+
+    Arguments:
+        text (str): Content of the XML file.
+
+    Returns:
+        Element: Root element (``precice-configuration``).
+    """
+    builder = ET.TreeBuilder()
+
+    def _comment(data):
+        builder.start(ET.Comment, {})
+        builder.data(data)
+        builder.end(ET.Comment)
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = builder.start
+    parser.EndElementHandler = builder.end
+    parser.CharacterDataHandler = builder.data
+    parser.CommentHandler = _comment
+    try:
+        parser.Parse(text, True)
+    except expat.ExpatError as exc:
+        raise PreciceConfigError('XML 格式错误: {}'.format(exc))
+    return builder.close()
+
+
+def _children(element, prefix):
+    """Return the children whose tag is *prefix* or starts with
+    *prefix* followed by ':'."""
+    return [child for child in element
+            if isinstance(child.tag, str)
+            and (child.tag == prefix or child.tag.startswith(prefix + ':'))]
+
+
+def _indent_before(parent, index):
+    """Return the indentation of the child *index* of *parent*."""
+    text = (parent.text if index == 0 else parent[index - 1].tail) or ''
+    return text.split('\n')[-1]
+
+
+def _insert(parent, index, elements, indent, tail):
+    """Insert *elements* at *index*, one per line."""
+    for num, element in enumerate(elements):
+        element.tail = tail if num == len(elements) - 1 else '\n' + indent
+        parent.insert(index + num, element)
+
+
+def _find_placeholder(parent, name):
+    """Find the placeholder line *name* in the text of *parent*.
+
+    Returns:
+        tuple: Insertion index, element and attribute holding the text,
+        lines before and after the placeholder and its indentation,
+        *None* if there is no placeholder.
+    """
+    slots = [(0, parent, 'text')]
+    slots.extend((num + 1, child, 'tail') for num, child in enumerate(parent))
+    for index, owner, attr in slots:
+        lines = (getattr(owner, attr) or '').split('\n')
+        for num, line in enumerate(lines):
+            if line.strip() == name:
+                indent = line[:len(line) - len(line.lstrip())]
+                return index, owner, attr, lines[:num], lines[num + 1:], indent
+    return None
+
+
+def _replace(parent, tag, placeholder, elements):
+    """Replace the children *tag* (or the placeholder) by *elements*."""
+    existing = [child for child in parent if child.tag == tag]
+    slot = None if existing else _find_placeholder(parent, placeholder)
+    if existing:
+        index = list(parent).index(existing[0])
+        indent = _indent_before(parent, index)
+        tail = existing[-1].tail
+        for child in existing:
+            parent.remove(child)
+        if not elements:
+            if index:
+                parent[index - 1].tail = tail
+            else:
+                parent.text = tail
+    elif slot is not None:
+        index, owner, attr, before, after, indent = slot
+        if not elements:
+            setattr(owner, attr, '\n'.join(before + after))
+        else:
+            setattr(owner, attr, '\n'.join(before) + '\n' + indent)
+            tail = '\n' + '\n'.join(after)
+    elif elements:
+        index = len(parent)
+        indent = _indent_before(parent, index) + '    '
+        if index:
+            tail = parent[-1].tail
+            parent[-1].tail = '\n' + indent
+        else:
+            tail = parent.text or ''
+            parent.text = '\n' + indent
+    if elements:
+        _insert(parent, index, elements, indent, tail)
+
+
+def _number(value):
+    """Return a float from a string, *None* if invalid."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_adapter_config(path):
+    """Read the interfaces declared in a preCICE adapter configuration.
+
+    Only the layouts of the OpenFOAM (``participant`` + ``interfaces``)
+    and CalculiX (``participants`` / ``<name>`` / ``interfaces``)
+    adapters are understood.
+
+    Returns:
+        list[dict]: Participant, mesh, read and written data of each
+        interface.
+    """
+    with open(path) as stream:
+        lines = stream.read().splitlines()
+
+    participant = None
+    interfaces = []
+    in_participants = False
+    for line in lines:
+        content = line.split('#')[0].rstrip()
+        if not content.strip():
+            continue
+        indent = len(content) - len(content.lstrip())
+        item = content.strip()
+        match = re.match(r'(- )?([\w-]+):\s*(.*)$', item)
+        if not match:
+            continue
+        key, value = match.group(2), match.group(3).strip()
+        if indent == 0:
+            in_participants = key == 'participants'
+            if key == 'participant':
+                participant = value
+        elif in_participants and not value and not match.group(1) \
+                and key != 'interfaces':
+            participant = key
+        if key in ('mesh', 'nodes-mesh', 'faces-mesh'):
+            interfaces.append({'participant': participant, 'mesh': value,
+                               'read': [], 'write': []})
+        elif key in ('read-data', 'write-data') and interfaces:
+            names = [name.strip() for name in value.strip('[]').split(',')
+                     if name.strip()]
+            interfaces[-1][key.split('-')[0]].extend(names)
+    return interfaces
+
+
+def read_adapters(path):
+    """Return the adapter interfaces declared in a case (or template)."""
+    interfaces = []
+    for relpath in ADAPTERS:
+        filename = osp.join(path, relpath)
+        if osp.isfile(filename):
+            interfaces.extend(read_adapter_config(filename))
+    return interfaces
+
+
+def count_inp_nodes(path):
+    """Return the number of nodes of a CalculiX mesh (``*NODE`` cards)."""
+    count = 0
+    in_nodes = False
+    with open(path) as stream:
+        for line in stream:
+            if line.startswith('*'):
+                keyword = line[1:].split(',')[0].strip().upper()
+                in_nodes = keyword == 'NODE'
+            elif in_nodes and line.strip():
+                count += 1
+    return count
+
+
+class CouplingCost:
+    """Estimated cost of a coupling scheme."""
+
+    def __init__(self):
+        self.scheme = None
+        self.deltat = 0.
+        self.max_time = 0.
+        self.windows = 0
+        self.iterations = 1
+        self.exchanges = []
+        self.watchpoints = []
+        self.acceleration = None
+        self.warnings = []
+
+    @property
+    def bytes_per_window(self):
+        """int: Bytes exchanged per coupling window, *None* if the
+        number of vertices of a mesh is unknown."""
+        sizes = [exchange['bytes'] for exchange in self.exchanges]
+        if None in sizes:
+            return None
+        return sum(sizes) * self.iterations
+
+    @property
+    def watchpoint_bytes(self):
+        """int: Size of the watch-point logs at the end of the run."""
+        return sum(point['bytes'] for point in self.watchpoints)
+
+    def summary(self):
+        """Return a readable summary."""
+        lines = ['耦合方案: {}, 时间窗口 {:g} s, 结束时间 {:g} s'.format(
+                     self.scheme, self.deltat, self.max_time),
+                 '耦合窗口数: {:,}{}'.format(
+                     self.windows, ', 每个窗口最多 {} 次迭代'.format(
+                         self.iterations) if self.iterations > 1 else '')]
+        for exchange in self.exchanges:
+            lines.append('交换 {} ({} -> {}, {}): {} 分量 x {} 节点{}'.format(
+                exchange['data'], exchange['from'], exchange['to'],
+                exchange['mesh'], exchange['components'],
+                '?' if exchange['vertices'] is None else
+                '{:,}'.format(exchange['vertices']),
+                '' if exchange['bytes'] is None else
+                ' = {}'.format(_size(exchange['bytes']))))
+        per_window = self.bytes_per_window
+        if per_window is not None:
+            lines.append('每个窗口交换数据: {}, 共计 {}'.format(
+                _size(per_window), _size(per_window * self.windows)))
+        lines.append('观察点: {} 个, 输出约 {}'.format(
+            len(self.watchpoints), _size(self.watchpoint_bytes)))
+        if self.acceleration:
+            lines.append('加速方法 {}: 保留 {} 次迭代{}'.format(
+                self.acceleration['method'],
+                self.acceleration['iterations'],
+                '' if self.acceleration['bytes'] is None else
+                ', 内存约 {}'.format(_size(self.acceleration['bytes']))))
+        lines.extend('警告: ' + warning for warning in self.warnings)
+        return '\n'.join(lines)
+
+
+def _size(nbytes):
+    """Return a readable size."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024 or unit == 'GB':
+            return '{:.4g} {}'.format(nbytes, unit)
+        nbytes /= 1024.
+
+
+class PreciceConfig:
+    """Element tree of a preCICE configuration.
+
+    Arguments:
+        root (Element): Root element (see `parse_config`).
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    @classmethod
+    def load(cls, path):
+        """Read a configuration file."""
+        with open(path) as stream:
+            return cls(parse_config(stream.read()))
+
+    def tostring(self):
+        """Return the XML text of the configuration."""
+        return '<?xml version="1.0"?>\n\n' + \
+            ET.tostring(self.root, encoding='unicode') + '\n'
+
+    def write(self, path):
+        """Write the configuration file."""
+        with open(path, 'w') as stream:
+            stream.write(self.tostring())
+
+    @property
+    def interface(self):
+        """Element: The ``solver-interface`` element."""
+        interface = self.root.find('solver-interface')
+        if interface is None:
+            raise PreciceConfigError('缺少 solver-interface')
+        return interface
+
+    @property
+    def dimensions(self):
+        """int: Number of space dimensions."""
+        return int(self.interface.get('dimensions', 3))
+
+    def data(self):
+        """Return the number of components of the declared data."""
+        return OrderedDict(
+            (element.get('name'), self.dimensions
+             if element.tag == 'data:vector' else 1)
+            for element in _children(self.interface, 'data'))
+
+    def meshes(self):
+        """Return the data used by each mesh."""
+        return OrderedDict(
+            (element.get('name'),
+             [use.get('name') for use in element.findall('use-data')])
+            for element in self.interface.findall('mesh'))
+
+    def participants(self):
+        """Return the participant elements by name."""
+        return OrderedDict((element.get('name'), element)
+                           for element in self.interface.findall('participant'))
+
+    def scheme(self):
+        """Return the coupling scheme element."""
+        schemes = _children(self.interface, 'coupling-scheme')
+        if len(schemes) != 1:
+            raise PreciceConfigError('需要一个且仅一个耦合方案 (coupling-scheme)')
+        return schemes[0]
+
+    def set_time_window(self, deltat, max_time):
+        """Set the time window size and the end time of the coupling."""
+        scheme = self.scheme()
+        _replace(scheme, 'timestep-length', 'DeltaT',
+                 [ET.Element('timestep-length', value=str(deltat))])
+        _replace(scheme, 'max-time', 'MaxT',
+                 [ET.Element('max-time', value=str(max_time))])
+
+    def set_watchpoints(self, points, mesh='Solid', participant='Fluid'):
+        """Set the watch-points of a participant.
+
+        Arguments:
+            points (dict): Coordinates (strings or numbers) by name.
+            mesh (Optional[str]): Mesh on which the points are located.
+            participant (Optional[str]): Participant writing the logs.
+        """
+        element = self.participants().get(participant)
+        if element is None:
+            raise PreciceConfigError('参与者 {} 不存在'.format(participant))
+        watchpoints = [ET.Element('watch-point', OrderedDict(
+            [('mesh', mesh), ('name', name),
+             ('coordinate', ';'.join(str(value).strip()
+                                     for value in coords))]))
+                       for name, coords in points.items()]
+        _replace(element, 'watch-point', 'Watchpoints', watchpoints)
+
+    def validate(self, adapters=()):
+        """Check the consistency of the configuration.
+
+        Arguments:
+            adapters (Optional[list[dict]]): Interfaces of the adapters
+                (see `read_adapter_config`).
+
+        Returns:
+            list[str]: Errors found.
+        """
+        errors = []
+        try:
+            interface = self.interface
+            scheme = self.scheme()
+        except PreciceConfigError as exc:
+            return exc.errors
+
+        for element in self.root.iter():
+            for text in (element.text, element.tail):
+                if text and text.strip() and element.tag is not ET.Comment:
+                    errors.append('未替换的占位符: {}'.format(text.strip()))
+
+        data = self.data()
+        meshes = self.meshes()
+        for mesh, names in meshes.items():
+            errors.extend('网格 {} 使用了未声明的数据 {}'.format(mesh, name)
+                          for name in names if name not in data)
+
+        participants = self.participants()
+        used = {}
+        providers = {}
+        for name, element in participants.items():
+            used[name] = set()
+            for use in element.findall('use-mesh'):
+                mesh = use.get('name')
+                used[name].add(mesh)
+                if mesh not in meshes:
+                    errors.append('参与者 {} 使用了未声明的网格 {}'
+                                  .format(name, mesh))
+                if use.get('provide') == 'yes':
+                    providers.setdefault(mesh, []).append(name)
+                elif use.get('from') not in participants:
+                    errors.append('网格 {} 来自未知的参与者 {}'
+                                  .format(mesh, use.get('from')))
+            for tag in ('read-data', 'write-data'):
+                for item in element.findall(tag):
+                    dname, mesh = item.get('name'), item.get('mesh')
+                    if mesh not in used[name]:
+                        errors.append('参与者 {} 的 {} 使用了未使用的网格 {}'
+                                      .format(name, tag, mesh))
+                    elif dname not in meshes.get(mesh, ()):
+                        errors.append('网格 {} 不包含数据 {}'
+                                      .format(mesh, dname))
+            for mapping in _children(element, 'mapping'):
+                for mesh in (mapping.get('from'), mapping.get('to')):
+                    if mesh not in used[name]:
+                        errors.append('参与者 {} 的映射使用了未使用的网格 {}'
+                                      .format(name, mesh))
+            names = set()
+            for point in element.findall('watch-point'):
+                pname = point.get('name')
+                if pname in names:
+                    errors.append('观察点 {} 重复'.format(pname))
+                names.add(pname)
+                if point.get('mesh') not in used[name]:
+                    errors.append('观察点 {} 位于未使用的网格 {}'
+                                  .format(pname, point.get('mesh')))
+                coords = (point.get('coordinate') or '').split(';')
+                if len(coords) != self.dimensions or \
+                        None in [_number(value) for value in coords]:
+                    errors.append('观察点 {} 的坐标无效: {}'
+                                  .format(pname, point.get('coordinate')))
+        for mesh in meshes:
+            if len(providers.get(mesh, ())) != 1:
+                errors.append('网格 {} 应由一个参与者提供'.format(mesh))
+
+        links = set()
+        for m2n in _children(interface, 'm2n'):
+            pair = (m2n.get('from'), m2n.get('to'))
+            links.update([pair, pair[::-1]])
+            errors.extend('通信 {} 使用了未知的参与者 {}'.format(m2n.tag, name)
+                          for name in pair if name not in participants)
+
+        pair = scheme.find('participants')
+        pair = (pair.get('first'), pair.get('second')) \
+            if pair is not None else (None, None)
+        if None in pair or pair[0] == pair[1] or \
+                any(name not in participants for name in pair):
+            errors.append('耦合方案的参与者无效: {} {}'.format(*pair))
+        elif pair not in links:
+            errors.append('参与者 {} 和 {} 之间缺少通信 (m2n)'.format(*pair))
+        for exchange in scheme.findall('exchange'):
+            dname, mesh = exchange.get('data'), exchange.get('mesh')
+            if dname not in meshes.get(mesh, ()):
+                errors.append('交换的数据 {} 不在网格 {} 上'.format(dname, mesh))
+            for name in (exchange.get('from'), exchange.get('to')):
+                if name not in pair:
+                    errors.append('交换 {} 的参与者 {} 不在耦合方案中'
+                                  .format(dname, name))
+                elif mesh not in used.get(name, ()):
+                    errors.append('参与者 {} 未使用交换网格 {}'
+                                  .format(name, mesh))
+        deltat = _number(self._value(scheme, 'timestep-length'))
+        max_time = _number(self._value(scheme, 'max-time'))
+        if not deltat or deltat <= 0:
+            errors.append('时间窗口无效: {}'.format(
+                self._value(scheme, 'timestep-length')))
+        if not max_time or max_time <= 0:
+            errors.append('结束时间无效: {}'.format(
+                self._value(scheme, 'max-time')))
+        elif deltat and deltat > 0 and max_time < deltat:
+            errors.append('结束时间小于时间窗口')
+
+        for adapter in adapters:
+            name, mesh = adapter['participant'], adapter['mesh']
+            element = participants.get(name)
+            if element is None:
+                errors.append('适配器的参与者 {} 未声明'.format(name))
+                continue
+            if mesh not in providers or name not in providers[mesh]:
+                errors.append('适配器网格 {} 不是由 {} 提供的'
+                              .format(mesh, name))
+            for kind in ('read', 'write'):
+                declared = [item.get('name')
+                            for item in element.findall(kind + '-data')
+                            if item.get('mesh') == mesh]
+                errors.extend('适配器的 {}-data {} 未在 {} 的网格 {} 上声明'
+                              .format(kind, dname, name, mesh)
+                              for dname in adapter[kind]
+                              if dname not in declared)
+        return errors
+
+    def check(self, adapters=()):
+        """Raise `PreciceConfigError` if the configuration is invalid."""
+        errors = self.validate(adapters)
+        if errors:
+            raise PreciceConfigError(errors)
+
+    @staticmethod
+    def _value(element, tag):
+        child = element.find(tag)
+        return child.get('value') if child is not None else None
+
+    def cost(self, vertices=None):
+        """Estimate the cost of the coupling.
+
+        Arguments:
+            vertices (Optional[dict]): Number of vertices by mesh name.
+
+        Returns:
+            CouplingCost: Windows, exchanged data, watch-point logs
+            and acceleration memory.
+        """
+        vertices = vertices or {}
+        scheme = self.scheme()
+        data = self.data()
+        meshes = self.meshes()
+        cost = CouplingCost()
+        cost.scheme = scheme.tag.split(':', 1)[-1]
+        cost.deltat = _number(self._value(scheme, 'timestep-length')) or 0.
+        cost.max_time = _number(self._value(scheme, 'max-time')) or 0.
+        if cost.deltat > 0:
+            cost.windows = int(math.ceil(cost.max_time / cost.deltat - 1e-9))
+        if cost.scheme.endswith('implicit'):
+            cost.iterations = int(_number(
+                self._value(scheme, 'max-iterations')) or 1)
+
+        for exchange in scheme.findall('exchange'):
+            mesh = exchange.get('mesh')
+            components = data.get(exchange.get('data'), 1)
+            count = vertices.get(mesh)
+            cost.exchanges.append({
+                'data': exchange.get('data'), 'mesh': mesh,
+                'from': exchange.get('from'), 'to': exchange.get('to'),
+                'components': components, 'vertices': count,
+                'bytes': None if count is None else
+                         count * components * VALUE_BYTES})
+
+        for name, element in self.participants().items():
+            for point in element.findall('watch-point'):
+                values = 1 + self.dimensions + sum(
+                    data.get(dname, 1)
+                    for dname in meshes.get(point.get('mesh'), ()))
+                cost.watchpoints.append({
+                    'participant': name, 'name': point.get('name'),
+                    'bytes': cost.windows * values * LOG_CHARS})
+
+        accel = _children(scheme, 'post-processing') + \
+            _children(scheme, 'acceleration')
+        if accel:
+            accel = accel[0]
+            iterations = int(_number(
+                self._value(accel, 'max-used-iterations')) or 0)
+            sizes = [vertices.get(item.get('mesh')) and
+                     vertices[item.get('mesh')] * data.get(item.get('name'), 1)
+                     for item in accel.findall('data')]
+            cost.acceleration = {
+                'method': accel.tag.split(':', 1)[-1],
+                'iterations': iterations,
+                # V and W matrices of the quasi-Newton methods
+                'bytes': None if None in sizes or 0 in sizes else
+                         2 * iterations * sum(sizes) * VALUE_BYTES}
+
+        if cost.windows > 100000:
+            cost.warnings.append('耦合窗口数过多, 可增大时间窗口')
+        if len(cost.watchpoints) > 20:
+            cost.warnings.append('观察点较多, 每个窗口都会写入日志')
+        distributions = [m2n.get('distribution-type')
+                         for m2n in _children(self.interface, 'm2n')]
+        if 'gather-scatter' in distributions and \
+                (cost.bytes_per_window or 0) > 64 * 2 ** 20:
+            cost.warnings.append('gather-scatter 通信经由主进程, '
+                                 '交换数据较大时宜改用 point-to-point')
+        return cost
+
+
+def generate(path, deltat, max_time, max_time2, watchpoints,
+             template=TEMPLATE, adapters=None):
+    """Write the preCICE configurations of the two stages of a case.
+
+    All the variants are validated before any file is written.
+
+    Arguments:
+        path (str): Case directory.
+        deltat (str): Time window size.
+        max_time (str): End time of the first stage.
+        max_time2 (str): End time of the second stage.
+        watchpoints (dict): Coordinates of the watch-points by name.
+        template (Optional[str]): Directory of the templates.
+        adapters (Optional[list[dict]]): Adapter interfaces, read from
+            the case (or the templates) by default.
+
+    Returns:
+        dict: `PreciceConfig` by file name.
+    """
+    if adapters is None:
+        adapters = read_adapters(path) or read_adapters(template)
+    configs = OrderedDict()
+    errors = []
+    for name, stage in VARIANTS:
+        config = PreciceConfig.load(osp.join(template, name))
+        config.set_time_window(deltat, max_time if stage == 1 else max_time2)
+        config.set_watchpoints(watchpoints)
+        errors.extend('{}: {}'.format(name, error)
+                      for error in config.validate(adapters))
+        configs[name] = config
+    if errors:
+        raise PreciceConfigError(errors)
+    for name, config in configs.items():
+        config.write(osp.join(path, name))
+    return configs
+
+
+def coupling_summary(path, configs=None):
+    """Return the cost summary of the two stages of a case.
+
+    The number of vertices of the solid interface is read from
+    ``Solid/mesh.inp`` when it exists.
+    """
+    vertices = {}
+    mesh = osp.join(path, 'Solid', 'mesh.inp')
+    if osp.isfile(mesh):
+        vertices['Solid'] = count_inp_nodes(mesh)
+    if configs is None:
+        configs = OrderedDict((name, PreciceConfig.load(osp.join(path, name)))
+                              for name, _ in VARIANTS
+                              if osp.isfile(osp.join(path, name)))
+    lines = []
+    for name, stage in VARIANTS:
+        if name in configs and name.startswith('precice-config_parallel'):
+            lines.append('第{}阶段 ({}):'.format(stage, name))
+            lines.append(configs[name].cost(vertices).summary())
+    return '\n'.join(lines)
+
+
+def check_variants(path, template=TEMPLATE):
+    """Generate every variant in *path*, parse and validate them again.
+
+    Returns:
+        list[str]: Errors found.
+    """
+    points = OrderedDict([('Solidwatchpoint1', ['0.5', '0', '1']),
+                          ('Solidwatchpoint2', ['-0.5', '0.2', '-1'])])
+    generate(path, '0.01', '2', '5', points, template)
+    adapters = read_adapters(template)
+    errors = []
+    for name, stage in VARIANTS:
+        config = PreciceConfig.load(osp.join(path, name))
+        errors.extend('{}: {}'.format(name, error)
+                      for error in config.validate(adapters))
+        cost = config.cost({'Solid': 1000})
+        expected = 200 if stage == 1 else 500
+        if cost.windows != expected:
+            errors.append('{}: {} windows instead of {}'
+                          .format(name, cost.windows, expected))
+        if len(cost.watchpoints) != len(points):
+            errors.append('{}: {} watch-points instead of {}'
+                          .format(name, len(cost.watchpoints), len(points)))
+        # generating from a generated file must give the same result
+        again = PreciceConfig(parse_config(config.tostring()))
+        again.set_time_window('0.01', '2' if stage == 1 else '5')
+        again.set_watchpoints(points)
+        if again.tostring() != config.tostring():
+            errors.append('{}: not stable when regenerated'.format(name))
+    bad = PreciceConfig.load(osp.join(path, VARIANTS[0][0]))
+    bad.set_watchpoints({'P': ['0', '0']}, mesh='Fluid-Mesh-Nodes',
+                        participant='Calculix')
+    if len(bad.validate(adapters)) != 2:
+        errors.append('invalid watch-point not detected')
+    return errors
+
+
+def main():
+    """Check the generation of the variants or show a configuration."""
+    import argparse
+    import tempfile
+    parser = argparse.ArgumentParser(
+        description='Generate and check the preCICE configurations.')
+    sub = parser.add_subparsers(dest='command')
+    check = sub.add_parser('check', help='generate, parse and validate '
+                                         'every variant')
+    check.add_argument('--template', default=TEMPLATE)
+    show = sub.add_parser('show', help='validate a configuration and '
+                                       'print its cost')
+    show.add_argument('config')
+    show.add_argument('--vertices', type=int, default=None,
+                      help='number of vertices of the solid interface')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        config = PreciceConfig.load(args.config)
+        adapters = read_adapters(osp.dirname(osp.abspath(args.config)))
+        for error in config.validate(adapters):
+            print('ERROR', error)
+        vertices = {'Solid': args.vertices} if args.vertices else None
+        print(config.cost(vertices).summary())
+        return
+
+    template = getattr(args, 'template', TEMPLATE)
+    with tempfile.TemporaryDirectory() as path:
+        errors = check_variants(path, template)
+        for name, _ in VARIANTS:
+            print('{}: {}'.format(name, 'ok' if not any(
+                error.startswith(name) for error in errors) else 'FAILED'))
+        print(coupling_summary(path))
+    for error in errors:
+        print('ERROR', error)
+    raise SystemExit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
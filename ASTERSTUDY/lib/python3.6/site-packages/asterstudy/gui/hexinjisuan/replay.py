@@ -0,0 +1,793 @@
+"""
+Solver output replay
+--------------------
+
+Stand-in for the solver processes of the Tanksimulator (``ccx_preCICE``
+and ``mpirun ... interFoam``) that writes recorded or synthetic outputs
+at a controlled pace, to exercise and measure the monitoring paths of
+`controltab.Maincontrol` without a cluster: the consoles
+(`outputreader`), the ``.sta`` and ``.cvg`` files, the tail conversion
+of the ``.frd`` file (`ccx2paraview.Frd2pvd`) and the preCICE logs read
+by the report.
+
+A `Recording` holds the outputs of a run split into steps (increments
+of CalculiX, time steps of OpenFOAM): the text written at the beginning
+(banner, mesh of the ``.frd`` file, headers), then for each step the
+text appended to the standard output and to each file. It is synthetic
+(`ccx_recording`, `foam_recording`) or read from a finished case
+(`load_recording`). `Replayer` writes it:
+
+- at *rate* steps per second, by bursts of *burst* steps,
+- with a random *jitter* of the intervals (fraction of the interval),
+- by chunks of *chunk* bytes flushed separately, so that the readers
+  also see partially written blocks.
+
+Called with the name of a solver (``ccx_preCICE -i Solid/tankpre ...``,
+``mpirun -np 4 interFoam -parallel -case Fluid``, ``foamDictionary``),
+the module behaves as this solver; the options of the replay are read
+from ``TANKSIM_REPLAY``. ``shims`` writes small scripts with the names
+of the solvers, so that the local stage scripts (``localsolidrun``,
+``localfluidrun``) run the replay instead of the solvers::
+
+    eval $(python3 -m asterstudy.gui.hexinjisuan.replay shims /tmp/solvers)
+    export TANKSIM_REPLAY='--rate 5 --steps 200 --nodes 20000'
+    export TANKSIM_EXECUTOR=local
+
+`measure()` replays a CalculiX run into a console while the ``.frd``
+file is converted periodically, and reports the latency of the event
+loop, the delay between the writing of a step and its conversion and
+the CPU time used by the monitoring::
+
+    python3 -m asterstudy.gui.hexinjisuan.replay measure --rate 20 \\
+        --steps 200 --nodes 20000
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import logging
+import os
+import os.path as osp
+import random
+import re
+import resource
+import shlex
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy
+
+from ...common import synthetic
+
+
+REPLAY_ENV = 'TANKSIM_REPLAY'
+
+MODULE = 'asterstudy.gui.hexinjisuan.replay'
+
+# Commands replaced by the shims
+SOLVERS = ('ccx_preCICE', 'ccx', 'mpirun', 'interFoam', 'foamDictionary')
+
+STDOUT = 'stdout'
+
+# Default size of a replay without recording or explicit number of steps
+DEFAULT_STEPS = 50
+DEFAULT_NODES = 2000
+
+CCX_BANNER = (
+    '\n************************************************************\n\n'
+    'CalculiX Version 2.16, Copyright(C) 1998-2019 Guido D. Dhondt\n'
+    'CalculiX comes with ABSOLUTELY NO WARRANTY.\n\n'
+    '************************************************************\n\n'
+    ' Decascading the MPC\'s\n\n Determining the structure of the '
+    'matrix:\n number of equations\n {}\n\n Using up to 1 cpu(s) for the '
+    'stress calculation.\n\n Setting up preCICE participant Calculix, '
+    'using config file: config.yml\n\n')
+
+STA_HEADER = (
+    'SUMMARY OF JOB INFORMATION\n'
+    '  STEP      INC     ATT  ITRS     TOT TIME     STEP TIME'
+    '         INC TIME\n')
+# Columns of 6, 11, 7, 6, 14, 14 and 14 characters (read by monitor.py)
+STA_ROW = ' %5d %10d %6d %5d %13.6E %13.6E %13.6E\n'
+
+CVG_HEADER = (
+    '   SUMMARY OF C0NVERGENCE INFORMATION\n'
+    '  STEP   INC  ATT ITER     CONT.   RESID.        CORR.      RESID.'
+    '       CORR.\n'
+    '                           EL.     FORCE         DISP       FLUX'
+    '        TEMP.\n'
+    '                                    (%)           (%)\n')
+CVG_ROW = '%6d%6d%5d%5d%10d %11.4E %11.4E %11.4E %11.4E\n'
+
+PRECICE_ITERATIONS = 'precice-Calculix-iterations.log'
+WATCHPOINT_LOG = 'precice-Fluid-watchpoint-Solidwatchpoint{}.log'
+
+# Recorded outputs: target, file of the case, first line of a step (or
+# number of header lines of the files written line by line)
+CCX_INCREMENT = re.compile(r'^ increment \d+ attempt')
+FRD_STEP = re.compile(r'^    1PSTEP')
+FOAM_TIME = re.compile(r'^Courant Number mean')
+RECORDED = {
+    'ccx': ((STDOUT, 'log.ccx_preCICE', CCX_INCREMENT),
+            ('{job}.frd', '{job}.frd', FRD_STEP),
+            ('{job}.sta', '{job}.sta', 2),
+            ('{job}.cvg', '{job}.cvg', 4),
+            (None, 'precice-Calculix-*.log', 1)),
+    'foam': ((STDOUT, 'log.interFoam', FOAM_TIME),
+             (None, 'precice-Fluid-*.log', 1)),
+}
+# Lines added to the solver logs by the stage scripts
+SCRIPT_LINE = re.compile(r'^Local job \S* ')
+
+
+class Recording:
+    """Outputs of a solver run split into steps.
+
+    The targets are `STDOUT` or paths relative to the working directory
+    of the solver, where ``{job}`` stands for the job name (``-i``
+    option of CalculiX).
+
+    Arguments:
+        prelude (dict): Text written at the beginning, by target.
+        steps (list[dict]): Text appended at each step, by target.
+        epilogue (dict): Text written at the end, by target.
+    """
+
+    def __init__(self, prelude=None, steps=None, epilogue=None):
+        self.prelude = prelude or OrderedDict()
+        self.steps = steps or []
+        self.epilogue = epilogue or OrderedDict()
+
+    def __len__(self):
+        return len(self.steps)
+
+    def targets(self):
+        """Return the targets, in order of appearance."""
+        targets = OrderedDict()
+        for part in [self.prelude] + self.steps + [self.epilogue]:
+            targets.update((target, None) for target in part)
+        return list(targets)
+
+    def nbytes(self):
+        """Return the number of characters of the recording."""
+        return sum(len(text) for part in
+                   [self.prelude] + self.steps + [self.epilogue]
+                   for text in part.values())
+
+
+def ccx_recording(steps=DEFAULT_STEPS, nodes=DEFAULT_NODES, frd_every=1,
+                  delta=1e-3, seed=0):
+    """Return a synthetic CalculiX run coupled with preCICE.
+
+    Each increment writes its convergence to the standard output and to
+    the ``.cvg`` file, a line of the ``.sta`` file and of the iterations
+    log of preCICE, and every *frd_every* increments the displacements
+    and stresses of a mesh of about *nodes* nodes in the ``.frd`` file.
+    A placeholder restart file (``.rout``) is written at the end.
+    """
+    rng = numpy.random.RandomState(seed)
+    xyz, hexa = synthetic.box_mesh(nodes)
+    prelude = OrderedDict([
+        (STDOUT, CCX_BANNER.format(3 * len(xyz))),
+        ('{job}.frd', synthetic.frd_header(xyz, hexa)),
+        ('{job}.sta', STA_HEADER),
+        ('{job}.cvg', CVG_HEADER),
+        (PRECICE_ITERATIONS,
+         'TimeWindow  TotalIterations  Iterations  Convergence\n')])
+    parts = []
+    total = 0
+    for inc in range(1, steps + 1):
+        value = delta * inc
+        iterations = rng.randint(2, 7)
+        total += iterations
+        out = [' increment {} attempt 1 \n increment size= {:.6e}\n'
+               ' sum of previous increments={:.6e}\n actual step time={:.6e}'
+               '\n actual total time={:.6e}\n\n'.format(
+                   inc, delta, value - delta, value, value)]
+        cvg = []
+        resid = 10. ** rng.uniform(-1., 1.)
+        for it in range(1, iterations + 1):
+            out.append(' iteration {}\n\n largest residual force= {:.6e} in '
+                       'node {} and dof 1\n\n'.format(it, resid,
+                                                      rng.randint(len(xyz))))
+            cvg.append(CVG_ROW % (1, inc, 1, it, 0, resid, 0.1 * resid, 0.,
+                                  0.))
+            resid *= 0.01
+        out.append('---[precice]  it {} of 50 | dt# {} | t {:g} | dt {:g} | '
+                   'ongoing yes | dt complete yes | \n convergence\n\n'.format(
+                       iterations, inc, value, delta))
+        part = OrderedDict([
+            (STDOUT, ''.join(out)),
+            ('{job}.sta', STA_ROW % (1, inc, 1, iterations, value, value,
+                                     delta)),
+            ('{job}.cvg', ''.join(cvg)),
+            (PRECICE_ITERATIONS, '{}  {}  {}  1\n'.format(inc, total,
+                                                          iterations))])
+        if inc % frd_every == 0:
+            part['{job}.frd'] = synthetic.frd_step(inc, value, xyz, rng)
+        parts.append(part)
+    epilogue = OrderedDict([
+        (STDOUT, ' Job finished\n\n' + '_' * 40 + '\n\n'
+                 ' Total CalculiX Time: {:.6f}\n'.format(0.05 * steps)),
+        ('{job}.frd', ' 9999\n'),
+        # restart file tested by localsolidrun before the second stage
+        ('{job}.rout', 'synthetic restart of {} nodes\n'.format(len(xyz)))])
+    return Recording(prelude, parts, epilogue)
+
+
+def foam_recording(steps=DEFAULT_STEPS, watchpoints=1, delta=1e-4, seed=0):
+    """Return a synthetic interFoam run coupled with preCICE.
+
+    Each time step writes the output of the solver and a line of each
+    watch point log.
+    """
+    rng = numpy.random.RandomState(seed)
+    prelude = OrderedDict([(STDOUT, synthetic.FOAM_BANNER)])
+    rows = []
+    for num in range(1, watchpoints + 1):
+        prelude[WATCHPOINT_LOG.format(num)] = synthetic.watchpoint_header()
+        rows.append(synthetic.watchpoint_rows(steps, rng, delta))
+    parts = []
+    for step in range(1, steps + 1):
+        part = OrderedDict([(STDOUT, synthetic.foam_step(step, rng, delta))])
+        for num, table in enumerate(rows, 1):
+            part[WATCHPOINT_LOG.format(num)] = \
+                synthetic.WATCHPOINT_FORMAT % tuple(table[step - 1]) + '\n'
+        parts.append(part)
+    return Recording(prelude, parts, OrderedDict([(STDOUT, 'End\n\n')]))
+
+
+def split(text, marker):
+    """Split a recorded output into its header and its steps.
+
+    Arguments:
+        text (str): Content of the output.
+        marker (int|re.Pattern): Number of header lines of an output
+            written line by line, or pattern of the first line of a step.
+
+    Returns:
+        (str, list[str]): Header and steps.
+    """
+    lines = text.splitlines(True)
+    if isinstance(marker, int):
+        return ''.join(lines[:marker]), lines[marker:]
+    head = []
+    units = []
+    for line in lines:
+        if marker.match(line):
+            units.append([line])
+        elif units:
+            units[-1].append(line)
+        else:
+            head.append(line)
+    return ''.join(head), [''.join(unit) for unit in units]
+
+
+def load_recording(case, participant='ccx', job='Solid/tankpre', steps=None):
+    """Read the outputs of a finished run of a case.
+
+    The outputs are split into steps (see `RECORDED`); the steps of the
+    outputs are distributed on *steps* steps (by default, the number of
+    steps of the standard output) in proportion of their numbers, so
+    that all the outputs end together.
+
+    Arguments:
+        case (str): Case directory.
+        participant (str): 'ccx' or 'foam'.
+        job (str): Job of CalculiX (relative to the case).
+        steps (Optional[int]): Number of steps of the replay.
+
+    Returns:
+        Recording: Outputs of the run, with '{job}' targets.
+    """
+    outputs = []
+    for target, pattern, marker in RECORDED[participant]:
+        paths = sorted(glob.glob(osp.join(case, pattern.format(job=job))))
+        for path in paths:
+            with open(path, 'rb') as fobj:
+                text = fobj.read().decode('utf-8', 'replace')
+            if target == STDOUT:
+                text = ''.join(line for line in text.splitlines(True)
+                               if not SCRIPT_LINE.match(line))
+            outputs.append((target or osp.basename(path),
+                            split(text, marker)))
+    if not outputs:
+        raise FileNotFoundError('no output of {} in {}'.format(participant,
+                                                               case))
+    count = steps or len(outputs[0][1][1]) or \
+        max(len(units) for _, (_, units) in outputs) or 1
+    recording = Recording()
+    recording.steps = [OrderedDict() for _ in range(count)]
+    for target, (head, units) in outputs:
+        recording.prelude[target] = head
+        for index, unit in enumerate(units):
+            part = recording.steps[index * count // len(units)]
+            part[target] = part.get(target, '') + unit
+    return recording
+
+
+class Replayer:
+    """Write a recording at a controlled pace.
+
+    Arguments:
+        recording (Recording): Outputs to write.
+        folder (Optional[str]): Working directory of the solver.
+        job (Optional[str]): Job name replacing ``{job}`` in the targets.
+        rate (Optional[float]): Steps per second, 0 for no pause.
+        burst (Optional[int]): Steps written together, the pause after a
+            burst keeps the mean rate.
+        jitter (Optional[float]): Random variation of the pauses, as a
+            fraction of the pause.
+        chunk (Optional[int]): Bytes written and flushed at once, 0 to
+            write each step of an output at once.
+        events (Optional[str]): File receiving the number and time of
+            each step once it is written.
+        seed (Optional[int]): Seed of the jitter.
+        stream (Optional[file]): Binary standard output.
+    """
+
+    def __init__(self, recording, folder='.', job='job', rate=10., burst=1,
+                 jitter=0., chunk=0, events=None, seed=0, stream=None):
+        self.recording = recording
+        self.folder = folder
+        self.job = job
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.jitter = jitter
+        self.chunk = chunk
+        self.events = events
+        self.seed = seed
+        self.stream = stream or sys.stdout.buffer
+        self.nbytes = 0
+        self._files = {}
+
+    def path(self, target):
+        """Return the path of a target."""
+        return osp.join(self.folder, target.format(job=self.job))
+
+    def _open(self):
+        """Create the output files (truncated, as the solvers do)."""
+        for target in self.recording.targets():
+            if target == STDOUT:
+                self._files[target] = self.stream
+                continue
+            path = self.path(target)
+            if osp.dirname(path):
+                os.makedirs(osp.dirname(path), exist_ok=True)
+            self._files[target] = open(path, 'wb')
+
+    def _close(self):
+        for target, fobj in self._files.items():
+            if target != STDOUT:
+                fobj.close()
+        self._files = {}
+
+    def _write(self, part):
+        """Write the text of a step to its targets."""
+        for target, text in part.items():
+            fobj = self._files[target]
+            data = text.encode('utf-8')
+            size = self.chunk or len(data) or 1
+            for start in range(0, len(data), size):
+                fobj.write(data[start:start + size])
+                fobj.flush()
+            self.nbytes += len(data)
+
+    def run(self):
+        """Write the recording.
+
+        Returns:
+            dict: Number of steps, bytes written and duration (s).
+        """
+        rng = random.Random(self.seed)
+        events = open(self.events, 'a') if self.events else None
+        start = time.perf_counter()
+        due = 0.
+        self._open()
+        try:
+            self._write(self.recording.prelude)
+            for index, part in enumerate(self.recording.steps):
+                if index and index % self.burst == 0 and self.rate > 0:
+                    due += self.burst / float(self.rate) * \
+                        (1. + self.jitter * rng.uniform(-1., 1.))
+                    delay = start + due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                self._write(part)
+                if events:
+                    events.write('{} {:.6f}\n'.format(index + 1, time.time()))
+                    events.flush()
+            self._write(self.recording.epilogue)
+        finally:
+            self._close()
+            if events:
+                events.close()
+        return {'steps': len(self.recording), 'bytes': self.nbytes,
+                'wall': time.perf_counter() - start}
+
+
+def _option(argv, name, default=None):
+    """Return the value following *name* in a solver command line."""
+    if name in argv[:-1]:
+        return argv[argv.index(name) + 1]
+    return default
+
+
+def options_parser(parser=None):
+    """Add the options of the replay to a parser."""
+    parser = parser or argparse.ArgumentParser(prog=REPLAY_ENV)
+    parser.add_argument('--rate', type=float, default=10.,
+                        help='steps per second (0: no pause)')
+    parser.add_argument('--burst', type=int, default=1,
+                        help='steps written together')
+    parser.add_argument('--jitter', type=float, default=0.,
+                        help='random variation of the pauses (fraction)')
+    parser.add_argument('--chunk', type=int, default=0,
+                        help='bytes written at once (0: whole steps)')
+    parser.add_argument('--steps', type=int, default=None,
+                        help='number of steps')
+    parser.add_argument('--nodes', type=int, default=DEFAULT_NODES,
+                        help='nodes of the synthetic .frd mesh')
+    parser.add_argument('--frd-every', type=int, default=1,
+                        help='increments between two .frd results')
+    parser.add_argument('--watchpoints', type=int, default=1,
+                        help='synthetic watch point logs')
+    parser.add_argument('--source', default=None,
+                        help='finished case to replay (synthetic if unset)')
+    parser.add_argument('--events', default=None,
+                        help='file receiving the time of each step')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+def make_recording(participant, options, job='Solid/tankpre'):
+    """Return the recording selected by the options."""
+    if options.source:
+        return load_recording(options.source, participant, job, options.steps)
+    steps = options.steps or DEFAULT_STEPS
+    if participant == 'ccx':
+        return ccx_recording(steps, options.nodes, options.frd_every,
+                             seed=options.seed)
+    return foam_recording(steps, options.watchpoints, seed=options.seed)
+
+
+def replay(participant, options, folder='.', job='Solid/tankpre'):
+    """Replay the outputs of a participant with the given options."""
+    recording = make_recording(participant, options, job)
+    return Replayer(recording, folder, job, options.rate, options.burst,
+                    options.jitter, options.chunk, options.events,
+                    options.seed).run()
+
+
+def _foam_times(case, procs):
+    """Create the last time directory of the processors of a case, as
+    tested by ``localfluidrun`` before the second stage."""
+    from ..parameterset.foamdict import read_foam
+    try:
+        end = read_foam(osp.join(case, 'system', 'controlDict')).get_path(
+            'endTime')
+    except OSError:
+        return
+    if end is None:
+        return
+    for num in range(procs):
+        os.makedirs(osp.join(case, 'processor{}'.format(num),
+                             '{:g}'.format(float(end))), exist_ok=True)
+
+
+def foam_dictionary(argv):
+    """Emulate ``foamDictionary -case C -entry E -value FILE``."""
+    from ..parameterset.foamdict import FoamError, read_foam
+    case = _option(argv, '-case', '.')
+    entry = _option(argv, '-entry')
+    path = osp.join(case, argv[-1])
+    try:
+        value = read_foam(path).get_path(entry.replace('.', '/'))
+    except (OSError, FoamError) as exc:
+        print('foamDictionary: {}'.format(exc), file=sys.stderr)
+        return 1
+    if value is None:
+        print('foamDictionary: no entry {!r} in {}'.format(entry, path),
+              file=sys.stderr)
+        return 1
+    print(' '.join(map(str, value)) if isinstance(value, (tuple, list))
+          else value)
+    return 0
+
+
+def emulate(argv):
+    """Behave as the solver command *argv* (options in `REPLAY_ENV`)."""
+    name = osp.basename(argv[0])
+    if name == 'foamDictionary':
+        return foam_dictionary(argv)
+    options = options_parser().parse_args(
+        shlex.split(os.getenv(REPLAY_ENV, '')))
+    procs = 1
+    if name == 'mpirun':
+        procs = int(_option(argv, '-np', 1))
+        argv = argv[1:]
+        while argv and argv[0].startswith('-'):
+            # options of mpirun with a value (-np 4, -x VAR...)
+            argv = argv[2:] if argv[0] in ('-np', '-n', '-x', '-H',
+                                           '--host') else argv[1:]
+        name = osp.basename(argv[0]) if argv else 'interFoam'
+    try:
+        if name.startswith('ccx'):
+            job = _option(argv, '-i', 'job')
+            replay('ccx', options, job=job)
+        else:
+            case = _option(argv, '-case', '.')
+            replay('foam', options)
+            _foam_times(case, procs)
+    except BrokenPipeError:
+        # the reader of the output has gone, as a killed tee
+        return 1
+    except OSError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    return 0
+
+
+def shims(folder):
+    """Write the scripts replacing the solvers in *folder*.
+
+    Returns:
+        str: Shell command putting *folder* first in ``PATH``.
+    """
+    root = osp.dirname(osp.dirname(osp.dirname(osp.dirname(
+        osp.abspath(__file__)))))
+    os.makedirs(folder, exist_ok=True)
+    for name in SOLVERS:
+        path = osp.join(folder, name)
+        with open(path, 'w') as fobj:
+            fobj.write('#!/bin/sh\n# stand-in written by {0}\n'
+                       'export PYTHONPATH={1}${{PYTHONPATH:+:$PYTHONPATH}}\n'
+                       'exec {2} -m {0} {3} "$@"\n'.format(
+                           MODULE, shlex.quote(root),
+                           shlex.quote(sys.executable), name))
+        os.chmod(path, 0o755)
+    return 'export PATH={}:$PATH'.format(shlex.quote(osp.abspath(folder)))
+
+
+class TailMonitor:
+    """Periodic tail conversion of the ``.frd`` results of a case, as
+    done by `Maincontrol.refreshresult`.
+
+    The delay between the writing of a step (read from the events file
+    of the `Replayer`) and its conversion is recorded, as well as the
+    time spent in the conversions and their errors.
+
+    Arguments:
+        case (str): Case directory.
+        events (str): Events file of the replay.
+        interval (Optional[int]): Period of the conversions (ms).
+    """
+
+    def __init__(self, case, events, interval=1000):
+        from PyQt5 import Qt as Q
+        self.case = case
+        self.events = events
+        self.converted = 0
+        self.latencies = []
+        self.durations = []
+        self.cpu = 0.
+        self.errors = []
+        self._timer = Q.QTimer()
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.convert)
+
+    def start(self):
+        """Start the periodic conversions."""
+        self._timer.start()
+
+    def stop(self):
+        """Stop the periodic conversions."""
+        self._timer.stop()
+
+    def _emitted(self):
+        """Return the time at which each step was written."""
+        times = {}
+        if osp.isfile(self.events):
+            with open(self.events) as fobj:
+                for line in fobj:
+                    index, value = line.split()
+                    times[int(index)] = float(value)
+        return times
+
+    def _count(self):
+        """Return the number of steps in the PVD file."""
+        from .ccx2paraview import getpvdinfo
+        pvd = osp.join(self.case, 'Solid', 'tank.pvd')
+        return len(getpvdinfo(pvd)[0]) if osp.isfile(pvd) else 0
+
+    def convert(self):
+        """Convert the new results."""
+        from .ccx2paraview import Frd2pvd
+        if not glob.glob(osp.join(self.case, 'Solid', '*.frd')):
+            # the solver has not started yet
+            return
+        start, cpu = time.perf_counter(), time.process_time()
+        logging.disable(logging.INFO)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                Frd2pvd(self.case).startconvert(self.case)
+        except Exception as exc:  # pragma pylint: disable=broad-except
+            self.errors.append('{}: {}'.format(type(exc).__name__, exc))
+        finally:
+            logging.disable(logging.NOTSET)
+        self.durations.append(time.perf_counter() - start)
+        self.cpu += time.process_time() - cpu
+        count = self._count()
+        if count > self.converted:
+            emitted = self._emitted()
+            now = time.time()
+            self.latencies.extend(now - emitted[index]
+                                  for index in range(self.converted + 1,
+                                                     count + 1)
+                                  if index in emitted)
+            self.converted = count
+
+
+def _stats(values, prefix):
+    """Return the mean, 95th percentile and maximum of *values* (ms)."""
+    values = sorted(values)
+    if not values:
+        return {}
+    nbv = len(values)
+    return {prefix + '_mean': 1000. * sum(values) / nbv,
+            prefix + '_p95': 1000. * values[min(nbv - 1, int(nbv * 0.95))],
+            prefix + '_max': 1000. * values[-1]}
+
+
+def measure(args, interval=1000, folder=None, participant='ccx'):
+    """Replay a run into a console while monitoring its results.
+
+    The replay is started as the solver by a `QProcess`, its output is
+    displayed by a `ProcessOutputReader` and, for CalculiX, the ``.frd``
+    file is converted every *interval* milliseconds and once at the end.
+
+    Arguments:
+        args (list[str]): Options of the replay (see `options_parser`).
+        interval (Optional[int]): Period of the conversions (ms).
+        folder (Optional[str]): Case directory (temporary by default).
+        participant (Optional[str]): 'ccx' or 'foam'.
+
+    Returns:
+        dict: Event loop latency (see `EventLoopProbe.summary()`), bytes
+        and refreshes of the console, steps written and converted,
+        conversion delays and durations (ms), CPU time of the monitoring
+        process and of the replay (s).
+    """
+    from PyQt5 import Qt as Q
+    from .outputreader import EventLoopProbe, ProcessOutputReader
+    app = Q.QApplication.instance() or Q.QApplication(sys.argv[:1])
+    temporary = folder is None
+    folder = folder or tempfile.mkdtemp(prefix='replay-')
+    os.makedirs(osp.join(folder, 'Solid'), exist_ok=True)
+    events = osp.join(folder, 'replay.events')
+    if osp.exists(events):
+        os.remove(events)
+    for name in ('tank.pvd', 'tanksim.pvd'):
+        if osp.exists(osp.join(folder, 'Solid', name)):
+            os.remove(osp.join(folder, 'Solid', name))
+
+    view = Q.QPlainTextEdit()
+    view.show()
+    process = Q.QProcess()
+    process.setProcessChannelMode(Q.QProcess.MergedChannels)
+    process.setWorkingDirectory(folder)
+    env = Q.QProcessEnvironment.systemEnvironment()
+    env.insert(REPLAY_ENV, ' '.join([shlex.quote(arg) for arg in args] +
+                                    ['--events', shlex.quote(events)]))
+    root = osp.dirname(osp.dirname(osp.dirname(osp.dirname(
+        osp.abspath(__file__)))))
+    env.insert('PYTHONPATH', os.pathsep.join(
+        [root] + ([env.value('PYTHONPATH')] if env.contains('PYTHONPATH')
+                  else [])))
+    process.setProcessEnvironment(env)
+    reader = ProcessOutputReader(process, view)
+    monitor = TailMonitor(folder, events, interval) \
+        if participant == 'ccx' else None
+    probe = EventLoopProbe()
+    loop = Q.QEventLoop()
+    process.finished.connect(loop.quit)
+
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    probe.start()
+    if monitor:
+        monitor.start()
+    argv = ['ccx_preCICE', '-i', 'Solid/tankpre', '-precice-participant',
+            'Calculix'] if participant == 'ccx' else \
+        ['interFoam', '-parallel', '-case', 'Fluid']
+    process.start(sys.executable, ['-m', MODULE] + argv)
+    loop.exec_()
+    wall = time.perf_counter() - start
+    probe.stop()
+    stats = probe.summary()
+    if monitor:
+        monitor.stop()
+        monitor.convert()
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    replayed = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    with open(events) as fobj:
+        steps = sum(1 for _ in fobj)
+    stats.update({
+        'wall': wall, 'steps': steps, 'bytes': reader.nbytes,
+        'refreshes': reader.nflush,
+        'cpu_gui': (after.ru_utime + after.ru_stime -
+                    before.ru_utime - before.ru_stime),
+        'cpu_replay': (replayed.ru_utime + replayed.ru_stime -
+                       children.ru_utime - children.ru_stime)})
+    if monitor:
+        stats.update({'converted': monitor.converted,
+                      'conversions': len(monitor.durations),
+                      'cpu_convert': monitor.cpu,
+                      'errors': len(monitor.errors)})
+        stats.update(_stats(monitor.latencies, 'delay'))
+        stats.update(_stats(monitor.durations, 'convert'))
+        for error in sorted(set(monitor.errors)):
+            logging.warning('conversion failed: %s', error)
+    view.close()
+    app.processEvents()
+    if temporary:
+        import shutil
+        shutil.rmtree(folder, ignore_errors=True)
+    return stats
+
+
+def main(argv=None):
+    """Emulate a solver, write the shims or measure the monitoring."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and osp.basename(argv[0]) in SOLVERS:
+        return emulate(argv)
+    parser = argparse.ArgumentParser(description='Replay solver outputs.')
+    sub = parser.add_subparsers(dest='command')
+    pshims = sub.add_parser('shims', help='write the solver stand-ins')
+    pshims.add_argument('folder')
+    pplay = options_parser(sub.add_parser(
+        'play', help='replay the outputs of a participant'))
+    pplay.add_argument('participant', choices=('ccx', 'foam'))
+    pplay.add_argument('--folder', default='.')
+    pplay.add_argument('--job', default='Solid/tankpre')
+    pmeasure = sub.add_parser('measure', help='measure the monitoring',
+                              epilog='other options are passed to the '
+                                     'replay (see play)')
+    pmeasure.add_argument('--participant', choices=('ccx', 'foam'),
+                          default='ccx')
+    pmeasure.add_argument('--interval', type=int, default=1000,
+                          help='period of the .frd conversions (ms)')
+    pmeasure.add_argument('--folder', default=None,
+                          help='case directory (temporary by default)')
+    args, others = parser.parse_known_args(argv)
+
+    if args.command == 'shims':
+        print(shims(args.folder))
+        return 0
+    if args.command != 'measure' and others:
+        parser.error('unrecognized arguments: ' + ' '.join(others))
+    if args.command == 'play':
+        try:
+            print(replay(args.participant, args, args.folder, args.job),
+                  file=sys.stderr)
+        except OSError as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        return 0
+    if args.command == 'measure':
+        options_parser().parse_args(others)
+        stats = measure(others, args.interval, args.folder, args.participant)
+        print(', '.join('{}={:.2f}'.format(key, stats[key])
+                        for key in sorted(stats)))
+        return 0
+    parser.print_help()
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+Restart artifacts of the solid calculation
+------------------------------------------
+
+The CalculiX participant runs in two stages: ``Solid/tankpre`` (first
+coupling phase) writes its restart file ``tankpre.rout``, which is read
+by ``Solid/tank`` (second phase) as ``tank.rin``. `Frd2pvd.startconvert`
+then stitches ``tankpre.frd`` and ``tank.frd`` in ``tank.pvd``.
+
+`RestartManager` records the artifacts of each stage (size and
+modification time, and the SHA-256 checksum of the restart file) with
+the wall time of the stage in ``Solid/restart.json``. It is used by the
+solid scripts (this module run as a script):
+
+- ``record``: record the artifacts of a stage once it has ended,
+- ``link``: provide ``tank.rin`` as a hard link (or a symbolic link) to
+  ``tankpre.rout`` instead of a copy,
+- ``rerun``: verify the recorded stage-1 restart (`RestartManager.verify`),
+  remove the results of stage 2 and rewind ``tank.pvd`` to the stage-1
+  results, so that stage 2 can be re-run without repeating stage 1.
+  The wall time and the disk I/O saved by each re-run are recorded and
+  reported.
+
+A re-run is requested with ``TANKSIM_SOLID_RERUN=2`` in the environment
+of the solid stage. The fluid participant must be restarted from the
+start time of the second phase as well, the preCICE coupling needs both.
+
+Example::
+
+    python3 restart.py show /path/to/case
+"""
+
+import hashlib
+import json
+import os
+import os.path as osp
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+
+RERUN_ENV = 'TANKSIM_SOLID_RERUN'
+
+MANIFEST = 'restart.json'
+
+# job name of each stage in the Solid directory
+STAGES = {1: 'tankpre', 2: 'tank'}
+
+# files written by CalculiX for a job
+OUTPUTS = ('.rout', '.frd', '.dat', '.cvg', '.sta')
+
+# artifacts whose checksum is recorded (the others may be large results)
+CHECKSUMS = ('.rout',)
+
+CHUNK = 1 << 20
+
+
+def file_digest(path):
+    """Return the size and the SHA-256 checksum of a file."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as fobj:
+        for block in iter(lambda: fobj.read(CHUNK), b''):
+            digest.update(block)
+            size += len(block)
+    return size, digest.hexdigest()
+
+
+def _size(nbytes):
+    """Format a number of bytes."""
+    return '{:.1f} MB'.format(nbytes / 2. ** 20)
+
+
+def _keep_stage1(collection):
+    """Remove the stage-2 datasets of a PVD collection."""
+    for item in list(collection):
+        if not item.attrib['file'].startswith(STAGES[1] + '.'):
+            collection.remove(item)
+
+
+class RestartError(Exception):
+    """Missing or modified restart artifact."""
+
+
+class RestartManager:
+    """Artifacts of the two solid stages of a case.
+
+    Arguments:
+        case (str): Case directory.
+    """
+
+    def __init__(self, case):
+        self.solid = osp.join(case, 'Solid')
+        self.path = osp.join(self.solid, MANIFEST)
+        try:
+            with open(self.path) as fobj:
+                self.data = json.load(fobj)
+        except (OSError, ValueError):
+            self.data = {}
+        self.data.setdefault('stages', {})
+        self.data.setdefault('reruns', [])
+
+    def save(self):
+        """Write the manifest."""
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fobj:
+            json.dump(self.data, fobj, indent=4)
+        os.replace(tmp, self.path)
+
+    def artifact(self, stage, ext):
+        """Return the path of an artifact of *stage*."""
+        return osp.join(self.solid, STAGES[stage] + ext)
+
+    def stage(self, stage):
+        """Return the record of *stage*, *None* if not recorded."""
+        return self.data['stages'].get(str(stage))
+
+    def record(self, stage, wall=None):
+        """Record the artifacts of *stage* after its end.
+
+        Arguments:
+            stage (int): Stage (1 or 2).
+            wall (Optional[float]): Wall time of the stage (s).
+
+        Returns:
+            dict: Record of the stage.
+        """
+        artifacts = {}
+        for ext in OUTPUTS:
+            path = self.artifact(stage, ext)
+            if not osp.isfile(path) or osp.islink(path):
+                continue
+            artifact = {'size': osp.getsize(path),
+                        'mtime': osp.getmtime(path)}
+            if ext in CHECKSUMS:
+                artifact['size'], artifact['sha256'] = file_digest(path)
+            artifacts[osp.basename(path)] = artifact
+        record = {'artifacts': artifacts, 'wall': wall, 'ended': time.time()}
+        self.data['stages'][str(stage)] = record
+        self.save()
+        return record
+
+    def verify(self, stage, ext='.rout'):
+        """Check that an artifact of *stage* is the recorded one.
+
+        The checksum is only computed again if the size or the
+        modification time changed, an artifact recorded without
+        checksum is modified if one of them changed.
+
+        Raises:
+            RestartError: If the artifact is missing, not recorded or
+            modified.
+        """
+        path = self.artifact(stage, ext)
+        name = osp.basename(path)
+        record = (self.stage(stage) or {}).get('artifacts', {}).get(name)
+        if record is None:
+            raise RestartError('{} is not recorded'.format(name))
+        if not osp.isfile(path):
+            raise RestartError('{} is missing'.format(name))
+        if osp.getsize(path) == record['size'] and \
+                osp.getmtime(path) == record['mtime']:
+            return record
+        if 'sha256' not in record or \
+                file_digest(path) != (record['size'], record['sha256']):
+            raise RestartError('{} has changed since stage {}'
+                               .format(name, stage))
+        return record
+
+    def link(self):
+        """Provide ``tank.rin`` as a link to ``tankpre.rout``.
+
+        A hard link is used if possible (the restart survives the
+        removal of ``tankpre.rout``), a relative symbolic link
+        otherwise.
+
+        Returns:
+            int: Number of bytes that were not copied.
+        """
+        source = self.artifact(1, '.rout')
+        target = self.artifact(2, '.rin')
+        if osp.lexists(target):
+            os.remove(target)
+        try:
+            os.link(source, target)
+        except OSError:
+            os.symlink(osp.basename(source), target)
+        return osp.getsize(source)
+
+    def rerun(self):
+        """Prepare the re-run of stage 2 from the stage-1 restart.
+
+        Returns:
+            dict: Wall time (s) and disk I/O (bytes) saved.
+
+        Raises:
+            RestartError: If the stage-1 restart is not valid.
+        """
+        self.verify(1)
+        removed = 0
+        for ext in OUTPUTS + ('.rin',):
+            path = self.artifact(2, ext)
+            if osp.lexists(path):
+                removed += 1
+                os.remove(path)
+        prefix = STAGES[2] + '.'
+        for name in os.listdir(self.solid):
+            if name.startswith(prefix) and name.endswith('.vtu'):
+                removed += 1
+                os.remove(osp.join(self.solid, name))
+        self.rewind_pvd()
+        stage1 = self.stage(1)
+        written = sum(item['size'] for item in stage1['artifacts'].values())
+        restart = stage1['artifacts'][STAGES[1] + '.rout']['size']
+        saved = {'time': time.time(), 'wall_saved': stage1['wall'],
+                 # stage-1 outputs not written again, restart not copied
+                 'io_saved': written + 2 * restart,
+                 'removed': removed}
+        self.data['reruns'].append(saved)
+        self.data['stages'].pop('2', None)
+        self.save()
+        return saved
+
+    def rewind_pvd(self):
+        """Keep only the stage-1 results in ``tank.pvd``.
+
+        `Frd2pvd.startconvert` then converts ``tank.frd`` again from
+        its beginning and appends it after the stage-1 results.
+        """
+        pvd = osp.join(self.solid, 'tank.pvd')
+        if not osp.isfile(pvd):
+            return
+        tree = ET.parse(pvd)
+        root = tree.getroot()
+        if root[1].text.strip() == STAGES[1] + '.frd':
+            return
+        frd = self.artifact(1, '.frd')
+        # the end of tankpre.frd has already been converted
+        root[1].text = '\n\t{}\n\t'.format(STAGES[1] + '.frd')
+        root[2].text = '\n\t{}\n\t'.format(
+            osp.getsize(frd) if osp.isfile(frd) else 0)
+        _keep_stage1(root[0])
+        tree.write(pvd)
+        sim = osp.join(self.solid, 'tanksim.pvd')
+        if osp.isfile(sim):
+            tree = ET.parse(sim)
+            _keep_stage1(tree.getroot()[0])
+            tree.write(sim)
+
+    def summary(self):
+        """Return a description of the recorded stages and re-runs."""
+        lines = []
+        for stage in sorted(STAGES):
+            record = self.stage(stage)
+            if record is None:
+                lines.append('stage {}: not recorded'.format(stage))
+                continue
+            size = sum(item['size'] for item in record['artifacts'].values())
+            wall = record['wall']
+            lines.append('stage {}: {} artifact(s), {}, wall {}'.format(
+                stage, len(record['artifacts']), _size(size),
+                '-' if wall is None else '{:.0f} s'.format(wall)))
+        for rerun in self.data['reruns']:
+            wall = rerun['wall_saved']
+            lines.append('re-run of stage 2 at {}: saved wall {}, I/O {}'.format(
+                time.strftime('%Y-%m-%d %H:%M', time.localtime(rerun['time'])),
+                '-' if wall is None else '{:.0f} s'.format(wall),
+                _size(rerun['io_saved'])))
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Entry point used by the solid scripts."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Restart artifacts of the solid stages.')
+    subparsers = parser.add_subparsers(dest='action')
+    record = subparsers.add_parser('record', help='record an ended stage')
+    record.add_argument('case')
+    record.add_argument('stage', type=int, choices=sorted(STAGES))
+    record.add_argument('--wall', type=float, default=None,
+                        help='wall time of the stage (s)')
+    link = subparsers.add_parser('link', help='link the stage-2 restart')
+    link.add_argument('case')
+    rerun = subparsers.add_parser('rerun', help='prepare a stage-2 re-run')
+    rerun.add_argument('case')
+    show = subparsers.add_parser('show', help='show the recorded stages')
+    show.add_argument('case')
+    args = parser.parse_args(argv)
+
+    if args.action is None:
+        parser.print_help()
+        return 1
+    manager = RestartManager(args.case)
+    if args.action == 'record':
+        record = manager.record(args.stage, args.wall)
+        print('stage {} recorded: {}'.format(
+            args.stage, ', '.join(sorted(record['artifacts']))), flush=True)
+    elif args.action == 'link':
+        print('tank.rin linked, {} not copied'.format(_size(manager.link())),
+              flush=True)
+    elif args.action == 'rerun':
+        try:
+            saved = manager.rerun()
+        except RestartError as exc:
+            print('cannot re-run stage 2: {}'.format(exc), flush=True)
+            return 1
+        wall = saved['wall_saved']
+        print('re-run of stage 2: saved wall {}, I/O {}'.format(
+            '-' if wall is None else '{:.0f} s'.format(wall),
+            _size(saved['io_saved'])), flush=True)
+    else:
+        print(manager.summary())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Tests of the local executor.
+
+Usage:
+    python3 -m unittest test_executor
+"""
+
+import io
+import os
+import os.path as osp
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, osp.dirname(osp.abspath(__file__)))
+
+import executor  # noqa: E402
+
+
+def group_exists(pgid):
+    """Tell if the process group *pgid* still exists."""
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class LocalJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='executor-')
+        self.state = osp.join(self.tmpdir, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def start_sleeper(self):
+        """Start a wrapper leading a group of sleeping processes."""
+        argv = [sys.executable, executor.__file__, 'run', '--name', 'test',
+                '--cores', '1', '--state', self.state, '--',
+                'sh', '-c', 'sleep 60 & sleep 60; wait']
+        process = subprocess.Popen(argv, stdout=subprocess.DEVNULL)
+        deadline = time.time() + 10.
+        while time.time() < deadline:
+            # the wrapper leads its group once it has started
+            if os.getpgid(process.pid) == process.pid:
+                children = subprocess.run(
+                    ['pgrep', '-g', str(process.pid)],
+                    stdout=subprocess.PIPE, universal_newlines=True)
+                if len(children.stdout.split()) >= 3:
+                    return process
+            time.sleep(0.1)
+        process.kill()
+        self.fail('the sleeper group did not start')
+
+    def test_cancel_command(self):
+        process = self.start_sleeper()
+        command = executor.LocalExecutor(state=self.state) \
+            .cancel_command(process.pid)
+        # the GUI runs the command through /bin/sh (see executor.start)
+        subprocess.check_call(['/bin/sh', '-c', command])
+        process.wait(timeout=executor.KILL_DELAY)
+        deadline = time.time() + 5.
+        while group_exists(process.pid) and time.time() < deadline:
+            time.sleep(0.1)
+        self.assertFalse(group_exists(process.pid))
+        self.assertFalse(executor.cancel_group(process.pid))
+
+    def test_follow(self):
+        log = osp.join(self.tmpdir, 'log.job.test')
+        with open(log, 'w') as fobj:
+            fobj.write('already shown\n')
+        sleeper = subprocess.Popen(['sleep', '60'])
+        output = io.StringIO()
+        thread = threading.Thread(target=executor.follow,
+                                  args=(sleeper.pid, log, 0.05, output))
+        thread.start()
+        time.sleep(0.3)
+        with open(log, 'a') as fobj:
+            fobj.write('new line\n')
+        time.sleep(0.3)
+        sleeper.kill()
+        sleeper.wait()
+        thread.join(timeout=5.)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(output.getvalue(), 'new line\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,60 +1,18 @@
-import os
+from collections import OrderedDict
 
-def xmlgen(DeltaT,MaxT,MaxT2,Watchpointsdic,path):
-
-    newxml = []
-    #xmlfile = 
-    # origin = os.path.join(path,'precice-config_parallel.xml')
-    origin = os.path.join(os.path.dirname(__file__),'../../template/precice-config_parallel.xml')
-    with open(origin) as file:
-        alllines = file.readlines()
-
-    for line in alllines:
-        #print(line)
-        if line.strip()=='DeltaT':
-            newxml += '        <timestep-length value="'+DeltaT+'"/>\n'
-        elif line.strip()=='MaxT':
-            newxml += '        <max-time value="'+MaxT+'"/>\n'
-        elif line.strip()=='Watchpoints':
-            #TODO 修改成 多个观察点
-            # for i,key in enumerate(allpointsdic):
-            for key in Watchpointsdic:
-                Watchpoints = Watchpointsdic[key]
-                newxml += '        <watch-point mesh="Solid" name="'+key+'" coordinate="'+Watchpoints[0]+';'+Watchpoints[1]+';'+Watchpoints[2]+'" />\n'
-        else:
-            newxml += line
-
-    target = os.path.join(path,'precice-config_parallel.xml')        
-    with open(target,'w') as file:
-        file.writelines(newxml)
+from .preciceconfig import generate
 
-    newxml = []
-    #xmlfile = 
-    # origin = os.path.join(path,'precice-config_parallel2.xml')
-    origin = os.path.join(os.path.dirname(__file__),'../../template/precice-config_parallel2.xml')
-    with open(origin) as file:
-        alllines = file.readlines()
+def xmlgen(DeltaT,MaxT,MaxT2,Watchpointsdic,path):
+    """
+    生成两个计算阶段(并行及串行)的 precice-config_*.xml
 
-    for line in alllines:
-        #print(line)
-        if line.strip()=='DeltaT':
-            newxml += '        <timestep-length value="'+DeltaT+'"/>\n'
-        elif line.strip()=='MaxT':
-            newxml += '        <max-time value="'+MaxT2+'"/>\n'
-        elif line.strip()=='Watchpoints':
-            #TODO 修改成 多个观察点
-            # newxml += '        <watch-point mesh="Solid" name="Solidwatchpoint1" coordinate="'+Watchpoints[0]+';'+Watchpoints[1]+';'+Watchpoints[2]+'" />\n'
-            for key in Watchpointsdic:
-                Watchpoints = Watchpointsdic[key]
-                newxml += '        <watch-point mesh="Solid" name="'+key+'" coordinate="'+Watchpoints[0]+';'+Watchpoints[1]+';'+Watchpoints[2]+'" />\n'
-        else:
-            newxml += line
+    配置文件在写入前经过校验(网格、数据、参与者与适配器配置一致),
+    校验失败时抛出 PreciceConfigError
 
-    target = os.path.join(path,'precice-config_parallel.xml')        
-    with open(target,'w') as file:
-        file.writelines(newxml)
+    Returns:
+        dict: 各配置文件的 PreciceConfig
+    """
+    return generate(path,DeltaT,MaxT,MaxT2,Watchpointsdic)
 
 if __name__ == "__main__":
-    xmlgen('0.01','18','88',['8','8','8'],'')
-
-
+    xmlgen('0.01','18','88',OrderedDict([('Solidwatchpoint1',['8','8','8'])]),'')
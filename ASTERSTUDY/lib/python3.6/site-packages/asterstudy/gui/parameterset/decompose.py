@@ -0,0 +1,516 @@
+"""
+Decomposition planner
+---------------------
+
+Choice of the domain decomposition of the OpenFOAM case of a
+Tanksimulator case (``Fluid/system/decomposeParDict``).
+
+The number of subdomains used to be the number of cores selected in
+the GUI, whatever the size of the mesh. `DecompositionPlanner` picks
+the number of subdomains and the decomposition method (``scotch`` or
+``hierarchical``) from the cell count, predicted by the mesh planner
+(`meshplan`) or read from the mesh, and from the cores available:
+
+- the time of a step on *n* ranks is estimated by a strong scaling
+  model: the computation (core time per cell and step of the mesh
+  planner calibration), the exchanges between subdomains (proportional
+  to the surface of a subdomain) and the global reductions (growing
+  with log2 *n*); the model keeps at least `MIN_CELLS_PER_RANK` cells
+  per rank,
+- the seconds per step observed for each choice on the cases run
+  locally are recorded in ``~/.tanksimulator/decompose.json`` (or
+  ``TANKSIM_DECOMPOSE``) and replace the model when a similar mesh
+  has been run with the same setting; the other estimates of the
+  model are scaled by the ratio measured / modelled of the measured
+  setting with the closest number of ranks.
+
+The fastest setting is recommended; among settings within `TOLERANCE`
+of the fastest, the one using the fewest ranks is preferred.
+
+A small synthetic case can be run locally at several numbers of ranks
+to measure the scaling (OpenFOAM must be available, see the local
+executor)::
+
+    python3 -m asterstudy.gui.parameterset.decompose scaling --ranks 1 2 4 8
+    python3 -m asterstudy.gui.parameterset.decompose plan --cells 800000 --cores 12
+    python3 -m asterstudy.gui.parameterset.decompose record /path/to/case
+"""
+
+import json
+import math
+import os
+import os.path as osp
+import shutil
+import sys
+import time
+
+import numpy
+
+from .foamdict import FoamList, read_foam, write_foam
+from .meshplan import (CORE_US_PER_CELL_STEP, Calibration, mesh_cells,
+                       solver_step_time)
+
+
+HISTORY_ENV = 'TANKSIM_DECOMPOSE'
+
+METHODS = ('scotch', 'hierarchical')
+
+# interFoam does not scale below this number of cells per rank
+MIN_CELLS_PER_RANK = 20000
+
+# Model: cost of a processor face relative to a cell, per method
+# (hierarchical cuts through the refined regions of snappyHexMesh)
+HALO_FACTOR = {'scotch': 6., 'hierarchical': 7.5}
+
+# Model: seconds per step for each doubling of the number of ranks
+LATENCY_S = 2.e-3
+
+# Settings this close to the fastest one are considered equivalent
+TOLERANCE = 0.05
+
+# Measures are reused for meshes up to this ratio of cells
+CELLS_RATIO = 4.
+
+MAX_SAMPLES = 50
+
+PLAN_FILE = 'decompose.json'
+
+
+def hierarchical_counts(subdomains, lengths=None):
+    """Split a number of subdomains along the directions.
+
+    The prime factors are given, the largest first, to the direction
+    whose slices are the thickest.
+
+    Arguments:
+        subdomains (int): Number of subdomains.
+        lengths (Optional[list[float]]): Extents of the domain.
+
+    Returns:
+        list[int]: Number of subdomains along x, y and z.
+    """
+    lengths = list(lengths or (1., 1., 1.))
+    counts = [1, 1, 1]
+    factors = []
+    value, divisor = subdomains, 2
+    while value > 1:
+        while value % divisor == 0:
+            factors.append(divisor)
+            value //= divisor
+        divisor += 1
+    for factor in sorted(factors, reverse=True):
+        axis = max(range(3), key=lambda i: lengths[i] / counts[i])
+        counts[axis] *= factor
+    return counts
+
+
+class Decomposition:
+    """Decomposition chosen for a case."""
+
+    def __init__(self, **values):
+        self.subdomains = 1
+        self.method = 'scotch'
+        self.counts = [1, 1, 1]
+        self.cells = 0
+        self.cores = 1
+        self.step_s = None
+        self.measured = False
+        self.candidates = []
+        self.__dict__.update(values)
+
+    @property
+    def cells_per_rank(self):
+        """int: Number of cells of a subdomain."""
+        return self.cells // max(1, self.subdomains)
+
+    def as_dict(self):
+        """Return the decomposition as a dict (for JSON export)."""
+        return dict(self.__dict__)
+
+    def summary(self):
+        """Return a readable summary."""
+        lines = ['区域分解: {} 个子区域, 方法 {}{}'.format(
+                     self.subdomains, self.method,
+                     ' {}'.format(tuple(self.counts))
+                     if self.method == 'hierarchical' else ''),
+                 '网格: {:,} 单元, 每个子区域约 {:,} 单元 (可用 {} 核)'.format(
+                     self.cells, self.cells_per_rank, self.cores)]
+        if self.step_s is not None:
+            lines.append('每步耗时: 约 {:.3g} s ({})'.format(
+                self.step_s, '实测' if self.measured else '模型估计'))
+        return '\n'.join(lines)
+
+
+class DecompositionHistory:
+    """Seconds per step observed for each decomposition.
+
+    Arguments:
+        path (Optional[str]): History file, defaults to
+            ``TANKSIM_DECOMPOSE`` or ``~/.tanksimulator/decompose.json``.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(HISTORY_ENV) or osp.join(
+            osp.expanduser('~'), '.tanksimulator', 'decompose.json')
+
+    def samples(self):
+        """Return the recorded samples."""
+        try:
+            with open(self.path) as fobj:
+                return json.load(fobj)['samples']
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def add(self, sample):
+        """Record a sample (see `measure_decomposition`)."""
+        key = (sample.get('case'), sample.get('subdomains'),
+               sample.get('method'))
+        samples = [item for item in self.samples()
+                   if (item.get('case'), item.get('subdomains'),
+                       item.get('method')) != key]
+        samples.append(sample)
+        dirname = osp.dirname(self.path)
+        if dirname and not osp.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.path, 'w') as fobj:
+            json.dump({'samples': samples[-MAX_SAMPLES:]}, fobj, indent=2)
+
+    def step_time(self, cells, subdomains, method):
+        """Return the seconds per step observed for a similar mesh.
+
+        The samples of the same setting whose cell count is within
+        `CELLS_RATIO` are scaled to *cells*.
+
+        Returns:
+            (float, int): Seconds per step and number of samples used,
+            (None, 0) if there is no similar sample.
+        """
+        rates = [item['seconds_per_step'] / item['cells']
+                 for item in self.samples()
+                 if item.get('subdomains') == subdomains
+                 and item.get('method') == method
+                 and item.get('seconds_per_step') and item.get('cells')
+                 and 1. / CELLS_RATIO <= item['cells'] / cells <= CELLS_RATIO]
+        if not rates:
+            return None, 0
+        return float(numpy.median(rates)) * cells, len(rates)
+
+
+class DecompositionPlanner:
+    """Choose the decomposition of a mesh.
+
+    Arguments:
+        history (Optional[DecompositionHistory]): Observed step times.
+        calibration (Optional[Calibration]): Mesh planner calibration
+            (core time per cell and step).
+    """
+
+    def __init__(self, history=None, calibration=None):
+        self.history = history or DecompositionHistory()
+        self.calibration = calibration or Calibration()
+
+    def model(self, cells, subdomains, method):
+        """Return the seconds per step estimated by the scaling model."""
+        core_s = self.calibration.factors().get(
+            'core_us_per_cell_step', CORE_US_PER_CELL_STEP) * 1.e-6
+        local = cells / float(subdomains)
+        step = core_s * local
+        if subdomains > 1:
+            step += core_s * HALO_FACTOR[method] * local ** (2. / 3.)
+            step += LATENCY_S * math.log(subdomains, 2)
+        return step
+
+    def estimate(self, cells, subdomains, method):
+        """Return the seconds per step and whether it was measured."""
+        measured, _ = self.history.step_time(cells, subdomains, method)
+        if measured is not None:
+            return measured, True
+        return self.model(cells, subdomains, method), False
+
+    @staticmethod
+    def ranks(cores):
+        """Return the numbers of subdomains considered for *cores*."""
+        ranks = set([1, cores])
+        value = 2
+        while value < cores:
+            ranks.add(value)
+            value *= 2
+        return sorted(ranks)
+
+    def plan(self, cells, cores, lengths=None):
+        """Choose the decomposition.
+
+        Arguments:
+            cells (int): Number of cells of the mesh.
+            cores (int): Cores available for the fluid solver.
+            lengths (Optional[list[float]]): Extents of the domain (for
+                the hierarchical method).
+
+        Returns:
+            Decomposition: Recommended setting, with the estimates of
+            all the candidates.
+        """
+        cores = max(1, int(cores))
+        cells = max(1, int(cells))
+        candidates = []
+        for subdomains in self.ranks(cores):
+            for method in (METHODS if subdomains > 1 else METHODS[:1]):
+                step, measured = self.estimate(cells, subdomains, method)
+                if not measured and subdomains > 1 and \
+                        cells / subdomains < MIN_CELLS_PER_RANK:
+                    continue
+                candidates.append(dict(subdomains=subdomains, method=method,
+                                       step_s=step, measured=measured))
+        # the model is corrected by the measured setting with the
+        # closest number of ranks
+        measured = [(item['subdomains'], item['method'],
+                     item['step_s'] / self.model(cells, item['subdomains'],
+                                                 item['method']))
+                    for item in candidates if item['measured']]
+        for item in candidates:
+            if item['measured'] or not measured:
+                continue
+            ranks = item['subdomains']
+            nearest = min(measured, key=lambda ref: (
+                abs(math.log(float(ref[0]) / ranks)),
+                ref[1] != item['method'], -ref[0]))
+            item['step_s'] *= nearest[2]
+        fastest = min(item['step_s'] for item in candidates)
+        best = min((item for item in candidates
+                    if item['step_s'] <= fastest * (1. + TOLERANCE)),
+                   key=lambda item: (item['subdomains'], item['step_s']))
+        return Decomposition(
+            subdomains=best['subdomains'], method=best['method'],
+            counts=hierarchical_counts(best['subdomains'], lengths),
+            cells=cells, cores=cores, step_s=best['step_s'],
+            measured=best['measured'], candidates=candidates)
+
+
+def apply_decomposition(decomposition, case):
+    """Write the decomposition in the case.
+
+    ``Fluid/system/decomposeParDict`` is updated and the plan is saved
+    in ``decompose.json`` (read by `read_decomposition`).
+    """
+    path = osp.join(case, 'Fluid', 'system', 'decomposeParDict')
+    entries = read_foam(path)
+    entries['numberOfSubdomains'] = decomposition.subdomains
+    entries['method'] = decomposition.method
+    entries.set_path('hierarchicalCoeffs/n', FoamList(decomposition.counts))
+    write_foam(path, entries)
+    with open(osp.join(case, PLAN_FILE), 'w') as fobj:
+        json.dump(decomposition.as_dict(), fobj, indent=2)
+
+
+def read_decomposition(case):
+    """Return the decomposition planned for a case, *None* if unknown."""
+    try:
+        with open(osp.join(case, PLAN_FILE)) as fobj:
+            return json.load(fobj)
+    except (OSError, ValueError):
+        return None
+
+
+def plan_case(case, cells, cores, lengths=None):
+    """Choose the decomposition of a case and write it.
+
+    Arguments:
+        case (str): Case directory.
+        cells (int): Number of cells, predicted by the mesh planner.
+        cores (int): Cores available for the fluid solver.
+        lengths (Optional[list[float]]): Extents of the tank.
+
+    Returns:
+        Decomposition: Decomposition written.
+    """
+    decomposition = DecompositionPlanner().plan(cells, cores, lengths)
+    apply_decomposition(decomposition, case)
+    return decomposition
+
+
+def measure_decomposition(case, stage='fluid'):
+    """Measure the step time of a case run locally.
+
+    Arguments:
+        case (str): Case directory (with its ``Fluid`` subdirectory).
+        stage (Optional[str]): Local stage of the solver whose
+            accounting is read (``log.job.<stage>.json``).
+
+    Returns:
+        dict: Sample, *None* if the mesh or the solver log are missing.
+    """
+    fluid_dir = osp.join(case, 'Fluid')
+    cells = mesh_cells(fluid_dir)
+    if not cells:
+        return None
+    for log in (osp.join(case, 'log.interFoam'),
+                osp.join(fluid_dir, 'log.interFoam')):
+        step, nsteps = solver_step_time(log)
+        if step:
+            break
+    else:
+        return None
+    try:
+        entries = read_foam(osp.join(fluid_dir, 'system', 'decomposeParDict'))
+    except (OSError, ValueError):
+        entries = {}
+    try:
+        with open(osp.join(case, 'log.job.%s.json' % stage)) as fobj:
+            record = json.load(fobj)
+    except (OSError, ValueError):
+        record = {}
+    subdomains = int(entries.get('numberOfSubdomains', 1))
+    return dict(case=osp.abspath(case), date=time.time(), cells=cells,
+                subdomains=subdomains,
+                method=str(entries.get('method', 'scotch')),
+                cores=record.get('cores') or subdomains,
+                seconds_per_step=step, steps=nsteps)
+
+
+_DECOMPOSE = r"""
+cd "$1/Fluid" || exit 1
+if [ -n "$FOAM_BASHRC" ]; then
+    . $FOAM_BASHRC
+fi
+decomposePar -force > ../log.decomposePar 2>&1 || exit 1
+"""
+
+
+def scaling_study(root, ranks=(1, 2, 4, 8), size=0.15, nsteps=20,
+                  methods=METHODS[:1], template=None, history=None):
+    """Run a small synthetic case at several numbers of ranks.
+
+    The case is meshed once, then decomposed and run for *nsteps*
+    steps for each setting; the step times are recorded in the
+    history. Numbers of ranks above the local cores are skipped.
+
+    Returns:
+        list[dict]: Ranks, method, seconds per step, speedup and
+        parallel efficiency (relative to the smallest number of ranks)
+        of each run.
+    """
+    from ..hexinjisuan import executor as jobs
+    from .meshplan import _BENCH, synthetic_case
+    template = template or osp.join(osp.dirname(osp.dirname(osp.dirname(
+        osp.abspath(__file__)))), 'template')
+    history = history or DecompositionHistory()
+    local = jobs.LocalExecutor()
+    ranks = sorted(set(n for n in ranks if n <= local.allocator.max_cores))
+    case = osp.abspath(osp.join(root, 'scaling-%g' % size))
+    if osp.isdir(case):
+        shutil.rmtree(case)
+    fluid = synthetic_case(case, size, template)
+    lengths = (fluid.xmax - fluid.xmin, fluid.ymax - fluid.ymin,
+               fluid.zmax - fluid.zmin)
+
+    # the mesh is generated with the largest number of ranks
+    apply_decomposition(Decomposition(
+        subdomains=ranks[-1], counts=hierarchical_counts(ranks[-1], lengths)),
+                        case)
+    record = local.wait([local.submit('fluidprepare', case, ranks[-1])])[0]
+    if record.get('returncode') != 0:
+        return [dict(ranks=ranks[-1], method=None, record=record)]
+
+    results = []
+    for subdomains in ranks:
+        for method in methods:
+            apply_decomposition(Decomposition(
+                subdomains=subdomains, method=method,
+                counts=hierarchical_counts(subdomains, lengths)), case)
+            argv = [sys.executable, jobs.__file__, 'run', '--name', 'bench',
+                    '--cores', str(subdomains),
+                    '--max-cores', str(local.allocator.max_cores),
+                    '--state', local.allocator.path,
+                    '--report', osp.join(case, 'log.job.bench.json'), '--',
+                    'bash', '-c', _DECOMPOSE + _BENCH, 'bench', case,
+                    repr(nsteps * fluid.delt_time)]
+            record = jobs.LocalJob('bench', case, argv).wait()
+            sample = measure_decomposition(case, 'bench')
+            log = osp.join(case, 'log.interFoam')
+            if osp.isfile(log):
+                shutil.copyfile(log, '%s.%d.%s' % (log, subdomains, method))
+            if sample is not None:
+                sample['source'] = 'scaling'
+                history.add(sample)
+            results.append(dict(ranks=subdomains, method=method,
+                                record=record, seconds_per_step=sample and
+                                sample['seconds_per_step']))
+
+    reference = [item for item in results if item['seconds_per_step']]
+    if reference:
+        base = reference[0]
+        for item in reference:
+            item['speedup'] = base['seconds_per_step'] / \
+                item['seconds_per_step']
+            item['efficiency'] = item['speedup'] * base['ranks'] / \
+                item['ranks']
+    return results
+
+
+def main(argv=None):
+    """Command line of the decomposition planner."""
+    import argparse
+    import tempfile
+    parser = argparse.ArgumentParser(
+        description='Domain decomposition planner of the fluid case.')
+    subparsers = parser.add_subparsers(dest='action')
+    plan = subparsers.add_parser('plan', help='recommend a decomposition')
+    plan.add_argument('--cells', type=int, required=True)
+    plan.add_argument('--cores', type=int, default=os.cpu_count() or 1)
+    record = subparsers.add_parser('record', help='record a case run locally')
+    record.add_argument('cases', nargs='+', help='case directories')
+    scaling = subparsers.add_parser('scaling',
+                                    help='run a synthetic scaling study')
+    scaling.add_argument('--root', default=None, help='working directory')
+    scaling.add_argument('--ranks', type=int, nargs='+', default=[1, 2, 4, 8])
+    scaling.add_argument('--size', type=float, default=0.15,
+                         help='tank half length')
+    scaling.add_argument('--steps', type=int, default=20)
+    scaling.add_argument('--methods', nargs='+', default=list(METHODS[:1]),
+                         choices=METHODS)
+    subparsers.add_parser('show', help='show the history')
+    args = parser.parse_args(argv)
+
+    history = DecompositionHistory()
+    if args.action == 'plan':
+        decomposition = DecompositionPlanner(history).plan(args.cells,
+                                                           args.cores)
+        print(decomposition.summary())
+        for item in decomposition.candidates:
+            print('  %3d %-12s %8.4f s/step%s'
+                  % (item['subdomains'], item['method'], item['step_s'],
+                     ' (measured)' if item['measured'] else ''))
+    elif args.action == 'record':
+        for case in args.cases:
+            sample = measure_decomposition(case)
+            if sample is None:
+                print('%s: no mesh or solver log found' % case)
+                continue
+            history.add(sample)
+            print(json.dumps(sample, indent=2))
+    elif args.action == 'scaling':
+        root = args.root or tempfile.mkdtemp(prefix='decompose-')
+        for res in scaling_study(root, args.ranks, args.size, args.steps,
+                                 args.methods, history=history):
+            if res.get('seconds_per_step'):
+                print('%2d ranks %-12s %8.4f s/step, speedup %.2f, '
+                      'efficiency %.0f%%'
+                      % (res['ranks'], res['method'], res['seconds_per_step'],
+                         res['speedup'], 100. * res['efficiency']))
+            else:
+                print('%2d ranks %-12s failed (see %s)'
+                      % (res['ranks'], res['method'], root))
+    elif args.action == 'show':
+        print(history.path)
+        for item in history.samples():
+            print('%10d cells %3d ranks %-12s %8.4f s/step  %s'
+                  % (item['cells'], item['subdomains'], item['method'],
+                     item['seconds_per_step'], item['case']))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
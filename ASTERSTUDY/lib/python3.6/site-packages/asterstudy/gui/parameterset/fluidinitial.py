@@ -8,9 +8,29 @@ Created on Sun Dec 23 10:24:39 2018
 import os
 import sys
 import subprocess as sp
-import linecache
 from pathlib import Path
 
+from .foamdict import (FoamDict, FoamList, Quoted, CaseManifest, read_foam,
+                       dump_foam, parse_value, patch_names, yaml_set_list)
+
+#0/下各场文件的壁面边界条件
+WALL_FIELDS = [('U',[('type','fixedValue'),('value','uniform (0 0 0)')]),
+               ('p_rgh',[('type','fixedFluxPressure'),('gradient','uniform 0'),
+                         ('value','uniform 0')]),
+               ('k',[('type','kqRWallFunction'),('value','uniform 0.05')]),
+               ('epsilon',[('type','epsilonWallFunction'),('value','uniform 0.01')]),
+               ('nut',[('type','nutkWallFunction'),('value','uniform 0')]),
+               ('nuTilda',[('type','zeroGradient')]),
+               ('alpha.water',[('type','zeroGradient')]),
+               ('pointDisplacement',[('type','fixedValue'),('value','$internalField')])]
+
+
+def foamheader(cls,obj,location):
+    """返回OpenFOAM文件的FoamFile头"""
+    return FoamDict([('version',2.0),('format','ascii'),('class',cls),
+                     ('location',Quoted(location)),('object',obj)])
+
+
 class Fluidinitial(object):
     """
     def __init__(self,workDic,acc,liqratio,xmin,xmax,ymin,ymax,zmin,zmax,
@@ -63,6 +83,9 @@ class Fluidinitial(object):
         self.runtimeac = kwarg['runtimeac']
         self.runtimesh = kwarg['runtimesh']
 
+        #记录生成文件输入的哈希值, 只重写输入变化的文件(见 setupcase)
+        self.manifest = None
+
         #时间步长和最大库朗数
         self.delt_time = 0.0001
         self.maxCo = 0.5
@@ -82,8 +105,11 @@ class Fluidinitial(object):
         print('self.sys_dir,',self.sys_dir)
         print('self.bd_file,',self.bd_file)
      
-    def meshinitial(self):
-        
+    def meshsizing(self):
+        """
+        计算block网格范围、网格尺寸、各方向网格数量及细分层数
+        (不写文件, 也用于 meshplan.py 的网格规模预估)
+        """
         #基于模型边界范围扩大1.2倍作为block网格
         #model_coord = list(map(float,self.coordinaterang))
         #box_coord = [x*1.2 for x in model_coord]
@@ -132,7 +158,6 @@ class Fluidinitial(object):
         #根据最新网格尺寸和blockMesh网格尺寸确定网格细分层数
         #refinelevel = int(mindim/50/meshsize_min)
         refinelevel = int(delt_x/meshnum_x/meshsize_min)
-        refinelevle_str = str(refinelevel)+' '+str(refinelevel+1)
         
         #内部点，用于修改snappHexMesDict文件
         locatpoint_x = delt_x*(2*meshnum_x+1)/(4*meshnum_x)
@@ -141,68 +166,101 @@ class Fluidinitial(object):
 
         locatpoint = str(locatpoint_x )+' '+str(locatpoint_y )+' '+str(locatpoint_z )
 
+        return dict(box=(box_xmin,box_xmax,box_ymin,box_ymax,box_zmin,box_zmax),
+                    meshsize=meshsize_min,
+                    meshnum=(meshnum_x,meshnum_y,meshnum_z),
+                    refinelevel=refinelevel,
+                    locatpoint=locatpoint)
+
+    def meshinitial(self):
+
+        sizing = self.meshsizing()
+        refinelevel = sizing['refinelevel']
+
+        manifest = self.manifest or CaseManifest(self.casedir)
+
         #创建blockMeshDict文件
-        #print('lineblockmesh=',self.sys_dir+r'/blockMeshDict')
-        with open(self.sys_dir / 'blockMeshDict',"w") as f:
-            f.write("FoamFile\n{\n    version     2.0;\n")
-            f.write("    format     ascii;\n    class      dictionary;\n")
-            f.write("""    location   "system";\n    object     blockMeshDict;\n}""")
-            f.write("\n//**********************************************//\n")
-            f.write("\nconvertToMeters 1;\n\nvertices\n(\n")
-            f.write("    ("+str(box_xmin)+" "+str(box_ymin)+" "+str(box_zmin)+")\n")
-            f.write("    ("+str(box_xmax)+" "+str(box_ymin)+" "+str(box_zmin)+")\n")
-            f.write("    ("+str(box_xmax)+" "+str(box_ymax)+" "+str(box_zmin)+")\n")
-            f.write("    ("+str(box_xmin)+" "+str(box_ymax)+" "+str(box_zmin)+")\n")
-            f.write("    ("+str(box_xmin)+" "+str(box_ymin)+" "+str(box_zmax)+")\n")
-            f.write("    ("+str(box_xmax)+" "+str(box_ymin)+" "+str(box_zmax)+")\n")
-            f.write("    ("+str(box_xmax)+" "+str(box_ymax)+" "+str(box_zmax)+")\n")
-            f.write("    ("+str(box_xmin)+" "+str(box_ymax)+" "+str(box_zmax)+")\n")
-            f.write(");\n\nblocks\n(\n    hex (0 1 2 3 4 5 6 7) fluid (")
-            f.write(str(meshnum_x)+" "+str(meshnum_y)+" "+str(meshnum_z)+")")
-            f.write(" simpleGrading (1 1 1)\n);\n\nedges\n(\n);\n\n")
-            f.write("defaultPatch\n{\n    type empty;\n    name default;\n}\n\n")
-            f.write("boundary\n(\n);")
-            f.close
-            
+        manifest.update('system/blockMeshDict', sizing,
+                        lambda: dump_foam(self.blockmeshdict(sizing)))
+
         # 创建snappyHexMeshDict文件
-        with open(self.bakdir / 'system/snappyHexMeshDict') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.sys_dir / 'snappyHexMeshDict',"w") as f:
-            f.writelines(lines[0:30])
-            for bound in self.boundary_list:
-                f.write('    '+bound+'.stl\n')
-                f.write("    {\n")
-                f.write("        type triSurfaceMesh;\n")
-                f.write("        name "+bound+";\n")
-                f.write("    }\n\n")
-            f.writelines(lines[54:74])
-            f.write("    maxLocalCells 10000000;\n")
-            f.write("    maxGlobalCells 15000000;\n")
-            f.write("    minRefinementCells 5;\n")
-            f.write("    maxLoadUnbalance 0.10;\n")
-            f.write("    nCellsBetweenLevels 3;\n\n")
-            f.writelines(lines[115:122])
-            f.writelines(lines[133:136])
-            for bound in self.boundary_list:
-                f.write('        '+bound+'\n')
-                f.write('        {\n')
-                f.write('            level ('+refinelevle_str+');\n')
-                f.write('            patchInfo\n')
-                f.write('            {\n')
-                f.write('                type wall;\n')
-                f.write('            }\n')
-                f.write('        }\n\n')
-            f.write('    }\n\n')
-            f.write('    resolveFeatureAngle 30;\n\n')
-            f.write('    refinementRegions\n    {\n    }\n\n')
-            f.write('    locationInMesh (0 0 0);\n\n')
-            # f.write('    locationInMesh ('+locatpoint+');\n\n')
-            f.write('    allowFreeStandingZoneFaces true;\n}\n\n')
-            f.writelines(lines[246:281])
-            f.writelines(lines[284:433])
-            f.write('mergeTolerance 1e-6;\n')
-            f.close
+        manifest.update('system/snappyHexMeshDict',
+                        [self.boundary_list,refinelevel],
+                        lambda: dump_foam(self.snappydict(refinelevel)),
+                        [self.bakdir / 'system/snappyHexMeshDict'])
+        if manifest is not self.manifest:
+            self.report(manifest.save())
+
+    def blockmeshdict(self,sizing):
+        """根据网格范围及网格数量生成blockMeshDict"""
+        box_xmin,box_xmax,box_ymin,box_ymax,box_zmin,box_zmax = sizing['box']
+        blockmesh = FoamDict()
+        blockmesh['FoamFile'] = foamheader('dictionary','blockMeshDict','system')
+        blockmesh['convertToMeters'] = 1
+        blockmesh['vertices'] = FoamList(FoamList(point) for point in
+                                         [(box_xmin,box_ymin,box_zmin),
+                                          (box_xmax,box_ymin,box_zmin),
+                                          (box_xmax,box_ymax,box_zmin),
+                                          (box_xmin,box_ymax,box_zmin),
+                                          (box_xmin,box_ymin,box_zmax),
+                                          (box_xmax,box_ymin,box_zmax),
+                                          (box_xmax,box_ymax,box_zmax),
+                                          (box_xmin,box_ymax,box_zmax)])
+        blockmesh['blocks'] = FoamList(['hex',FoamList(range(8)),'fluid',
+                                        FoamList(sizing['meshnum']),
+                                        'simpleGrading',FoamList([1,1,1])])
+        blockmesh['edges'] = FoamList()
+        blockmesh['defaultPatch'] = FoamDict([('type','empty'),('name','default')])
+        blockmesh['boundary'] = FoamList()
+        return blockmesh
+
+    def snappydict(self,refinelevel):
+        """基于模板生成snappyHexMeshDict: 几何、细化参数及各壁面细分层数"""
+        snappy = read_foam(self.bakdir / 'system/snappyHexMeshDict')
+        snappy['geometry'] = FoamDict(
+            (bound+'.stl',FoamDict([('type','triSurfaceMesh'),('name',bound)]))
+            for bound in self.boundary_list)
+        castellated = snappy['castellatedMeshControls']
+        castellated['maxLocalCells'] = 10000000
+        castellated['maxGlobalCells'] = 15000000
+        castellated['minRefinementCells'] = 5
+        castellated['maxLoadUnbalance'] = 0.10
+        castellated['nCellsBetweenLevels'] = 3
+        castellated['refinementSurfaces'] = FoamDict(
+            (bound,FoamDict([('level',FoamList([refinelevel,refinelevel+1])),
+                             ('patchInfo',FoamDict([('type','wall')]))]))
+            for bound in self.boundary_list)
+        castellated['resolveFeatureAngle'] = 30
+        castellated['refinementRegions'] = FoamDict()
+        castellated['locationInMesh'] = FoamList([0,0,0])
+        # 也可使用 meshsizing() 计算的内部点 locatpoint
+        castellated['allowFreeStandingZoneFaces'] = 'true'
+        snappy['mergeTolerance'] = 1e-6
+        return snappy
+
+    def setupcase(self):
+        """
+        生成流体计算文件(网格及求解设置), 只重写输入发生变化的文件
+
+        Returns:
+            dict: 耗时(s)、写入及跳过的文件
+        """
+        self.manifest = CaseManifest(self.casedir)
+        try:
+            self.meshinitial()
+            self.siminitial()
+        finally:
+            manifest, self.manifest = self.manifest, None
+        return self.report(manifest.save())
+
+    def report(self,report):
+        """输出算例设置耗时及写入的文件"""
+        print('流体算例设置: {:.3f} s, 写入 {} 个文件, 跳过 {} 个未变化的文件'.format(
+            report['time'],len(report['written']),len(report['skipped'])))
+        for name in report['written']:
+            print('    写入', name)
+        return report
+
 
     def siminitial(self):
         
@@ -225,211 +283,62 @@ class Fluidinitial(object):
         g_y = float('%.3f' % accfinal_2)
         g_z = float('%.3f' % accfinal_3)
         
-        #initialize 0/U
-        with open(self.bakdir / '0/U') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.zero_dir / 'U',"w") as f:
-            f.writelines(lines[0:23])
-            for bound in self.boundary_list:
-                f.write('    '+bound+'\n')
-                f.write("""    {\n""")
-                f.write("""        type            fixedValue;\n""")
-                f.write("""        value           uniform (0 0 0);\n""")
-                f.write("""    }\n""")
-            f.write('}')
-            f.close
-            
-        #initialize 0/p_rgh
-        with open(self.bakdir / '0/p_rgh') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.zero_dir / 'p_rgh',"w") as f:
-            f.writelines(lines[0:23])
-            for bound in self.boundary_list:
-                f.write('    '+bound+'\n')
-                f.write("""    {\n""")
-                f.write("""        type            fixedFluxPressure;\n""")
-                f.write("""        gradient        uniform 0;\n""")
-                f.write("""        value           uniform 0;\n    }\n""")
-            f.write('}')
-            f.close        
-        
-        #initialize 0/k        
-        with open(self.bakdir / '0/k') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.zero_dir / 'k',"w") as f:
-            f.writelines(lines[0:23])
-            for bound in self.boundary_list:
-                f.write('    '+bound+'\n')
-                f.write("""    {\n""")
-                f.write("""        type            kqRWallFunction;\n""")
-                f.write("""        value           uniform 0.05;\n""")
-                f.write("""    }\n""")
-            f.write('}')
-            f.close
-        
-        #initialize 0/epsilon
-        with open(self.bakdir / '0/epsilon') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.zero_dir / 'epsilon',"w") as f:
-            f.writelines(lines[0:23])
-            for bound in self.boundary_list:
-                f.write('    '+bound+'\n')
-                f.write("""    {\n""")
-                f.write("""        type            epsilonWallFunction;\n""")
-                f.write("""        value           uniform 0.01;\n""")
-                f.write("""    }\n""")
-            f.write('}')
-            f.close
-        
-        #initialize 0/nut
-        with open(self.bakdir / '0/nut') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.zero_dir / 'nut',"w") as f:
-            f.writelines(lines[0:23])
-            for bound in self.boundary_list:
-                f.write('    '+bound+'\n')
-                f.write("""    {\n""")
-                f.write("""        type            nutkWallFunction;\n""")
-                f.write("""        value           uniform 0;\n""")
-                f.write("""    }\n""")
-            f.write('}')
-            f.close
-        
-        #initialize 0/nuTilda
-        with open(self.bakdir / '0/nuTilda') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.zero_dir / 'nuTilda',"w") as f:
-            f.writelines(lines[0:23])
-            for bound in self.boundary_list:
-                f.write('    '+bound+'\n')
-                f.write("""    {\n""")
-                f.write("""        type            zeroGradient;\n""")
-                f.write("""    }\n""")
-            f.write('}')
-            f.close        
-                
-        #initialize 0/alpha.water         
-        with open(self.bakdir / '0/alpha.water') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.zero_dir / 'alpha.water',"w") as f:
-            f.writelines(lines[0:22])
-            for bound in self.boundary_list:
-                f.write('    '+bound+'\n')
-                f.write("""    {\n""")
-                f.write("""        type            zeroGradient;\n""")
-                f.write("""    }\n""")
-            f.write('}')
-            f.close
-            
-        #initialize 0/pointDisplacement   
-        with open(self.bakdir / '0/pointDisplacement') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.zero_dir / 'pointDisplacement',"w") as f:
-            f.writelines(lines[0:23])
-            for bound in self.boundary_list:
-                f.write('    '+bound+'\n')
-                f.write("""    {\n""")
-                f.write("""        type            fixedValue;\n""")
-                f.write("""        value           $internalField;\n""")
-                f.write("""    }\n""")
-            f.write('}')
-            f.close
-            
+
+        manifest = self.manifest or CaseManifest(self.casedir)
+
+        #initialize 0/U 0/p_rgh 0/k 0/epsilon 0/nut 0/nuTilda 0/alpha.water 0/pointDisplacement
+        #各壁面的边界条件
+        for field,patch in WALL_FIELDS:
+            manifest.update('0/'+field,[self.boundary_list,patch],
+                            lambda field=field,patch=patch: dump_foam(self.fielddict(field,patch)),
+                            [self.bakdir / '0' / field])
+
         # initilize constant/g
         #加速阶段g
-        gfile_ac=open(self.cons_dir / 'g_ac',mode="w+",encoding="utf-8")
-        with open(self.bakdir / 'constant/g') as f:
-            for line,content in enumerate(f,1):
-                #print(content)
-                if "value" in content:
-                    i=content.find('(')
-                    new_g=str(g_x)+' '+str(g_y)+' '+str(g_z)
-                    gfile_ac.write(content[:i+1]+new_g+');\n')
-                else:
-                    gfile_ac.write(content)
-            f.close
-        gfile_ac.close
+        manifest.update('constant/g_ac',[g_x,g_y,g_z],
+                        lambda: dump_foam(self.templatedict('constant/g',
+                                          value=FoamList([g_x,g_y,g_z]))),
+                        [self.bakdir / 'constant/g'])
         #自由晃动阶段g
-        gfile_sh=open(self.cons_dir / 'g_sh',mode="w+",encoding="utf-8")
-        with open(self.bakdir / 'constant/g') as f:
-            for line,content in enumerate(f,1):
-                #print(content)
-                if "value" in content:
-                    i=content.find('(')
-                    #new_g=str(g_x)+' '+str(g_y)+' '+str(g_z)
-                    gfile_sh.write(content[:i+1]+self.gravity+');\n')
-                else:
-                    gfile_sh.write(content)
-            f.close
-        gfile_ac.close
-        
+        manifest.update('constant/g_sh',self.gravity,
+                        lambda: dump_foam(self.templatedict('constant/g',
+                                          value=FoamList(gravity_floatlist))),
+                        [self.bakdir / 'constant/g'])
+
         # initilize constant/transportProperties
-        with open(self.bakdir / 'constant/transportProperties') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.cons_dir / 'transportProperties',"w") as f:
-            f.writelines(lines[0:22])
-            f.write('    nu              '+self.mpnu+';\n')
-            f.write('    rho             '+self.mprho+';\n}\n')
-            f.writelines(lines[25:29])
-            f.write('    nu              '+self.spnu+';\n')
-            f.write('    rho             '+self.sprho+';\n}\n')
-            f.writelines(lines[32])
-            f.write('sigma           '+self.dyne+';\n')
-            f.close
-        
+        transport = {'water/nu':self.mpnu,'water/rho':self.mprho,
+                     'air/nu':self.spnu,'air/rho':self.sprho,'sigma':self.dyne}
+        manifest.update('constant/transportProperties',transport,
+                        lambda: dump_foam(self.templatedict(
+                            'constant/transportProperties',
+                            **{key:parse_value(str(val)) for key,val in transport.items()})),
+                        [self.bakdir / 'constant/transportProperties'])
+
         # initilize constant/dynamicMeshDict
-        dynaMD_file = open(self.cons_dir / 'dynamicMeshDict',mode="w+")
-        with open(self.bakdir / 'constant/dynamicMeshDict') as f:
-            for line,content in enumerate(f,1):
-                if 'diffusivity quadratic inverseDistance' in content:
-                    i = content.find('(')
-                    bd = ' '.join(self.boundary_list)
-                    dynaMD_file.write(content[:i+1]+bd+');')
-                else:
-                    dynaMD_file.write(content)
-            f.close
-        dynaMD_file.close
-                    
-        
+        diffusivity = ('quadratic','inverseDistance',FoamList(self.boundary_list))
+        manifest.update('constant/dynamicMeshDict',self.boundary_list,
+                        lambda: dump_foam(self.templatedict(
+                            'constant/dynamicMeshDict',
+                            **{'displacementLaplacianCoeffs/diffusivity':diffusivity})),
+                        [self.bakdir / 'constant/dynamicMeshDict'])
+
         # initilize system/controlDict
         deltaT = float(self.timestep)
         runtime_ac = float(self.runtimeac)
         runtime_sh = float(self.runtimesh)
-        with open(self.bakdir / 'system/controlDict') as f:
-            lines = f.readlines()
-            f.close
         #加速阶段controlDict文件
-        with open(self.sys_dir / 'controlDict_ac',"w") as f:
-            f.writelines(lines[0:21])
-            f.write('startTime       0;\n')
-            f.writelines(lines[22:25])
-            f.write('endTime         '+str(runtime_ac)+';\n\n')
-            #f.write('deltaT          '+str(deltaT)+';\n')
-            f.write('deltaT          '+str(self.delt_time)+';\n')
-            f.writelines(lines[28:31])
-            f.write('writeInterval   '+str(deltaT)+';\n')
-            f.writelines(lines[32:])
-            f.close
+        control_ac = {'startFrom':'startTime','startTime':0,'endTime':runtime_ac,
+                      'deltaT':self.delt_time,'writeInterval':deltaT}
         #晃动阶段controlDict文件
-        with open(self.sys_dir / 'controlDict_sh',"w") as f:
-            f.writelines(lines[0:19])
-            f.write('startFrom       latestTime;\n')
-            f.writelines(lines[20:25])
-            f.write('endTime         '+str(runtime_ac+runtime_sh)+';\n\n')
-            f.write('deltaT          '+str(self.delt_time)+';\n')
-            f.writelines(lines[28:31])
-            f.write('writeInterval   '+str(deltaT)+';\n')
-            f.writelines(lines[32:])
-            f.close
+        control_sh = {'startFrom':'latestTime','startTime':0,
+                      'endTime':runtime_ac+runtime_sh,
+                      'deltaT':self.delt_time,'writeInterval':deltaT}
+        for name,control in (('controlDict_ac',control_ac),('controlDict_sh',control_sh)):
+            manifest.update('system/'+name,control,
+                            lambda control=control: dump_foam(self.templatedict(
+                                'system/controlDict',**control)),
+                            [self.bakdir / 'system/controlDict'])
+
 
         # initilize system/setFieldsDict
         #判断重力方向
@@ -490,21 +399,20 @@ class Fluidinitial(object):
             pt1_y = float('%.3f' % pt1_y)
             pt1_z = float('%.3f' % pt1_z)
         
-        point1 = str(pt1_x)+' '+str(pt1_y)+' '+str(pt1_z)
-        point2 = '('+str(pt2_x)+' '+str(pt2_y)+' '+str(pt2_z)
-        
-        new_sFDfile=open(self.sys_dir / 'setFieldsDict',mode="w+")
-        with open(self.bakdir / 'system/setFieldsDict') as f:
-            for line,content in enumerate(f,1):
-                if "box " in content:
-                    i=content.find('(')
-                    new_sFD=point1+') '+point2
-                    new_sFDfile.write(content[:i+1]+new_sFD+');\n')
-                else:
-                    new_sFDfile.write(content)
-            f.close
-        new_sFDfile.close
+
+        point1 = FoamList([pt1_x,pt1_y,pt1_z])
+        point2 = FoamList([pt2_x,pt2_y,pt2_z])
+
+        def setfields():
+            setfieldsdict = read_foam(self.bakdir / 'system/setFieldsDict')
+            regions = setfieldsdict['regions']
+            region = regions[regions.index('boxToCell')+1]
+            region['box'] = (point1,point2)
+            return dump_foam(setfieldsdict)
+        manifest.update('system/setFieldsDict',[point1,point2],setfields,
+                        [self.bakdir / 'system/setFieldsDict'])
         
+
         # initilize system/fvSolution
         #设置压力参考点
         pRefPoint_x = 0.5*(pt1_x+pt2_x)
@@ -513,41 +421,40 @@ class Fluidinitial(object):
         pRefPoint_x = float('%.3f' % pRefPoint_x)
         pRefPoint_y = float('%.3f' % pRefPoint_y)
         pRefPoint_z = float('%.3f' % pRefPoint_z)
-        pRefPoint = str(pRefPoint_x)+' '+str(pRefPoint_y)+' '+str(pRefPoint_z)
-        
-        fvSfile = open(self.sys_dir / 'fvSolution',mode="w+")
-        with open(self.bakdir / 'system/fvSolution') as f:
-            for line,content in enumerate(f,1):
-                if "pRefPoint" in content:
-                    i=content.find('t')
-                    fvSfile.write(content[:i+1]+'      ('+pRefPoint+');\n')
-                else:
-                    fvSfile.write(content)
-            f.close
-        fvSfile.close
-        
+        pRefPoint = FoamList([pRefPoint_x,pRefPoint_y,pRefPoint_z])
+
+        manifest.update('system/fvSolution',pRefPoint,
+                        lambda: dump_foam(self.templatedict('system/fvSolution',
+                                          **{'PIMPLE/pRefPoint':pRefPoint})),
+                        [self.bakdir / 'system/fvSolution'])
+
         #initilize precice-adapter-config.yml
-        with open(self.bakdir / 'precice-adapter-config.yml') as f:
-            lines = f.readlines()
-            f.close
-        with open(self.casedir / 'precice-adapter-config.yml','w') as f:
-            f.writelines(lines[:8])
-            for wall in self.boundary_list:
-                f.write('  - '+wall+'\n')
-            f.writelines(lines[12:16])
-            for wall in self.boundary_list:
-                f.write('  - '+wall+'\n')
-            f.writelines(lines[20:])     
+        def adapterconfig():
+            with open(self.bakdir / 'precice-adapter-config.yml') as f:
+                return yaml_set_list(f.read(),'patches',self.boundary_list)
+        manifest.update('precice-adapter-config.yml',self.boundary_list,
+                        adapterconfig,[self.bakdir / 'precice-adapter-config.yml'])
+        if manifest is not self.manifest:
+            self.report(manifest.save())
+
+    def templatedict(self,relpath,**values):
+        """读取模板文件并修改其中的条目(键为'/'分隔的路径)"""
+        entries = read_foam(self.bakdir / relpath)
+        for path,value in values.items():
+            entries.set_path(path,value)
+        return entries
+
+    def fielddict(self,field,patch):
+        """基于模板生成0/下的场文件, 所有壁面使用相同的边界条件"""
+        entries = read_foam(self.bakdir / '0' / field)
+        entries['boundaryField'] = FoamDict(
+            (bound,FoamDict((key,parse_value(val)) for key,val in patch))
+            for bound in self.boundary_list)
+        return entries
                       
     def findboundary(self):
-        boundary=[]
-        with open(self.bd_file) as f:     
-          for line,content in enumerate(f,1):
-              if "type" in content:
-                  #line2=line-2
-                  count = linecache.getline(self.bd_file,line-2)
-                  boundary.append(count.strip())
-        return boundary
+        return patch_names(self.bd_file)
+
     
     #def findmaxmin(self):
        # with open()
@@ -0,0 +1,685 @@
+"""
+OpenFOAM dictionaries
+---------------------
+
+Structured model of the OpenFOAM case files written by `Fluidinitial`.
+
+A file is parsed into a `FoamDict` (ordered, nested); the values are:
+
+- a single token: `int`, `float`, `str` (word) or `Quoted` (string),
+- a `tuple` of tokens for multi-token entries
+  (``internalField uniform (0 0 0);``),
+- a `FoamList` for ``( ... )`` and `Dimensions` for ``[ ... ]``,
+- a `FoamDict` for sub-dictionaries.
+
+The comments are kept: a comment is written back before the entry it
+precedes (the comments after the last entry of a dictionary at its
+end), the banner, separator and footer of the files are rewritten by
+`dump_foam`. The layout is not kept: the entries are written one per
+line, aligned, and the blank lines are not preserved. Directives
+(``#include "file"``) are stored as keys with a *None* value and the
+anonymous content of files like ``polyMesh/boundary`` under the *None*
+key.
+
+Example::
+
+    snappy = read_foam('template/Fluid/system/snappyHexMeshDict')
+    snappy['castellatedMeshControls']['locationInMesh'] = \\
+        FoamList([0, 0, 0])
+    write_foam('case/Fluid/system/snappyHexMeshDict', snappy)
+
+`CaseManifest` records a hash of the inputs of each generated file so
+that a new setup of the case only rewrites the files whose inputs (or
+template) changed.
+
+The round trip of the bundled templates is checked with::
+
+    python3 -m asterstudy.gui.parameterset.foamdict check
+"""
+
+import hashlib
+import json
+import os
+import os.path as osp
+import re
+import time
+from collections import OrderedDict
+
+
+BANNER = r"""/*--------------------------------*- C++ -*----------------------------------*\
+  =========                 |
+  \\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox
+   \\    /   O peration     | Website:  https://openfoam.org
+    \\  /    A nd           | Version:  6
+     \\/     M anipulation  |
+\*---------------------------------------------------------------------------*/"""
+SEPARATOR = '// * * * * * * * * * * * * * * * * * * * * * * * * * * *' \
+            ' * * * * * * * * * * //'
+FOOTER = '// *************************************************************' \
+         '************ //'
+
+PUNCTUATION = '{}()[];'
+# separator and footer lines, rewritten by dump_foam
+DECORATION = re.compile(r'//[\s*]*//$')
+NUMBER = re.compile(r'[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+
+
+class FoamError(Exception):
+    """Syntax error in an OpenFOAM dictionary."""
+
+
+class Quoted(str):
+    """Quoted string token."""
+
+    def __repr__(self):
+        return 'Quoted(%s)' % str.__repr__(self)
+
+
+class Comment(str):
+    """Comment token (``// ...`` or ``/* ... */``, delimiters included)."""
+
+
+class Verbatim(str):
+    """Verbatim code block (``#{ ... #}``)."""
+
+
+class FoamList(list):
+    """List between parentheses."""
+
+    def __repr__(self):
+        return 'FoamList(%s)' % list.__repr__(self)
+
+
+class Dimensions(list):
+    """Dimension set between brackets."""
+
+    def __repr__(self):
+        return 'Dimensions(%s)' % list.__repr__(self)
+
+
+class FoamDict(OrderedDict):
+    """Dictionary of an OpenFOAM file.
+
+    Attributes:
+        banner (str): Comment at the beginning of the file.
+        comments (dict): Comments written before the entries, by key.
+        trailing (list[str]): Comments after the last entry.
+    """
+
+    banner = None
+    comments = None
+    trailing = None
+
+    def get_path(self, path, default=None):
+        """Return the value at a '/' separated *path* of keys."""
+        value = self
+        for key in path.split('/'):
+            if not isinstance(value, FoamDict) or key not in value:
+                return default
+            value = value[key]
+        return value
+
+    def set_path(self, path, value):
+        """Set the value at a '/' separated *path*, creating the dicts."""
+        keys = path.split('/')
+        current = self
+        for key in keys[:-1]:
+            current = current.setdefault(key, FoamDict())
+        current[keys[-1]] = value
+
+
+def tokenize(text):
+    """Split the text of a dictionary into tokens.
+
+    Returns:
+        list: Punctuation characters (str), words (str), numbers,
+        `Quoted`, `Verbatim` and `Comment` strings.
+    """
+    tokens = []
+    pos, size = 0, len(text)
+    while pos < size:
+        char = text[pos]
+        if char.isspace():
+            pos += 1
+        elif text.startswith('//', pos):
+            end = text.find('\n', pos)
+            end = size if end < 0 else end
+            tokens.append(Comment(text[pos:end].rstrip()))
+            pos = end + 1
+        elif text.startswith('/*', pos):
+            end = text.find('*/', pos + 2)
+            if end < 0:
+                raise FoamError('unterminated comment')
+            tokens.append(Comment(text[pos:end + 2]))
+            pos = end + 2
+        elif text.startswith('#{', pos):
+            end = text.find('#}', pos + 2)
+            if end < 0:
+                raise FoamError('unterminated code block')
+            tokens.append(Verbatim(text[pos + 2:end]))
+            pos = end + 2
+        elif char == '"':
+            end = pos + 1
+            while end < size and text[end] != '"':
+                end += 2 if text[end] == '\\' else 1
+            if end >= size:
+                raise FoamError('unterminated string')
+            tokens.append(Quoted(text[pos + 1:end]))
+            pos = end + 1
+        elif char in PUNCTUATION:
+            tokens.append(char)
+            pos += 1
+        else:
+            # words may contain balanced parentheses: div(phi,U)
+            end, depth = pos, 0
+            while end < size:
+                char = text[end]
+                if char.isspace() or char in '{}[];"':
+                    break
+                if char == '(':
+                    if end > pos and not NUMBER.match(text[pos:end]):
+                        depth += 1
+                    else:
+                        break
+                elif char == ')':
+                    if not depth:
+                        break
+                    depth -= 1
+                end += 1
+            tokens.append(_token(text[pos:end]))
+            pos = end
+    return tokens
+
+
+def _token(word):
+    """Convert a word into a number if possible."""
+    if NUMBER.match(word):
+        if re.match(r'[-+]?\d+$', word):
+            return int(word)
+        return float(word)
+    return word
+
+
+class _Parser:
+    """Recursive descent parser of a list of tokens.
+
+    The comments are skipped and kept in `pending` until the next entry
+    of a dictionary takes them.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.pending = []
+
+    def next(self):
+        """Return the next token."""
+        self.peek()
+        if self.pos >= len(self.tokens):
+            raise FoamError('unexpected end of file')
+        self.pos += 1
+        return self.tokens[self.pos - 1]
+
+    def peek(self):
+        """Return the next token without consuming it (*None* at end)."""
+        while self.pos < len(self.tokens) \
+                and isinstance(self.tokens[self.pos], Comment):
+            self.pending.append(self.tokens[self.pos])
+            self.pos += 1
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take_comments(self):
+        """Return and forget the pending comments."""
+        comments, self.pending = self.pending, []
+        return comments
+
+    def parse_dict(self, end=None):
+        """Parse entries until *end* ('}' or end of file)."""
+        result = FoamDict()
+        result.comments = {}
+        while True:
+            token = self.peek()
+            if token is None:
+                if end is not None:
+                    raise FoamError('missing %r' % end)
+                result.trailing = self.take_comments()
+                return result
+            if _is_punct(token, end):
+                self.next()
+                result.trailing = self.take_comments()
+                return result
+            if _is_punct(token, ';'):
+                self.next()
+                continue
+            if isinstance(token, str) and not _is_punct(token) \
+                    and not isinstance(token, Verbatim):
+                comments = self.take_comments()
+                key = self.next()
+                if isinstance(key, Quoted):
+                    key = '"%s"' % key
+                if key.startswith('#'):
+                    # directive with one argument: #include "file"
+                    key += ' ' + _format(self.next())
+                if comments:
+                    result.comments[key] = comments
+                if key.startswith('#'):
+                    result[key] = None
+                    continue
+                if self.peek() == '{':
+                    self.next()
+                    result[key] = self.parse_dict('}')
+                else:
+                    result[key] = _unwrap(self.parse_value())
+            else:
+                # anonymous content (polyMesh/boundary: "4 ( ... )")
+                result[None] = _unwrap(self.parse_value(end))
+
+    def parse_value(self, end=None):
+        """Parse the tokens of an entry until ';' (or *end*)."""
+        items = []
+        while True:
+            token = self.peek()
+            if token is None or _is_punct(token, end):
+                return items
+            token = self.next()
+            if not _is_punct(token):
+                items.append(token)
+            elif token == ';':
+                return items
+            else:
+                items.append(self.parse_item(token))
+
+    def parse_item(self, token):
+        """Parse an item starting with *token* inside a value or list."""
+        if not _is_punct(token):
+            return token
+        if token == '(':
+            return self.parse_list(')', FoamList)
+        if token == '[':
+            return self.parse_list(']', Dimensions)
+        if token == '{':
+            return self.parse_dict('}')
+        if token in '})];':
+            raise FoamError('unexpected %r' % token)
+        return token
+
+    def parse_list(self, end, kind):
+        """Parse list items until *end*."""
+        items = kind()
+        while True:
+            token = self.next()
+            if _is_punct(token, end):
+                return items
+            if _is_punct(token, ';'):
+                continue
+            items.append(self.parse_item(token))
+
+
+def _is_punct(token, char=PUNCTUATION):
+    """Tell if *token* is a punctuation character (one of *char*)."""
+    return char is not None and type(token) is str and len(token) == 1 \
+        and token in char
+
+
+def _unwrap(items):
+    """Single token values are stored without tuple."""
+    return items[0] if len(items) == 1 else tuple(items)
+
+
+def parse_foam(text):
+    """Parse the text of an OpenFOAM file.
+
+    Returns:
+        FoamDict: Entries of the file (including ``FoamFile``).
+    """
+    banner = None
+    stripped = text.lstrip()
+    if stripped.startswith('/*'):
+        banner = stripped[:stripped.find('*/') + 2]
+    tokens = [token for token in tokenize(text)
+              if not isinstance(token, Comment)
+              or token != banner and not DECORATION.match(token)]
+    result = _Parser(tokens).parse_dict()
+    result.banner = banner
+    return result
+
+
+def parse_value(text):
+    """Parse the value of an entry given as text (from the GUI).
+
+    ``'0 -9.81 0'`` gives ``(0, -9.81, 0)``, ``'1e-06'`` gives 1e-06.
+    """
+    return _unwrap(_Parser(tokenize(text)).parse_value())
+
+
+def read_foam(path):
+    """Read and parse an OpenFOAM file."""
+    with open(str(path)) as fobj:
+        return parse_foam(fobj.read())
+
+
+def _format(value):
+    """Format a token or a list on one line."""
+    if isinstance(value, Quoted):
+        return '"%s"' % value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return '%.12g' % value
+    if isinstance(value, Dimensions):
+        return '[' + ' '.join(_format(item) for item in value) + ']'
+    if isinstance(value, FoamList):
+        return '(' + ' '.join(_format(item) for item in value) + ')'
+    if isinstance(value, tuple):
+        return ' '.join(_format(item) for item in value)
+    if isinstance(value, FoamDict):
+        return '{ ' + ' '.join('%s %s;' % (key, _format(val))
+                               for key, val in value.items()) + ' }'
+    return str(value)
+
+
+def _is_simple(value):
+    """Tell if a value can be written on one line."""
+    if isinstance(value, FoamDict):
+        return False
+    if isinstance(value, (tuple, FoamList)):
+        return all(_is_simple(item) for item in value) and \
+            len(_format(value)) < 70
+    return True
+
+
+def _write_value(lines, value, indent):
+    """Append the lines of a value spanning several lines."""
+    pad = '    ' * indent
+    if isinstance(value, FoamDict):
+        lines.append(pad + '{')
+        _write_dict(lines, value, indent + 1)
+        _write_comments(lines, value.trailing, indent + 1)
+        lines.append(pad + '}')
+    elif isinstance(value, FoamList):
+        lines.append(pad + '(')
+        # a word starts a new line, followed by its numbers and list:
+        # "hex (0 1 2 3 4 5 6 7)", "fluid (20 20 40)"...
+        line = []
+        line_list = False
+        for item in value:
+            if not _is_simple(item):
+                if line:
+                    lines.append(pad + '    ' + ' '.join(line))
+                    line = []
+                _write_value(lines, item, indent + 1)
+                continue
+            is_list = isinstance(item, (FoamList, tuple))
+            if line and (isinstance(item, str) or is_list and line_list):
+                lines.append(pad + '    ' + ' '.join(line))
+                line = []
+            if not line:
+                line_list = False
+            line.append(_format(item))
+            line_list = line_list or is_list
+        if line:
+            lines.append(pad + '    ' + ' '.join(line))
+        lines.append(pad + ')')
+    else:
+        lines.append(pad + _format(value))
+
+
+def _write_comments(lines, comments, indent):
+    """Append comments, the lines of a block comment are not indented."""
+    for comment in comments or ():
+        lines.append('    ' * indent + comment)
+
+
+def _write_dict(lines, entries, indent):
+    """Append the lines of the entries of a dictionary."""
+    pad = '    ' * indent
+    comments = entries.comments or {}
+    for key, value in entries.items():
+        _write_comments(lines, comments.get(key), indent)
+        if key is None:
+            items = value if isinstance(value, tuple) else (value,)
+            for item in items:
+                _write_value(lines, item, indent)
+            continue
+        if value is None:
+            lines.append(pad + key)
+        elif isinstance(value, FoamDict):
+            lines.append(pad + key)
+            _write_value(lines, value, indent)
+            if indent == 0:
+                lines.append('')
+        elif _is_simple(value):
+            lines.append('{}{:<15} {};'.format(pad, key, _format(value)))
+        else:
+            items = value if isinstance(value, tuple) else (value,)
+            lines.append(pad + key)
+            for item in items:
+                _write_value(lines, item, indent)
+            lines[-1] += ';'
+
+
+def dump_foam(entries):
+    """Return the text of an OpenFOAM file.
+
+    The ``FoamFile`` header is written first, followed by the other
+    entries in their order.
+    """
+    lines = [entries.banner or BANNER]
+    header = entries.get('FoamFile')
+    if header is not None:
+        _write_comments(lines, (entries.comments or {}).get('FoamFile'), 0)
+        lines.append('FoamFile')
+        _write_value(lines, header, 0)
+        lines.append(SEPARATOR)
+        lines.append('')
+    body = FoamDict((key, value) for key, value in entries.items()
+                    if key != 'FoamFile')
+    body.comments = entries.comments
+    _write_dict(lines, body, 0)
+    _write_comments(lines, entries.trailing, 0)
+    lines.append('')
+    lines.append(FOOTER)
+    return '\n'.join(lines) + '\n'
+
+
+def write_foam(path, entries):
+    """Write an OpenFOAM file."""
+    with open(str(path), 'w') as fobj:
+        fobj.write(dump_foam(entries))
+
+
+def patch_names(boundary):
+    """Return the names of the patches of a ``polyMesh/boundary`` file."""
+    content = read_foam(boundary).get(None, ())
+    patches = content[-1] if isinstance(content, tuple) else content
+    return [item for item, following in zip(patches, patches[1:])
+            if isinstance(item, str) and isinstance(following, FoamDict)]
+
+
+def yaml_set_list(text, key, values):
+    """Replace the items of the block lists *key* of a YAML text.
+
+    Only the simple layout of ``precice-adapter-config.yml`` is handled:
+    ``key:`` on its own line followed by ``- item`` lines.
+    """
+    lines = text.splitlines()
+    result = []
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        result.append(line)
+        index += 1
+        match = re.match(r'(\s*)(- )?%s:\s*$' % re.escape(key), line)
+        if not match:
+            continue
+        indent = len(match.group(1)) + (2 if match.group(2) else 0)
+        prefix = ' ' * indent + '- '
+        while index < len(lines) and lines[index].startswith(prefix):
+            index += 1
+        result.extend(prefix + str(value) for value in values)
+    return '\n'.join(result) + '\n'
+
+
+def _hash(data):
+    """Return the hash of bytes or of a JSON compatible object."""
+    if not isinstance(data, bytes):
+        data = json.dumps(data, sort_keys=True, default=str).encode()
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_hash(path):
+    """Return the hash of the content of a file (None if missing)."""
+    try:
+        with open(str(path), 'rb') as fobj:
+            return _hash(fobj.read())
+    except OSError:
+        return None
+
+
+class CaseManifest:
+    """Regeneration of the case files whose inputs changed.
+
+    The hash of the inputs (parameters and templates) and of the
+    written content of each file are stored in a JSON manifest. A file
+    is rewritten if its inputs changed or if it was modified or removed
+    since it was generated.
+
+    Arguments:
+        root (str): Case directory, the paths are relative to it.
+        name (Optional[str]): File name of the manifest in *root*.
+    """
+
+    def __init__(self, root, name='.setup-manifest.json'):
+        self.root = str(root)
+        self.path = osp.join(self.root, name)
+        try:
+            with open(self.path) as fobj:
+                self.entries = json.load(fobj).get('files', {})
+        except (OSError, ValueError):
+            self.entries = {}
+        self.written = []
+        self.skipped = []
+        self.start = time.perf_counter()
+
+    def update(self, relpath, inputs, build, templates=()):
+        """Write *relpath* with the text returned by *build()* if needed.
+
+        Arguments:
+            relpath (str): Path of the file relative to the case.
+            inputs (misc): JSON compatible parameters of the file.
+            build (callable): Returns the content of the file.
+            templates (list[str]): Files read by *build*.
+
+        Returns:
+            bool: *True* if the file has been written.
+        """
+        path = osp.join(self.root, str(relpath))
+        key = _hash([inputs] + [file_hash(tpl) for tpl in templates])
+        entry = self.entries.get(str(relpath))
+        if entry and entry['inputs'] == key \
+                and entry['output'] == file_hash(path):
+            self.skipped.append(str(relpath))
+            return False
+        content = build()
+        dirname = osp.dirname(path)
+        if not osp.isdir(dirname):
+            os.makedirs(dirname)
+        with open(path, 'w') as fobj:
+            fobj.write(content)
+        self.entries[str(relpath)] = {'inputs': key,
+                                      'output': _hash(content.encode())}
+        self.written.append(str(relpath))
+        return True
+
+    def save(self):
+        """Write the manifest and return the report of the setup.
+
+        Returns:
+            dict: Elapsed time (s), files written and files skipped.
+        """
+        report = {'time': time.perf_counter() - self.start,
+                  'written': self.written, 'skipped': self.skipped}
+        with open(self.path, 'w') as fobj:
+            json.dump({'files': self.entries, 'report': report}, fobj,
+                      indent=2)
+        return report
+
+
+def all_comments(entries):
+    """Return the comments of the entries and sub-dictionaries in order."""
+    result = []
+    for key, value in entries.items():
+        result.extend((entries.comments or {}).get(key, ()))
+        if isinstance(value, FoamDict):
+            result.extend(all_comments(value))
+    result.extend(entries.trailing or ())
+    return result
+
+
+def check_roundtrip(path):
+    """Check that writing the parsed file gives back the same entries
+    and comments.
+
+    Returns:
+        FoamDict: Parsed entries.
+
+    Raises:
+        FoamError: If the entries or the comments differ.
+    """
+    entries = read_foam(path)
+    again = parse_foam(dump_foam(entries))
+    if again != entries:
+        for key in entries:
+            if again.get(key) != entries[key]:
+                raise FoamError('{}: entry {!r} differs'.format(path, key))
+        raise FoamError('{}: entries differ'.format(path))
+    if all_comments(again) != all_comments(entries):
+        raise FoamError('{}: comments differ'.format(path))
+    return entries
+
+
+def main(argv=None):
+    """Check the round trip of the templates, or print a parsed file."""
+    import argparse
+    parser = argparse.ArgumentParser(description='OpenFOAM dictionaries.')
+    subparsers = parser.add_subparsers(dest='action')
+    check = subparsers.add_parser('check', help='round trip of files')
+    check.add_argument('paths', nargs='*', help='files or directories, '
+                       'defaults to the bundled templates')
+    show = subparsers.add_parser('show', help='print a parsed file')
+    show.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.action == 'show':
+        print(dump_foam(read_foam(args.path)), end='')
+        return 0
+    if args.action != 'check':
+        parser.print_help()
+        return 1
+    paths = args.paths or [osp.join(osp.dirname(osp.dirname(osp.dirname(
+        osp.abspath(__file__)))), 'template', 'Fluid')]
+    files = []
+    for path in paths:
+        if osp.isdir(path):
+            for dirpath, dirnames, names in os.walk(path):
+                # obsolete files, some of them are not valid
+                dirnames[:] = [name for name in dirnames
+                               if name != 'abadoned']
+                files.extend(osp.join(dirpath, name) for name in sorted(names)
+                             if not name.endswith(('.yml', '.foam')))
+        else:
+            files.append(path)
+    failed = 0
+    for path in sorted(files):
+        try:
+            entries = check_roundtrip(path)
+            print('ok      %s (%d entries)' % (path, len(entries)))
+        except (FoamError, UnicodeDecodeError) as exc:
+            failed += 1
+            print('FAILED  %s: %s' % (path, exc))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,570 @@
+"""
+Mesh planner
+------------
+
+Prediction of the size of the OpenFOAM mesh of a Tanksimulator case
+before its dictionaries are written.
+
+`Fluidinitial.meshinitial` derives the extent and the cell size of the
+``blockMeshDict`` background mesh and the surface refinement level of
+``snappyHexMeshDict``. From the same sizing (`Fluidinitial.meshsizing`)
+and the area of the wall surfaces (STL files), `MeshPlanner` predicts:
+
+- the number of background cells and of cells after ``snappyHexMesh``,
+- the memory used by the fluid solver,
+- the cost of a time step (core seconds, and wall seconds on the
+  requested number of cores) and of the whole simulation.
+
+The refined cell count is a simple model: the cells of the background
+mesh inside the tank, plus, for each refinement level, a band of
+``nCellsBetweenLevels`` cells along the walls.
+
+The predictions are corrected by a calibration built from the cases
+already run locally (`Calibration`, stored in
+``~/.tanksimulator/meshplan.json`` or ``TANKSIM_MESHPLAN``): the real
+cell count is read from the mesh, the time per step from
+``log.interFoam`` and the memory from the accounting written by the
+local executor (``log.job.<stage>.json``).
+
+Small synthetic cases (box tanks of increasing size) can be meshed and
+run for a few steps locally to build the calibration::
+
+    python3 -m asterstudy.gui.parameterset.meshplan synthetic --cores 2
+    python3 -m asterstudy.gui.parameterset.meshplan record /path/to/case
+    python3 -m asterstudy.gui.parameterset.meshplan show
+"""
+
+import json
+import os
+import os.path as osp
+import re
+import struct
+import sys
+import time
+
+import numpy
+
+
+CALIBRATION_ENV = 'TANKSIM_MESHPLAN'
+
+# Values written in snappyHexMeshDict by Fluidinitial.meshinitial
+N_CELLS_BETWEEN_LEVELS = 3
+MAX_GLOBAL_CELLS = 15000000
+
+# Default costs of interFoam (dynamic mesh, VOF), before calibration
+KB_PER_CELL = 1.5
+CORE_US_PER_CELL_STEP = 4.
+
+# Number of recent samples used by the calibration
+MAX_SAMPLES = 20
+
+def read_stl(path):
+    """Read the triangles of an ASCII or binary STL file.
+
+    Returns:
+        numpy.ndarray: Array of shape (ntria, 3, 3).
+    """
+    with open(path, 'rb') as fobj:
+        data = fobj.read()
+    if len(data) >= 84:
+        ntria = struct.unpack('<I', data[80:84])[0]
+        if len(data) == 84 + 50 * ntria:
+            dtype = numpy.dtype([('normal', '<f4', 3), ('vertices', '<f4', 9),
+                                 ('attr', '<u2')])
+            tria = numpy.frombuffer(data, dtype, ntria, 84)
+            return tria['vertices'].reshape(-1, 3, 3).astype(float)
+    coords = re.findall(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)', data)
+    return numpy.array(coords, dtype=float).reshape(-1, 3, 3)
+
+
+def surface_area(tria):
+    """Return the area of the triangles read by `read_stl`."""
+    if not len(tria):
+        return 0.
+    cross = numpy.cross(tria[:, 1] - tria[:, 0], tria[:, 2] - tria[:, 0])
+    return 0.5 * numpy.sqrt((cross ** 2).sum(axis=1)).sum()
+
+
+def write_stl(path, tria, name='wall'):
+    """Write triangles in an ASCII STL file (used by the synthetic cases)."""
+    with open(path, 'w') as fobj:
+        fobj.write('solid %s\n' % name)
+        for tri in tria:
+            normal = numpy.cross(tri[1] - tri[0], tri[2] - tri[0])
+            norm = numpy.linalg.norm(normal)
+            normal = normal / norm if norm else normal
+            fobj.write('  facet normal %g %g %g\n    outer loop\n'
+                       % tuple(normal))
+            for vertex in tri:
+                fobj.write('      vertex %g %g %g\n' % tuple(vertex))
+            fobj.write('    endloop\n  endfacet\n')
+        fobj.write('endsolid %s\n' % name)
+
+
+def box_triangles(lower, upper):
+    """Return the 12 triangles of the faces of a box, normals inward."""
+    (x0, y0, z0), (x1, y1, z1) = lower, upper
+    pts = numpy.array([[x0, y0, z0], [x1, y0, z0], [x1, y1, z0],
+                       [x0, y1, z0], [x0, y0, z1], [x1, y0, z1],
+                       [x1, y1, z1], [x0, y1, z1]], dtype=float)
+    quads = [(0, 1, 2, 3), (4, 7, 6, 5), (0, 4, 5, 1),
+             (3, 2, 6, 7), (0, 3, 7, 4), (1, 5, 6, 2)]
+    tria = []
+    for a, b, c, d in quads:
+        tria.append(pts[[a, b, c]])
+        tria.append(pts[[a, c, d]])
+    return numpy.array(tria)
+
+
+class MeshPlan:
+    """Predicted size and cost of a fluid case.
+
+    Attributes:
+        background (int): Cells of the blockMesh background mesh.
+        cells (int): Cells after snappyHexMesh (calibrated).
+        memory_kb (float): Memory of the fluid solver (all ranks).
+        step_core_s (float): Core seconds per time step.
+        step_wall_s (float): Wall seconds per time step on *cores*.
+        steps (int): Number of time steps of the simulation.
+        total_wall_s (float): Wall time of the whole simulation.
+    """
+
+    def __init__(self, **values):
+        self.sizing = values.pop('sizing', {})
+        self.background = self.inside = self.raw_cells = self.cells = 0
+        self.area = self.memory_kb = 0.
+        self.step_core_s = self.step_wall_s = self.total_wall_s = 0.
+        self.cores = self.steps = 1
+        self.calibrated = 0
+        self.__dict__.update(values)
+
+    @property
+    def warnings(self):
+        """list[str]: Problems foreseen with this mesh."""
+        warnings = []
+        if self.raw_cells > MAX_GLOBAL_CELLS:
+            warnings.append('预计网格数超过 snappyHexMesh 的 maxGlobalCells '
+                            '({}), 细化将提前停止'.format(MAX_GLOBAL_CELLS))
+        total_kb = os.sysconf('SC_PAGE_SIZE') * \
+            os.sysconf('SC_PHYS_PAGES') / 1024.
+        if self.memory_kb > 0.8 * total_kb:
+            warnings.append('预计内存超过本机内存的80%')
+        return warnings
+
+    def as_dict(self):
+        """Return the plan as a dict (JSON compatible)."""
+        values = dict(self.__dict__)
+        values['warnings'] = self.warnings
+        return values
+
+    def summary(self):
+        """Return a readable summary (shown before writing the case)."""
+        meshnum = self.sizing.get('meshnum', (0, 0, 0))
+        lines = ['背景网格: {} x {} x {} = {:,} 单元'.format(
+                     meshnum[0], meshnum[1], meshnum[2], self.background),
+                 '网格尺寸: {:.4g} m, 表面细分层数: {}'.format(
+                     self.sizing.get('meshsize', 0.),
+                     self.sizing.get('refinelevel', 0)),
+                 '壁面面积: {:.4g} m2'.format(self.area),
+                 '细化后网格: 约 {:,} 单元'.format(self.cells),
+                 '求解内存: 约 {}'.format(_size(self.memory_kb)),
+                 '每步耗时: 约 {:.3g} s ({} 核), 共 {:,} 步, 总计约 {}'.format(
+                     self.step_wall_s, self.cores, self.steps,
+                     _duration(self.total_wall_s)),
+                 '校准样本数: {}'.format(self.calibrated)]
+        lines.extend('警告: ' + warning for warning in self.warnings)
+        return '\n'.join(lines)
+
+
+class MeshPlanner:
+    """Predict the mesh of a case from its sizing.
+
+    Arguments:
+        calibration (Optional[Calibration]): Correction factors,
+            defaults to the user calibration file.
+    """
+
+    def __init__(self, calibration=None):
+        self.calibration = calibration or Calibration()
+
+    def predict(self, sizing, area, tank_volume, cores=1, duration=0.,
+                deltat=1.e-4):
+        """Predict the mesh and costs.
+
+        Arguments:
+            sizing (dict): Result of `Fluidinitial.meshsizing`.
+            area (float): Area of the wall surfaces (m2).
+            tank_volume (float): Volume of the fluid domain (m3).
+            cores (Optional[int]): Cores of the fluid solver.
+            duration (Optional[float]): Simulated time (s).
+            deltat (Optional[float]): Time step (s).
+
+        Returns:
+            MeshPlan: Predictions.
+        """
+        xmin, xmax, ymin, ymax, zmin, zmax = sizing['box']
+        nx, ny, nz = sizing['meshnum']
+        size = sizing['meshsize']
+        level = max(0, int(sizing['refinelevel']))
+        background = nx * ny * nz
+        box_volume = (xmax - xmin) * (ymax - ymin) * (zmax - zmin)
+        fraction = min(1., tank_volume / box_volume) if box_volume else 1.
+        inside = background * fraction
+        refined = 0.
+        for lvl in range(1, level + 1):
+            # a level-lvl cell replaces 1/8 of its parent
+            hlvl = size / 2 ** lvl
+            refined += 7. / 8. * area * N_CELLS_BETWEEN_LEVELS / hlvl ** 2
+        raw = int(inside + refined)
+        factors = self.calibration.factors()
+        cells = int(raw * factors['cells'])
+        core_s = cells * factors['core_us_per_cell_step'] * 1.e-6
+        steps = max(1, int(round(duration / deltat))) if duration else 1
+        return MeshPlan(sizing=sizing, background=background,
+                        inside=int(inside), raw_cells=raw, cells=cells,
+                        area=area, cores=cores,
+                        memory_kb=cells * factors['kb_per_cell'],
+                        step_core_s=core_s, step_wall_s=core_s / cores,
+                        steps=steps, total_wall_s=core_s / cores * steps,
+                        calibrated=factors['samples'])
+
+
+def plan_case(fluid, cores=1):
+    """Predict the mesh of a `Fluidinitial` case before it is written.
+
+    The wall surfaces are read from ``constant/triSurface`` of the case
+    (written by the preprocessing tab), the tank is approximated by its
+    bounding box when they are not available.
+
+    Arguments:
+        fluid (Fluidinitial): Fluid case.
+        cores (Optional[int]): Cores of the fluid solver.
+
+    Returns:
+        MeshPlan: Predictions.
+    """
+    sizing = fluid.meshsizing()
+    lengths = (fluid.xmax - fluid.xmin, fluid.ymax - fluid.ymin,
+               fluid.zmax - fluid.zmin)
+    volume = lengths[0] * lengths[1] * lengths[2]
+    area = 0.
+    for wall in fluid.boundary_list:
+        path = osp.join(str(fluid.casedir), 'constant', 'triSurface',
+                        wall + '.stl')
+        if osp.isfile(path):
+            area += surface_area(read_stl(path))
+    if not area:
+        area = 2. * (lengths[0] * lengths[1] + lengths[1] * lengths[2] +
+                     lengths[2] * lengths[0])
+    duration = float(fluid.runtimeac) + float(fluid.runtimesh)
+    return MeshPlanner().predict(sizing, area, volume, int(cores),
+                                 duration, fluid.delt_time)
+
+
+class Calibration:
+    """Correction factors learned from the cases run locally.
+
+    Each sample stores the predicted and real cell counts, the memory
+    per cell and the core time per cell and step of one case; the
+    factors are the medians of the recent samples.
+
+    Arguments:
+        path (Optional[str]): Calibration file, defaults to
+            ``TANKSIM_MESHPLAN`` or ``~/.tanksimulator/meshplan.json``.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(CALIBRATION_ENV) or osp.join(
+            osp.expanduser('~'), '.tanksimulator', 'meshplan.json')
+
+    def samples(self):
+        """Return the recorded samples."""
+        try:
+            with open(self.path) as fobj:
+                return json.load(fobj)['samples']
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def add(self, sample):
+        """Record a sample (see `measure_case`)."""
+        samples = [item for item in self.samples()
+                   if item.get('case') != sample.get('case')]
+        samples.append(sample)
+        dirname = osp.dirname(self.path)
+        if dirname and not osp.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.path, 'w') as fobj:
+            json.dump({'samples': samples[-MAX_SAMPLES:]}, fobj, indent=2)
+
+    def factors(self):
+        """Return the correction factors.
+
+        Returns:
+            dict: 'cells' (real / predicted cells), 'kb_per_cell',
+            'core_us_per_cell_step' and the number of 'samples'.
+        """
+        samples = self.samples()[-MAX_SAMPLES:]
+
+        def _median(key, default):
+            values = [item[key] for item in samples if item.get(key)]
+            return float(numpy.median(values)) if values else default
+        return {'cells': _median('cells_ratio', 1.),
+                'kb_per_cell': _median('kb_per_cell', KB_PER_CELL),
+                'core_us_per_cell_step': _median('core_us_per_cell_step',
+                                                 CORE_US_PER_CELL_STEP),
+                'samples': len(samples)}
+
+
+def mesh_cells(fluid_dir):
+    """Return the number of cells of an OpenFOAM mesh (None if unknown).
+
+    The count is read from the header of ``polyMesh/owner``, of the
+    reconstructed mesh or summed over the processor directories.
+    """
+    def _read(path):
+        try:
+            with open(path, 'rb') as fobj:
+                match = re.search(rb'nCells:\s*(\d+)', fobj.read(4096))
+        except OSError:
+            return None
+        return int(match.group(1)) if match else None
+
+    cells = _read(osp.join(fluid_dir, 'constant', 'polyMesh', 'owner'))
+    if cells is not None:
+        return cells
+    procs = [_read(osp.join(fluid_dir, name, 'constant', 'polyMesh', 'owner'))
+             for name in sorted(os.listdir(fluid_dir))
+             if name.startswith('processor')] \
+        if osp.isdir(fluid_dir) else []
+    return sum(procs) if procs and None not in procs else None
+
+
+def solver_step_time(log):
+    """Return the mean execution time of a step read from a solver log.
+
+    The first step (initialization) is excluded.
+
+    Returns:
+        (float, int): Seconds per step and number of steps, or
+        (None, 0) if the log contains less than two steps.
+    """
+    try:
+        with open(log, errors='replace') as fobj:
+            text = fobj.read()
+    except OSError:
+        return None, 0
+    times = [float(value) for value in
+             re.findall(r'^ExecutionTime = (\S+) s', text, re.M)]
+    if len(times) < 2:
+        return None, 0
+    return (times[-1] - times[0]) / (len(times) - 1), len(times)
+
+
+def measure_case(case, stage='fluid'):
+    """Measure a case run locally and return a calibration sample.
+
+    Arguments:
+        case (str): Case directory (with its ``Fluid`` subdirectory).
+        stage (Optional[str]): Local stage of the solver whose
+            accounting is read (``log.job.<stage>.json``).
+
+    Returns:
+        dict: Sample, *None* if the mesh is not available.
+    """
+    fluid_dir = osp.join(case, 'Fluid')
+    cells = mesh_cells(fluid_dir)
+    if not cells:
+        return None
+    sample = dict(case=osp.abspath(case), date=time.time(), cells=cells)
+    try:
+        with open(osp.join(case, 'meshplan.json')) as fobj:
+            predicted = json.load(fobj)['raw_cells']
+        sample['cells_ratio'] = cells / predicted if predicted else None
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        with open(osp.join(case, 'log.job.%s.json' % stage)) as fobj:
+            record = json.load(fobj)
+    except (OSError, ValueError):
+        record = {}
+    cores = record.get('cores') or 1
+    sample['cores'] = cores
+    if record.get('maxrss_kb'):
+        # maximum resident size of one rank
+        sample['kb_per_cell'] = record['maxrss_kb'] * cores / cells
+    for log in (osp.join(case, 'log.interFoam'),
+                osp.join(fluid_dir, 'log.interFoam')):
+        step, nsteps = solver_step_time(log)
+        if step:
+            sample['steps'] = nsteps
+            sample['core_us_per_cell_step'] = step * cores / cells * 1.e6
+            break
+    return sample
+
+
+def save_plan(plan, case):
+    """Save the prediction in the case, it is compared after the run."""
+    with open(osp.join(str(case), 'meshplan.json'), 'w') as fobj:
+        json.dump(plan.as_dict(), fobj, indent=2)
+
+
+_BENCH = r"""
+cd "$1/Fluid" || exit 1
+if [ -n "$FOAM_BASHRC" ]; then
+    . $FOAM_BASHRC
+fi
+cp -f constant/g_ac constant/g
+cp -f system/controlDict_ac system/controlDict
+# 不耦合preCICE, 固定时间步长
+foamDictionary -entry functions -remove system/controlDict > /dev/null
+foamDictionary -entry adjustTimeStep -set no system/controlDict > /dev/null
+foamDictionary -entry endTime -set $2 system/controlDict > /dev/null
+foamDictionary -entry writeInterval -set $2 system/controlDict > /dev/null
+${TANKSIM_MPIRUN:-mpirun} -np ${TANKSIM_NPROCS:-1} interFoam -parallel \
+    > ../log.interFoam 2>&1
+"""
+
+
+def synthetic_case(root, size, template):
+    """Write a synthetic box tank case.
+
+    The mesh is sized for an acceleration phase of 1 s, the solver is
+    only run for a few steps by `run_synthetic`.
+
+    Arguments:
+        root (str): Directory of the case.
+        size (float): Half length of the tank along x (the tank is
+            2 size x 2 size x 4 size).
+        template (str): Template directory (with ``Fluid``).
+
+    Returns:
+        Fluidinitial: Fluid case written in *root*.
+    """
+    import shutil
+    from pathlib import Path
+    from .fluidinitial import Fluidinitial
+    shutil.copytree(template, root)
+    surfaces = osp.join(root, 'Fluid', 'constant', 'triSurface')
+    if not osp.isdir(surfaces):
+        os.makedirs(surfaces)
+    lower, upper = (-size, -size, -2 * size), (size, size, 2 * size)
+    write_stl(osp.join(surfaces, 'tank_wall.stl'),
+              box_triangles(lower, upper), 'tank_wall')
+    params = dict(coordrang=[lower[0], upper[0], lower[1], upper[1],
+                             lower[2], upper[2]],
+                  boundname=['tank_wall'], acc='0 0 5', gravity='0 -9.81 0',
+                  liquidratio='0.5', sigma='0.07', mp_rho='1000',
+                  mp_nu='1e-06', sp_rho='1', sp_nu='1.48e-05',
+                  writetime='0.05', runtimeac='1', runtimesh='0')
+    fluid = Fluidinitial(Path(template), Path(root), **params)
+    fluid.meshinitial()
+    fluid.siminitial()
+    return fluid
+
+
+def run_synthetic(root, sizes=(0.1, 0.15, 0.2), cores=1, nsteps=20,
+                  template=None, calibration=None):
+    """Mesh and run synthetic cases locally and record the calibration.
+
+    OpenFOAM must be available (or ``FOAM_BASHRC`` set), see the local
+    executor.
+
+    Returns:
+        list[dict]: Predictions and measured samples of the cases.
+    """
+    from ..hexinjisuan import executor as jobs
+    template = template or osp.join(osp.dirname(osp.dirname(osp.dirname(
+        osp.abspath(__file__)))), 'template')
+    calibration = calibration or Calibration()
+    local = jobs.LocalExecutor()
+    results = []
+    for size in sizes:
+        case = osp.join(root, 'box-%g' % size)
+        fluid = synthetic_case(case, size, template)
+        plan = MeshPlanner(calibration).predict(
+            fluid.meshsizing(), surface_area(box_triangles(
+                (-size, -size, -2 * size), (size, size, 2 * size))),
+            32 * size ** 3, cores, nsteps * fluid.delt_time, fluid.delt_time)
+        save_plan(plan, case)
+        record = local.wait([local.submit('fluidprepare', case, cores)])[0]
+        if record.get('returncode') == 0:
+            argv = [sys.executable, jobs.__file__, 'run', '--name', 'bench',
+                    '--cores', str(cores),
+                    '--max-cores', str(local.allocator.max_cores),
+                    '--state', local.allocator.path,
+                    '--report', osp.join(case, 'log.job.bench.json'), '--',
+                    'bash', '-c', _BENCH, 'bench', case,
+                    repr(nsteps * fluid.delt_time)]
+            record = jobs.LocalJob('bench', case, argv).wait()
+        sample = measure_case(case, 'bench')
+        if sample is not None:
+            calibration.add(sample)
+        results.append(dict(size=size, plan=plan.as_dict(), sample=sample,
+                            record=record))
+    return results
+
+
+def main(argv=None):
+    """Command line of the calibration."""
+    import argparse
+    import tempfile
+    parser = argparse.ArgumentParser(
+        description='Calibration of the fluid mesh planner.')
+    subparsers = parser.add_subparsers(dest='action')
+    record = subparsers.add_parser('record', help='record a case run locally')
+    record.add_argument('cases', nargs='+', help='case directories')
+    synth = subparsers.add_parser('synthetic',
+                                  help='mesh and run synthetic cases')
+    synth.add_argument('--root', default=None, help='working directory')
+    synth.add_argument('--sizes', type=float, nargs='+',
+                       default=[0.1, 0.15, 0.2], help='tank half lengths')
+    synth.add_argument('--cores', type=int, default=1)
+    synth.add_argument('--steps', type=int, default=20)
+    subparsers.add_parser('show', help='show the calibration')
+    args = parser.parse_args(argv)
+
+    calibration = Calibration()
+    if args.action == 'record':
+        for case in args.cases:
+            sample = measure_case(case)
+            if sample is None:
+                print('%s: no mesh found' % case)
+                continue
+            calibration.add(sample)
+            print(json.dumps(sample, indent=2))
+    elif args.action == 'synthetic':
+        root = args.root or tempfile.mkdtemp(prefix='meshplan-')
+        for res in run_synthetic(root, args.sizes, args.cores, args.steps,
+                                 calibration=calibration):
+            print('size %g: predicted %d cells, measured %s'
+                  % (res['size'], res['plan']['cells'],
+                     res['sample'] and res['sample']['cells']))
+    elif args.action == 'show':
+        print(calibration.path)
+        print(json.dumps(calibration.factors(), indent=2))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+def _size(kbytes):
+    """Format a memory size given in kilobytes."""
+    for unit in ('kB', 'MB', 'GB'):
+        if kbytes < 1024.:
+            return '{:.1f} {}'.format(kbytes, unit)
+        kbytes /= 1024.
+    return '{:.1f} TB'.format(kbytes)
+
+
+def _duration(seconds):
+    """Format a duration given in seconds."""
+    if seconds < 120.:
+        return '{:.0f} s'.format(seconds)
+    if seconds < 7200.:
+        return '{:.1f} min'.format(seconds / 60.)
+    return '{:.1f} h'.format(seconds / 3600.)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,7 +9,7 @@ See `Results` class for more details.
 
 """
 import os
-from turtle import Turtle
+import sys
 from PyQt5 import Qt as Q
 from PyQt5 import QtWidgets
 from ..common import (wait_cursor, CFG, translate,connect)
@@ -20,7 +20,13 @@ from ..post import (ResultFile, PlotWindow,
                     ColorRep, WarpRep, ModesRep, BaseRep,
                     pvcontrol, show_min_max, selection_probe, selection_plot,
                     get_active_selection, get_pv_mem_use, dbg_print,
-                    RESULTS_PV_LAYOUT_NAME, RESULTS_PV_VIEW_NAME)
+                    MEMORY, ARRAYS, RESULTS_PV_LAYOUT_NAME,
+                    RESULTS_PV_VIEW_NAME, FOAM_CACHE, TIME_LOD, SPATIAL_LOD,
+                    LAZY_ARRAYS)
+from ..post import foamcache
+from ..post.timelod import LodPlayer, StepIndex, TemporalLOD
+from ..post.spatiallod import SurfaceLOD
+from ..post.groupcache import SUBSETS
 
 from . import get_icon
 import pvsimple as pvs
@@ -29,6 +35,16 @@ from ..post.TBridgeDesigner import Ui_Form
 
 __all__ = ["Results"]
 
+# 静力结果(static_res.rmed)的场
+STATIC_ARRAYS = {
+    'DEPL': 'TS0/mesh/ComSup0/reslin__DEPL@@][@@P1',
+    'EFGE_NOEU': 'TS0/mesh/ComSup0/reslin__EFGE_NOEU@@][@@P1',
+    'REAC_NODA': 'TS0/mesh/ComSup0/reslin__REAC_NODA@@][@@P1',
+    'SIEF_ELGA': 'TS0/mesh/ComSup0/reslin__SIEF_ELGA@@][@@GAUSS'}
+
+# 位移/应力(comboBox_53)显示的场
+STATIC_SHOWN = ['DEPL', 'EFGE_NOEU']
+
 # note: the following pragma is added to prevent pylint complaining
 #       about functions that follow Qt naming conventions;
 #       it should go after all global functions
@@ -150,6 +166,29 @@ class Results(Q.QWidget):
         self.currentdisplay1 = None
         self.solidpvd = None
         self.fluidfoam = None
+        self.fluidtime = None
+        self.fluidcase = None
+        self.fluidcached = False
+        self.cacheprocess = None
+        self.cachesteps = 0
+        self.timelod = None
+        self.spatiallod = {}
+        MEMORY.budgetExceeded.connect(self._memoryExceeded)
+
+    def _memoryExceeded(self, used, budget):
+        """
+        Warns the user that the memory budget of paraview is exceeded
+        """
+        released = ', '.join(MEMORY.released[-3:])
+        msg = translate("AsterStudy",
+                        "Memory budget exceeded: {} MB used for {} MB "
+                        "allowed.").format(used // 1024, budget // 1024)
+        if released:
+            msg += ' ' + translate("AsterStudy",
+                                   "Released: {}").format(released)
+        dbg_print(msg)
+        if self.astergui:
+            self.astergui.showNotification(msg, 10000)
 
     def slider_value_changed(self,slider,lineEdit):
         lineEdit.setText(str(slider.value()/10))
@@ -162,18 +201,52 @@ class Results(Q.QWidget):
             slider.setValue(int(10))
             QtWidgets.QMessageBox.information(self, '注意', '请输入数字!')
         
+    def static_arrays(self, fields):
+        """Enables the arrays of the static result needed by the view."""
+        if LAZY_ARRAYS:
+            ARRAYS.require(self.static, 'static',
+                           [STATIC_ARRAYS[field] for field in fields])
+        else:
+            self.static.AllArrays = list(STATIC_ARRAYS.values())
+
+    def static_reader(self, fdir):
+        """Returns the reader of the static result, created once by file."""
+        static = getattr(self, 'static', None)
+        if static is not None and static.FileName == fdir:
+            return static
+        if static is not None:
+            ARRAYS.forget(static)
+            pvs.Delete(static)
+        self.static = pvs.MEDReader(FileName=fdir)
+        return self.static
+
+    def clear_static_display(self):
+        """Removes the current display, the static reader is kept."""
+        warp = getattr(self, 'warpByVector1', None)
+        if warp is not None:
+            pvs.Delete(warp)
+            self.warpByVector1 = None
+        if self.currentdisplay1 is None or self.currentdisplay1 is warp:
+            pass
+        elif self.currentdisplay1 is getattr(self, 'static', None):
+            pvs.Hide(self.static, self.ren_view)
+        else:
+            pvs.Delete(self.currentdisplay1)
+        self.currentdisplay1 = None
+
     def load_static_results(self):
         #self.shown = None
         try:
-            pvs.Delete(self.currentdisplay1)
+            self.clear_static_display()
             self.static_resrmedDisplay.SetScalarBarVisibility(self.ren_view, False)
             self.staticDisplay.SetScalarBarVisibility(self.ren_view, False)
         except Exception as e:
             print(e)
         path = self.result_path
         fdir = os.path.join(path,'static_res.rmed')
-        self.static = pvs.MEDReader(FileName=fdir)
-        self.static.AllArrays = ['TS0/mesh/ComSup0/reslin__DEPL@@][@@P1', 'TS0/mesh/ComSup0/reslin__EFGE_NOEU@@][@@P1', 'TS0/mesh/ComSup0/reslin__REAC_NODA@@][@@P1', 'TS0/mesh/ComSup0/reslin__SIEF_ELGA@@][@@GAUSS']
+        self.static = self.static_reader(fdir)
+        # 只加载显示的位移场(见 post/arrays.py)
+        self.static_arrays(['DEPL'])
         self.staticDisplay = pvs.Show(self.static, self.ren_view)
         self.staticDisplay.Representation = 'Surface'
         materialLibrary1 = pvs.GetMaterialLibrary()
@@ -203,6 +276,10 @@ class Results(Q.QWidget):
         self.warpByVector1 = pvs.WarpByVector(Input=self.static)
                 
     def changeStaicComponent(self):
+        index = self.sidebar.comboBox_53.currentIndex()
+        if index >= 0 and getattr(self, 'static', None) is not None:
+            # 切换着色的场, 不再显示的场被卸载
+            self.static_arrays(['DEPL', STATIC_SHOWN[index]])
         if self.sidebar.comboBox_53.currentIndex()==0:
             array_1 = ['Magnitude','DX','DY','DZ']
             self.sidebar.comboBox_54.clear()
@@ -215,7 +292,7 @@ class Results(Q.QWidget):
     def updateStaticChange(self):
         try:
             # 清除当前显示
-            pvs.Delete(self.currentdisplay1)
+            self.clear_static_display()
             # 清除图例
             self.static_resrmedDisplay.SetScalarBarVisibility(self.ren_view, False)
             self.staticDisplay.SetScalarBarVisibility(self.ren_view, False)
@@ -223,8 +300,10 @@ class Results(Q.QWidget):
             print(e)
         path = self.result_path
         fdir = os.path.join(path,'static_res.rmed')
-        self.static = pvs.MEDReader(FileName=fdir)
-        self.static.AllArrays = ['TS0/mesh/ComSup0/reslin__DEPL@@][@@P1', 'TS0/mesh/ComSup0/reslin__EFGE_NOEU@@][@@P1', 'TS0/mesh/ComSup0/reslin__REAC_NODA@@][@@P1', 'TS0/mesh/ComSup0/reslin__SIEF_ELGA@@][@@GAUSS']
+        self.static = self.static_reader(fdir)
+        # 位移场用于变形, 另加载着色的场
+        self.static_arrays(['DEPL', STATIC_SHOWN[
+            self.sidebar.comboBox_53.currentIndex()]])
         self.staticDisplay = pvs.Show(self.static, self.ren_view)
         self.staticDisplay.Representation = 'Surface'
         materialLibrary1 = pvs.GetMaterialLibrary()
@@ -421,6 +500,10 @@ class Results(Q.QWidget):
             self.pv_widget_children = []
             self.pv_widget = None
 
+        for lod in self.spatiallod.values():
+            lod.close()
+        self.spatiallod = {}
+
         # This forces the creation of new overlay buttons upon restarting
         # the AsterStudy results tab
         self.pv_overlay = None
@@ -505,6 +588,7 @@ class Results(Q.QWidget):
             dbg_print("  Finished in %d seconds..." % int(end - start))
 
             self._finalize_pv_widget()
+            MEMORY.start()
         else:
             self.update_pv_layout_view()
             self._finalize_pv_widget()
@@ -794,7 +878,13 @@ class Results(Q.QWidget):
 
     def refresh(self):
         pvs.ReloadFiles(self.solidpvd)
-        pvs.ReloadFiles(self.fluidfoam)
+        if self.fluidcached:
+            # 缓存由后台进程追加, 重新读取时间步
+            proxy = self.fluidfoam.SMProxy
+            proxy.MarkModified(proxy)
+            self.fluidfoam.UpdatePipelineInformation()
+        else:
+            pvs.ReloadFiles(self.fluidfoam)
 
     def clear_paraview_pipeline(self):
         """
@@ -802,11 +892,21 @@ class Results(Q.QWidget):
         refreshes the current representation
         """
         wait_cursor(True)
+        self.clear_timelod()
         self.shown.clear_sources()
         self.clear_readers()
         self.redraw()
         wait_cursor(False)
 
+    def clear_timelod(self):
+        """
+        Stops and drops the decimated playback of the tank series
+        (see timelod.py)
+        """
+        if self.timelod is not None:
+            self.timelod.stop()
+            self.timelod = None
+
     def clear_readers(self):
         """
         Clears readers from the paraview pipeline not relevant
@@ -827,6 +927,7 @@ class Results(Q.QWidget):
                     setattr(prev, source, None)
                     if not src:
                         continue
+                    MEMORY.forget(src)
                     try:
                         pvs.Delete(src)
                     except RuntimeError:
@@ -836,6 +937,7 @@ class Results(Q.QWidget):
 
         for path in to_remove:
             self.previous.pop(path, None)
+            SUBSETS.hold(path, None)
 
         for source in ['mode_source', 'dup_source']:
             if hasattr(self.current, source):
@@ -843,6 +945,7 @@ class Results(Q.QWidget):
                 setattr(self.current, source, None)
                 if not src:
                     continue
+                MEMORY.forget(src)
                 try:
                     pvs.Delete(src)
                 except RuntimeError:
@@ -890,6 +993,8 @@ class Results(Q.QWidget):
         # Initialize paraview widget in asterstudy gui
         # (this can take a few seconds on first load)
         new_load = True
+        # 播放 MED 结果时不使用 tank.pvd 的抽取播放
+        self.clear_timelod()
 
         self.init_paraview(full_load_pv=full_load_pv)
         self.shown = None
@@ -1084,8 +1189,15 @@ class Results(Q.QWidget):
         else:
             # fname = '/home/export/online1/amd_app/TanksimulatorProject/testnew01/Solid/tank.pvd'
             Q.QMessageBox.information(self, '错误', '工程目录不存在后处理文件！')
+        MEMORY.forget(self.solidpvd)
         self.solidpvd = pvs.PVDReader(FileName=fname)
+        MEMORY.register(self.solidpvd, 'reader', 'tank.pvd')
         self.alltimes = self.solidpvd.TimestepValues
+        if TIME_LOD:
+            # 播放时按目标帧率抽取时间步
+            self.clear_timelod()
+            self.timelod = LodPlayer(TemporalLOD(StepIndex(fname)), parent=self)
+            self.timelod.finished.connect(self._playbackFinished)
 
         for array in self.solidpvd.PointArrays:
             self.sidebar.comboBox_5.addItem(array)
@@ -1103,6 +1215,7 @@ class Results(Q.QWidget):
         # self.ren_view = pvs.GetActiveView()
 
         # self.ren_view.ResetCamera()
+        previous = getattr(self, 'tankpvdDisplay', None)
         self.tankpvdDisplay = pvs.Show(self.solidpvd, self.ren_view)
 
         annotateTimeFilter1 = pvs.AnnotateTimeFilter(Input=self.solidpvd)
@@ -1149,6 +1262,8 @@ class Results(Q.QWidget):
         # rescale color and/or opacity maps used to exactly fit the current data range
         self.tankpvdDisplay.RescaleTransferFunctionToDataRange(False, True)
         self.currentdisplay = self.tankpvdDisplay
+        self.track_lod(self.ren_view, self.tankpvdDisplay, self.solidpvd,
+                       previous)
 
         if path:
             fname = os.path.join(path,'Fluid','Fluid.foam')
@@ -1156,12 +1271,28 @@ class Results(Q.QWidget):
             # fname = '/home/export/online1/amd_app/TanksimulatorProject/testnew01/Fluid/Fluid.foam'
             # fname = '/home/export/online1/amd_app/TanksimulatorProject/testmonpoint/Fluid/Fluid.foam'
             return
-        self.fluidfoam = pvs.OpenFOAMReader(FileName=fname)
+        MEMORY.forget(self.fluidfoam)
+        self.fluidcase = path
+        # 新的算例重新统计已缓存的时间步
+        self.cachesteps = 0
+        # 缓存覆盖全部时间步时直接读取缓存, 否则读取分解算例并在后台生成缓存
+        self.fluidcached = FOAM_CACHE and foamcache.cache_ready(path)
+        if self.fluidcached:
+            self.fluidfoam = foamcache.pv_cache_source(path)
+            MEMORY.register(self.fluidfoam, 'reader', foamcache.CACHE_NAME)
+            arrays = foamcache.cache_fields(path)
+        else:
+            self.fluidfoam = pvs.OpenFOAMReader(FileName=fname)
+            MEMORY.register(self.fluidfoam, 'reader', 'Fluid.foam')
+            self.fluidfoam.CaseType = 'Decomposed Case'
+            arrays = self.fluidfoam.CellArrays
+            if FOAM_CACHE:
+                self.build_fluid_cache()
 
         # set active source
         pvs.SetActiveSource(self.fluidfoam)
 
-        for array in self.fluidfoam.CellArrays:
+        for array in arrays:
             self.sidebar.comboBox_7.addItem(array)
 
         #根据分量选择改变表示内容
@@ -1186,14 +1317,12 @@ class Results(Q.QWidget):
         # connect(self.sidebar.groupBox_2.clicked[bool], self._meshActivated)  
         # connect(self.sidebar.groupBox_4.clicked[bool], self._meshActivated)
         
-        #self.fluidfoam
-        self.fluidfoam.CaseType = 'Decomposed Case'
-
         # show data in view
+        previous = getattr(self, 'fluidfoamDisplay', None)
         self.fluidfoamDisplay = pvs.Show(self.fluidfoam, self.ren_view1)
 
-        annotateTimeFilter = pvs.AnnotateTimeFilter(Input=self.fluidfoam)
-        annotateTimeFilterDisplay = pvs.Show(annotateTimeFilter, self.ren_view1)
+        self.fluidtime = pvs.AnnotateTimeFilter(Input=self.fluidfoam)
+        annotateTimeFilterDisplay = pvs.Show(self.fluidtime, self.ren_view1)
         # annotateTimeFilterDisplay.Color = [0.0, 0.0, 0.5000076295109483]
 
         self.fluidfoamDisplay.Ambient = 0.48
@@ -1209,6 +1338,110 @@ class Results(Q.QWidget):
 
         self.fluidfoamDisplay.SetScalarBarVisibility(self.ren_view1, True)
         self.currentdisplay1 = self.fluidfoamDisplay
+        self.track_lod(self.ren_view1, self.fluidfoamDisplay, self.fluidfoam,
+                       previous)
+
+    def surface_lod(self, view):
+        """
+        Returns the spatial level of detail of a view (see spatiallod.py),
+        *None* if disabled
+        """
+        if not SPATIAL_LOD or view is None:
+            return None
+        lod = self.spatiallod.get(view)
+        if lod is None:
+            lod = self.spatiallod[view] = SurfaceLOD(view, parent=self)
+        return lod
+
+    def track_lod(self, view, display, source, previous=None):
+        """
+        Precomputes the decimated surface shown instead of *display*
+        during the camera interactions, *previous* is the display that
+        *display* replaces (no longer tracked)
+        """
+        lod = self.surface_lod(view)
+        if lod is None:
+            return
+        if previous is not None and previous is not display:
+            lod.untrack(previous)
+        lod.track(display, source)
+
+    def _playbackFinished(self, stats):
+        for lod in self.spatiallod.values():
+            lod.resume()
+        self.play_btn.setVisible(True)
+        self.pause_btn.setVisible(False)
+        self.update_infobar()
+        dbg_print('playback: {frames} frames in {elapsed:.1f} s, '
+                  '{fps:.1f} fps'.format(**stats))
+
+    def build_fluid_cache(self):
+        """
+        在后台生成流体结果的快速浏览缓存(见 foamcache.py),
+        生成结束后自动切换到缓存; 计算进行中时重复生成, 直到缓存覆盖已写出的时间步
+        """
+        if self.cacheprocess is not None:
+            self.cacheprocess.finished.disconnect()
+            self.cacheprocess.kill()
+            self.cacheprocess.waitForFinished()
+        self.cacheprocess = Q.QProcess(self)
+        self.cacheprocess.setProcessChannelMode(Q.QProcess.MergedChannels)
+        connect(self.cacheprocess.readyRead, self._cacheOutput)
+        self.cacheprocess.finished.connect(self._cacheFinished)
+        self.cacheprocess.start(sys.executable,
+                                ['-m', 'asterstudy.post.foamcache', 'build',
+                                 self.fluidcase])
+
+    def _cacheOutput(self):
+        output = bytes(self.cacheprocess.readAll()).decode(errors='replace')
+        dbg_print(output.rstrip())
+
+    def _cacheFinished(self, exitcode, _):
+        self.cacheprocess = None
+        if exitcode == 0 and not foamcache.cache_ready(self.fluidcase):
+            # 生成期间流体计算写出了新的时间步, 只追加新的时间步
+            cache = foamcache.CacheFile(foamcache.cache_path(self.fluidcase))
+            steps = len(cache.times) if cache.load() else 0
+            if steps > self.cachesteps:
+                self.cachesteps = steps
+                self.build_fluid_cache()
+                return
+        if exitcode != 0 or not foamcache.cache_ready(self.fluidcase):
+            dbg_print('fluid cache not available: {}'.format(self.fluidcase))
+            return
+        self.switch_fluid_source(foamcache.pv_cache_source(self.fluidcase))
+        self.fluidcached = True
+
+    def switch_fluid_source(self, source):
+        """
+        用 *source* 替换流体视图的数据源, 保留当前显示的场和切片
+        """
+        previous = self.fluidfoam
+        lod = self.surface_lod(self.ren_view1)
+        if lod is not None:
+            lod.untrack(self.fluidfoamDisplay)
+        MEMORY.forget(previous)
+        self.fluidfoam = source
+        MEMORY.register(source, 'reader', foamcache.CACHE_NAME)
+        self.fluidtime.Input = source
+        for filtr in (self.clip2, self.threshold1):
+            if filtr is not None:
+                filtr.Input = source
+        visible = self.currentdisplay1 is self.fluidfoamDisplay
+        pvs.Hide(previous, self.ren_view1)
+        self.fluidfoamDisplay = pvs.Show(source, self.ren_view1)
+        self.fluidfoamDisplay.Ambient = 0.48
+        self.fluidfoamDisplay.Representation = 'Surface'
+        if visible:
+            self.currentdisplay1 = self.fluidfoamDisplay
+        else:
+            pvs.Hide(source, self.ren_view1)
+        arrayname = self.sidebar.comboBox_7.currentText()
+        if arrayname:
+            pvs.ColorBy(self.fluidfoamDisplay, ('POINTS', arrayname))
+        pvs.Delete(previous)
+        self.track_lod(self.ren_view1, self.fluidfoamDisplay, source)
+        self.updateview()
 
     def resetview(self,needreset):
         if not needreset:
@@ -1460,6 +1693,7 @@ class Results(Q.QWidget):
         wait_cursor(True)
 
         updated = False
+        previous = getattr(self.shown, 'display', None)
         # if isinstance(self.shown, repclass) and not forced:
         if isinstance(self.shown, repclass) and not forced:
             if self.shown.field == field:
@@ -1482,6 +1716,9 @@ class Results(Q.QWidget):
         if self.minmax_shown():
             show_min_max(self.shown)
 
+        self.track_lod(self.ren_view, self.shown.display, self.shown.source,
+                       previous)
+
         wait_cursor(False)
 
         # Render the new or modified representation
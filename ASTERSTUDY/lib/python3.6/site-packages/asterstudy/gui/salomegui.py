@@ -25,6 +25,7 @@ from ..common import (FilesSupplier, MeshElemType, common_filters,
                       debug_message, enable_except_hook,
                       external_files_callback, get_base_name, get_file_name,
                       info_message, is_medfile, translate)
+from ..common.importprofile import finish_import_profile, mark_startup
 from . import Context, NodeType, Panel, WorkingMode, check_selection, str2font
 from .astergui import AsterGui
 from .behavior import behavior
@@ -705,6 +706,9 @@ class AsterSalomeGui(AsterGui):
             # 只在load()后的第一次activate()中需要上述步骤
             self.currentpath = None
         self._loader.terminate()
+        mark_startup('activated')
+        # first turn of the event loop: the window is shown and interactive
+        Q.QTimer.singleShot(0, finish_import_profile)
         return True
 
     def deactivate(self):
@@ -902,7 +906,8 @@ class AsterSalomeGui(AsterGui):
 
         # Controller.abortAll()
 
-        self.work_space.result01.detach(keep_pipeline=False)
+        if self.work_space.isResultsLoaded():
+            self.work_space.result01.detach(keep_pipeline=False)
 
         self.work_space = None
         
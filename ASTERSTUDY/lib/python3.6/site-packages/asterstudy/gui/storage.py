@@ -0,0 +1,1093 @@
+"""
+Disk usage and retention
+------------------------
+
+Accounting of the disk space used by the runs and cleaning of their
+intermediate files.
+
+The runs accumulate files that nobody removes: one
+``Mesh_{w}_{h}_{l}_{sections}_{spacing}.med`` per parameter set of the
+truss bridge, the processor directories of the decomposed fluid case,
+the ``.rout``/``.rin`` restart files and the VTU files of each step of
+the solid.
+
+`StorageIndex` attributes the disk usage to the projects, the runs (the
+directories found as in the catalog, see `catalog.run_kind`) and the
+artifact classes of `ARTIFACTS`. It keeps, in a local SQLite database,
+the usage of each directory: a directory whose modification time did
+not change is not listed again (a file growing in place, such as a
+log, is seen by a full scan only).
+
+`RetentionPolicy` gives the runs kept untouched:
+
+- the *keep_latest* most recently modified runs of each project,
+- the pinned runs (a ``.pinned`` file in the run directory),
+- the runs modified in the last *idle* hours (running),
+
+and the classes of intermediate files removed from the other runs, when
+they can be regenerated or are saved elsewhere:
+
+- ``restart``: restart files of the solid stages,
+- ``steps``: VTU files of the steps converted from an FRD file of the
+  same directory, or saved unchanged in the verified archive of the run
+  (`post.archive`), with the PVD files listing them (`Frd2pvd` converts
+  the FRD files again from their beginning),
+- ``meshes``: parameter meshes of a bridge but the last one,
+- ``decomposed`` (not purged by default): time directories of the
+  processor directories but the latest one, once reconstructed in the
+  case or saved unchanged in the verified archive.
+
+The policy is read from ``~/.asterstudy/retention.json`` (or the file
+given by ``ASTERSTUDY_RETENTION``), the database is
+``~/.asterstudy/storage.db`` or ``ASTERSTUDY_STORAGE``.
+
+`StoragePanel` shows the usage by project, run and class; the scan and
+the cleaning run in a background thread (`StorageThread`), the panel
+shows the cost of the scan and the space reclaimed.
+
+Example::
+
+    python3 -m asterstudy.gui.storage scan ~/Tanksimulator
+    python3 -m asterstudy.gui.storage usage --by class
+    python3 -m asterstudy.gui.storage clean --dry-run
+    python3 -m asterstudy.gui.storage bench --runs 300
+"""
+
+import fnmatch
+import json
+import os
+import os.path as osp
+import shutil
+import sqlite3
+import sys
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+from PyQt5 import Qt as Q
+
+from .catalog import MAX_DEPTH, MESH_NAME, SKIPPED, default_roots, run_kind
+
+
+STORAGE_ENV = 'ASTERSTUDY_STORAGE'
+POLICY_ENV = 'ASTERSTUDY_RETENTION'
+
+SCHEMA_VERSION = 1
+
+# Marker of a pinned run
+PIN_FILE = '.pinned'
+
+# Artifact classes of the files of a run (first match wins), the time
+# directories of the processor directories are 'decomposed'
+ARTIFACTS = OrderedDict([
+    ('restart', ('*.rout', '*.rin')),
+    ('steps', ('*.vtu', '*.vtk')),
+    ('meshes', ('Mesh_*.med', '*.unv')),
+    ('results', ('*.rmed', '*.frd', '*.pvd', '*.tscache', '*.rarc',
+                 'result.json')),
+    ('logs', ('log.*', '*.mess', '*.log', '*.sta', '*.cvg', '*.dat',
+              '*.out')),
+])
+DECOMPOSED = 'decomposed'
+OTHER = 'inputs'
+CLASSES = (DECOMPOSED,) + tuple(ARTIFACTS) + (OTHER,)
+
+LABELS = {'decomposed': '分区结果', 'restart': '重启动', 'steps': '时间步',
+          'meshes': '网格', 'results': '结果', 'logs': '日志',
+          'inputs': '输入及其他'}
+KEPT_LABELS = {'pinned': '固定', 'latest': '最近', 'active': '运行中'}
+
+# Default retention
+KEEP_LATEST = 3
+PURGED = ('restart', 'steps', 'meshes')
+IDLE_HOURS = 24
+
+
+def artifact_class(parts, name):
+    """Return the artifact class of a file.
+
+    Arguments:
+        parts (tuple[str]): Directories of the file below the run.
+        name (str): File name.
+    """
+    for index, part in enumerate(parts[:-1]):
+        if part.startswith('processor'):
+            if parts[index + 1] not in ('0', 'constant'):
+                return DECOMPOSED
+            break
+    for kind, patterns in ARTIFACTS.items():
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+            return kind
+    return OTHER
+
+
+def human_size(nbytes):
+    """Format a number of bytes."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(nbytes) < 1024.:
+            return '{:.1f} {}'.format(nbytes, unit)
+        nbytes /= 1024.
+    return '{:.1f} TB'.format(nbytes)
+
+
+def _add(usage, other):
+    for kind, (files, size) in other.items():
+        item = usage.setdefault(kind, [0, 0])
+        item[0] += files
+        item[1] += size
+
+
+def _total(usage):
+    return sum(size for _, size in usage.values())
+
+
+# Retention ------------------------------------------------------------------
+
+class RetentionPolicy:
+    """Runs kept untouched and classes of files removed from the others.
+
+    Arguments:
+        keep_latest (Optional[int]): Most recent runs kept by project.
+        purge (Optional[list[str]]): Classes removed (see `PURGERS`).
+        idle (Optional[float]): Runs modified in the last *idle* hours
+            are kept.
+    """
+
+    def __init__(self, keep_latest=KEEP_LATEST, purge=PURGED,
+                 idle=IDLE_HOURS):
+        unknown = set(purge).difference(PURGERS)
+        if unknown:
+            raise ValueError('unknown class: ' + ', '.join(sorted(unknown)))
+        self.keep_latest = keep_latest
+        self.purge = tuple(purge)
+        self.idle = idle
+
+    @staticmethod
+    def default_path():
+        """Return the file of the policy."""
+        return os.getenv(POLICY_ENV) or osp.join(
+            osp.expanduser('~'), '.asterstudy', 'retention.json')
+
+    @classmethod
+    def load(cls, path=None):
+        """Read a policy, the default one if the file does not exist."""
+        try:
+            with open(path or cls.default_path()) as fobj:
+                return cls(**json.load(fobj))
+        except FileNotFoundError:
+            return cls()
+
+    def save(self, path=None):
+        """Write the policy."""
+        path = path or self.default_path()
+        os.makedirs(osp.dirname(osp.abspath(path)), exist_ok=True)
+        with open(path, 'w') as fobj:
+            json.dump(self.asdict(), fobj, indent=1)
+
+    def asdict(self):
+        """Return the policy as a dict."""
+        return OrderedDict([('keep_latest', self.keep_latest),
+                            ('purge', list(self.purge)),
+                            ('idle', self.idle)])
+
+    def kept(self, runs, now=None):
+        """Return the reason why runs are kept.
+
+        Arguments:
+            runs (list[dict]): Runs (path, root, project, mtime, pinned).
+
+        Returns:
+            dict: 'pinned', 'latest' or 'active' by path of the runs kept.
+        """
+        now = time.time() if now is None else now
+        reasons = {}
+        projects = {}
+        for run in runs:
+            projects.setdefault((run['root'], run['project']), []).append(run)
+        for items in projects.values():
+            items.sort(key=lambda run: run['mtime'], reverse=True)
+            for run in items[:self.keep_latest]:
+                reasons[run['path']] = 'latest'
+        for run in runs:
+            if run['mtime'] > now - self.idle * 3600.:
+                reasons[run['path']] = 'active'
+            if run['pinned']:
+                reasons[run['path']] = 'pinned'
+        return reasons
+
+
+def _walk_size(path):
+    """Return the size of a file or a directory tree (as in the scan)."""
+    if not osp.isdir(path) or osp.islink(path):
+        paths = [path]
+    else:
+        paths = [osp.join(folder, name) for folder, _, files in os.walk(path)
+                 for name in files]
+    total = 0
+    for name in paths:
+        stat = os.lstat(name)
+        total += stat.st_size // max(stat.st_nlink, 1)
+    return total
+
+
+# Archives verified, by (path, size, modification time)
+_VERIFIED = {}
+
+
+def _archive_members(run):
+    """Return the members of the archive of a run, *None* if there is
+    no archive or if it is not verified."""
+    from ..post.archive import Archive, ArchiveError, archive_path
+    path = archive_path(run)
+    try:
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime)
+        with Archive(path) as archive:
+            if key not in _VERIFIED:
+                _VERIFIED[key] = not archive.verify()
+            return archive.members if _VERIFIED[key] else None
+    except (OSError, ArchiveError):
+        return None
+
+
+def _archived(run, paths):
+    """Tell if files (or the files of directories) are saved unchanged
+    in the verified archive of the run."""
+    members = _archive_members(run)
+    if members is None:
+        return False
+    for path in paths:
+        names = [path] if not osp.isdir(path) else [
+            osp.join(folder, name) for folder, _, files in os.walk(path)
+            for name in files]
+        for name in names:
+            stat = os.lstat(name)
+            member = members.get(osp.relpath(name, run))
+            if member is None or member['size'] != stat.st_size or \
+                    member['mtime'] != stat.st_mtime:
+                return False
+    return True
+
+
+def _pvd_files(path):
+    """Return the files listed by a PVD file, *None* if unreadable."""
+    try:
+        root = ET.parse(path).getroot()
+    except (ET.ParseError, OSError):
+        return None
+    return [osp.normpath(osp.join(osp.dirname(path), item.get('file', '')))
+            for item in root.iter('DataSet')]
+
+
+def _purge_restart(run):
+    """Restart files of the solid stages."""
+    found = []
+    for folder, _, files in os.walk(run):
+        found += [osp.join(folder, name) for name in files
+                  if name.endswith(('.rout', '.rin'))]
+    return found
+
+
+def _purge_steps(run):
+    """VTU files converted from an FRD file of their directory, or
+    archived, and the PVD files listing them.
+
+    A PVD file listing a step that is kept keeps all its steps: the
+    conversion of the FRD files (`Frd2pvd`) resumes from the offset
+    saved in the PVD file, it starts again from the beginning once the
+    PVD file is removed.
+    """
+    found = []
+    for folder, _, files in os.walk(run):
+        jobs = set(name[:-4] for name in files if name.endswith('.frd'))
+        steps = [osp.join(folder, name) for name in files
+                 if name.endswith(('.vtu', '.vtk'))]
+        if not steps:
+            continue
+        pvds = [osp.join(folder, name) for name in files
+                if name.endswith('.pvd')]
+        if not jobs and not _archived(run, steps + pvds):
+            continue
+        purged = set(step for step in steps
+                     if not jobs or osp.basename(step).split('.')[0] in jobs)
+        series = {}
+        for pvd in pvds:
+            listed = _pvd_files(pvd)
+            if listed is not None:
+                series[pvd] = set(name for name in listed
+                                  if osp.exists(name))
+        kept = True
+        while kept:
+            kept = [pvd for pvd, listed in series.items()
+                    if not listed <= purged]
+            for pvd in kept:
+                purged.difference_update(series.pop(pvd))
+        found += sorted(series) + sorted(purged)
+    return found
+
+
+def _is_time(name):
+    try:
+        float(name)
+    except ValueError:
+        return False
+    return True
+
+
+def _reconstructed(fluid, name, path):
+    """Tell if a time directory of a processor is reconstructed in the
+    case (the same fields in the time directory of the case)."""
+    target = osp.join(fluid, name)
+    return osp.isdir(target) and \
+        set(os.listdir(path)) <= set(os.listdir(target))
+
+
+def _purge_decomposed(run):
+    """Time directories of the processor directories but the latest
+    one, reconstructed in the case or archived."""
+    fluid = osp.join(run, 'Fluid')
+    if not osp.isdir(fluid):
+        return []
+    times = {}
+    for proc in sorted(os.listdir(fluid)):
+        if not proc.startswith('processor') or \
+                not osp.isdir(osp.join(fluid, proc)):
+            continue
+        for name in sorted(os.listdir(osp.join(fluid, proc))):
+            path = osp.join(fluid, proc, name)
+            if name != '0' and _is_time(name) and osp.isdir(path):
+                times.setdefault(name, []).append(path)
+    found = []
+    # the latest time is kept to continue the run
+    for name in sorted(times, key=float)[:-1]:
+        paths = times[name]
+        if all(_reconstructed(fluid, name, path) for path in paths) or \
+                _archived(run, paths):
+            found += paths
+    return found
+
+
+def _purge_meshes(run):
+    """Parameter meshes of a bridge but the last modified one."""
+    meshes = [osp.join(run, name) for name in os.listdir(run)
+              if MESH_NAME.match(name)]
+    meshes.sort(key=osp.getmtime)
+    return meshes[:-1]
+
+
+# Files or directories removed by class
+PURGERS = OrderedDict([('restart', _purge_restart), ('steps', _purge_steps),
+                       ('decomposed', _purge_decomposed),
+                       ('meshes', _purge_meshes)])
+
+
+# Index ----------------------------------------------------------------------
+
+class StorageIndex:
+    """Disk usage of the runs, by directory.
+
+    Arguments:
+        path (Optional[str]): Database, ``ASTERSTUDY_STORAGE`` or
+            ``~/.asterstudy/storage.db`` by default.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(STORAGE_ENV) or osp.join(
+            osp.expanduser('~'), '.asterstudy', 'storage.db')
+        if self.path != ':memory:':
+            os.makedirs(osp.dirname(osp.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self._create()
+
+    def _create(self):
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            with self.db:
+                for table in ('dirs', 'runs', 'purges'):
+                    self.db.execute('DROP TABLE IF EXISTS ' + table)
+        with self.db:
+            self.db.executescript('''
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY, mtime REAL, kind TEXT,
+                    subdirs TEXT, usage TEXT, newest REAL);
+                CREATE TABLE IF NOT EXISTS runs (
+                    path TEXT PRIMARY KEY, root TEXT, project TEXT,
+                    kind TEXT, mtime REAL, pinned INTEGER, usage TEXT,
+                    total INTEGER);
+                CREATE TABLE IF NOT EXISTS purges (
+                    time REAL, run TEXT, class TEXT, files INTEGER,
+                    bytes INTEGER);
+            ''')
+            self.db.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def close(self):
+        """Close the database."""
+        self.db.close()
+
+    # scan
+
+    def scan(self, roots=None, full=False, callback=None):
+        """Measure the disk usage of the runs under project roots.
+
+        Arguments:
+            roots (Optional[list[str]]): Project roots, `default_roots`
+                if *None*.
+            full (Optional[bool]): List all the directories again,
+                whatever their modification times.
+            callback (Optional[callable]): Called with the number of
+                runs seen, every 100 runs.
+
+        Returns:
+            dict: Numbers of directories (seen, listed and reused),
+            of files examined, of runs, bytes used and elapsed time (s).
+        """
+        start = time.time()
+        stats = dict(dirs=0, listed=0, reused=0, files=0, runs=0, bytes=0)
+        cached = {row[0]: row[1:] for row in self.db.execute(
+            'SELECT path, mtime, kind, subdirs, usage, newest FROM dirs')}
+        dirs, runs, seen = [], [], set()
+
+        def _list(path, parts):
+            entries, subdirs = {}, []
+            try:
+                with os.scandir(path) as items:
+                    for item in items:
+                        try:
+                            if item.is_dir(follow_symlinks=False):
+                                subdirs.append(item.name)
+                            else:
+                                entries[item.name] = item.stat(
+                                    follow_symlinks=False)
+                        except OSError:
+                            continue
+            except OSError:
+                return None
+            stats['listed'] += 1
+            stats['files'] += len(entries)
+            kind = run_kind(entries) if parts is None else None
+            usage = {}
+            if parts is not None or kind is not None:
+                for name, stat in entries.items():
+                    cls = artifact_class(parts or (), name)
+                    item = usage.setdefault(cls, [0, 0])
+                    item[0] += 1
+                    # the hard links share their size
+                    item[1] += stat.st_size // max(stat.st_nlink, 1)
+            # modification of the data, not of the directory (changed by
+            # a cleaning)
+            newest = max([stat.st_mtime for name, stat in entries.items()
+                          if name != PIN_FILE] or [0.])
+            return kind, sorted(subdirs), usage, newest, PIN_FILE in entries
+
+        def _visit(path, root, depth, run, parts):
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                return
+            stats['dirs'] += 1
+            seen.add(path)
+            row = cached.get(path)
+            if not full and row is not None and row[0] == mtime:
+                stats['reused'] += 1
+                kind, subdirs, usage, newest = row[1], json.loads(row[2]), \
+                    json.loads(row[3]), row[4]
+                pinned = kind is not None and osp.exists(
+                    osp.join(path, PIN_FILE))
+            else:
+                listed = _list(path, parts)
+                if listed is None:
+                    return
+                kind, subdirs, usage, newest, pinned = listed
+                dirs.append((path, mtime, kind, json.dumps(subdirs),
+                             json.dumps(usage), newest))
+            if run is None and kind is not None:
+                rel = osp.relpath(path, root).split(os.sep)
+                run = dict(path=path, root=root, kind=kind, mtime=newest,
+                           pinned=pinned, usage={},
+                           project=rel[0] if len(rel) > 1 else '.')
+                runs.append(run)
+                stats['runs'] += 1
+                if callback is not None and not stats['runs'] % 100:
+                    callback(stats['runs'])
+                parts = ()
+            if run is not None:
+                _add(run['usage'], usage)
+                run['mtime'] = max(run['mtime'], newest)
+            elif depth >= MAX_DEPTH:
+                return
+            for name in subdirs:
+                if run is None and any(fnmatch.fnmatchcase(name, pattern)
+                                       for pattern in SKIPPED):
+                    continue
+                _visit(osp.join(path, name), root, depth + 1, run,
+                       None if run is None else parts + (name,))
+
+        scanned = []
+        for root in (default_roots() if roots is None else roots):
+            root = osp.abspath(root)
+            scanned.append(root)
+            first = len(runs)
+            _visit(root, root, 0, None, None)
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO dirs VALUES '
+                                    '(?, ?, ?, ?, ?, ?)', dirs)
+                prefix = root.rstrip(os.sep) + os.sep
+                self.db.execute(
+                    'DELETE FROM runs WHERE path = ? OR substr(path, 1, ?) '
+                    '= ?', (root, len(prefix), prefix))
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO runs VALUES '
+                    '(?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(run['path'], root, run['project'], run['kind'],
+                      run['mtime'], int(run['pinned']),
+                      json.dumps(run['usage']), _total(run['usage']))
+                     for run in runs[first:]])
+            del dirs[:]
+        stats['bytes'] = sum(_total(run['usage']) for run in runs)
+        prefixes = tuple(root.rstrip(os.sep) + os.sep for root in scanned)
+        with self.db:
+            self.db.executemany('DELETE FROM dirs WHERE path = ?', [
+                (path,) for path in cached if path not in seen and
+                (path in scanned or path.startswith(prefixes))])
+        stats['elapsed'] = time.time() - start
+        return stats
+
+    # usage
+
+    def runs(self, root=None):
+        """Return the runs (dicts of path, root, project, kind, mtime,
+        pinned, usage by class and total), the largest first."""
+        sql = 'SELECT * FROM runs'
+        args = ()
+        if root is not None:
+            sql += ' WHERE root = ?'
+            args = (osp.abspath(root),)
+        cursor = self.db.execute(sql + ' ORDER BY total DESC', args)
+        names = [column[0] for column in cursor.description]
+        rows = []
+        for values in cursor:
+            row = dict(zip(names, values))
+            row['usage'] = json.loads(row['usage'])
+            row['pinned'] = bool(row['pinned'])
+            rows.append(row)
+        return rows
+
+    def usage(self, by='project'):
+        """Return the usage by project, run or class.
+
+        Returns:
+            OrderedDict: Number of files and bytes by key, the largest
+            first.
+        """
+        totals = {}
+        for run in self.runs():
+            if by == 'class':
+                _add(totals, run['usage'])
+                continue
+            key = run['path'] if by == 'run' else osp.join(run['root'],
+                                                           run['project'])
+            _add(totals, {key: [sum(files for files, _ in
+                                    run['usage'].values()), run['total']]})
+        return OrderedDict(sorted(totals.items(),
+                                  key=lambda item: -item[1][1]))
+
+    def reclaimed(self, since=0.):
+        """Return the bytes removed by the cleanings since a date."""
+        return self.db.execute('SELECT COALESCE(SUM(bytes), 0) FROM purges '
+                               'WHERE time >= ?', (since,)).fetchone()[0]
+
+    # retention
+
+    def plan(self, policy=None, roots=None):
+        """Return the files removed by a retention policy.
+
+        Arguments:
+            policy (Optional[RetentionPolicy]): Policy, the saved one by
+                default.
+            roots (Optional[list[str]]): Project roots, only their runs
+                are cleaned (all the indexed runs if *None*).
+
+        Returns:
+            list[dict]: Run, class, paths (files or directories) and
+            bytes, for each run and class with something to remove.
+        """
+        policy = policy or RetentionPolicy.load()
+        runs = self.runs()
+        if roots is not None:
+            roots = [osp.abspath(root) for root in roots]
+            runs = [run for run in runs
+                    if any(run['path'] == root or
+                           run['path'].startswith(osp.join(root, ''))
+                           for root in roots)]
+        kept = policy.kept(runs)
+        plan = []
+        for run in runs:
+            if run['path'] in kept or not osp.isdir(run['path']):
+                continue
+            for kind in policy.purge:
+                if not run['usage'].get(kind, [0, 0])[1]:
+                    continue
+                paths = PURGERS[kind](run['path'])
+                if paths:
+                    plan.append(dict(run=run['path'], kind=kind, paths=paths,
+                                     bytes=sum(_walk_size(path)
+                                               for path in paths)))
+        return plan
+
+    def apply(self, policy=None, dry_run=False, callback=None, roots=None):
+        """Remove the intermediate files of the runs not kept.
+
+        Arguments:
+            policy (Optional[RetentionPolicy]): Policy, the saved one by
+                default.
+            dry_run (Optional[bool]): Only compute what would be removed.
+            callback (Optional[callable]): Called with the bytes removed
+                after each run and class.
+            roots (Optional[list[str]]): Project roots, only their runs
+                are cleaned (all the indexed runs if *None*).
+
+        Returns:
+            dict: Numbers of runs and paths, bytes (removed or to
+            remove) by class, errors and elapsed time (s).
+        """
+        start = time.time()
+        plan = self.plan(policy, roots)
+        stats = dict(runs=len(set(item['run'] for item in plan)), paths=0,
+                     bytes=0, classes={}, errors=[])
+        records = []
+        for item in plan:
+            for path in item['paths']:
+                if dry_run:
+                    continue
+                try:
+                    if osp.isdir(path) and not osp.islink(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError as exc:
+                    stats['errors'].append('{}: {}'.format(path, exc))
+            stats['paths'] += len(item['paths'])
+            stats['bytes'] += item['bytes']
+            stats['classes'][item['kind']] = stats['classes'].get(
+                item['kind'], 0) + item['bytes']
+            records.append((time.time(), item['run'], item['kind'],
+                            len(item['paths']), item['bytes']))
+            if callback is not None:
+                callback(stats['bytes'])
+        if not dry_run:
+            with self.db:
+                self.db.executemany('INSERT INTO purges VALUES '
+                                    '(?, ?, ?, ?, ?)', records)
+        stats['elapsed'] = time.time() - start
+        return stats
+
+
+def pin(run, pinned=True):
+    """Pin (or unpin) a run: it is never cleaned."""
+    path = osp.join(run, PIN_FILE)
+    if pinned:
+        with open(path, 'w') as fobj:
+            fobj.write(time.strftime('%Y-%m-%d %H:%M\n'))
+    elif osp.exists(path):
+        os.remove(path)
+
+
+# GUI ------------------------------------------------------------------------
+
+class StorageThread(Q.QThread):
+    """Scan of the roots, then cleaning of the runs, in a background
+    thread (the thread has its own connection to the index).
+
+    Arguments:
+        path (str): Database of the index.
+        roots (list[str]): Project roots.
+        policy (Optional[RetentionPolicy]): Policy applied after the
+            scan (the files are removed), only planned if *None*.
+    """
+
+    progress = Q.pyqtSignal(str)
+    finished_pass = Q.pyqtSignal(dict)
+
+    def __init__(self, path, roots, policy=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.roots = roots
+        self.policy = policy
+
+    def run(self):
+        index = StorageIndex(self.path)
+        result = {}
+        try:
+            result['scan'] = index.scan(
+                self.roots, callback=lambda count: self.progress.emit(
+                    '扫描中: %d 个算例' % count))
+            if self.policy is not None:
+                result['clean'] = index.apply(
+                    self.policy, callback=lambda size: self.progress.emit(
+                        '清理中: 已释放 %s' % human_size(size)),
+                    roots=self.roots)
+                # the cleaned directories are listed again
+                result['rescan'] = index.scan(self.roots)
+            result['plan'] = index.apply(RetentionPolicy.load(),
+                                         dry_run=True, roots=self.roots)
+            result['reclaimed'] = index.reclaimed()
+        except Exception as exc: # pragma pylint: disable=broad-except
+            result['error'] = str(exc)
+        finally:
+            index.close()
+        self.finished_pass.emit(result)
+
+
+class StoragePanel(Q.QWidget):
+    """Disk usage by project, run and class, with the cleaning of the
+    intermediate files.
+
+    Arguments:
+        index (Optional[StorageIndex]): Index, the default one if *None*.
+        roots (Optional[list[str]]): Project roots.
+    """
+
+    def __init__(self, index=None, roots=None, parent=None):
+        super().__init__(parent)
+        self.index = index or StorageIndex()
+        self.roots = default_roots() if roots is None else roots
+        self._thread = None
+        self.setWindowTitle('磁盘空间')
+        self.scan_button = Q.QPushButton('重新扫描', self)
+        self.scan_button.clicked.connect(lambda: self.start())
+        self.clean_button = Q.QPushButton('清理中间文件', self)
+        self.clean_button.clicked.connect(self.clean)
+        self.pin_button = Q.QPushButton('固定/取消固定', self)
+        self.pin_button.setToolTip('固定的算例不会被清理')
+        self.pin_button.clicked.connect(self.toggle_pin)
+        self.tree = Q.QTreeWidget(self)
+        self.tree.setHeaderLabels(['项目/算例', '保留', '合计'] +
+                                  [LABELS[kind] for kind in CLASSES])
+        self.tree.setSortingEnabled(True)
+        self.status = Q.QLabel(self)
+        self.cost = Q.QLabel(self)
+        top = Q.QHBoxLayout()
+        top.addWidget(self.scan_button)
+        top.addWidget(self.clean_button)
+        top.addWidget(self.pin_button)
+        top.addStretch()
+        layout = Q.QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addWidget(self.tree)
+        layout.addWidget(self.cost)
+        layout.addWidget(self.status)
+        self.resize(1000, 500)
+        self.refresh()
+
+    def showEvent(self, event):
+        """Rescan the roots when the panel is shown."""
+        super().showEvent(event)
+        self.start()
+
+    def start(self, policy=None):
+        """Scan (and clean with *policy*) in the background."""
+        if self._thread is not None or not self.roots:
+            return
+        for button in (self.scan_button, self.clean_button, self.pin_button):
+            button.setEnabled(False)
+        self.status.setText('扫描中...')
+        self._thread = StorageThread(self.index.path, self.roots, policy,
+                                     self)
+        self._thread.progress.connect(self.status.setText)
+        self._thread.finished_pass.connect(self._finished)
+        self._thread.start()
+
+    def clean(self):
+        """Clean the runs with the saved policy, after confirmation."""
+        policy = RetentionPolicy.load()
+        text = ('按保留策略删除中间文件 ({}):\n每个项目保留最近 {} 个算例, '
+                '固定的算例及 {} 小时内修改的算例不清理。').format(
+                    ', '.join(LABELS[kind] for kind in policy.purge),
+                    policy.keep_latest, policy.idle)
+        answer = Q.QMessageBox.question(self, '清理中间文件', text)
+        if answer == Q.QMessageBox.Yes:
+            self.start(policy)
+
+    def toggle_pin(self):
+        """Pin or unpin the selected run."""
+        item = self.tree.currentItem()
+        path = item.data(0, Q.Qt.UserRole) if item is not None else None
+        if not path:
+            return
+        pinned = item.data(1, Q.Qt.UserRole) != 'pinned'
+        pin(path, pinned)
+        item.setData(1, Q.Qt.UserRole, 'pinned' if pinned else '')
+        item.setText(1, KEPT_LABELS['pinned'] if pinned else '')
+
+    def _finished(self, result):
+        self._thread.wait()
+        self._thread = None
+        for button in (self.scan_button, self.clean_button, self.pin_button):
+            button.setEnabled(True)
+        self.refresh()
+        if 'error' in result:
+            self.status.setText('失败: %s' % result['error'])
+            return
+        scan = result['scan']
+        self.cost.setText(
+            '扫描用时 %.2f s: %d 个目录 (读取 %d, 未修改 %d), %d 个文件, '
+            '%d 个算例, 共 %s' % (scan['elapsed'], scan['dirs'],
+                              scan['listed'], scan['reused'], scan['files'],
+                              scan['runs'], human_size(scan['bytes'])))
+        text = '可清理 %s (%d 个算例), 累计已释放 %s' % (
+            human_size(result['plan']['bytes']), result['plan']['runs'],
+            human_size(result['reclaimed']))
+        if 'clean' in result:
+            clean = result['clean']
+            text = '本次释放 %s (%d 个算例, 用时 %.1f s), ' % (
+                human_size(clean['bytes']), clean['runs'],
+                clean['elapsed']) + text
+            if clean['errors']:
+                text += ', %d 个错误' % len(clean['errors'])
+        self.status.setText(text)
+
+    def refresh(self):
+        """Show the usage recorded in the index."""
+        runs = self.index.runs()
+        kept = RetentionPolicy.load().kept(runs)
+        self.tree.setSortingEnabled(False)
+        self.tree.clear()
+        projects = OrderedDict()
+        for run in runs:
+            projects.setdefault(osp.join(run['root'], run['project']),
+                                []).append(run)
+
+        def _fill(item, usage, total):
+            item.setData(2, Q.Qt.DisplayRole, total)
+            item.setText(2, human_size(total))
+            for column, kind in enumerate(CLASSES, 3):
+                size = usage.get(kind, [0, 0])[1]
+                item.setText(column, human_size(size) if size else '')
+
+        for name, items in projects.items():
+            usage = {}
+            for run in items:
+                _add(usage, run['usage'])
+            top = Q.QTreeWidgetItem(self.tree, [name])
+            _fill(top, usage, _total(usage))
+            for run in items:
+                reason = kept.get(run['path'], '')
+                child = Q.QTreeWidgetItem(top, [osp.basename(run['path']),
+                                                KEPT_LABELS.get(reason, '')])
+                child.setData(0, Q.Qt.UserRole, run['path'])
+                child.setData(1, Q.Qt.UserRole, reason)
+                child.setToolTip(0, run['path'])
+                _fill(child, run['usage'], run['total'])
+        self.tree.setSortingEnabled(True)
+        self.tree.sortByColumn(2, Q.Qt.DescendingOrder)
+        for column in range(self.tree.columnCount()):
+            self.tree.resizeColumnToContents(column)
+
+
+# Benchmark ------------------------------------------------------------------
+
+def synthetic_projects(folder, count, seed=0):
+    """Write *count* runs (tank cases and truss bridges) in projects of
+    10 runs, with restart files, step VTUs, processor directories and
+    parameter meshes.
+
+    Returns:
+        list[str]: Run directories.
+    """
+    import random
+    rng = random.Random(seed)
+    paths = []
+    block = b'x' * 4096
+
+    def _write(path, blocks):
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fobj:
+            fobj.write(block * blocks)
+
+    for i in range(count):
+        project = osp.join(folder, 'Project-%03d' % (i // 10))
+        path = osp.join(project, 'case-%05d' % i)
+        paths.append(path)
+        if i % 2:
+            for sections in range(8, 8 + rng.randint(1, 4)):
+                _write(osp.join(path, 'Mesh_8.0_5.0_40.0_{}_{:.2f}.med'.format(
+                    sections, 40. / sections)), 16)
+            _write(osp.join(path, 'Mesh_1.med'), 16)
+            _write(osp.join(path, 'static_res.rmed'), 32)
+            _write(osp.join(path, 'static.comm'), 1)
+            _write(osp.join(path, 'static.mess'), 2)
+            with open(osp.join(path, 'fre.set'), 'w') as fobj:
+                fobj.write('10')
+            continue
+        _write(osp.join(path, 'savedata.json'), 1)
+        _write(osp.join(path, 'log.interFoam'), 8)
+        for proc in range(4):
+            for name in ('0', 'constant') + tuple(
+                    '%.1f' % (0.1 * step) for step in range(1, 6)):
+                for field in ('U', 'p', 'alpha.water'):
+                    _write(osp.join(path, 'Fluid', 'processor%d' % proc,
+                                    name, field), 2)
+        solid = osp.join(path, 'Solid')
+        for job in ('tankpre', 'tank'):
+            _write(osp.join(solid, job + '.frd'), 32)
+            _write(osp.join(solid, job + '.rout'), 16)
+        os.link(osp.join(solid, 'tankpre.rout'), osp.join(solid, 'tank.rin'))
+        for step in range(20):
+            _write(osp.join(solid, 'tank.%d.vtu' % step), 4)
+        with open(osp.join(solid, 'tank.pvd'), 'w') as fobj:
+            fobj.write('<VTKFile><Collection>{}</Collection></VTKFile>'.format(
+                ''.join('<DataSet timestep="{}" file="tank.{}.vtu"/>'.format(
+                    step, step) for step in range(20))))
+        if i % 4 == 0:
+            # reconstructed runs: their processor directories can be
+            # removed but the latest time
+            for step in range(1, 6):
+                for field in ('U', 'p', 'alpha.water'):
+                    _write(osp.join(path, 'Fluid', '%.1f' % (0.1 * step),
+                                    field), 6)
+    later = time.time() - 7 * 86400
+    for path in paths:
+        for folder_, dirs, files in os.walk(path):
+            for name in files + dirs:
+                os.utime(osp.join(folder_, name), (later, later))
+            os.utime(folder_, (later, later))
+    return paths
+
+
+def benchmark(folder, count=300):
+    """Measure the scans and the cleaning of synthetic runs.
+
+    Returns:
+        dict: Statistics of the full scan, of an incremental scan
+        without change, of an incremental scan after changing 5% of the
+        runs, of the planning and of the cleaning, usage before and
+        after the cleaning.
+    """
+    runs = synthetic_projects(osp.join(folder, 'runs'), count)
+    roots = [osp.join(folder, 'runs')]
+    index = StorageIndex(osp.join(folder, 'storage.db'))
+    policy = RetentionPolicy(keep_latest=2, purge=PURGED + (DECOMPOSED,),
+                             idle=1)
+    result = OrderedDict()
+    result['full'] = index.scan(roots)
+    result['unchanged'] = index.scan(roots)
+    for path in runs[::20]:
+        with open(osp.join(path, 'log.new'), 'w') as fobj:
+            fobj.write('x' * 10000)
+    result['touched'] = index.scan(roots)
+    pin(runs[0])
+    result['pinned'] = index.scan(roots)
+    result['before'] = index.usage('class')
+    result['plan'] = index.apply(policy, dry_run=True)
+    result['clean'] = index.apply(policy)
+    result['after_scan'] = index.scan(roots)
+    result['after'] = index.usage('class')
+    result['reclaimed'] = index.reclaimed()
+    index.close()
+    return result
+
+
+def main(argv=None):
+    """Scan the runs, show their usage or clean them."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Disk usage and retention of the runs.')
+    parser.add_argument('--db', default=None, help='storage index')
+    sub = parser.add_subparsers(dest='command')
+    scan = sub.add_parser('scan', help='measure the runs under roots')
+    scan.add_argument('roots', nargs='*')
+    scan.add_argument('--full', action='store_true')
+    usage = sub.add_parser('usage', help='usage by project, run or class')
+    usage.add_argument('--by', choices=('project', 'run', 'class'),
+                       default='project')
+    usage.add_argument('--limit', type=int, default=20)
+    clean = sub.add_parser('clean', help='apply the retention policy')
+    clean.add_argument('roots', nargs='*',
+                       help='only clean the runs under these roots')
+    clean.add_argument('--dry-run', action='store_true')
+    clean.add_argument('--keep-latest', type=int, default=None)
+    clean.add_argument('--purge', nargs='+', choices=list(PURGERS),
+                       default=None)
+    clean.add_argument('--save', action='store_true',
+                       help='save the policy for the next cleanings')
+    pin_parser = sub.add_parser('pin', help='pin or unpin runs')
+    pin_parser.add_argument('runs', nargs='+')
+    pin_parser.add_argument('--unpin', action='store_true')
+    sub.add_parser('panel', help='open the storage panel')
+    bench = sub.add_parser('bench', help='scan and clean synthetic runs')
+    bench.add_argument('--runs', type=int, default=300)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        import tempfile
+        folder = tempfile.mkdtemp(prefix='storage')
+        try:
+            res = benchmark(folder, args.runs)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        for name in ('full', 'unchanged', 'touched', 'pinned', 'after_scan'):
+            item = res[name]
+            print('%-10s scan: %6.3f s, %6d dirs (%6d listed, %6d reused), '
+                  '%6d files examined, %s' % (
+                      name, item['elapsed'], item['dirs'], item['listed'],
+                      item['reused'], item['files'],
+                      human_size(item['bytes'])))
+        print('plan: %s in %d runs (%.3f s)' % (
+            human_size(res['plan']['bytes']), res['plan']['runs'],
+            res['plan']['elapsed']))
+        print('clean: %s removed (%d paths, %d errors) in %.3f s' % (
+            human_size(res['clean']['bytes']), res['clean']['paths'],
+            len(res['clean']['errors']), res['clean']['elapsed']))
+        for kind in CLASSES:
+            before = res['before'].get(kind, [0, 0])[1]
+            after = res['after'].get(kind, [0, 0])[1]
+            print('  %-10s %10s -> %10s' % (kind, human_size(before),
+                                            human_size(after)))
+        print('reclaimed (recorded): %s' % human_size(res['reclaimed']))
+        return 0
+    if args.command == 'pin':
+        for run in args.runs:
+            pin(run, not args.unpin)
+        return 0
+    index = StorageIndex(args.db)
+    if args.command == 'scan':
+        stats = index.scan(args.roots or None, args.full)
+        print('%(runs)d runs, %(dirs)d directories (%(listed)d listed, '
+              '%(reused)d reused), %(files)d files in %(elapsed).2f s' % stats)
+        print('used: ' + human_size(stats['bytes']))
+    elif args.command == 'usage':
+        for key, (files, size) in list(index.usage(args.by).items())[
+                :args.limit]:
+            print('%10s %8d  %s' % (human_size(size), files, key))
+        print('reclaimed: ' + human_size(index.reclaimed()))
+    elif args.command == 'clean':
+        policy = RetentionPolicy.load()
+        policy = RetentionPolicy(
+            policy.keep_latest if args.keep_latest is None
+            else args.keep_latest, args.purge or policy.purge, policy.idle)
+        if args.save:
+            policy.save()
+        stats = index.apply(policy, dry_run=args.dry_run,
+                            roots=args.roots or None)
+        for kind, size in stats['classes'].items():
+            print('%-10s %s' % (kind, human_size(size)))
+        print('%s %s in %d runs (%d paths) in %.2f s' % (
+            'to remove:' if args.dry_run else 'removed:',
+            human_size(stats['bytes']), stats['runs'], stats['paths'],
+            stats['elapsed']))
+        for error in stats['errors']:
+            print(error)
+    elif args.command == 'panel':
+        app = Q.QApplication(sys.argv)
+        panel = StoragePanel(index)
+        panel.show()
+        return app.exec_()
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
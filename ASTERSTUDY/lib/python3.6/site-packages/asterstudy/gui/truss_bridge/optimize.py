@@ -0,0 +1,398 @@
+"""
+Mass optimization of the truss bridge
+-------------------------------------
+
+The section sizes entered in `Main.change_element_pro` (thickness of
+the road, side of the top, main, bottom and lateral beams) are tuned by
+hand, each trial being a code_aster run. `Optimizer` minimizes the mass
+of the bridge subject to limits on the maximum displacement, on the
+maximum normal stress of the beams and on the first frequency.
+
+The solver is a black box: a design is evaluated by `sweep.run_design`
+(code_aster or the preview solver) and its result is kept in the
+directory of the study, ``designs/<key>/result.json``. `Evaluator`
+looks the designs up there before calling the solver: the designs
+visited again by the search, the designs of a previous (interrupted)
+optimization and the designs of a sweep of the same directory are not
+computed again. The candidates of an iteration are evaluated in
+parallel.
+
+The search is a compass search on the variables snapped to a grid of
+`RESOLUTION`: each iteration polls the points at plus and minus one step
+along each variable, moves to the best one or halves the step. Designs
+are compared by feasibility first, then by mass (feasible designs) or
+by constraint violation (infeasible designs). The mass does not need the
+solver: once a feasible design is known, the candidates heavier than it
+are not evaluated at all.
+
+The convergence history is written in ``history.csv`` with the solver
+calls made and saved at each iteration.
+
+Example::
+
+    python3 -m asterstudy.gui.truss_bridge.optimize /tmp/opt \\
+        --max-disp 0.1 --max-stress 235e6 --min-freq 2 --jobs 4
+"""
+
+import csv
+import json
+import math
+import os
+import os.path as osp
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .preview import SECTION_GROUPS, truss_mesh
+from .sweep import PARAMETERS, RESULT, design, design_key, run_design
+
+
+HISTORY = 'history.csv'
+OPTIMUM = 'optimum.json'
+
+# size variables (m): thickness of the road and side of the beams
+VARIABLES = OrderedDict([
+    ('thickness', (0.05, 0.5)), ('top_beams', (0.05, 0.5)),
+    ('main_beams', (0.05, 0.5)), ('bottom_beams', (0.05, 0.5)),
+    ('lateral_beams', (0.05, 0.5)),
+])
+
+# grid of the variables (m): the solver only sees rounded designs
+RESOLUTION = 1.e-3
+
+# design parameter of each section group
+SIZES = OrderedDict(zip(SECTION_GROUPS, ('thickness',) + SECTION_GROUPS[1:]))
+
+_GEOMETRY = {}
+
+
+def _geometry(width, height, length, sections):
+    """Length of the beams of each group and area of the road."""
+    key = (width, height, length, sections)
+    if key not in _GEOMETRY:
+        mesh = truss_mesh(width, height, length, sections)
+        lengths = np.linalg.norm(mesh.coords[mesh.segs[:, 1]] -
+                                 mesh.coords[mesh.segs[:, 0]], axis=1)
+        beams = {group: float(lengths[mesh.cells(group, 'seg')].sum())
+                 for group in SECTION_GROUPS[1:]}
+        _GEOMETRY[key] = beams, width * length
+    return _GEOMETRY[key]
+
+
+def mass(point):
+    """Return the mass (kg) of the beams and of the road of a design."""
+    beams, area = _geometry(point['width'], point['height'],
+                            point['length'], point['sections'])
+    steel = sum(point[SIZES[group]] ** 2 * length
+                for group, length in beams.items())
+    return steel * point['steel_rho'] + \
+        point['thickness'] * area * point['concrete_rho']
+
+
+class Constraints:
+    """Limits of a design.
+
+    Arguments:
+        max_disp (Optional[float]): Maximum displacement (m).
+        max_stress (Optional[float]): Maximum normal stress (Pa).
+        min_freq (Optional[float]): Minimum first frequency (Hz).
+    """
+
+    def __init__(self, max_disp=None, max_stress=None, min_freq=None):
+        self.max_disp = max_disp
+        self.max_stress = max_stress
+        self.min_freq = min_freq
+
+    def violation(self, result):
+        """Return the sum of the relative violations of the limits.
+
+        A design that could not be computed has an infinite violation.
+        """
+        if result is None or result.get('status') != 'ok':
+            return math.inf
+        violation = 0.
+        if self.max_disp is not None:
+            violation += max(0., result['max_disp'] / self.max_disp - 1.)
+        if self.max_stress is not None:
+            violation += max(0., result['max_stress'] / self.max_stress - 1.)
+        if self.min_freq is not None:
+            first = (result.get('frequencies') or [0.])[0]
+            violation += max(0., 1. - first / self.min_freq)
+        return violation
+
+    def as_dict(self):
+        """Return the limits that are set."""
+        return OrderedDict((name, value) for name, value in (
+            ('max_disp', self.max_disp), ('max_stress', self.max_stress),
+            ('min_freq', self.min_freq)) if value is not None)
+
+
+class Evaluator:
+    """Cached, parallel evaluation of designs.
+
+    Arguments:
+        folder (str): Directory of the study.
+        solver (str): 'preview' or 'aster' (see `sweep.SOLVERS`).
+        jobs (Optional[int]): Number of processes.
+    """
+
+    def __init__(self, folder, solver='preview', jobs=None):
+        self.folder = folder
+        self.solver = solver
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache = {}
+        self.requests = self.hits = self.calls = 0
+        self._pool = None
+
+    def __enter__(self):
+        self._pool = ProcessPoolExecutor(max_workers=self.jobs)
+        return self
+
+    def __exit__(self, *_):
+        self._pool.shutdown()
+        self._pool = None
+
+    def lookup(self, key):
+        """Return the known result of a design, *None* if not computed."""
+        if key not in self.cache:
+            try:
+                path = osp.join(self.folder, 'designs', key, RESULT)
+                with open(path) as fobj:
+                    result = json.load(fobj)
+            except (OSError, ValueError):
+                return None
+            if result.get('status') != 'ok' or \
+                    result.get('solver') != self.solver:
+                return None
+            self.cache[key] = result
+        return self.cache[key]
+
+    def evaluate(self, points):
+        """Return the results of designs, computing the unknown ones.
+
+        Returns:
+            list[dict]: Results (see `sweep.run_design`).
+        """
+        keys = [design_key(point) for point in points]
+        self.requests += len(points)
+        missing = OrderedDict()
+        for key, point in zip(keys, points):
+            if self.lookup(key) is None:
+                missing.setdefault(key, point)
+        self.hits += len(points) - len(missing)
+        self.calls += len(missing)
+        args = [(self.folder, point, self.solver)
+                for point in missing.values()]
+        if self._pool is not None and len(args) > 1:
+            results = self._pool.map(run_design, *zip(*args))
+        else:
+            results = (run_design(*arg) for arg in args)
+        for key, result in zip(missing, results):
+            self.cache[key] = result
+        return [self.cache[key] for key in keys]
+
+
+class Optimizer:
+    """Compass search of the lightest design within limits.
+
+    Arguments:
+        evaluator (Evaluator): Evaluation of the designs.
+        constraints (Constraints): Limits of the designs.
+        variables (Optional[dict]): Bounds of the optimized parameters
+            (default: `VARIABLES`).
+        base (Optional[dict]): Other parameters (see `sweep.design`).
+    """
+
+    def __init__(self, evaluator, constraints, variables=None, base=None):
+        self.evaluator = evaluator
+        self.constraints = constraints
+        self.variables = OrderedDict(variables or VARIABLES)
+        self.base = dict(base or {})
+        self.history = []
+
+    def point(self, values):
+        """Return the design of variable values (snapped and bounded)."""
+        params = dict(self.base)
+        for name, (low, high) in self.variables.items():
+            value = min(max(values[name], low), high)
+            params[name] = round(value / RESOLUTION) * RESOLUTION
+        return design(**params)
+
+    def _rank(self, point, result):
+        """Sort key: feasible first, then mass or violation."""
+        violation = self.constraints.violation(result)
+        return (0, mass(point)) if violation == 0. else (1, violation)
+
+    def _poll(self, center, step):
+        """Return the distinct neighbours of *center*."""
+        points = OrderedDict()
+        for name, (low, high) in self.variables.items():
+            for sign in (-1., 1.):
+                values = dict(center)
+                values[name] = center[name] + sign * step * (high - low)
+                point = self.point(values)
+                key = design_key(point)
+                if point[name] != center[name]:
+                    points.setdefault(key, point)
+        return list(points.values())
+
+    def run(self, start=None, step=0.25, max_iter=100, callback=None):
+        """Search the lightest feasible design.
+
+        Arguments:
+            start (Optional[dict]): Initial values of the variables, the
+                middle of the bounds by default.
+            step (Optional[float]): Initial step, relative to the range
+                of the variables.
+            max_iter (Optional[int]): Maximum number of iterations.
+            callback (Optional[callable]): Called with the history entry
+                of each iteration.
+
+        Returns:
+            dict: Best design and its result, mass and violation.
+        """
+        if start is None:
+            start = {name: 0.5 * (low + high)
+                     for name, (low, high) in self.variables.items()}
+        best = self.point(start)
+        result, = self.evaluator.evaluate([best])
+        rank = self._rank(best, result)
+        begin = time.time()
+        min_step = RESOLUTION / max(high - low for low, high
+                                    in self.variables.values())
+        for iteration in range(max_iter + 1):
+            calls, hits = self.evaluator.calls, self.evaluator.hits
+            candidates = self._poll(best, step)
+            pruned = 0
+            if rank[0] == 0:
+                # heavier than the best feasible design: cannot be better
+                lighter = [point for point in candidates
+                           if mass(point) < rank[1]]
+                pruned = len(candidates) - len(lighter)
+                candidates = lighter
+            results = self.evaluator.evaluate(candidates)
+            ranked = sorted((self._rank(point, res), i)
+                            for i, (point, res)
+                            in enumerate(zip(candidates, results)))
+            moved = bool(ranked) and ranked[0][0] < rank
+            if moved:
+                best = candidates[ranked[0][1]]
+                result = results[ranked[0][1]]
+                rank = ranked[0][0]
+            entry = OrderedDict([
+                ('iteration', iteration), ('step', step),
+                ('mass', mass(best)),
+                ('violation', self.constraints.violation(result)),
+                ('moved', moved), ('candidates', len(candidates) + pruned),
+                ('calls', self.evaluator.calls - calls),
+                ('hits', self.evaluator.hits - hits), ('pruned', pruned),
+                ('wall', time.time() - begin)])
+            entry.update((name, best[name]) for name in self.variables)
+            self.history.append(entry)
+            if callback is not None:
+                callback(entry)
+            if not moved:
+                step *= 0.5
+                if step < min_step:
+                    break
+        return OrderedDict([
+            ('design', best), ('result', result), ('mass', mass(best)),
+            ('violation', self.constraints.violation(result)),
+            ('feasible', rank[0] == 0),
+            ('constraints', self.constraints.as_dict()),
+            ('iterations', len(self.history)),
+            ('requests', self.evaluator.requests),
+            ('calls', self.evaluator.calls),
+            ('hits', self.evaluator.hits),
+            ('pruned', sum(entry['pruned'] for entry in self.history)),
+            ('wall', time.time() - begin)])
+
+    def write_history(self, path):
+        """Write the convergence history in a CSV file."""
+        if not self.history:
+            return
+        with open(path, 'w', newline='') as fobj:
+            writer = csv.DictWriter(fobj, fieldnames=list(self.history[0]))
+            writer.writeheader()
+            writer.writerows(self.history)
+
+
+def optimize(folder, constraints, variables=None, base=None,
+             solver='preview', jobs=None, **kwargs):
+    """Run an optimization in *folder* and write its history and optimum.
+
+    Returns:
+        dict: See `Optimizer.run`.
+    """
+    os.makedirs(folder, exist_ok=True)
+    with Evaluator(folder, solver, jobs) as evaluator:
+        optimizer = Optimizer(evaluator, constraints, variables, base)
+        try:
+            optimum = optimizer.run(**kwargs)
+        finally:
+            optimizer.write_history(osp.join(folder, HISTORY))
+    with open(osp.join(folder, OPTIMUM), 'w') as fobj:
+        json.dump(optimum, fobj, indent=1)
+    return optimum
+
+
+def main(argv=None):
+    """Minimize the mass of the bridge."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Mass optimization of the truss bridge.')
+    parser.add_argument('folder', help='directory of the study')
+    parser.add_argument('--max-disp', type=float, default=None,
+                        help='maximum displacement (m)')
+    parser.add_argument('--max-stress', type=float, default=None,
+                        help='maximum normal stress (Pa)')
+    parser.add_argument('--min-freq', type=float, default=None,
+                        help='minimum first frequency (Hz)')
+    parser.add_argument('--bounds', action='append', default=[],
+                        help='name=low:high, optimized parameter')
+    parser.add_argument('--set', action='append', default=[],
+                        help='name=value, fixed parameter')
+    parser.add_argument('--solver', choices=('preview', 'aster'),
+                        default='preview')
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--step', type=float, default=0.25)
+    parser.add_argument('--max-iter', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    def _parse(text):
+        name, _, value = text.partition('=')
+        if name not in PARAMETERS:
+            raise SystemExit('unknown parameter: {!r}'.format(name))
+        return name, value
+    variables = OrderedDict(
+        (name, tuple(float(bound) for bound in value.split(':')))
+        for name, value in map(_parse, args.bounds)) or None
+    base = {name: float(value) for name, value in map(_parse, args.set)}
+    constraints = Constraints(args.max_disp, args.max_stress, args.min_freq)
+    if not constraints.as_dict():
+        parser.error('at least one limit is required')
+
+    def _progress(entry):
+        print('{iteration:3d} step {step:.4f} mass {mass:10.1f} kg '
+              'violation {violation:.3g} calls {calls} hits {hits} '
+              'pruned {pruned}'.format(**entry), flush=True)
+
+    optimum = optimize(args.folder, constraints, variables, base,
+                       args.solver, args.jobs, step=args.step,
+                       max_iter=args.max_iter, callback=_progress)
+    print('{} design: mass {:.1f} kg, {}'.format(
+        'feasible' if optimum['feasible'] else 'infeasible', optimum['mass'],
+        ', '.join('{}={:g}'.format(name, optimum['design'][name])
+                  for name in (variables or VARIABLES))))
+    print('{} designs requested: {} solver calls, {} saved by the cache, '
+          '{} pruned by the mass bound, {:.1f} s'.format(
+              optimum['requests'] + optimum['pruned'], optimum['calls'],
+              optimum['hits'], optimum['pruned'], optimum['wall']))
+    return 0 if optimum['feasible'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
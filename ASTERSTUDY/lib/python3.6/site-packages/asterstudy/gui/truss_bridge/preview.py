@@ -0,0 +1,967 @@
+"""
+Preview solver of the truss bridge
+----------------------------------
+
+Each design change of `truss_bridge.Main` needs a new mesh and a
+code_aster run (``static.comm`` or ``modes.comm``) before any result can
+be seen. This module solves the same model locally with numpy and
+scipy.sparse, in a few seconds:
+
+- the beams (``all_beams``, ``POU_D_E`` in the command files) are 3D
+  Euler-Bernoulli beams with a full square section of side ``H``,
+- the deck (``road``, ``DKT``) is made of flat 4-node shells: bilinear
+  membrane, MITC4 plate bending (transverse shear with assumed strains)
+  and a small drilling stiffness,
+- ``left`` is pinned (DX, DY, DZ) and ``right`` is a roller (DY, DZ),
+  as in the command files.
+
+`BridgeModel.static` returns the nodal displacements under the deck
+pressure (``PRES_REP``), `BridgeModel.modes` the first eigenfrequencies
+and mode shapes (consistent beam mass, lumped shell mass).
+
+The mesh is read from the MED file generated by
+``create_geo_mesh_new.py`` (MEDLoader in SALOME, h5py otherwise), or
+generated directly with the same topology (`truss_mesh`), without
+SALOME, and written for code_aster (`write_med`).
+
+The preview is compared with the code_aster results of the default
+bridge, and timed for increasing numbers of sections::
+
+    python3 preview.py validate
+    python3 preview.py timing --sections 8 16 32 64
+"""
+
+import math
+import os.path as osp
+import re
+import sys
+import time
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+
+HERE = osp.dirname(osp.abspath(__file__))
+
+# order of the properties of `Main.change_element_pro` (tab0 ... tab4)
+SECTION_GROUPS = ('road', 'top_beams', 'main_beams', 'bottom_beams',
+                  'lateral_beams')
+
+BEAM_GROUP = 'all_beams'
+SHELL_GROUP = 'road'
+
+# shear correction factor of the shells
+SHEAR_FACTOR = 5. / 6.
+
+# drilling stiffness of the shells, relative to E.t.area
+DRILLING = 1.e-3
+
+# configuration of the code_aster results of this directory
+REFERENCE = {
+    'element': [0.1, 0.1, 0.1, 0.1, 0.1],
+    'steel': [2.e11, 0.3, 7850.],
+    'concrete': [2.5e10, 0.2, 2300.],
+    'pressure': 1.e5,
+    'static': 'static_res.rmed',
+    'modes': 'study_modes.rmed',
+    'frequencies': 'modes.mess',
+}
+
+
+class BridgeMesh():
+    """Nodes, cells and groups of a bridge mesh.
+
+    Arguments:
+        coords (numpy.ndarray): Coordinates of the nodes (n, 3).
+        segs (numpy.ndarray): Nodes of the beam cells (m, 2).
+        quads (numpy.ndarray): Nodes of the shell cells (k, 4).
+        groups (dict): Cell groups, name: (kind, indices) where kind is
+            'seg' or 'quad'.
+        node_groups (Optional[dict]): Node groups, name: indices. By
+            default the nodes of the cell groups.
+    """
+
+    def __init__(self, coords, segs, quads, groups, node_groups=None):
+        self.coords = np.asarray(coords, dtype=float)
+        self.segs = np.asarray(segs, dtype=int).reshape(-1, 2)
+        self.quads = np.asarray(quads, dtype=int).reshape(-1, 4)
+        self.groups = {name: (kind, np.asarray(cells, dtype=int))
+                       for name, (kind, cells) in groups.items()}
+        self.node_groups = {}
+        for name, (kind, cells) in self.groups.items():
+            conn = self.segs if kind == 'seg' else self.quads
+            self.node_groups[name] = np.unique(conn[cells])
+        if node_groups:
+            self.node_groups.update({name: np.asarray(nodes, dtype=int)
+                                     for name, nodes in node_groups.items()})
+
+    @property
+    def nb_nodes(self):
+        """int: Number of nodes."""
+        return len(self.coords)
+
+    def cells(self, name, kind):
+        """Return the cells of a group, empty if the group is missing."""
+        group = self.groups.get(name)
+        if group is None or group[0] != kind:
+            return np.zeros(0, dtype=int)
+        return group[1]
+
+    def __repr__(self):
+        return '<BridgeMesh: {} nodes, {} beams, {} shells>'.format(
+            self.nb_nodes, len(self.segs), len(self.quads))
+
+
+def _nb_divisions(length, size):
+    """Number of segments of a line meshed with a local length."""
+    return max(1, int(math.ceil(length / size - 1.e-6)))
+
+
+def truss_mesh(width=8., height=5., length=40., sections=8, divisions=8):
+    """Generate the mesh of ``create_geo_mesh_new.py`` without SALOME.
+
+    Arguments:
+        width (float): Width of the deck (Y).
+        height (float): Height of the trusses (Z).
+        length (float): Length of the bridge (X, centered on 0).
+        sections (int): Number of sections (even).
+        divisions (int): Segments per section along X (the local length
+            is ``length / sections / divisions``).
+
+    Returns:
+        BridgeMesh: Mesh with the groups of the MED file.
+    """
+    if sections < 2 or sections % 2:
+        raise ValueError('the number of sections must be even')
+    spacing = length / sections
+    size = spacing / divisions
+    xpos = [-length / 2. + i * spacing for i in range(sections + 1)]
+    nodes = {}
+    coords = []
+
+    def node(point):
+        key = tuple(round(value, 6) for value in point)
+        if key not in nodes:
+            nodes[key] = len(coords)
+            coords.append(point)
+        return nodes[key]
+
+    # deck first: its nodes are shared with the chords and cross beams
+    nbx = sections * divisions
+    nby = _nb_divisions(width, size)
+    grid = [[node((-length / 2. + i * size, j * width / nby, 0.))
+             for j in range(nby + 1)] for i in range(nbx + 1)]
+    quads = [(grid[i][j], grid[i + 1][j], grid[i + 1][j + 1], grid[i][j + 1])
+             for i in range(nbx) for j in range(nby)]
+
+    segs = []
+    groups = {}
+
+    def line(start, end, *names):
+        start, end = np.array(start, float), np.array(end, float)
+        count = _nb_divisions(np.linalg.norm(end - start), size)
+        ids = [node(tuple(start + (end - start) * k / count))
+               for k in range(count + 1)]
+        for name in (BEAM_GROUP,) + names:
+            groups.setdefault(name, []).extend(
+                range(len(segs), len(segs) + count))
+        segs.extend(zip(ids[:-1], ids[1:]))
+
+    half = sections // 2
+    for yval in (0., width):
+        for i in range(sections):
+            line((xpos[i], yval, 0.), (xpos[i + 1], yval, 0.), 'main_beams')
+        for i in range(1, sections - 1):
+            line((xpos[i], yval, height), (xpos[i + 1], yval, height),
+                 'main_beams')
+        line((xpos[0], yval, 0.), (xpos[1], yval, height), 'main_beams')
+        line((xpos[-1], yval, 0.), (xpos[-2], yval, height), 'main_beams')
+        for i in range(1, sections):
+            line((xpos[i], yval, 0.), (xpos[i], yval, height),
+                 'lateral_beams')
+        for i in range(2, half + 1):
+            line((xpos[i], yval, 0.), (xpos[i - 1], yval, height),
+                 'lateral_beams')
+        for i in range(half, sections - 1):
+            line((xpos[i], yval, 0.), (xpos[i + 1], yval, height),
+                 'lateral_beams')
+    for i in range(1, sections):
+        line((xpos[i], 0., 0.), (xpos[i], width, 0.), 'bottom_beams')
+        line((xpos[i], 0., height), (xpos[i], width, height), 'top_beams')
+    line((xpos[0], 0., 0.), (xpos[0], width, 0.), 'bottom_beams', 'left')
+    line((xpos[-1], 0., 0.), (xpos[-1], width, 0.), 'bottom_beams', 'right')
+
+    groups = {name: ('seg', cells) for name, cells in groups.items()}
+    groups[SHELL_GROUP] = ('quad', range(len(quads)))
+    return BridgeMesh(coords, segs, quads, groups)
+
+
+def read_med(path, mesh_name=None):
+    """Read the nodes, the SEG2/QUAD4 cells and the groups of a MED file.
+
+    Arguments:
+        path (str): MED file (mesh or result).
+        mesh_name (Optional[str]): Mesh name, the first mesh by default.
+
+    Returns:
+        BridgeMesh: Mesh and its groups.
+    """
+    try:
+        import MEDLoader  # pragma pylint: disable=unused-import
+    except ImportError:
+        return _read_med_h5(path, mesh_name)
+    return _read_med_loader(path, mesh_name)
+
+
+def _read_med_loader(path, mesh_name):
+    """Read a mesh with MEDLoader (SALOME)."""
+    # pragma pylint: disable=import-error
+    import MEDLoader as ml
+    if mesh_name is None:
+        umesh = ml.MEDFileUMesh.New(path)
+    else:
+        umesh = ml.MEDFileUMesh.New(path, mesh_name)
+    coords = umesh.getCoords().toNumPyArray().reshape(-1, 3)
+    conn = {}
+    for level in umesh.getNonEmptyLevels():
+        mesh = umesh.getMeshAtLevel(level)
+        nodal = mesh.getNodalConnectivity().toNumPyArray()
+        index = mesh.getNodalConnectivityIndex().toNumPyArray()
+        # [type, nodes...] per cell
+        cells = [nodal[index[i] + 1:index[i + 1]]
+                 for i in range(len(index) - 1)]
+        kind = {2: 'seg', 4: 'quad'}.get(len(cells[0]) if cells else 0)
+        if kind is not None:
+            conn[level] = (kind, np.array(cells, dtype=int))
+    segs = np.zeros((0, 2), dtype=int)
+    quads = np.zeros((0, 4), dtype=int)
+    groups = {}
+    for level, (kind, cells) in conn.items():
+        if kind == 'seg':
+            segs = cells
+        else:
+            quads = cells
+        for name in umesh.getGroupsOnSpecifiedLev(level):
+            groups[name] = (kind, umesh.getGroupArr(level, name)
+                            .toNumPyArray())
+    node_groups = {name: umesh.getGroupArr(1, name).toNumPyArray()
+                   for name in umesh.getGroupsOnSpecifiedLev(1)}
+    return BridgeMesh(coords, segs, quads, groups, node_groups)
+
+
+def _family_groups(families):
+    """Return the group names of the families of a MED file."""
+    groups = {}
+    for family in families.values():
+        if 'GRO' not in family:
+            continue
+        names = [bytes(row).rstrip(b'\x00 ').decode()
+                 for row in family['GRO/NOM'][()].astype(np.uint8)]
+        groups[int(family.attrs['NUM'])] = names
+    return groups
+
+
+def _read_med_h5(path, mesh_name):
+    """Read a mesh with h5py (MED 3 and 4 files)."""
+    import h5py
+    with h5py.File(path, 'r') as med:
+        if mesh_name is None:
+            mesh_name = sorted(med['ENS_MAA'])[0]
+        mesh = med['ENS_MAA'][mesh_name]
+        step = mesh[sorted(mesh)[0]]
+        # MED stores the arrays component by component
+        coords = step['NOE/COO'][()].reshape(3, -1).T
+        families = med['FAS'][mesh_name]
+        cell_groups = _family_groups(families['ELEME']) \
+            if 'ELEME' in families else {}
+        node_families = _family_groups(families['NOEUD']) \
+            if 'NOEUD' in families else {}
+        conn = {'seg': ('SE2', 2), 'quad': ('QU4', 4)}
+        cells = {}
+        groups = {}
+        for kind, (name, size) in conn.items():
+            if name not in step['MAI']:
+                cells[kind] = np.zeros((0, size), dtype=int)
+                continue
+            cells[kind] = step['MAI'][name]['NOD'][()].reshape(size, -1).T - 1
+            fams = step['MAI'][name]['FAM'][()]
+            for num, names in cell_groups.items():
+                selected = np.flatnonzero(fams == num)
+                for group in names:
+                    if not len(selected):
+                        continue
+                    previous = groups.get(group, (kind, []))[1]
+                    groups[group] = (kind, np.concatenate([previous,
+                                                           selected]))
+        fams = step['NOE/FAM'][()]
+        node_groups = {}
+        for num, names in node_families.items():
+            selected = np.flatnonzero(fams == num)
+            for group in names:
+                node_groups[group] = np.concatenate(
+                    [node_groups.get(group, []), selected]).astype(int)
+    return BridgeMesh(coords, cells['seg'], cells['quad'], groups,
+                      node_groups)
+
+
+def read_med_field(path, field, mesh_name=None):
+    """Read the steps of a nodal field of a MED result with h5py.
+
+    Returns:
+        list[(float, numpy.ndarray)]: Time (or frequency) and values of
+        each step (nodes, components).
+    """
+    import h5py
+    steps = []
+    with h5py.File(path, 'r') as med:
+        data = med['CHA'][field]
+        ncomp = int(data.attrs['NCO'])
+        for key in sorted(data):
+            step = data[key]
+            values = step['NOE'][step['NOE'].attrs['PFL'].decode()]['CO']
+            steps.append((float(step.attrs['PDT']),
+                          values[()].reshape(ncomp, -1).T))
+    return steps
+
+
+def _families(nb_items, groups, sign):
+    """Families (number, group names) of items from their groups."""
+    members = [[] for _ in range(nb_items)]
+    for name in sorted(groups):
+        for item in groups[name]:
+            members[item].append(name)
+    numbers = np.zeros(nb_items, dtype=np.int32)
+    families = {}
+    for item, names in enumerate(members):
+        if names:
+            key = tuple(names)
+            if key not in families:
+                families[key] = sign * (len(families) + 1)
+            numbers[item] = families[key]
+    return numbers, families
+
+
+def _write_families(parent, families):
+    for names, num in families.items():
+        name = 'FAM_{}_{}'.format(num, '_'.join(names))[:64]
+        family = parent.create_group(name)
+        family.attrs['NUM'] = np.int32(num)
+        gro = family.create_group('GRO')
+        gro.attrs['NBR'] = np.int32(len(names))
+        nom = np.zeros((len(names), 80), dtype=np.int8)
+        for i, group in enumerate(names):
+            raw = group.encode()[:80]
+            nom[i, :len(raw)] = np.frombuffer(raw, dtype=np.int8)
+        # array of 80 characters per group, as written by MED
+        dset = gro.create_dataset('NOM', shape=(len(names),),
+                                  dtype=np.dtype(('i1', (80,))))
+        dset[...] = nom
+
+
+def write_med(mesh, path, mesh_name='Mesh_com'):
+    """Write a mesh and its groups in a MED 4.0 file with h5py.
+
+    The layout is the one of the files exported by SALOME, so that the
+    meshes of `truss_mesh` can be read by ``LIRE_MAILLAGE``.
+    """
+    import h5py
+
+    def dataset(parent, name, data, dtype):
+        data = np.ascontiguousarray(data, dtype=dtype)
+        dset = parent.create_dataset(name, data=data.ravel())
+        dset.attrs['CGT'] = np.int32(1)
+        dset.attrs['NBR'] = np.int32(len(data))
+        return dset
+
+    with h5py.File(path, 'w') as med:
+        infos = med.create_group('INFOS_GENERALES')
+        for key, value in (('MAJ', 4), ('MIN', 0), ('REL', 0)):
+            infos.attrs[key] = np.int32(value)
+        root = med.create_group('ENS_MAA/' + mesh_name)
+        for key, value in (('DIM', 2), ('ESP', 3), ('NXI', -1), ('NXT', -1),
+                           ('REP', 0), ('SRT', 0), ('TYP', 0)):
+            root.attrs[key] = np.int32(value)
+        for key in ('DES', 'NOM', 'UNI', 'UNT'):
+            root.attrs[key] = np.bytes_(b'')
+        step = root.create_group('-0000000000000000001-0000000000000000001')
+        for key in ('CGT', 'NDT', 'NOR', 'NXI', 'NXT', 'PVI', 'PVT'):
+            step.attrs[key] = np.int32(1 if key == 'CGT' else -1)
+        step.attrs['PDT'] = np.float64(-1.)
+
+        fas = med.create_group('FAS/' + mesh_name)
+        fas.create_group('FAMILLE_ZERO').attrs['NUM'] = np.int32(0)
+        cell_groups = {'seg': {}, 'quad': {}}
+        for name, (kind, cells) in mesh.groups.items():
+            cell_groups[kind][name] = cells
+        offset = 0
+        cell_families = {}
+        mai = step.create_group('MAI')
+        mai.attrs['CGT'] = np.int32(1)
+        for kind, conn, key, geo in (('seg', mesh.segs, 'SE2', 102),
+                                     ('quad', mesh.quads, 'QU4', 204)):
+            if not len(conn):
+                continue
+            numbers, families = _families(len(conn), cell_groups[kind], -1)
+            # family numbers are shared by the cell types
+            families = {names: num - offset for names, num in families.items()}
+            numbers[numbers != 0] -= offset
+            offset += len(families)
+            cell_families.update(families)
+            group = mai.create_group(key)
+            for attr, value in (('CGS', 1), ('CGT', 1), ('GEO', geo)):
+                group.attrs[attr] = np.int32(value)
+            group.attrs['PFL'] = np.bytes_(b'MED_NO_PROFILE_INTERNAL')
+            dataset(group, 'NOD', conn.T + 1, np.int32)
+            dataset(group, 'FAM', numbers, np.int32)
+            dataset(group, 'NUM', np.arange(1, len(conn) + 1), np.int32)
+        _write_families(fas.create_group('ELEME'), cell_families)
+
+        numbers, families = _families(mesh.nb_nodes, mesh.node_groups, 1)
+        noe = step.create_group('NOE')
+        noe.attrs['CGS'] = noe.attrs['CGT'] = np.int32(1)
+        noe.attrs['PFL'] = np.bytes_(b'MED_NO_PROFILE_INTERNAL')
+        dset = dataset(noe, 'COO', mesh.coords.T, np.float64)
+        dset.attrs['NBR'] = np.int32(mesh.nb_nodes)
+        dataset(noe, 'FAM', numbers, np.int32)
+        dataset(noe, 'NUM', np.arange(1, mesh.nb_nodes + 1), np.int32)
+        _write_families(fas.create_group('NOEUD'), families)
+
+
+def read_mess_frequencies(path):
+    """Read the frequencies computed by CALC_MODES in a message file."""
+    frequencies = []
+    table = False
+    with open(path, errors='replace') as mess:
+        for line in mess:
+            if 'Calcul modal' in line:
+                table, frequencies = False, []
+            elif re.match(r'\s*num.ro\s+fr.quence', line):
+                table = True
+            elif table:
+                fields = line.split()
+                if len(fields) < 2 or not fields[0].isdigit():
+                    table = False
+                    continue
+                frequencies.append(float(fields[1]))
+    return frequencies
+
+
+def _gauss2():
+    point = 1. / math.sqrt(3.)
+    return [(-point, -point), (point, -point), (point, point), (-point, point)]
+
+
+_XI = np.array([-1., 1., 1., -1.])
+_ETA = np.array([-1., -1., 1., 1.])
+
+
+def _shape(xi, eta):
+    """Shape functions of the quadrangle and their derivatives."""
+    shape = 0.25 * (1. + _XI * xi) * (1. + _ETA * eta)
+    dxi = 0.25 * _XI * (1. + _ETA * eta)
+    deta = 0.25 * _ETA * (1. + _XI * xi)
+    return shape, dxi, deta
+
+
+def _jacobian(local, xi, eta):
+    """Jacobian matrices (e, 2, 2) of the quadrangles at a point."""
+    _, dxi, deta = _shape(xi, eta)
+    jac = np.empty((len(local), 2, 2))
+    jac[:, 0, :] = np.einsum('i,eij->ej', dxi, local)
+    jac[:, 1, :] = np.einsum('i,eij->ej', deta, local)
+    return jac
+
+
+def _shear_row(local, xi, eta, direction):
+    """Covariant transverse shear (e, 12) on the (w, thx, thy) dofs."""
+    shape, dxi, deta = _shape(xi, eta)
+    jac = _jacobian(local, xi, eta)
+    dshape = dxi if direction == 0 else deta
+    row = np.zeros((len(local), 12))
+    row[:, 0::3] = dshape
+    # gamma = w,s + x,s thy - y,s thx
+    row[:, 1::3] = -jac[:, direction, 1][:, None] * shape
+    row[:, 2::3] = jac[:, direction, 0][:, None] * shape
+    return row
+
+
+def _frames(points):
+    """Local frames (e, 3, 3), rows are the axes, of the quadrangles."""
+    axis1 = points[:, 1] + points[:, 2] - points[:, 0] - points[:, 3]
+    normal = np.cross(points[:, 2] - points[:, 0], points[:, 3] - points[:, 1])
+    normal /= np.linalg.norm(normal, axis=1)[:, None]
+    axis1 -= np.einsum('ei,ei->e', axis1, normal)[:, None] * normal
+    axis1 /= np.linalg.norm(axis1, axis=1)[:, None]
+    axis2 = np.cross(normal, axis1)
+    return np.stack([axis1, axis2, normal], axis=1)
+
+
+def _rotate(matrices, frames):
+    """Global matrices R^T k R of elements with 3-component dof blocks."""
+    nblocks = matrices.shape[1] // 3
+    rot = np.zeros(matrices.shape)
+    for block in range(nblocks):
+        rot[:, 3 * block:3 * block + 3, 3 * block:3 * block + 3] = frames
+    return np.matmul(np.matmul(rot.transpose(0, 2, 1), matrices), rot)
+
+
+def shell_matrices(points, thick, young, poisson, rho):
+    """Stiffness (e, 24, 24) and lumped mass (e, 24) of flat shells.
+
+    Arguments:
+        points (numpy.ndarray): Coordinates of the nodes (e, 4, 3).
+        thick, young, poisson, rho (numpy.ndarray): Properties (e,).
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray, numpy.ndarray): Global stiffness
+        matrices, lumped masses and unit normals (e, 3).
+    """
+    nbel = len(points)
+    frames = _frames(points)
+    center = points.mean(axis=1)
+    local = np.einsum('eij,ekj->eki', frames[:, :2], points - center[:, None])
+
+    shear = young / (2. * (1. + poisson))
+    plane = np.zeros((nbel, 3, 3))
+    plane[:, 0, 0] = plane[:, 1, 1] = 1.
+    plane[:, 0, 1] = plane[:, 1, 0] = poisson
+    plane[:, 2, 2] = 0.5 * (1. - poisson)
+    plane *= (young / (1. - poisson ** 2))[:, None, None]
+    membrane = plane * thick[:, None, None]
+    bending = plane * (thick ** 3 / 12.)[:, None, None]
+    transverse = SHEAR_FACTOR * shear * thick
+
+    # MITC4 tying points of the covariant transverse shear strains
+    tying_xi = [_shear_row(local, 0., -1., 0), _shear_row(local, 0., 1., 0)]
+    tying_eta = [_shear_row(local, -1., 0., 1), _shear_row(local, 1., 0., 1)]
+
+    kmem = np.zeros((nbel, 8, 8))
+    kplate = np.zeros((nbel, 12, 12))
+    area = np.zeros(nbel)
+    for xi, eta in _gauss2():
+        _, dxi, deta = _shape(xi, eta)
+        jac = _jacobian(local, xi, eta)
+        det = np.linalg.det(jac)
+        inv = np.linalg.inv(jac)
+        area += det
+        dnat = np.stack([np.broadcast_to(dxi, (nbel, 4)),
+                         np.broadcast_to(deta, (nbel, 4))], axis=1)
+        dxy = np.einsum('eij,ejk->eik', inv, dnat)
+        bmem = np.zeros((nbel, 3, 8))
+        bmem[:, 0, 0::2] = dxy[:, 0]
+        bmem[:, 1, 1::2] = dxy[:, 1]
+        bmem[:, 2, 0::2] = dxy[:, 1]
+        bmem[:, 2, 1::2] = dxy[:, 0]
+        kmem += np.matmul(np.matmul(bmem.transpose(0, 2, 1), membrane),
+                          bmem) * det[:, None, None]
+        bbend = np.zeros((nbel, 3, 12))
+        bbend[:, 0, 2::3] = dxy[:, 0]
+        bbend[:, 1, 1::3] = -dxy[:, 1]
+        bbend[:, 2, 1::3] = -dxy[:, 0]
+        bbend[:, 2, 2::3] = dxy[:, 1]
+        kplate += np.matmul(np.matmul(bbend.transpose(0, 2, 1), bending),
+                            bbend) * det[:, None, None]
+        covariant = np.stack([
+            0.5 * (1. - eta) * tying_xi[0] + 0.5 * (1. + eta) * tying_xi[1],
+            0.5 * (1. - xi) * tying_eta[0] + 0.5 * (1. + xi) * tying_eta[1]],
+                             axis=1)
+        bshear = np.einsum('eij,ejk->eik', inv, covariant)
+        kplate += np.matmul(bshear.transpose(0, 2, 1), bshear) * \
+            (transverse * det)[:, None, None]
+
+    stiff = np.zeros((nbel, 24, 24))
+    mem = np.array([6 * i + j for i in range(4) for j in (0, 1)])
+    plate = np.array([6 * i + j for i in range(4) for j in (2, 3, 4)])
+    drill = np.array([6 * i + 5 for i in range(4)])
+    stiff[:, mem[:, None], mem] = kmem
+    stiff[:, plate[:, None], plate] = kplate
+    stiff[:, drill[:, None], drill] = \
+        (DRILLING * young * thick * area)[:, None, None] * \
+        (np.eye(4) - 0.25)
+    stiff = _rotate(stiff, frames)
+
+    # lumped mass, the rotational inertia is isotropic
+    nodal = rho * thick * area / 4.
+    mass = np.zeros((nbel, 24))
+    for i in range(4):
+        mass[:, 6 * i:6 * i + 3] = nodal[:, None]
+        mass[:, 6 * i + 3:6 * i + 6] = (nodal * thick ** 2 / 12.)[:, None]
+    return stiff, mass, frames[:, 2], area
+
+
+def _beam_frames(points):
+    """Lengths (e,) and local frames (e, 3, 3) of the beams."""
+    delta = points[:, 1] - points[:, 0]
+    length = np.linalg.norm(delta, axis=1)
+    axis1 = delta / length[:, None]
+    # the section is square: any transverse axes will do
+    ref = np.zeros((len(points), 3))
+    vertical = np.abs(axis1[:, 2]) > 0.9
+    ref[vertical, 1] = 1.
+    ref[~vertical, 2] = 1.
+    axis2 = np.cross(ref, axis1)
+    axis2 /= np.linalg.norm(axis2, axis=1)[:, None]
+    axis3 = np.cross(axis1, axis2)
+    return length, np.stack([axis1, axis2, axis3], axis=1)
+
+
+def beam_matrices(points, side, young, poisson, rho):
+    """Stiffness and consistent mass (e, 12, 12) of 3D Euler beams.
+
+    Arguments:
+        points (numpy.ndarray): Coordinates of the nodes (e, 2, 3).
+        side (numpy.ndarray): Side of the square sections (e,).
+        young, poisson, rho (numpy.ndarray): Properties (e,).
+    """
+    nbel = len(points)
+    length, frames = _beam_frames(points)
+
+    area = side ** 2
+    inertia = side ** 4 / 12.
+    # torsion constant of a square section (as code_aster RECTANGLE)
+    torsion = side ** 4 * (1. / 3. - 0.21 * (1. - 1. / 12.))
+    shear = young / (2. * (1. + poisson))
+    L = length
+
+    stiff = np.zeros((nbel, 12, 12))
+    mass = np.zeros((nbel, 12, 12))
+
+    def put(matrix, i, j, value):
+        matrix[:, i, j] = value
+        matrix[:, j, i] = value
+
+    axial = young * area / L
+    twist = shear * torsion / L
+    put(stiff, 0, 0, axial)
+    put(stiff, 6, 6, axial)
+    put(stiff, 0, 6, -axial)
+    put(stiff, 3, 3, twist)
+    put(stiff, 9, 9, twist)
+    put(stiff, 3, 9, -twist)
+    # bending in the (1, 2) plane: v, thz and in the (1, 3) plane: w, thy
+    ei = young * inertia
+    for trans, rot, sign in ((1, 5, 1.), (2, 4, -1.)):
+        put(stiff, trans, trans, 12. * ei / L ** 3)
+        put(stiff, trans + 6, trans + 6, 12. * ei / L ** 3)
+        put(stiff, trans, trans + 6, -12. * ei / L ** 3)
+        put(stiff, trans, rot, sign * 6. * ei / L ** 2)
+        put(stiff, trans, rot + 6, sign * 6. * ei / L ** 2)
+        put(stiff, rot, trans + 6, -sign * 6. * ei / L ** 2)
+        put(stiff, trans + 6, rot + 6, -sign * 6. * ei / L ** 2)
+        put(stiff, rot, rot, 4. * ei / L)
+        put(stiff, rot + 6, rot + 6, 4. * ei / L)
+        put(stiff, rot, rot + 6, 2. * ei / L)
+
+    line = rho * area * L / 420.
+    put(mass, 0, 0, 140. * line)
+    put(mass, 6, 6, 140. * line)
+    put(mass, 0, 6, 70. * line)
+    polar = rho * 2. * inertia * L
+    put(mass, 3, 3, polar / 3.)
+    put(mass, 9, 9, polar / 3.)
+    put(mass, 3, 9, polar / 6.)
+    for trans, rot, sign in ((1, 5, 1.), (2, 4, -1.)):
+        put(mass, trans, trans, 156. * line)
+        put(mass, trans + 6, trans + 6, 156. * line)
+        put(mass, trans, trans + 6, 54. * line)
+        put(mass, trans, rot, sign * 22. * L * line)
+        put(mass, trans, rot + 6, -sign * 13. * L * line)
+        put(mass, rot, trans + 6, sign * 13. * L * line)
+        put(mass, trans + 6, rot + 6, -sign * 22. * L * line)
+        put(mass, rot, rot, 4. * L ** 2 * line)
+        put(mass, rot + 6, rot + 6, 4. * L ** 2 * line)
+        put(mass, rot, rot + 6, -3. * L ** 2 * line)
+    return _rotate(stiff, frames), _rotate(mass, frames)
+
+
+def _dofs(conn):
+    """Global dofs (e, 6 * nodes) of the cells."""
+    return (6 * conn[:, :, None] + np.arange(6)).reshape(len(conn), -1)
+
+
+def _assemble(dofs, matrices, size):
+    rows = np.repeat(dofs, dofs.shape[1], axis=1).ravel()
+    cols = np.tile(dofs, (1, dofs.shape[1])).ravel()
+    return sp.coo_matrix((matrices.ravel(), (rows, cols)),
+                         shape=(size, size)).tocsc()
+
+
+class BridgeModel():
+    """Beam and shell model of a bridge mesh.
+
+    Arguments:
+        mesh (BridgeMesh): Mesh with the groups of the command files.
+        element (list[float]): Thickness of the deck then side of the
+            top, main, bottom and lateral beams (`SECTION_GROUPS`).
+        steel (list[float]): E, NU, RHO of the beams.
+        concrete (list[float]): E, NU, RHO of the deck.
+    """
+
+    def __init__(self, mesh, element, steel, concrete):
+        self.mesh = mesh
+        self.element = [float(value) for value in element]
+        self.steel = [float(value) for value in steel]
+        self.concrete = [float(value) for value in concrete]
+        self._matrices = None
+        self.timings = {}
+
+    def _beam_sides(self):
+        """Side of the section of each beam cell."""
+        side = np.full(len(self.mesh.segs), np.nan)
+        for name, value in zip(SECTION_GROUPS[1:], self.element[1:]):
+            side[self.mesh.cells(name, 'seg')] = value
+        beams = self.mesh.cells(BEAM_GROUP, 'seg')
+        missing = np.isnan(side[beams])
+        if missing.any():
+            raise ValueError('{} beam cells have no section'
+                             .format(int(missing.sum())))
+        return beams, side[beams]
+
+    def assemble(self):
+        """Assemble the stiffness and mass matrices (computed once).
+
+        Returns:
+            (scipy.sparse.csc_matrix, scipy.sparse.csc_matrix): K, M.
+        """
+        if self._matrices is not None:
+            return self._matrices
+        start = time.perf_counter()
+        mesh = self.mesh
+        size = 6 * mesh.nb_nodes
+        beams, side = self._beam_sides()
+        ones = np.ones(len(beams))
+        conn = mesh.segs[beams]
+        kbeam, mbeam = beam_matrices(
+            mesh.coords[conn], side, self.steel[0] * ones,
+            self.steel[1] * ones, self.steel[2] * ones)
+        dofs = _dofs(conn)
+        self._beams = dofs, kbeam, _beam_frames(mesh.coords[conn])[1]
+        stiff = _assemble(dofs, kbeam, size)
+        mass = _assemble(dofs, mbeam, size)
+
+        shells = mesh.cells(SHELL_GROUP, 'quad')
+        self._pressure = np.zeros(size)
+        if len(shells):
+            ones = np.ones(len(shells))
+            conn = mesh.quads[shells]
+            kshell, mshell, normals, area = shell_matrices(
+                mesh.coords[conn], self.element[0] * ones,
+                self.concrete[0] * ones, self.concrete[1] * ones,
+                self.concrete[2] * ones)
+            dofs = _dofs(conn)
+            stiff = stiff + _assemble(dofs, kshell, size)
+            diag = np.zeros(size)
+            np.add.at(diag, dofs.ravel(), mshell.ravel())
+            mass = mass + sp.diags(diag, format='csc')
+            # unit pressure, acting against the normal of the cells
+            force = -normals * (area / 4.)[:, None]
+            for i in range(4):
+                np.add.at(self._pressure, 6 * conn[:, i][:, None] +
+                          np.arange(3), force)
+        self._free = self._free_dofs(size, stiff)
+        self._matrices = stiff, mass
+        self.timings['assemble'] = time.perf_counter() - start
+        return self._matrices
+
+    def _free_dofs(self, size, stiff):
+        """Dofs neither blocked by the supports nor disconnected."""
+        blocked = np.zeros(size, dtype=bool)
+        for name, comps in (('left', (0, 1, 2)), ('right', (1, 2))):
+            nodes = self.mesh.node_groups.get(name)
+            if nodes is None:
+                raise ValueError('node group {!r} is missing'.format(name))
+            for comp in comps:
+                blocked[6 * nodes + comp] = True
+        blocked |= np.abs(stiff.diagonal()) == 0.
+        return np.flatnonzero(~blocked)
+
+    def _reduced(self, matrix):
+        return matrix[self._free][:, self._free]
+
+    def static(self, pressure):
+        """Displacements under a pressure on the deck (``PRES_REP``).
+
+        Returns:
+            numpy.ndarray: DX, DY, DZ, DRX, DRY, DRZ of the nodes (n, 6).
+        """
+        stiff, _ = self.assemble()
+        start = time.perf_counter()
+        result = np.zeros(stiff.shape[0])
+        result[self._free] = spla.spsolve(
+            self._reduced(stiff), float(pressure) * self._pressure[self._free])
+        self.timings['static'] = time.perf_counter() - start
+        return result.reshape(-1, 6)
+
+    def beam_forces(self, disp):
+        """Generalized forces at the ends of the beams.
+
+        Arguments:
+            disp (numpy.ndarray): Displacements returned by `static`.
+
+        Returns:
+            numpy.ndarray: N, VY, VZ, MT, MFY, MFZ in the local frame of
+            the beams (e, 2, 6), as the ``EFGE`` fields of code_aster.
+        """
+        self.assemble()
+        dofs, stiff, frames = self._beams
+        ends = np.matmul(stiff, disp.ravel()[dofs][:, :, None])[:, :, 0]
+        local = np.einsum('eij,ekj->eki', frames, ends.reshape(-1, 4, 3))
+        forces = local.reshape(-1, 2, 6)
+        # internal forces: opposite of the end force at the first node
+        forces[:, 0] *= -1.
+        return forces
+
+    def beam_stresses(self, forces):
+        """Maximum normal stress of the beams.
+
+        Arguments:
+            forces (numpy.ndarray): Forces returned by `beam_forces`.
+
+        Returns:
+            numpy.ndarray: |N|/A + |MFY|/W + |MFZ|/W at the corners of
+            the square sections, maximum of both ends (e,).
+        """
+        _, side = self._beam_sides()
+        area = (side ** 2)[:, None]
+        modulus = (side ** 3 / 6.)[:, None]
+        stress = np.abs(forces[..., 0]) / area + \
+            (np.abs(forces[..., 4]) + np.abs(forces[..., 5])) / modulus
+        return stress.max(axis=1)
+
+    def modes(self, count=10):
+        """First eigenfrequencies and mode shapes.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): Frequencies (Hz) and mode
+            shapes (count, n, 6).
+        """
+        stiff, mass = self.assemble()
+        start = time.perf_counter()
+        values, vectors = spla.eigsh(self._reduced(stiff), k=int(count),
+                                     M=self._reduced(mass), sigma=0.,
+                                     which='LM')
+        order = np.argsort(values)
+        values, vectors = values[order], vectors[:, order]
+        shapes = np.zeros((len(values), stiff.shape[0]))
+        shapes[:, self._free] = vectors.T
+        self.timings['modes'] = time.perf_counter() - start
+        freqs = np.sqrt(np.maximum(values, 0.)) / (2. * math.pi)
+        return freqs, shapes.reshape(len(values), -1, 6)
+
+
+def gui_model(mesh_file, element, material1, material2):
+    """Model of the current design of `truss_bridge.Main`.
+
+    Arguments:
+        mesh_file (str): MED file of the bridge.
+        element, material1, material2 (list[str]): Properties gathered
+            by `Main.change_element_pro` (section sizes, steel and
+            concrete).
+    """
+    return BridgeModel(read_med(mesh_file), element, material1, material2)
+
+
+def validate(folder=HERE):
+    """Compare the preview with the code_aster results of *folder*.
+
+    Returns:
+        dict: 'static' (maximum deflections and relative error of the
+        displacements) and 'modes' (reference and preview frequencies)
+        for the results that are available.
+    """
+    report = {}
+    static = osp.join(folder, REFERENCE['static'])
+    if osp.isfile(static):
+        model = BridgeModel(read_med(static), REFERENCE['element'],
+                            REFERENCE['steel'], REFERENCE['concrete'])
+        disp = model.static(REFERENCE['pressure'])
+        _, ref = read_med_field(static, 'reslin__DEPL')[0]
+        error = np.linalg.norm(disp[:, :3] - ref[:, :3]) / \
+            np.linalg.norm(ref[:, :3])
+        report['static'] = {
+            'reference': float(ref[:, 2].min()),
+            'preview': float(disp[:, 2].min()),
+            'error': float(error),
+            'time': sum(model.timings.values())}
+    mess = osp.join(folder, REFERENCE['frequencies'])
+    modes = osp.join(folder, REFERENCE['modes'])
+    if osp.isfile(mess) and osp.isfile(modes):
+        ref = read_mess_frequencies(mess)
+        model = BridgeModel(read_med(modes), REFERENCE['element'],
+                            REFERENCE['steel'], REFERENCE['concrete'])
+        freqs, _ = model.modes(len(ref))
+        report['modes'] = {'reference': ref, 'preview': list(freqs),
+                           'time': sum(model.timings.values())}
+    return report
+
+
+def timing(sections, count=10, pressure=REFERENCE['pressure']):
+    """Time the preview of generated bridges.
+
+    Returns:
+        list[dict]: Sizes and timings for each number of sections.
+    """
+    rows = []
+    for nbsec in sections:
+        start = time.perf_counter()
+        mesh = truss_mesh(length=5. * nbsec, sections=nbsec)
+        generated = time.perf_counter() - start
+        model = BridgeModel(mesh, REFERENCE['element'], REFERENCE['steel'],
+                            REFERENCE['concrete'])
+        model.static(pressure)
+        freqs, _ = model.modes(count)
+        rows.append(dict(model.timings, sections=nbsec, mesh=generated,
+                         nodes=mesh.nb_nodes, dofs=len(model._free),
+                         first=float(freqs[0])))
+    return rows
+
+
+def main(argv=None):
+    """Validation and timings of the preview solver."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Beam and shell preview solver of the truss bridge.')
+    subparsers = parser.add_subparsers(dest='action')
+    check = subparsers.add_parser('validate',
+                                  help='compare with code_aster results')
+    check.add_argument('folder', nargs='?', default=HERE)
+    bench = subparsers.add_parser('timing', help='time generated bridges')
+    bench.add_argument('--sections', type=int, nargs='+',
+                       default=[8, 16, 32, 64])
+    bench.add_argument('--modes', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.action == 'validate':
+        report = validate(args.folder)
+        if not report:
+            print('no code_aster result in {}'.format(args.folder))
+            return 1
+        if 'static' in report:
+            res = report['static']
+            print('static: min DZ {:.4e} m (code_aster {:.4e} m), '
+                  'relative error of the displacements {:.2%}, {:.2f} s'
+                  .format(res['preview'], res['reference'], res['error'],
+                          res['time']))
+        if 'modes' in report:
+            res = report['modes']
+            print('modes: {:.2f} s'.format(res['time']))
+            for i, (ref, val) in enumerate(zip(res['reference'],
+                                               res['preview'])):
+                print('  {:2d}  {:8.4f} Hz  code_aster {:8.4f} Hz  {:+6.2%}'
+                      .format(i + 1, val, ref, val / ref - 1.))
+    elif args.action == 'timing':
+        print('sections   nodes    dofs    mesh  assemble  static   modes'
+              '  f1 (Hz)')
+        for row in timing(args.sections, args.modes):
+            print('{sections:8d} {nodes:7d} {dofs:7d} {mesh:7.2f} '
+                  '{assemble:9.2f} {static:7.2f} {modes:7.2f} {first:8.4f}'
+                  .format(**row))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,596 @@
+"""
+Parameter sweeps of the truss bridge
+------------------------------------
+
+`truss_bridge.Main` evaluates one design at a time (`cal_spacing`,
+`change_element_pro` then `submit`). This module runs design studies:
+
+- the designs are a full grid of parameter values (`grid`) or a Latin
+  hypercube sample of parameter ranges (`latin_hypercube`), the other
+  parameters keep the values of the default bridge (`PARAMETERS`),
+- each design gets its own directory with its mesh (`preview.truss_mesh`
+  written in MED, the topology of ``create_geo_mesh_new.py``) and its
+  command files (``static.comm`` and ``modes.comm`` of this directory
+  with the parameters of the design),
+- the designs are run concurrently by a local process pool, either with
+  code_aster (``as_run``, see `executor.STAGES`) or with the preview
+  solver (`preview.BridgeModel`, a few seconds per design),
+- the maximum displacement, the maximum generalized forces and normal
+  stress of the beams and the frequencies of all the designs are
+  gathered in ``results.csv``.
+
+The result of each design is written in its directory as soon as it is
+known: an interrupted sweep is resumed where it stopped, the designs
+already computed are not run again. The throughput of each run, in
+designs per hour, is recorded in ``sweep.json``.
+
+Example::
+
+    python3 -m asterstudy.gui.truss_bridge.sweep grid /tmp/study \\
+        --set width=6,8,10 --set sections=8,12,16 --jobs 4
+    python3 -m asterstudy.gui.truss_bridge.sweep lhs /tmp/study2 \\
+        --range height=4:6 --range main_beams=0.08:0.15 --count 50 \\
+        --solver aster
+    python3 -m asterstudy.gui.truss_bridge.sweep resume /tmp/study2
+"""
+
+import csv
+import hashlib
+import itertools
+import json
+import os
+import os.path as osp
+import re
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .preview import (HERE, BridgeModel, read_med_field,
+                      read_mess_frequencies, truss_mesh, write_med)
+from ..hexinjisuan.executor import STAGES
+
+
+MANIFEST = 'sweep.json'
+TABLE = 'results.csv'
+RESULT = 'result.json'
+MESH = 'Mesh_1.med'
+
+SOLVERS = ('preview', 'aster')
+
+# parameters of a design and their values for the default bridge
+PARAMETERS = OrderedDict([
+    ('width', 8.), ('height', 5.), ('length', 40.), ('sections', 8),
+    # EPAIS of the road, H of the beams (`Main.change_element_pro`)
+    ('thickness', 0.1), ('top_beams', 0.1), ('main_beams', 0.1),
+    ('bottom_beams', 0.1), ('lateral_beams', 0.1),
+    ('steel_e', 2.e11), ('steel_nu', 0.3), ('steel_rho', 7850.),
+    ('concrete_e', 2.5e10), ('concrete_nu', 0.2), ('concrete_rho', 2300.),
+    ('pressure', 1.e5), ('modes', 10),
+])
+
+INTEGERS = ('sections', 'modes')
+
+# maxima gathered for each design
+MAXIMA = ('max_disp', 'max_dz', 'max_n', 'max_v', 'max_mt', 'max_mf',
+          'max_stress')
+
+
+def design(**values):
+    """Return a complete design: the default bridge changed by *values*.
+
+    The spacing is not a parameter: it is ``length / sections``, as in
+    `Main.cal_spacing`.
+    """
+    unknown = set(values).difference(PARAMETERS)
+    if unknown:
+        raise KeyError('unknown parameter(s): ' + ', '.join(sorted(unknown)))
+    point = OrderedDict(PARAMETERS)
+    point.update(values)
+    for name in INTEGERS:
+        point[name] = int(round(point[name]))
+    if point['sections'] < 2 or point['sections'] % 2:
+        raise ValueError('the number of sections must be even')
+    for name in PARAMETERS:
+        if name not in INTEGERS:
+            point[name] = float(point[name])
+    return point
+
+
+def design_key(point):
+    """Return the identifier of a design (hash of its parameters)."""
+    text = json.dumps([[name, point[name]] for name in PARAMETERS])
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def grid(**values):
+    """Return the designs of a full grid.
+
+    Arguments:
+        values (list): Values of each varied parameter.
+
+    Returns:
+        list[dict]: Designs, the last parameter varies fastest.
+    """
+    names = list(values)
+    return [design(**dict(zip(names, combination)))
+            for combination in itertools.product(*values.values())]
+
+
+def _even(value, low, high):
+    """Nearest even integer of *value* in [low, high]."""
+    even = 2 * int(round(value / 2.))
+    low, high = 2 * int(np.ceil(low / 2.)), 2 * int(high // 2)
+    return min(max(even, low), high)
+
+
+def latin_hypercube(ranges, count, seed=0):
+    """Return a Latin hypercube sample of parameter ranges.
+
+    Each range is divided in *count* strata of equal width and each
+    stratum is sampled exactly once. Integer parameters are rounded (the
+    number of sections to an even number), so that duplicated designs
+    may be removed.
+
+    Arguments:
+        ranges (dict): (low, high) of each varied parameter.
+        count (int): Number of designs.
+        seed (Optional[int]): Seed of the random generator.
+
+    Returns:
+        list[dict]: Designs.
+    """
+    random = np.random.RandomState(seed)
+    names = list(ranges)
+    unit = (random.rand(count, len(names)) +
+            np.array([random.permutation(count)
+                      for _ in names]).T) / count
+    designs = OrderedDict()
+    for row in unit:
+        values = {}
+        for name, fraction in zip(names, row):
+            low, high = ranges[name]
+            value = low + fraction * (high - low)
+            if name == 'sections':
+                value = _even(value, low, high)
+            values[name] = value
+        point = design(**values)
+        designs.setdefault(design_key(point), point)
+    return list(designs.values())
+
+
+def _substitute(text, pattern, value):
+    """Replace the group 1 of *pattern* by *value* in *text*."""
+    def _replace(match):
+        start, end = match.start(1) - match.start(), match.end(1) - match.start()
+        return match.group(0)[:start] + str(value) + match.group(0)[end:]
+    new, count = re.subn(pattern, _replace, text)
+    if not count:
+        raise ValueError('{!r} not found in the command file'.format(pattern))
+    return new
+
+
+def command_file(template, point):
+    """Return a command file of this directory adapted to a design.
+
+    Arguments:
+        template (str): Text of ``static.comm`` or ``modes.comm``.
+        point (dict): Design.
+    """
+    text = _substitute(template, r"EPAIS=([^,]+),", point['thickness'])
+    for group in ('top_beams', 'main_beams', 'bottom_beams',
+                  'lateral_beams'):
+        text = _substitute(
+            text, r"GROUP_MA=\('{}', \),\s*SECTION='RECTANGLE',\s*"
+            r"VALE=\(([^,]+),".format(group), point[group])
+    for name in ('steel', 'concrete'):
+        text = re.sub(
+            r"(?m)^{} = DEFI_MATERIAU\(.*$".format(name),
+            '{} = DEFI_MATERIAU(ELAS=_F(E={}, NU={}, RHO={}))'.format(
+                name, point[name + '_e'], point[name + '_nu'],
+                point[name + '_rho']), text)
+    if 'PRES=' in text:
+        text = _substitute(text, r"PRES=([^)\s]+)\)", point['pressure'])
+    if 'NMAX_FREQ=' in text:
+        text = _substitute(text, r"NMAX_FREQ=(\d+)", point['modes'])
+    return text
+
+
+def command_parameters(text):
+    """Return the design parameters found in a command file.
+
+    Inverse of `command_file`: only the parameters written in the file
+    are returned (no pressure in ``modes.comm``, no number of modes in
+    ``static.comm``).
+    """
+    patterns = [('thickness', r"EPAIS=([^,]+),")]
+    for group in ('top_beams', 'main_beams', 'bottom_beams',
+                  'lateral_beams'):
+        patterns.append((group, r"GROUP_MA=\('{}', \),\s*SECTION='RECTANGLE',"
+                                r"\s*VALE=\(([^,]+),".format(group)))
+    patterns.append(('pressure', r"PRES=([^)\s]+)\)"))
+    patterns.append(('modes', r"NMAX_FREQ=(\d+)"))
+    values = OrderedDict()
+    for name, pattern in patterns:
+        match = re.search(pattern, text)
+        if match:
+            values[name] = match.group(1)
+    for name in ('steel', 'concrete'):
+        match = re.search(r"(?m)^{} = DEFI_MATERIAU\(ELAS=_F\(E=([^,]+), "
+                          r"NU=([^,]+), RHO=([^)]+)\)".format(name), text)
+        if match:
+            for suffix, value in zip(('_e', '_nu', '_rho'), match.groups()):
+                values[name + suffix] = value
+    for name, value in list(values.items()):
+        try:
+            values[name] = (int if name in INTEGERS else float)(
+                float(value.strip()))
+        except ValueError:
+            del values[name]
+    return values
+
+
+def export_file(template, case, stage):
+    """Return an export file of this directory for a design directory."""
+    lines = []
+    for line in template.splitlines():
+        fields = line.split()
+        if not fields or fields[:2] == ['P', 'rep_trav']:
+            continue
+        if fields[:2] == ['P', 'mpi_nbcpu']:
+            line = 'P mpi_nbcpu 1'
+        elif fields[0] == 'F':
+            name = osp.basename(fields[2])
+            if name.endswith('.med'):
+                name = MESH
+            elif name.endswith('.rmed'):
+                name = stage + '_res.rmed'
+            fields[2] = osp.join(case, name)
+            line = ' '.join(fields)
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def prepare(case, point):
+    """Write the mesh and the code_aster files of a design."""
+    os.makedirs(case, exist_ok=True)
+    mesh = truss_mesh(point['width'], point['height'], point['length'],
+                      point['sections'])
+    write_med(mesh, osp.join(case, MESH))
+    for stage in ('static', 'modes'):
+        with open(osp.join(HERE, stage + '.comm')) as fobj:
+            comm = command_file(fobj.read(), point)
+        with open(osp.join(case, stage + '.comm'), 'w') as fobj:
+            fobj.write(comm)
+        with open(osp.join(HERE, stage + '.export')) as fobj:
+            export = export_file(fobj.read(), case, stage)
+        with open(osp.join(case, stage + '.export'), 'w') as fobj:
+            fobj.write(export)
+    return mesh
+
+
+def maxima(disp, forces, stress):
+    """Maxima of a design.
+
+    Arguments:
+        disp (numpy.ndarray): DX, DY, DZ... of the nodes (n, 6).
+        forces (numpy.ndarray): N, VY, VZ, MT, MFY, MFZ of the beams
+            (k, 6). The shear forces and the bending moments are
+            compared by their resultant, independent of the local axes.
+        stress (numpy.ndarray): Normal stress of the beams, axial plus
+            bending at the corners of the sections.
+    """
+    return OrderedDict([
+        ('max_disp', float(np.sqrt((disp[:, :3] ** 2).sum(axis=1)).max())),
+        ('max_dz', float(np.abs(disp[:, 2]).max())),
+        ('max_n', float(np.abs(forces[:, 0]).max())),
+        ('max_v', float(np.hypot(forces[:, 1], forces[:, 2]).max())),
+        ('max_mt', float(np.abs(forces[:, 3]).max())),
+        ('max_mf', float(np.hypot(forces[:, 4], forces[:, 5]).max())),
+        ('max_stress', float(np.max(stress))),
+    ])
+
+
+def _run_preview(case, point):
+    mesh = truss_mesh(point['width'], point['height'], point['length'],
+                      point['sections'])
+    model = BridgeModel(
+        mesh, [point[name] for name in ('thickness', 'top_beams',
+                                        'main_beams', 'bottom_beams',
+                                        'lateral_beams')],
+        [point['steel_e'], point['steel_nu'], point['steel_rho']],
+        [point['concrete_e'], point['concrete_nu'], point['concrete_rho']])
+    disp = model.static(point['pressure'])
+    forces = model.beam_forces(disp)
+    result = maxima(disp, forces.reshape(-1, 6),
+                    model.beam_stresses(forces))
+    freqs, _ = model.modes(point['modes'])
+    result['frequencies'] = [float(fre) for fre in freqs]
+    return result
+
+
+def _run_aster(case, point):
+    mesh = prepare(case, point)
+    for stage in ('static', 'modes'):
+        with open(osp.join(case, stage + '.log'), 'wb') as log:
+            subprocess.run(STAGES[stage].local_argv(case, []), cwd=case,
+                           stdout=log, stderr=subprocess.STDOUT, check=True)
+    rmed = osp.join(case, 'static_res.rmed')
+    _, disp = read_med_field(rmed, 'reslin__DEPL')[-1]
+    _, efge = read_med_field(rmed, 'reslin__EFGE_NOEU')[-1]
+    beams = mesh.node_groups['all_beams']
+    _, sipo = read_med_field(rmed, 'reslin__SIPO_NOEU')[-1]
+    result = maxima(disp, efge[beams, :6], np.abs(sipo[:, 0]) +
+                    np.abs(sipo[:, 4]) + np.abs(sipo[:, 5]))
+    result['frequencies'] = read_mess_frequencies(
+        osp.join(case, 'modes.mess'))
+    return result
+
+
+def run_design(folder, point, solver):
+    """Run a design (in a worker process) and write its result.
+
+    Returns:
+        dict: Result of the design (see `Sweep.results`).
+    """
+    key = design_key(point)
+    case = osp.join(folder, 'designs', key)
+    os.makedirs(case, exist_ok=True)
+    start = time.time()
+    result = OrderedDict([('key', key), ('solver', solver)])
+    try:
+        if solver == 'aster':
+            values = _run_aster(case, point)
+        else:
+            values = _run_preview(case, point)
+        result['status'] = 'ok'
+        result.update(values)
+    except Exception as exc: # pragma pylint: disable=broad-except
+        result['status'] = 'failed'
+        result['error'] = '{}: {}'.format(type(exc).__name__, exc)
+    result['wall'] = time.time() - start
+    result['design'] = point
+    path = osp.join(case, RESULT)
+    with open(path + '.tmp', 'w') as fobj:
+        json.dump(result, fobj, indent=1)
+    os.replace(path + '.tmp', path)
+    return result
+
+
+class Sweep:
+    """Design study stored in a directory.
+
+    Arguments:
+        folder (str): Directory of the study.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = osp.join(folder, MANIFEST)
+        with open(self.path) as fobj:
+            self.data = json.load(fobj, object_pairs_hook=OrderedDict)
+
+    @classmethod
+    def create(cls, folder, designs, solver='preview'):
+        """Create a study, or reuse it if it has the same designs.
+
+        Raises:
+            ValueError: If *folder* holds another study.
+        """
+        if solver not in SOLVERS:
+            raise ValueError('unknown solver: {!r}'.format(solver))
+        designs = OrderedDict((design_key(point), point)
+                              for point in designs)
+        path = osp.join(folder, MANIFEST)
+        if osp.isfile(path):
+            sweep = cls(folder)
+            if list(sweep.data['designs']) != list(designs) or \
+                    sweep.data['solver'] != solver:
+                raise ValueError('{} holds another study'.format(folder))
+            return sweep
+        os.makedirs(folder, exist_ok=True)
+        data = OrderedDict([('solver', solver), ('created', time.time()),
+                            ('designs', designs), ('runs', [])])
+        with open(path, 'w') as fobj:
+            json.dump(data, fobj, indent=1)
+        return cls(folder)
+
+    def save(self):
+        """Write the manifest."""
+        with open(self.path + '.tmp', 'w') as fobj:
+            json.dump(self.data, fobj, indent=1)
+        os.replace(self.path + '.tmp', self.path)
+
+    @property
+    def designs(self):
+        """OrderedDict: Designs of the study by key."""
+        return self.data['designs']
+
+    def result(self, key):
+        """Return the result of a design, *None* if not computed."""
+        try:
+            with open(osp.join(self.folder, 'designs', key, RESULT)) as fobj:
+                return json.load(fobj, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            return None
+
+    def results(self):
+        """Return the results of the designs computed so far."""
+        results = (self.result(key) for key in self.designs)
+        return [result for result in results if result is not None]
+
+    def pending(self):
+        """Return the keys of the designs not computed successfully."""
+        return [key for key in self.designs
+                if (self.result(key) or {}).get('status') != 'ok']
+
+    def run(self, jobs=None, callback=None):
+        """Run the pending designs with a pool of processes.
+
+        Arguments:
+            jobs (Optional[int]): Number of processes (number of CPUs by
+                default).
+            callback (Optional[callable]): Called with the result of
+                each design once it is known.
+
+        Returns:
+            dict: Record of the run: number of designs done and failed,
+            wall time and throughput (designs per hour).
+        """
+        pending = self.pending()
+        jobs = jobs or os.cpu_count() or 1
+        record = OrderedDict([('start', time.time()), ('jobs', jobs),
+                              ('pending', len(pending)), ('done', 0),
+                              ('failed', 0)])
+        self.data['runs'].append(record)
+        self.save()
+        try:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [pool.submit(run_design, self.folder,
+                                       self.designs[key], self.data['solver'])
+                           for key in pending]
+                try:
+                    for future in as_completed(futures):
+                        if callback is not None:
+                            callback(future.result())
+                except BaseException:
+                    # interrupted: only the running designs are finished
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            record['wall'] = time.time() - record['start']
+            for key in pending:
+                status = (self.result(key) or {}).get('status')
+                if status is not None:
+                    record['done' if status == 'ok' else 'failed'] += 1
+            record['per_hour'] = _per_hour(record['done'], record['wall'])
+            self.save()
+            self.write_table()
+        return record
+
+    def throughput(self):
+        """Return the throughput of all the runs (designs per hour)."""
+        done = sum(run['done'] for run in self.data['runs'])
+        wall = sum(run.get('wall', 0.) for run in self.data['runs'])
+        return _per_hour(done, wall)
+
+    def write_table(self):
+        """Write the results of the computed designs in ``results.csv``.
+
+        Returns:
+            str: Path of the table.
+        """
+        results = self.results()
+        nbfreq = max([len(result.get('frequencies', []))
+                      for result in results] + [0])
+        columns = (['key'] + list(PARAMETERS) + ['solver', 'status'] +
+                   list(MAXIMA) + ['f%d' % (i + 1) for i in range(nbfreq)] +
+                   ['wall', 'error'])
+        path = osp.join(self.folder, TABLE)
+        with open(path + '.tmp', 'w', newline='') as fobj:
+            writer = csv.writer(fobj)
+            writer.writerow(columns)
+            for result in results:
+                row = dict(result['design'], **result)
+                for i, fre in enumerate(result.get('frequencies', [])):
+                    row['f%d' % (i + 1)] = fre
+                writer.writerow([row.get(name, '') for name in columns])
+        os.replace(path + '.tmp', path)
+        return path
+
+    def summary(self):
+        """Return a description of the study."""
+        results = self.results()
+        done = sum(1 for result in results if result['status'] == 'ok')
+        lines = ['{} designs ({} solver): {} done, {} failed, {} pending'
+                 .format(len(self.designs), self.data['solver'], done,
+                         len(results) - done, len(self.designs) - done)]
+        for run in self.data['runs']:
+            lines.append('run at {}: {} done, {} failed in {:.0f} s with {} '
+                         'process(es), {:.0f} designs/h'.format(
+                             time.strftime('%Y-%m-%d %H:%M',
+                                           time.localtime(run['start'])),
+                             run['done'], run['failed'], run.get('wall', 0.),
+                             run['jobs'], run.get('per_hour', 0.)))
+        return '\n'.join(lines)
+
+
+def _per_hour(done, wall):
+    return 3600. * done / wall if wall > 0. else 0.
+
+
+def _values(text, parse):
+    """Parse 'name=...' of the command line."""
+    name, _, value = text.partition('=')
+    if name not in PARAMETERS:
+        raise SystemExit('unknown parameter: {!r}'.format(name))
+    return name, parse(value)
+
+
+def main(argv=None):
+    """Create, run and resume design studies."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Parameter sweeps of the truss bridge.')
+    subparsers = parser.add_subparsers(dest='action')
+    full = subparsers.add_parser('grid', help='full grid of values')
+    full.add_argument('--set', action='append', default=[],
+                      help='name=v1,v2,... (see PARAMETERS)')
+    lhs = subparsers.add_parser('lhs', help='Latin hypercube sample')
+    lhs.add_argument('--range', action='append', default=[],
+                     help='name=low:high')
+    lhs.add_argument('--count', type=int, default=20)
+    lhs.add_argument('--seed', type=int, default=0)
+    for sub in (full, lhs):
+        sub.add_argument('--solver', choices=SOLVERS, default='preview')
+    resume = subparsers.add_parser('resume', help='run the pending designs')
+    show = subparsers.add_parser('show', help='show the state of a study')
+    for sub in (full, lhs, resume, show):
+        sub.add_argument('folder')
+    for sub in (full, lhs, resume):
+        sub.add_argument('--jobs', type=int, default=None,
+                         help='number of processes')
+    args = parser.parse_args(argv)
+
+    if args.action is None:
+        parser.print_help()
+        return 1
+    if args.action == 'grid':
+        values = OrderedDict(_values(item, lambda text: [
+            float(value) for value in text.split(',')]) for item in args.set)
+        sweep = Sweep.create(args.folder, grid(**values), args.solver)
+    elif args.action == 'lhs':
+        ranges = OrderedDict(_values(item, lambda text: [
+            float(value) for value in text.split(':')]) for item in args.range)
+        sweep = Sweep.create(args.folder, latin_hypercube(
+            ranges, args.count, args.seed), args.solver)
+    else:
+        sweep = Sweep(args.folder)
+    if args.action == 'show':
+        print(sweep.summary())
+        return 0
+
+    total = len(sweep.designs)
+    state = {'count': total - len(sweep.pending())}
+
+    def _progress(result):
+        state['count'] += 1
+        print('[{}/{}] {} {} {}'.format(
+            state['count'], total, result['key'], result['status'],
+            result.get('error', '{:.4e} m, f1 {:.4f} Hz'.format(
+                result.get('max_disp', 0.),
+                (result.get('frequencies') or [0.])[0]))), flush=True)
+
+    record = sweep.run(args.jobs, _progress)
+    print('{} designs in {:.1f} s: {:.0f} designs/h, results in {}'.format(
+        record['done'], record['wall'], record['per_hour'],
+        osp.join(args.folder, TABLE)))
+    return 0 if not record['failed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
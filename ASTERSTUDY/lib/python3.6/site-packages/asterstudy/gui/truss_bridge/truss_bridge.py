@@ -2,7 +2,6 @@ import sys
 import os
 import shutil
 import time
-import pvsimple as pvs
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import QApplication, QDialog,QFrame
 from PyQt5.QtWidgets import QApplication,QFileDialog
@@ -29,6 +28,7 @@ from ...common import (MeshElemType, MeshGroupType, common_filters, connect,
                        is_child, is_medfile, is_reference, is_subclass,
                        is_valid_group_name, load_icon, translate)
 from ..salomegui_utils import *
+from ..hexinjisuan.executor import get_executor, start
 
 
 class Main(QWidget):
@@ -58,6 +58,8 @@ class Main(QWidget):
         self.process = QtCore.QProcess(self)
         #self.process1 = QtCore.QProcess(self)
         self.process2 = QtCore.QProcess(self)
+        # 集群提交(submit.sh)或本机运行as_run(TANKSIM_EXECUTOR=local)
+        self.executor = get_executor()
         #self.process.readyRead.connect(self.dataReady)
         #self.process2.readyRead.connect(self.dataReady)
         #self.init_paraview()
@@ -82,6 +84,12 @@ class Main(QWidget):
         self.ui.pushButton_4.clicked.connect(self.submit)
         self.ui.pushButton_break.clicked.connect(self.show_result)
         self.ui.pushButton_break.setEnabled(False)
+        # 快速预览
+        self.ui.pushButton_preview.clicked.connect(self.preview)
+        # 算例目录
+        self.ui.pushButton_catalog.clicked.connect(self.show_catalog)
+        # 磁盘空间
+        self.ui.pushButton_storage.clicked.connect(self.show_storage)
         #self.ui.tabWidget.currentChanged['int'].connect(self.main_tab_change)
     def startmesh(self,fname):
         #import subprocess
@@ -337,6 +345,7 @@ class Main(QWidget):
         '''
             显示网格
         '''
+        import pvsimple as pvs
         #boundary_file = self.workingdirectory + '/constant/polyMesh/boundary'
         try:
             if self.currentdisplay:
@@ -490,14 +499,12 @@ class Main(QWidget):
                 self.disable_some_buttons()
                 self.ui.pushButton_4.setEnabled(False)
                 #cmd = '/amd_share/online1/install/code_aster_14.6/14.6/bin/as_run '
-                cmd = 'sh '
-                cmd += self.curr_dir
-                cmd += '/submit2.sh'
+                cmd = self.executor.command('modes', self.curr_dir, 1, '')
                 print('cmd_modes:',cmd)
                 try:
                     self.process2.start('echo 提交计算')
                     QApplication.processEvents()
-                    self.process.start(cmd)
+                    start(self.process, cmd)
                     #self.process.waitForFinished()
                     QtWidgets.QMessageBox.information(self, '提示', '已提交计算，请稍等!')
                     self.ui.pushButton_4.setEnabled(False)
@@ -515,15 +522,14 @@ class Main(QWidget):
                 self.disable_some_buttons()
                 self.ui.pushButton_4.setEnabled(False)
                 self.create_static_comm(self.material1,self.material2,self.element,self.curr_dir,self.pres)    
-                cmd = 'sh '
-                cmd += self.curr_dir
-                cmd += '/submit.sh'
+                cmd = self.executor.command('static', self.curr_dir,
+                                            self.executor.max_cores, '')
                 print('cmd:',cmd)
                 try:
                     self.process2.start('echo 提交计算')
                     print('提交计算！')
                     QApplication.processEvents()
-                    self.process.start(cmd)
+                    start(self.process, cmd)
                     self.process.waitForFinished()
                     QtWidgets.QMessageBox.information(self, '提示', '已提交计算，请稍等!')
                     self.ui.pushButton_4.setEnabled(False)
@@ -536,6 +542,85 @@ class Main(QWidget):
                     print('提交计算失败!')
                     ok = 0
     
+    def preview_mesh(self):
+        '''
+            快速预览所用网格：按界面当前参数生成；
+            参数与界面完全一致的网格文件(cal_spacing 生成的 Mesh_<参数>.med)才被复用
+        '''
+        from .preview import read_med, truss_mesh
+        width = float(self.ui.width_lineEdit.text())
+        height = float(self.ui.height_lineEdit.text())
+        length = float(self.ui.length_lineEdit.text())
+        sections = int(self.ui.sections_lineEdit.text())
+        # 文件名中的参数保留两位小数(见 cal_spacing)
+        exact = all(value == float('%.2f' % value)
+                    for value in (width, height, length))
+        if exact and sections > 0:
+            spacing = float('%.2f' % (length / sections))
+            fname = 'Mesh' + ''.join('_' + str(i) for i in
+                                     (width, height, length, sections, spacing)) + '.med'
+            fdir = os.path.join(self.curr_dir, fname)
+            if os.path.isfile(fdir):
+                return read_med(fdir)
+        return truss_mesh(width, height, length, sections)
+
+    def preview(self):
+        '''
+            本地梁/板模型快速计算位移或频率(秒级)，不提交code_aster
+        '''
+        from .preview import BridgeModel
+        self.change_element_pro()
+        for i in self.element + self.material1 + self.material2:
+            if not self.check_parameter_isnum(i):
+                return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            model = BridgeModel(self.preview_mesh(), self.element,
+                                self.material1, self.material2)
+            if self.ui.modes_button.isChecked():
+                nbfre = getattr(self, 'fre', '') or '10'
+                freqs, _ = model.modes(int(float(nbfre)))
+                text = '\n'.join('第%d阶: %.4f Hz' % (i + 1, fre)
+                                  for i, fre in enumerate(freqs))
+            else:
+                pres = float(getattr(self, 'pres', '') or '1e5')
+                disp = model.static(pres)
+                norm = (disp[:, :3] ** 2).sum(axis=1) ** 0.5
+                text = '压力 %g Pa\n最大位移: %.4e m\n最大竖向位移DZ: %.4e m' % (
+                    pres, norm.max(), abs(disp[:, 2]).max())
+        except Exception as exc: # pragma pylint: disable=broad-except
+            QApplication.restoreOverrideCursor()
+            QtWidgets.QMessageBox.information(self, '错误', '预览失败: %s' % exc)
+            return
+        QApplication.restoreOverrideCursor()
+        text += '\n\n计算用时 %.2f s (预览结果，以code_aster计算为准)' % sum(
+            model.timings.values())
+        QtWidgets.QMessageBox.information(self, '快速预览', text)
+
+    def show_catalog(self):
+        '''
+            历史算例查询面板：按参数与结果检索已计算的算例
+        '''
+        from ..catalog import CatalogPanel, default_roots
+        if getattr(self, 'catalog_panel', None) is None:
+            self.catalog_panel = CatalogPanel(
+                roots=default_roots() + [self.curr_dir])
+            self.catalog_panel.setWindowFlags(Qt.Window)
+        self.catalog_panel.show()
+        self.catalog_panel.raise_()
+
+    def show_storage(self):
+        '''
+            磁盘空间面板：按项目/算例/文件类别统计占用，按保留策略清理中间文件
+        '''
+        from ..storage import StoragePanel, default_roots
+        if getattr(self, 'storage_panel', None) is None:
+            # curr_dir 为程序安装目录, 不作为算例根目录(避免清理)
+            self.storage_panel = StoragePanel(roots=default_roots())
+            self.storage_panel.setWindowFlags(Qt.Window)
+        self.storage_panel.show()
+        self.storage_panel.raise_()
+
     def check_parameter_isnum(self,num):
         try:
             num = float(num)
@@ -563,6 +648,7 @@ class Main(QWidget):
             return False       
 
     def show_modes_result(self):
+        import pvsimple as pvs
         #choice = self.fre[0]
         choice_list = self.fre_all
         #QInputDialog.getItem(self, "select input dialog", '语言列表', items, 0, False)
@@ -688,6 +774,7 @@ class Main(QWidget):
             self.show_static_result()
 
     def show_static_result(self):
+        import pvsimple as pvs
         choice_list = ['位移','应力']
         self.res_show, ok = QtWidgets.QInputDialog.getItem(self, "select", '结果类型', choice_list, 0, False)
         try:
@@ -886,6 +973,7 @@ class Main(QWidget):
         self.ui.static_button.setEnabled(True)
         self.ui.modes_button.setEnabled(True)
         self.ui.pushButton_4.setEnabled(True)
+        self.ui.pushButton_preview.setEnabled(True)
 
     def disable_some_buttons(self):
         '''
@@ -897,4 +985,5 @@ class Main(QWidget):
         self.ui.apply.setEnabled(False)
         self.ui.static_button.setEnabled(False)
         self.ui.modes_button.setEnabled(False)
+        self.ui.pushButton_preview.setEnabled(False)
         self.ui.pushButton_break.setEnabled(False)
\ No newline at end of file
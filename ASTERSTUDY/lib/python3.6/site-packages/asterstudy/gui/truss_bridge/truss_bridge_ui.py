@@ -247,6 +247,12 @@ class Ui_Workspace(QWidget):
         self.pushButton_4 = QtWidgets.QPushButton(self.groupBox_3)
         self.pushButton_break = QtWidgets.QPushButton('显示结果',self.groupBox_3)
         self.pushButton_break.setEnabled(False)
+        # 本地快速预览(preview.py)，无需提交code_aster
+        self.pushButton_preview = QtWidgets.QPushButton('快速预览',self.groupBox_3)
+        # 历史算例查询(catalog.py)
+        self.pushButton_catalog = QtWidgets.QPushButton('算例目录',self.groupBox_3)
+        # 磁盘空间与清理(storage.py)
+        self.pushButton_storage = QtWidgets.QPushButton('磁盘空间',self.groupBox_3)
         #icon5 = QtGui.QIcon()
         #icon5.addPixmap(QtGui.QPixmap("/usr/sw-cluster/simforge/PFsalome/SALOME-9.4.0-CO7-SRC/BINARIES-CO7/ASTERSTUDY/lib/python3.6/site-packages/asterstudy/gui/Workspace/检查 (1).png"), QtGui.QIcon.Normal, QtGui.QIcon.Off)
         #self.pushButton_4.setIcon(icon5)
@@ -254,6 +260,9 @@ class Ui_Workspace(QWidget):
 
         self.h_layout_test.addWidget(self.pushButton_4)
         self.h_layout_test.addWidget(self.pushButton_break)
+        self.h_layout_test.addWidget(self.pushButton_preview)
+        self.h_layout_test.addWidget(self.pushButton_catalog)
+        self.h_layout_test.addWidget(self.pushButton_storage)
 
         self.v_layout.addLayout(self.h_layout)
         #self.v_layout.addWidget(self.pushButton_4)
@@ -16,7 +16,8 @@ from .elidedbutton import ElidedButton
 from .elidedlabel import ElidedLabel
 from .filterpanel import FilterPanel, FilterWidget
 from .fontwidget import FontWidget
-from .graph_canvas import GraphCanvas
+# matplotlib is heavy: import GraphCanvas from .graph_canvas when needed
+# from .graph_canvas import GraphCanvas
 from .load_database_dialog import LoadDatabaseWindow
 # from .mainwindow import MainWindow
 from .messagebox import MessageBox
@@ -6,15 +6,15 @@ from itertools import chain
 
 from PyQt5 import Qt as Q
 
-from ..common import connect, font, is_child, load_icon, translate, wrap_html
+from ..common import (change_cursor, connect, font, is_child, load_icon,
+                      translate, wrap_html)
+from ..common.importprofile import mark_startup
 from . import Entity, Context, Panel, WorkingMode
 from . behavior import behavior
 # 各个标签页内容对应的class
-from .results import Results
-from .hexinjisuan.controltab import Maincontrol
-from .preprocess import ParameterMeshGroupView
+# Results (ParaView), Maincontrol 与 MainWindow (储罐仿真) 在首次使用时才导入,
+# 见 result01, maincontrol, paratab
 from .truss_bridge.truss_bridge import Main
-from .parameterset.TankSimulator import MainWindow
 from .geom import GEOM
 
 __workspace__version__ = '2.0'
@@ -172,9 +172,8 @@ class Workspace(Q.QWidget):
         #
 
         self.results_hboxlayoutnew = Q.QHBoxLayout(self.pages[WorkingMode.ResultsMode])
-        self.result01 = Results(astergui,self.pages[WorkingMode.ResultsMode])
-        self.result01.init_paraview()
-        self.results_hboxlayoutnew.addWidget(self.result01)
+        # 切换到该标签页时才创建(加载pvsimple)
+        self._result01 = None
 
         ## 设置 "JianmoMode"
         #
@@ -223,16 +222,15 @@ class Workspace(Q.QWidget):
         #
 
         self.first_hboxlayout = Q.QHBoxLayout(self.pages[WorkingMode.SettingMode])
-        self.paratab = MainWindow()
-        self.first_hboxlayout.addWidget(self.paratab)
+        self._paratab = None
 
         ## 设置 "KongzhiMode"
         #
 
         self.results_hboxlayout = Q.QHBoxLayout(self.pages[WorkingMode.KongzhiMode])
         # Maincontrol 就是GUi的最外层的一个Class 加入前几个标签的instance 因此其级别实际上是所有标签页中最高？
-        self.maincontrol = Maincontrol(self.Qianchuli,self.paratab,self.result01)
-        self.results_hboxlayout.addWidget(self.maincontrol)
+        # 打开/保存工程时才创建
+        self._maincontrol = None
 
 
 
@@ -241,6 +239,7 @@ class Workspace(Q.QWidget):
         # #
         
         connect(self.main.currentChanged, self.modeChanged)
+        connect(self.main.currentChanged, self._loadPage)
         # connect(self.main.currentChanged, self._updateBanner)
         connect(self.main.currentChanged, self._selectActiveCase)
         # connect(self.panels[Panel.Edit].editorClosed, self.views[Context.Information].update)
@@ -262,6 +261,63 @@ class Workspace(Q.QWidget):
 
         self.setFocusPolicy(Q.Qt.StrongFocus)
         self.activate(False)
+        mark_startup('workspace created')
+
+    @property
+    def result01(self):
+        """Results: ParaView post-processing panel, created on first use."""
+        if self._result01 is None:
+            self._createResults()
+        return self._result01
+
+    @property
+    def paratab(self):
+        """MainWindow: Tanksimulator settings, created on first use."""
+        if self._paratab is None:
+            from .parameterset.TankSimulator import MainWindow
+            self._paratab = MainWindow()
+            self.first_hboxlayout.addWidget(self._paratab)
+        return self._paratab
+
+    @property
+    def maincontrol(self):
+        """Maincontrol: Tanksimulator job control, created on first use."""
+        if self._maincontrol is None:
+            self._createMaincontrol()
+        return self._maincontrol
+
+    @change_cursor
+    def _createResults(self):
+        """Create the ParaView post-processing panel."""
+        from .results import Results
+        page = self.pages[WorkingMode.ResultsMode]
+        self._result01 = Results(self.astergui, page)
+        self._result01.init_paraview()
+        self.results_hboxlayoutnew.addWidget(self._result01)
+        mark_startup('results page created')
+
+    @change_cursor
+    def _createMaincontrol(self):
+        """Create the Tanksimulator job control panel."""
+        from .hexinjisuan.controltab import Maincontrol
+        self._maincontrol = Maincontrol(self.Qianchuli, self.paratab,
+                                        self.result01)
+        self.results_hboxlayout.addWidget(self._maincontrol)
+        mark_startup('job control created')
+
+    def isResultsLoaded(self):
+        """
+        Check if the ParaView post-processing panel has been created.
+
+        Returns:
+            bool: *True* if `result01` has already been created.
+        """
+        return self._result01 is not None
+
+    def _loadPage(self, index):
+        """Create the content of a page when it is shown first."""
+        if index == self.main.indexOf(self.pages[WorkingMode.ResultsMode]):
+            self.result01 # pragma pylint: disable=pointless-statement
 
 
     def activate(self, enable):
@@ -6,6 +6,8 @@ from .config import *
 from .result_data import (ResultFile, ResultConcept, ConceptField)
 from .utils import (pvcontrol, show_min_max, selection_probe, selection_plot,
                     get_active_selection, get_pv_mem_use, dbg_print)
+from .memory import (MEMORY, MemoryBudget)
+from .arrays import ARRAYS
 from .representation import (BaseRep, ColorRep, WarpRep, ContourRep,
                              VectorRep, ModesRep)
 from .plotter import (PlotWindow, CustomTable)
@@ -0,0 +1,982 @@
+"""
+Compressed archives of the completed runs.
+
+A finished tank run keeps its ASCII VTU series (``Solid/tank.pvd``),
+its FRD files, the decomposed OpenFOAM directories and the logs: tens
+of GB per case. The bridge studies accumulate ``.rmed`` and mesh files.
+
+`archive_run` repacks a run directory into one file, ``<run>.rarc``:
+
+- the files are cut in chunks of `config.ARCHIVE_CHUNK` bytes,
+  compressed independently (`config.ARCHIVE_CODEC`, zlib or lzma); the
+  small files are compressed whole,
+- the VTU files of the PVD series are stored as their data arrays
+  (geometry, point and cell data), each array compressed apart after a
+  byte shuffle (the bytes of the floats grouped by significance
+  compress much better than the ASCII text),
+- identical chunks and arrays are stored once (the geometry of the
+  steps of a series, the copies of ``Mesh_1.med``),
+- a JSON manifest at the end of the file gives the members (path,
+  size, modification time, chunks or arrays) and the series (times and
+  steps), as in the fast-browse cache (`foamcache`).
+
+The compression runs in parallel in a process pool (one task per
+chunk, per VTU step or per batch of small files), the archive is
+written in the order of the members.
+
+`Archive` reads a member without extracting the others: a data array of
+one step of a series (`Archive.read_array`, `Archive.read_step`), any
+part of a file (`Archive.open` returns a seekable file object, h5py
+reads the MED files from it), or the whole file. `Archive.extract`
+restores the run (the VTU files of the series are written back with the
+same arrays, in binary format).
+
+Example::
+
+    python3 -m asterstudy.post.archive pack /path/to/case --jobs 4
+    python3 -m asterstudy.post.archive list /path/to/case.rarc
+    python3 -m asterstudy.post.archive extract /path/to/case.rarc /tmp/case
+    python3 -m asterstudy.post.archive bench --steps 100 --points 10000
+"""
+
+import hashlib
+import io
+import json
+import lzma
+import os
+import os.path as osp
+import shutil
+import struct
+import sys
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from collections import OrderedDict, deque
+
+import numpy
+
+from .config import ARCHIVE_CHUNK, ARCHIVE_CODEC, ARCHIVE_IDLE, ARCHIVE_LEVEL
+
+
+EXTENSION = '.rarc'
+
+MAGIC = b'RESARCH1'
+
+# magic, offset and length of the JSON manifest
+TRAILER = struct.Struct('<8sQQ')
+
+CODECS = ('zlib', 'lzma')
+
+
+class ArchiveError(Exception):
+    """Missing, incomplete or corrupted archive."""
+
+
+def archive_path(run):
+    """Return the path of the archive of a run (next to the run)."""
+    return osp.normpath(run) + EXTENSION
+
+
+def _compress(data, codec, level):
+    if codec == 'lzma':
+        return lzma.compress(data, preset=level)
+    return zlib.compress(data, level)
+
+
+def _decompress(data, codec):
+    if codec == 'lzma':
+        return lzma.decompress(data)
+    return zlib.decompress(data)
+
+
+def _shuffle(array):
+    """Return the bytes of an array grouped by significance."""
+    raw = numpy.ascontiguousarray(array).view(numpy.uint8)
+    size = array.dtype.itemsize
+    if size == 1:
+        return raw.tobytes()
+    return raw.reshape(-1, size).T.tobytes()
+
+
+def _unshuffle(data, dtype, shape):
+    dtype = numpy.dtype(dtype)
+    raw = numpy.frombuffer(data, numpy.uint8)
+    if dtype.itemsize > 1:
+        raw = raw.reshape(dtype.itemsize, -1).T.copy()
+    return raw.view(dtype).reshape(shape)
+
+
+# Compression tasks (run in the worker processes) ----------------------------
+
+def _pack_chunk(path, start, length, codec, level):
+    """Compress a chunk of a file."""
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        data = stream.read(length)
+    return [(hashlib.sha1(data).hexdigest(), len(data),
+             _compress(data, codec, level))]
+
+
+def _pack_files(paths, codec, level):
+    """Compress small files (one block each)."""
+    blocks = []
+    for path in paths:
+        with open(path, 'rb') as stream:
+            data = stream.read()
+        blocks.append((hashlib.sha1(data).hexdigest(), len(data),
+                       _compress(data, codec, level)))
+    return blocks
+
+
+def _pack_vtu(path, codec, level):
+    """
+    Compress the data arrays of a VTU file
+
+    Returns:
+        list: Section, name, XML attributes, type, shape, SHA1 and
+        compressed bytes of the arrays, *None* if the file cannot be
+        read as a single piece unstructured grid.
+    """
+    from .compare import vtu_arrays
+    try:
+        root = ET.parse(path).getroot() if osp.getsize(path) < 2 ** 20 \
+            else None
+        if root is not None and len(root.findall('UnstructuredGrid/Piece')) \
+                != 1:
+            return None
+        arrays = vtu_arrays(path)
+    except Exception: # pragma pylint: disable=broad-except
+        return None
+    packed = []
+    for (section, name), (attrib, values) in arrays.items():
+        data = _shuffle(values)
+        packed.append((section, name, attrib, values.dtype.str,
+                       list(values.shape), hashlib.sha1(data).hexdigest(),
+                       _compress(data, codec, level)))
+    return packed
+
+
+def _ordered(tasks, jobs):
+    """
+    Run tasks (function and arguments) in a process pool, yield their
+    results in the order of the tasks (a few tasks ahead at most)
+    """
+    if jobs <= 1:
+        for func, args in tasks:
+            yield func(*args)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(jobs) as pool:
+        pending = deque()
+        for func, args in tasks:
+            pending.append(pool.submit(func, *args))
+            if len(pending) >= 3 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# Writing --------------------------------------------------------------------
+
+def series_steps(run):
+    """
+    Return the PVD series of a run
+
+    Returns:
+        OrderedDict: Times and files (relative to the run) by PVD path
+        (relative to the run).
+    """
+    series = OrderedDict()
+    for folder, dirs, files in os.walk(run):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith('.pvd'):
+                continue
+            path = osp.join(folder, name)
+            try:
+                root = ET.parse(path).getroot()
+            except (ET.ParseError, OSError):
+                continue
+            times, steps = [], []
+            for dataset in root.iter('DataSet'):
+                step = osp.normpath(osp.join(folder, dataset.get('file', '')))
+                if osp.isfile(step) and step.lower().endswith('.vtu'):
+                    times.append(float(dataset.get('timestep', 0.)))
+                    steps.append(osp.relpath(step, run))
+            series[osp.relpath(path, run)] = {'times': times, 'files': steps}
+    return series
+
+
+def inventory(run, exclude=()):
+    """
+    Return the entries of a run directory
+
+    Returns:
+        list[(str, str, os.stat_result)]: Relative path, kind ('file',
+        'link' or 'dir' for the empty directories) and status.
+    """
+    entries = []
+    for folder, dirs, files in os.walk(run):
+        dirs.sort()
+        names = sorted(files) + [name for name in dirs
+                                 if osp.islink(osp.join(folder, name))]
+        for name in names:
+            path = osp.join(folder, name)
+            if osp.abspath(path) in exclude:
+                continue
+            stat = os.lstat(path)
+            kind = 'link' if osp.islink(path) else 'file'
+            entries.append((osp.relpath(path, run), kind, stat))
+        if not files and not dirs and folder != run:
+            entries.append((osp.relpath(folder, run), 'dir', os.stat(folder)))
+    return entries
+
+
+def completed(run, idle=ARCHIVE_IDLE):
+    """Tell if no file of a run changed for *idle* hours."""
+    limit = time.time() - idle * 3600.
+    for folder, _, files in os.walk(run):
+        for name in files:
+            try:
+                if os.lstat(osp.join(folder, name)).st_mtime > limit:
+                    return False
+            except OSError:
+                continue
+    return True
+
+
+class ArchiveWriter():
+    """
+    Write the blocks of an archive (each distinct block once).
+
+    Arguments:
+        stream (file): Binary stream of the archive.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.blocks = {}
+        self.stored = 0
+        self.duplicates = 0
+
+    def add(self, sha1, size, data):
+        """
+        Write a compressed block unless an identical one was written
+
+        Returns:
+            list[int]: Offset, compressed and raw sizes of the block.
+        """
+        ref = self.blocks.get(sha1)
+        if ref is not None:
+            self.duplicates += size
+            return ref
+        ref = [self.stream.tell(), len(data), size]
+        self.stream.write(data)
+        self.blocks[sha1] = ref
+        self.stored += len(data)
+        return ref
+
+    def finish(self, manifest):
+        """Write the manifest and the trailer."""
+        offset = self.stream.tell()
+        data = json.dumps(manifest).encode('utf-8')
+        self.stream.write(data)
+        self.stream.write(TRAILER.pack(MAGIC, offset, len(data)))
+        self.stream.flush()
+        os.fsync(self.stream.fileno())
+
+
+def archive_run(run, path=None, jobs=None, codec=ARCHIVE_CODEC,
+                level=ARCHIVE_LEVEL, chunk=ARCHIVE_CHUNK, series=True,
+                remove=False, progress=None):
+    """
+    Archive a run directory
+
+    Arguments:
+        run (str): Run directory.
+        path (Optional[str]): Archive, ``<run>.rarc`` by default.
+        jobs (Optional[int]): Compression processes (all the CPUs by
+            default).
+        codec (Optional[str]): 'zlib' or 'lzma'.
+        level (Optional[int]): Compression level.
+        chunk (Optional[int]): Size of the chunks of the files (bytes).
+        series (Optional[bool]): Store the VTU files of the PVD series
+            as data arrays (else as files).
+        remove (Optional[bool]): Remove the run once the archive is
+            written and verified.
+        progress (Optional[callable]): Called with the bytes of the run
+            processed and the total.
+
+    Returns:
+        dict: Sizes of the run and of the archive (bytes), elapsed time
+        (s), numbers of members and of steps.
+    """
+    if codec not in CODECS:
+        raise ValueError('unknown codec: {!r}'.format(codec))
+    start = time.time()
+    run = osp.abspath(run)
+    path = osp.abspath(path or archive_path(run))
+    jobs = jobs or os.cpu_count() or 1
+    steps = series_steps(run) if series else OrderedDict()
+    vtus = set(name for item in steps.values() for name in item['files'])
+    entries = inventory(run, exclude=(path, path + '.tmp'))
+    total = sum(stat.st_size for _, kind, stat in entries if kind == 'file')
+
+    members = OrderedDict()
+    tasks, owners = [], []
+    batch, batch_size = [], 0
+
+    def _flush():
+        nonlocal batch, batch_size
+        if batch:
+            tasks.append((_pack_files, ([osp.join(run, name)
+                                         for name in batch], codec, level)))
+            owners.append(('files', list(batch)))
+            batch, batch_size = [], 0
+
+    for name, kind, stat in entries:
+        member = OrderedDict([('kind', kind), ('size', stat.st_size),
+                              ('mtime', stat.st_mtime),
+                              ('mode', stat.st_mode & 0o7777)])
+        members[name] = member
+        if kind == 'link':
+            member['target'] = os.readlink(osp.join(run, name))
+        if kind != 'file':
+            continue
+        member['chunks'] = []
+        if name in vtus:
+            tasks.append((_pack_vtu, (osp.join(run, name), codec, level)))
+            owners.append(('vtu', name))
+        elif stat.st_size < chunk // 4:
+            batch.append(name)
+            batch_size += stat.st_size
+            if batch_size >= chunk:
+                _flush()
+        else:
+            for offset in range(0, max(stat.st_size, 1), chunk):
+                tasks.append((_pack_chunk, (osp.join(run, name), offset,
+                                            chunk, codec, level)))
+                owners.append(('chunk', name))
+    _flush()
+
+    done = 0
+    with open(path + '.tmp', 'wb') as stream:
+        writer = ArchiveWriter(stream)
+        for (kind, name), result in zip(owners, _ordered(tasks, jobs)):
+            if kind == 'files':
+                for item, (sha1, size, data) in zip(name, result):
+                    members[item]['chunks'].append(writer.add(sha1, size,
+                                                              data))
+                    done += size
+            elif kind == 'chunk':
+                sha1, size, data = result[0]
+                members[name]['chunks'].append(writer.add(sha1, size, data))
+                done += size
+            elif result is None:
+                # not a readable VTU file: stored as a file
+                for sha1, size, data in _pack_chunk(
+                        osp.join(run, name), 0, members[name]['size'], codec,
+                        level):
+                    members[name]['chunks'].append(writer.add(sha1, size,
+                                                              data))
+                done += members[name]['size']
+            else:
+                member = members[name]
+                member['kind'] = 'vtu'
+                del member['chunks']
+                member['arrays'] = []
+                for section, array, attrib, dtype, shape, sha1, data \
+                        in result:
+                    member['arrays'].append(OrderedDict([
+                        ('section', section), ('name', array),
+                        ('attributes', attrib), ('dtype', dtype),
+                        ('shape', shape), ('sha1', sha1),
+                        ('block', writer.add(
+                            sha1, int(numpy.prod(shape)) *
+                            numpy.dtype(dtype).itemsize, data))]))
+                done += member['size']
+            if progress is not None:
+                progress(done, total)
+        writer.finish(OrderedDict([
+            ('version', 1), ('source', run), ('created', time.time()),
+            ('codec', codec), ('level', level), ('chunk', chunk),
+            ('members', members), ('series', steps)]))
+    os.replace(path + '.tmp', path)
+    result = {'run': total, 'archive': osp.getsize(path),
+              'elapsed': time.time() - start, 'members': len(members),
+              'steps': len(vtus), 'duplicates': writer.duplicates,
+              'path': path}
+    if remove:
+        errors = Archive(path).verify()
+        if errors:
+            raise ArchiveError('archive not verified, {} kept: {}'.format(
+                run, errors[0]))
+        shutil.rmtree(run)
+    return result
+
+
+# Reading --------------------------------------------------------------------
+
+def read_manifest(stream):
+    """Return the manifest of an open archive, *None* if invalid."""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    if size < TRAILER.size:
+        return None
+    stream.seek(size - TRAILER.size)
+    magic, offset, length = TRAILER.unpack(stream.read(TRAILER.size))
+    if magic != MAGIC or offset + length > size - TRAILER.size:
+        return None
+    stream.seek(offset)
+    try:
+        return json.loads(stream.read(length).decode('utf-8'),
+                          object_pairs_hook=OrderedDict)
+    except ValueError:
+        return None
+
+
+class MemberReader(io.RawIOBase):
+    """
+    Seekable file object of a member of an archive: only the chunks
+    read are decompressed (the last one is kept).
+
+    Arguments:
+        archive (Archive): Archive.
+        name (str): Member.
+    """
+
+    def __init__(self, archive, name):
+        super().__init__()
+        self.archive = archive
+        self.name = name
+        self.chunks = archive.member(name)['chunks']
+        self.starts = numpy.cumsum([0] + [ref[2] for ref in self.chunks])
+        self.size = int(self.starts[-1])
+        self.pos = 0
+        self._cached = (None, b'')
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def _chunk(self, index):
+        if self._cached[0] != index:
+            self._cached = (index, self.archive.read_block(
+                self.chunks[index]))
+        return self._cached[1]
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        count = 0
+        while count < len(view) and self.pos < self.size:
+            index = int(numpy.searchsorted(self.starts, self.pos,
+                                           side='right')) - 1
+            data = self._chunk(index)
+            start = self.pos - int(self.starts[index])
+            piece = data[start:start + len(view) - count]
+            view[count:count + len(piece)] = piece
+            count += len(piece)
+            self.pos += len(piece)
+        return count
+
+
+class Archive():
+    """
+    Archive of a run.
+
+    Arguments:
+        path (str): Path of the archive.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as stream:
+            self.manifest = read_manifest(stream)
+        if self.manifest is None:
+            raise ArchiveError('not an archive: {}'.format(path))
+        self.codec = self.manifest['codec']
+        self._stream = open(path, 'rb')
+
+    def close(self):
+        """Close the archive."""
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @property
+    def members(self):
+        """OrderedDict: Description of the members by path."""
+        return self.manifest['members']
+
+    @property
+    def series(self):
+        """OrderedDict: Times and files of the PVD series by path."""
+        return self.manifest['series']
+
+    def member(self, name):
+        """Return the description of a member."""
+        try:
+            return self.members[osp.normpath(name)]
+        except KeyError:
+            raise ArchiveError('no member {!r} in {}'.format(name,
+                                                             self.path))
+
+    def read_block(self, ref):
+        """Return the decompressed bytes of a block."""
+        self._stream.seek(ref[0])
+        return _decompress(self._stream.read(ref[1]), self.codec)
+
+    def open(self, name):
+        """Return a seekable binary file object of a member."""
+        if self.member(name)['kind'] != 'file':
+            raise ArchiveError('{} is not stored as a file'.format(name))
+        return io.BufferedReader(MemberReader(self, name),
+                                 self.manifest['chunk'])
+
+    def read(self, name):
+        """Return the content of a member (a VTU file is rebuilt)."""
+        member = self.member(name)
+        if member['kind'] == 'vtu':
+            stream = io.BytesIO()
+            _write_vtu(stream, member['arrays'], self.read_array_block)
+            return stream.getvalue()
+        return b''.join(self.read_block(ref) for ref in member['chunks'])
+
+    def read_array_block(self, array):
+        """Return the values of an array described in a VTU member."""
+        return _unshuffle(self.read_block(array['block']), array['dtype'],
+                          array['shape'])
+
+    def arrays(self, name):
+        """Return the (section, name) of the arrays of a VTU member."""
+        return [(array['section'], array['name'])
+                for array in self.member(name).get('arrays', [])]
+
+    def read_array(self, name, section, array):
+        """
+        Return a data array of a VTU member
+
+        Arguments:
+            name (str): Member.
+            section (str): 'Points', 'Cells', 'PointData' or 'CellData'.
+            array (str): Name of the array ('Points' for the points).
+        """
+        for item in self.member(name).get('arrays', []):
+            if item['section'] == section and item['name'] == array:
+                return self.read_array_block(item)
+        raise ArchiveError('no array {}/{} in {}'.format(section, array,
+                                                         name))
+
+    def read_step(self, series, index, names=None):
+        """
+        Return a step of a series as `compare.read_vtu` does
+
+        Arguments:
+            series (str): PVD file (relative to the run).
+            index (int): Index of the step.
+            names (Optional[set]): Point and cell data to read, all if
+                *None*.
+        """
+        from .compare import CELLS, POINTS
+        member = self.series[series]['files'][index]
+        grid = {POINTS: OrderedDict(), CELLS: OrderedDict()}
+        for item in self.member(member).get('arrays', []):
+            section = item['section']
+            if section in ('PointData', 'CellData') and names is not None \
+                    and item['name'] not in names:
+                continue
+            values = self.read_array_block(item)
+            if section == 'Points':
+                grid['points'] = values.astype(float).reshape(-1, 3)
+            elif section == 'Cells':
+                grid[item['name']] = values
+            else:
+                assoc = POINTS if section == 'PointData' else CELLS
+                grid[assoc][item['name']] = values.reshape(len(values), -1)
+        return grid
+
+    def extract(self, dest, names=None):
+        """
+        Extract members (all by default) in a directory
+
+        Returns:
+            int: Number of members extracted.
+        """
+        count = 0
+        for name, member in self.members.items():
+            if names is not None and name not in names:
+                continue
+            target = osp.join(dest, name)
+            if member['kind'] == 'dir':
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(osp.dirname(target) or '.', exist_ok=True)
+            if member['kind'] == 'link':
+                if osp.lexists(target):
+                    os.remove(target)
+                os.symlink(member['target'], target)
+                continue
+            with open(target, 'wb') as stream:
+                if member['kind'] == 'vtu':
+                    _write_vtu(stream, member['arrays'],
+                               self.read_array_block)
+                else:
+                    for ref in member['chunks']:
+                        stream.write(self.read_block(ref))
+            os.chmod(target, member['mode'])
+            os.utime(target, (member['mtime'], member['mtime']))
+            count += 1
+        return count
+
+    def verify(self):
+        """
+        Decompress all the blocks (zlib and lzma check their content),
+        the sizes of the files and the SHA1 of the arrays
+
+        Returns:
+            list[str]: Errors.
+        """
+        errors = []
+        for name, member in self.members.items():
+            try:
+                if member['kind'] == 'vtu':
+                    for array in member['arrays']:
+                        data = self.read_block(array['block'])
+                        if hashlib.sha1(data).hexdigest() != array['sha1']:
+                            errors.append('{}: {}'.format(name,
+                                                          array['name']))
+                elif member['kind'] == 'file':
+                    size = sum(len(self.read_block(ref))
+                               for ref in member['chunks'])
+                    if size != member['size']:
+                        errors.append('{}: size {} != {}'.format(
+                            name, size, member['size']))
+            except (zlib.error, lzma.LZMAError, OSError) as exc:
+                errors.append('{}: {}'.format(name, exc))
+        return errors
+
+
+def _write_vtu(stream, arrays, read):
+    """Write a VTU file (raw appended data) of the arrays of a member."""
+    kinds = {'f': 'Float', 'i': 'Int', 'u': 'UInt'}
+    sections = OrderedDict((section, []) for section in
+                           ('PointData', 'CellData', 'Points', 'Cells'))
+    blocks, offset, sizes = [], 0, {}
+    for array in arrays:
+        values = read(array)
+        attrib = OrderedDict((key, value) for key, value in
+                             array['attributes'].items()
+                             if key not in ('format', 'offset', 'type'))
+        dtype = values.dtype
+        attrib['type'] = '{}{}'.format(kinds[dtype.kind], 8 * dtype.itemsize)
+        attrib['format'] = 'appended'
+        attrib['offset'] = str(offset)
+        sections[array['section']].append(
+            '<DataArray {}/>'.format(' '.join(
+                '{}="{}"'.format(key, value) for key, value in attrib.items())))
+        data = numpy.ascontiguousarray(values).astype(
+            dtype.newbyteorder('<')).tobytes()
+        blocks.append(data)
+        offset += 8 + len(data)
+        sizes[array['section'], array['name']] = len(values)
+    npoints = sizes.get(('Points', 'Points'), 0)
+    ncells = sizes.get(('Cells', 'types'), 0)
+    stream.write(
+        '<?xml version="1.0"?>\n<VTKFile type="UnstructuredGrid" '
+        'version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+        '<UnstructuredGrid>\n<Piece NumberOfPoints="{}" NumberOfCells="{}">'
+        '\n{}</Piece>\n</UnstructuredGrid>\n<AppendedData encoding="raw">\n_'
+        .format(npoints, ncells, ''.join(
+            '<{0}>\n{1}\n</{0}>\n'.format(section, '\n'.join(tags))
+            for section, tags in sections.items())).encode('utf-8'))
+    for data in blocks:
+        stream.write(numpy.uint64(len(data)).tobytes())
+        stream.write(data)
+    stream.write(b'\n</AppendedData>\n</VTKFile>\n')
+
+
+# Benchmark ------------------------------------------------------------------
+
+def synthetic_run(folder, steps, points, seed=0):
+    """
+    Write a synthetic tank-like run: an ASCII VTU series (as written by
+    `VTUWriter`), an FRD-like text file, decomposed OpenFOAM-like
+    fields, logs and copies of the bridge MED files
+
+    Returns:
+        str: Run directory.
+    """
+    from ..gui.truss_bridge.preview import HERE
+    rng = numpy.random.RandomState(seed)
+    run = osp.join(folder, 'case-synthetic')
+    solid = osp.join(run, 'Solid')
+    os.makedirs(solid)
+    side = max(2, int(round(points ** (1. / 3))))
+    axis = numpy.linspace(0., 1., side)
+    xyz = numpy.stack(numpy.meshgrid(axis, axis, axis, indexing='ij'),
+                      axis=-1).reshape(-1, 3)
+    ijk = numpy.arange(side ** 3).reshape(side, side, side)[:-1, :-1, :-1]
+    ijk = ijk.ravel()
+    dx, dy = side * side, side
+    hexa = numpy.stack([ijk, ijk + dx, ijk + dx + dy, ijk + dy, ijk + 1,
+                        ijk + dx + 1, ijk + dx + dy + 1, ijk + dy + 1], axis=1)
+
+    def _ascii(array, fmt):
+        text = io.StringIO()
+        numpy.savetxt(text, array.reshape(len(array), -1), fmt=fmt)
+        return text.getvalue()
+
+    geometry = (
+        '<Points>\n<DataArray type="Float64" NumberOfComponents="3" '
+        'format="ascii">\n{}</DataArray>\n</Points>\n<Cells>\n'
+        '<DataArray type="Int32" Name="connectivity" format="ascii">\n{}'
+        '</DataArray>\n<DataArray type="Int32" Name="offsets" '
+        'format="ascii">\n{}</DataArray>\n<DataArray type="UInt8" '
+        'Name="types" format="ascii">\n{}</DataArray>\n</Cells>\n'.format(
+            _ascii(xyz, '%.6e'), _ascii(hexa, '%d'),
+            _ascii(numpy.arange(8, 8 * len(hexa) + 1, 8), '%d'),
+            _ascii(numpy.full(len(hexa), 12), '%d')))
+    names, frd = [], []
+    for step in range(steps):
+        value = 0.01 * (step + 1)
+        disp = 1e-3 * value * numpy.sin(numpy.pi * xyz) + \
+            1e-6 * rng.standard_normal(xyz.shape)
+        stress = 1e6 * value * numpy.cos(numpy.pi * xyz[:, [0, 1, 2, 0, 1, 2]])
+        name = 'tank.{}.vtu'.format(step + 1)
+        with open(osp.join(solid, name), 'w') as vtu:
+            vtu.write(
+                '<?xml version="1.0"?>\n<VTKFile type="UnstructuredGrid" '
+                'version="0.1" byte_order="LittleEndian">\n<UnstructuredGrid>'
+                '\n<Piece NumberOfPoints="{}" NumberOfCells="{}">\n'
+                '<PointData>\n<DataArray type="Float32" Name="DISP" '
+                'NumberOfComponents="3" ComponentName0="D1" ComponentName1='
+                '"D2" ComponentName2="D3" format="ascii">\n{}</DataArray>\n'
+                '<DataArray type="Float32" Name="STRESS" NumberOfComponents='
+                '"6" format="ascii">\n{}</DataArray>\n</PointData>\n{}'
+                '</Piece>\n</UnstructuredGrid>\n</VTKFile>\n'.format(
+                    len(xyz), len(hexa), _ascii(disp, '%.6e'),
+                    _ascii(stress, '%.6e'), geometry))
+        names.append(name)
+        frd.append(' -4  DISP        4    1\n' + _ascii(
+            numpy.column_stack([numpy.arange(1, len(xyz) + 1), disp]),
+            ' -1%10d%12.5E%12.5E%12.5E'))
+    with open(osp.join(solid, 'tank.pvd'), 'w') as pvd:
+        pvd.write('<?xml version="1.0"?>\n<VTKFile type="Collection" '
+                  'version="0.1" byte_order="LittleEndian">\n\t<Collection>\n')
+        for step, name in enumerate(names):
+            pvd.write('\t\t<DataSet timestep="{}" file="{}"/>\n'.format(
+                0.01 * (step + 1), name))
+        pvd.write('\t</Collection>\n\t<fname>\n\ttank.frd\n\t</fname>\n'
+                  '\t<currentposition>\n\t0\n\t</currentposition>\n'
+                  '</VTKFile>')
+    with open(osp.join(solid, 'tank.frd'), 'w') as stream:
+        stream.write(''.join(frd))
+    for proc in range(4):
+        for step in range(0, steps, max(1, steps // 5)):
+            folder = osp.join(run, 'Fluid', 'processor%d' % proc,
+                              '%g' % (0.01 * (step + 1)))
+            os.makedirs(folder)
+            for field, ncomp in (('p', 1), ('U', 3), ('alpha.water', 1)):
+                values = rng.standard_normal((points // 4, ncomp))
+                with open(osp.join(folder, field), 'w') as stream:
+                    stream.write('FoamFile\n{{\n    object {};\n}}\n'
+                                 'internalField nonuniform List<scalar>\n'
+                                 '{}\n(\n'.format(field, len(values)))
+                    stream.write(_ascii(values, '%.6g'))
+                    stream.write(')\n;\n')
+    with open(osp.join(run, 'log.interFoam'), 'w') as log:
+        for step in range(50 * steps):
+            log.write('Time = {:.4f}\nCourant Number mean: 0.01 max: 0.4\n'
+                      'ExecutionTime = {:.2f} s\n\n'.format(
+                          1e-4 * step, 0.05 * step))
+    for name in ('static_res.rmed', 'Mesh_1.med'):
+        shutil.copy(osp.join(HERE, name), osp.join(run, name))
+    shutil.copy(osp.join(HERE, 'Mesh_1.med'),
+                osp.join(run, 'Mesh_8.0_5.0_40.0_8_5.0.med'))
+    return run
+
+
+def benchmark(folder, steps=100, points=10000, jobs=None, reads=50):
+    """
+    Measure the archiving of a synthetic run and the random access to
+    its members
+
+    Returns:
+        dict: Archiving results by number of jobs, read latencies (s)
+        of a step field (archive and original VTU), of 64 KB of a file
+        and of a MED field read with h5py from the archive.
+    """
+    import random
+    from .compare import read_vtu
+    run = synthetic_run(folder, steps, points)
+    result = OrderedDict()
+    counts = sorted(set([1, jobs or os.cpu_count() or 1]))
+    for count in counts:
+        result['pack', count] = archive_run(
+            run, osp.join(folder, 'case-%d.rarc' % count), jobs=count)
+    path = result['pack', counts[-1]]['path']
+    rng = random.Random(0)
+    with Archive(path) as archive:
+        series = archive.series['Solid/tank.pvd']
+        latency = {'step': [], 'vtu': [], 'range': [], 'med': []}
+        for _ in range(reads):
+            index = rng.randrange(len(series['files']))
+            field = rng.choice(('DISP', 'STRESS'))
+            start = time.perf_counter()
+            archive.read_array(series['files'][index], 'PointData', field)
+            latency['step'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            read_vtu(osp.join(run, series['files'][index]), {field})
+            latency['vtu'].append(time.perf_counter() - start)
+            stream = archive.open('Solid/tank.frd')
+            start = time.perf_counter()
+            stream.seek(rng.randrange(archive.member('Solid/tank.frd')
+                                      ['size']))
+            stream.read(65536)
+            latency['range'].append(time.perf_counter() - start)
+        try:
+            import h5py
+            for _ in range(min(reads, 10)):
+                start = time.perf_counter()
+                with h5py.File(archive.open('static_res.rmed'), 'r') as med:
+                    med['CHA/reslin__DEPL'].visititems(lambda *_: None)
+                    group = med['CHA/reslin__DEPL']
+                    step = group[sorted(group)[0]]['NOE']
+                    step[step.attrs['PFL'].decode()]['CO'][()]
+                latency['med'].append(time.perf_counter() - start)
+        except ImportError:
+            pass
+        result['latency'] = {key: sorted(values)[len(values) // 2]
+                             for key, values in latency.items() if values}
+        result['verify'] = archive.verify()
+        dest = osp.join(folder, 'extracted')
+        start = time.perf_counter()
+        archive.extract(dest)
+        result['extract'] = time.perf_counter() - start
+        first = series['files'][0]
+        ref, back = read_vtu(osp.join(run, first)), read_vtu(
+            osp.join(dest, first))
+        result['identical'] = all(
+            numpy.array_equal(ref['POINTS'][name], back['POINTS'][name])
+            for name in ref['POINTS']) and numpy.array_equal(
+                ref['connectivity'], back['connectivity']) and all(
+                    open(osp.join(run, name), 'rb').read() ==
+                    open(osp.join(dest, name), 'rb').read()
+                    for name in ('Solid/tank.frd', 'static_res.rmed',
+                                 'Solid/tank.pvd'))
+    return result
+
+
+def main(argv=None):
+    """Archive runs, list or extract archives, or measure the archiving."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Compressed archives of the completed runs.')
+    sub = parser.add_subparsers(dest='command')
+    pack = sub.add_parser('pack', help='archive run directories')
+    pack.add_argument('runs', nargs='+')
+    pack.add_argument('--jobs', type=int, default=None)
+    pack.add_argument('--codec', choices=CODECS, default=ARCHIVE_CODEC)
+    pack.add_argument('--level', type=int, default=ARCHIVE_LEVEL)
+    pack.add_argument('--completed', action='store_true',
+                      help='only the runs unchanged for ARCHIVE_IDLE hours')
+    pack.add_argument('--remove', action='store_true',
+                      help='remove the runs once archived and verified')
+    listing = sub.add_parser('list', help='members of an archive')
+    listing.add_argument('archive')
+    extract = sub.add_parser('extract', help='extract an archive')
+    extract.add_argument('archive')
+    extract.add_argument('dest')
+    extract.add_argument('members', nargs='*')
+    verify = sub.add_parser('verify', help='check an archive')
+    verify.add_argument('archive')
+    bench = sub.add_parser('bench', help='archive a synthetic run')
+    bench.add_argument('--steps', type=int, default=100)
+    bench.add_argument('--points', type=int, default=10000)
+    bench.add_argument('--jobs', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        for run in args.runs:
+            if args.completed and not completed(run):
+                print('%s: modified in the last %g hours, skipped' % (
+                    run, ARCHIVE_IDLE))
+                continue
+            res = archive_run(run, jobs=args.jobs, codec=args.codec,
+                              level=args.level, remove=args.remove)
+            print('%s: %.1f MB -> %.1f MB (ratio %.1f) in %.1f s, '
+                  '%.1f MB/s, %d members, %d steps' % (
+                      res['path'], res['run'] / 2 ** 20,
+                      res['archive'] / 2 ** 20,
+                      res['run'] / max(res['archive'], 1), res['elapsed'],
+                      res['run'] / 2 ** 20 / max(res['elapsed'], 1e-9),
+                      res['members'], res['steps']))
+    elif args.command == 'list':
+        with Archive(args.archive) as archive:
+            for name, member in archive.members.items():
+                stored = sum(ref[1] for ref in member.get('chunks', [])) + \
+                    sum(array['block'][1] for array in
+                        member.get('arrays', []))
+                print('%-5s %12d %12d  %s' % (member['kind'], member['size'],
+                                              stored, name))
+            for name, series in archive.series.items():
+                print('series %s: %d steps' % (name, len(series['files'])))
+    elif args.command == 'extract':
+        with Archive(args.archive) as archive:
+            count = archive.extract(args.dest, args.members or None)
+        print('%d members extracted' % count)
+    elif args.command == 'verify':
+        with Archive(args.archive) as archive:
+            errors = archive.verify()
+        for error in errors:
+            print(error)
+        print('%d errors' % len(errors))
+        return 1 if errors else 0
+    elif args.command == 'bench':
+        import tempfile
+        folder = tempfile.mkdtemp(prefix='archive')
+        try:
+            res = benchmark(folder, args.steps, args.points, args.jobs)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        for key, item in res.items():
+            if isinstance(key, tuple):
+                print('%d job(s): %.1f MB -> %.1f MB, ratio %.1f, %.1f s, '
+                      '%.1f MB/s (%.1f MB of duplicates)' % (
+                          key[1], item['run'] / 2 ** 20,
+                          item['archive'] / 2 ** 20,
+                          item['run'] / item['archive'], item['elapsed'],
+                          item['run'] / 2 ** 20 / item['elapsed'],
+                          item['duplicates'] / 2 ** 20))
+        lat = res['latency']
+        print('random access (median): step field %.1f ms (original VTU '
+              '%.1f ms), 64 KB of the FRD %.1f ms, MED field %.1f ms' % (
+                  lat['step'] * 1e3, lat['vtu'] * 1e3, lat['range'] * 1e3,
+                  lat.get('med', float('nan')) * 1e3))
+        print('extraction %.1f s, verified: %s, identical: %s' % (
+            res['extract'], not res['verify'], res['identical']))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Demand-driven arrays of the ParaView readers.
+
+A MEDReader loads from the disk every array selected in its
+``AllArrays`` property. `Results.load_static_results` selected the four
+fields of the static result (``static_res.rmed``) although the view
+shows the displacement and at most one other field.
+
+`ArraySelection` enables the arrays of a reader by use: the reader loads
+the union of the arrays held by its uses, which is applied only when it
+changes, so that an array no longer used by any use is unloaded. A
+reader keeps its last arrays when no use is left (MEDReader reads the
+mesh through the support of the selected fields). Only the static view
+goes through it (`Results.static_arrays`); the representations of the
+Results tab already select the array of the displayed field.
+`config.LAZY_ARRAYS` restores the selection of all the arrays.
+
+The static view keeps one reader by result file (`Results.static_reader`)
+and switches its arrays on the change of the displayed field
+(comboBox_53), so that the field no longer shown is unloaded.
+
+The benchmark compares the reading of all the fields of a synthetic
+result with the reading of the displayed field. It times h5py reads of
+the field values, a lower bound of the MEDReader update; the MEDReader
+itself is measured only when pvsimple is available, one reader being
+switched from all the arrays to the displayed one::
+
+    python3 -m asterstudy.post.arrays --nodes 1000000
+"""
+
+import os.path as osp
+import time
+
+from .utils import dbg_print
+
+
+class ArraySelection():
+    """Arrays enabled on the readers, by use."""
+
+    def __init__(self):
+        self.entries = []
+        self.loads = 0
+        self.unloads = 0
+
+    def require(self, source, use, keys):
+        """
+        Enables the arrays of a reader needed by a use, the arrays held
+        before by the use are unloaded if no other use holds them
+
+        Arguments:
+            source (Proxy): Reader (MEDReader).
+            use (str): Use of the arrays ('field', 'color', 'mode'...).
+            keys (list[str]): Field identifiers (``pv-fident``).
+        """
+        if source is None:
+            return
+        entry = self._find(source)
+        if entry is None:
+            entry = {'source': source, 'uses': {}, 'applied': None}
+            self.entries.append(entry)
+        entry['uses'][use] = set(keys)
+        self._apply(entry)
+
+    def release(self, source, use):
+        """Releases the arrays held by a use of a reader."""
+        entry = self._find(source)
+        if entry is not None and entry['uses'].pop(use, None) is not None:
+            self._apply(entry)
+
+    def enabled(self, source):
+        """Returns the arrays enabled on a reader."""
+        entry = self._find(source)
+        return list(entry['applied'] or []) if entry is not None else []
+
+    def forget(self, source):
+        """Unregisters a reader (when it is deleted)."""
+        entry = self._find(source)
+        if entry is not None:
+            self.entries.remove(entry)
+
+    def clear(self):
+        """Unregisters all the readers."""
+        self.entries = []
+
+    def _find(self, source):
+        for entry in self.entries:
+            if entry['source'] is source:
+                return entry
+        return None
+
+    def _apply(self, entry):
+        keys = sorted(set().union(*entry['uses'].values()))
+        if not keys or keys == entry['applied']:
+            return
+        before = set(entry['applied'] or [])
+        added, removed = set(keys) - before, before - set(keys)
+        self.loads += len(added)
+        self.unloads += len(removed)
+        entry['source'].AllArrays = keys
+        entry['applied'] = keys
+        dbg_print('Arrays of {}: {} loaded, {} unloaded'.format(
+            osp.basename(str(getattr(entry['source'], 'FileName', ''))),
+            sorted(added), sorted(removed)))
+
+
+ARRAYS = ArraySelection()
+
+
+def _read_field(med, name):
+    """Reads the values of the last step of a nodal field (h5py)."""
+    data = med['CHA'][name]
+    noe = data[sorted(data)[-1]]['NOE']
+    pfl = noe.attrs['PFL']
+    if isinstance(pfl, bytes):
+        pfl = pfl.decode()
+    return noe[pfl]['CO'][()].reshape(int(data.attrs['NCO']), -1)
+
+
+def benchmark(nodes, fields, shown='DEPL'):
+    """
+    Compares the reading of all the fields of a multi-field MED result
+    with the reading of the displayed field only (h5py reads of the
+    values, the MEDReader with pvsimple only)
+
+    Returns:
+        dict: Read time (seconds) and peak memory (bytes) of all the
+        fields ('eager', 'eager_mem') and of the displayed field ('lazy',
+        'lazy_mem'), MEDReader measures ('pv', *None* without pvsimple).
+    """
+    import shutil
+    import tempfile
+    folder = tempfile.mkdtemp(prefix='arrays-')
+    try:
+        return _benchmark(osp.join(folder, 'static_res.rmed'), nodes,
+                          fields, shown)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _benchmark(path, nodes, fields, shown):
+    import h5py
+    import tracemalloc
+    from ..common.synthetic import RESULT_NAME, write_med
+    info = write_med(path, nodes=nodes, fields=fields)
+    names = [RESULT_NAME + field for field in fields]
+    res = {'nodes': info['nodes'], 'size': info['size'], 'fields': names}
+    for mode in ('eager', 'lazy'):
+        read = names if mode == 'eager' else [RESULT_NAME + shown]
+        tracemalloc.start()
+        start = time.perf_counter()
+        with h5py.File(path, 'r') as med:
+            values = [_read_field(med, name) for name in read]
+        res[mode] = time.perf_counter() - start
+        res[mode + '_mem'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del values
+    res['pv'] = pv_benchmark(path, names, RESULT_NAME + shown)
+    return res
+
+
+def pv_benchmark(path, names, shown):
+    """
+    Measures the update of a MEDReader with all the arrays, then with
+    the displayed array only: the arrays of the same reader are switched
+    through `ArraySelection`, as on a field change of the static view,
+    *None* without pvsimple
+
+    Returns:
+        dict: Update time (seconds) and reader memory (kilobytes) of
+        both selections, arrays unloaded by the switch ('unloads').
+    """
+    try:
+        import pvsimple as pvs
+    except ImportError:
+        return None
+    from .utils import get_pv_mem_use
+    res = {}
+    selection = ArraySelection()
+    before = get_pv_mem_use()[0]
+    reader = pvs.MEDReader(FileName=path)
+    try:
+        for mode, arrays in (('eager', names), ('lazy', [shown])):
+            start = time.perf_counter()
+            selection.require(reader, 'benchmark',
+                              ['TS0/mesh/ComSup0/{}@@][@@P1'.format(name)
+                               for name in arrays])
+            reader.UpdatePipeline()
+            res[mode] = time.perf_counter() - start
+            res[mode + '_mem'] = get_pv_mem_use()[0] - before
+    finally:
+        selection.forget(reader)
+        pvs.Delete(reader)
+    res['unloads'] = selection.unloads
+    return res
+
+
+def main():
+    """Measure the eager and lazy readings on a synthetic result."""
+    import argparse
+    from ..common.synthetic import MED_FIELDS
+    parser = argparse.ArgumentParser(
+        description='Read time and memory of all the arrays of a MED '
+                    'result and of the displayed array only.')
+    parser.add_argument('--nodes', type=int, default=1000000)
+    parser.add_argument('--fields', nargs='+', default=sorted(MED_FIELDS),
+                        choices=sorted(MED_FIELDS))
+    args = parser.parse_args()
+
+    res = benchmark(args.nodes, args.fields)
+    print('%d nodes, %d fields, %.1f MB' % (
+        res['nodes'], len(res['fields']), res['size'] / 2. ** 20))
+    print('h5py eager %8.1f ms, %8.1f MB (all the arrays)' % (
+        res['eager'] * 1e3, res['eager_mem'] / 2. ** 20))
+    print('h5py lazy  %8.1f ms, %8.1f MB (displayed array)' % (
+        res['lazy'] * 1e3, res['lazy_mem'] / 2. ** 20))
+    if res['pv'] is None:
+        print('MEDReader not measured (pvsimple not available)')
+    else:
+        for mode in ('eager', 'lazy'):
+            print('MEDReader %-6s %8.1f ms, %8.1f MB' % (
+                mode, res['pv'][mode] * 1e3,
+                res['pv'][mode + '_mem'] / 1024.))
+        print('MEDReader unloaded %d arrays' % res['pv']['unloads'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1242 @@
+"""
+Difference fields between two results.
+
+Engineers compare the bridge variants and the tank runs step by step:
+opening two results side by side in the Results tab loads both series
+entirely in ParaView and leaves the comparison to the eye.
+
+`open_series` reads a MED result (h5py) or a PVD/VTU series (XML
+parsing) one step at a time, without ParaView. `Comparison` pairs the
+steps of a reference and of another result (by time, or by index for
+the modal results whose "times" are frequencies), aligns the other
+result on the reference:
+
+- same topology: by the node and cell numbers (MED ``NUM``, VTK
+  ``GlobalNodeIds``/``GlobalCellIds``), a permutation or the identity;
+- different topologies: an inverse distance interpolation on the
+  `config.COMPARE_NEIGHBOURS` nearest points (cell centers for the cell
+  fields), cached on disk by the hash of both coordinates
+  (`InterpolationMap`).
+
+Only one step of each result is in memory at a time: the differences
+(other - reference) are written step by step (`MedDiffWriter`,
+`PvdDiffWriter`) and summarized (`FieldStats`: maximum absolute
+difference, RMS, relative L2 norm).
+
+Two results are compared with::
+
+    python3 -m asterstudy.post.compare diff ref.rmed other.rmed -o diff.rmed
+
+and the cost of comparing two synthetic 200-step series is measured
+with::
+
+    python3 -m asterstudy.post.compare bench --steps 200 --points 100000
+"""
+
+import base64
+import hashlib
+import os
+import os.path as osp
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from collections import OrderedDict
+
+import numpy
+
+from .config import COMPARE_NEIGHBOURS
+
+POINTS, CELLS = 'POINTS', 'CELLS'
+
+# Types of the VTK data arrays
+VTK_DTYPES = {
+    'Int8': '<i1', 'UInt8': '<u1', 'Int16': '<i2', 'UInt16': '<u2',
+    'Int32': '<i4', 'UInt32': '<u4', 'Int64': '<i8', 'UInt64': '<u8',
+    'Float32': '<f4', 'Float64': '<f8',
+}
+
+# Arrays holding the node and cell numbers of a VTU file
+VTK_IDS = {
+    POINTS: ('GlobalNodeIds', 'vtkOriginalPointIds', 'NodeIds'),
+    CELLS: ('GlobalCellIds', 'vtkOriginalCellIds', 'CellIds'),
+}
+
+NO_PROFILE = 'MED_NO_PROFILE_INTERNAL'
+
+
+def _text(value):
+    """Returns a MED string attribute as text."""
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'replace')
+    return str(value).strip()
+
+
+# VTU files ------------------------------------------------------------------
+
+def _decode_binary(data, dtype, header, compressed):
+    """
+    Decodes a binary data array (one block of bytes: header and data)
+
+    Returns:
+        (numpy.ndarray, int): Values and size of the encoded block.
+    """
+    hsize = numpy.dtype(header).itemsize
+    if not compressed:
+        nbytes = int(numpy.frombuffer(data, header, 1)[0])
+        return (numpy.frombuffer(data, dtype, nbytes // numpy.dtype(dtype)
+                                 .itemsize, hsize), hsize + nbytes)
+    nblocks = int(numpy.frombuffer(data, header, 1)[0])
+    sizes = numpy.frombuffer(data, header, 3 + nblocks)
+    start = hsize * (3 + nblocks)
+    chunks = []
+    for size in sizes[3:]:
+        chunks.append(zlib.decompress(data[start:start + int(size)]))
+        start += int(size)
+    return numpy.frombuffer(b''.join(chunks), dtype), start
+
+
+def _decode_base64(text, dtype, header, compressed):
+    """Decodes a base64 data array (header encoded apart or not)."""
+    text = ''.join(text.split())
+    hsize = numpy.dtype(header).itemsize
+
+    def _chars(nbytes):
+        return 4 * ((nbytes + 2) // 3)
+
+    if compressed:
+        nblocks = int(numpy.frombuffer(
+            base64.b64decode(text[:_chars(hsize * 3)])[:hsize], header)[0])
+        end = _chars(hsize * (3 + nblocks))
+        head = base64.b64decode(text[:end])
+        try:
+            values, _ = _decode_binary(head + base64.b64decode(text[end:]),
+                                       dtype, header, True)
+        except zlib.error:
+            values, _ = _decode_binary(base64.b64decode(text), dtype,
+                                       header, True)
+        return values
+    data = base64.b64decode(text)
+    nbytes = int(numpy.frombuffer(data, header, 1)[0])
+    if len(data) >= hsize + nbytes and len(data) - hsize - nbytes < 3:
+        return _decode_binary(data, dtype, header, False)[0]
+    nbytes = int(numpy.frombuffer(
+        base64.b64decode(text[:_chars(hsize)])[:hsize], header)[0])
+    data = base64.b64decode(text[_chars(hsize):])
+    return numpy.frombuffer(data, dtype, nbytes // numpy.dtype(dtype).itemsize)
+
+
+def vtu_arrays(path, names=None):
+    """
+    Reads the data arrays of the first piece of a VTU file: ascii,
+    binary or appended (raw or base64) data arrays, compressed with
+    zlib or not
+
+    Arguments:
+        path (str): Path of the VTU file.
+        names (Optional[set]): Names of the point and cell data arrays
+            to read, all if *None* (the geometry is always read).
+
+    Returns:
+        OrderedDict: Attributes of the XML element (dict) and values
+        (native type, (n, ncomp) if several components) by section
+        ('Points', 'Cells', 'PointData', 'CellData') and name, in the
+        order of the file.
+    """
+    with open(path, 'rb') as vtu:
+        content = vtu.read()
+    appended, encoding = b'', 'raw'
+    marker = content.find(b'<AppendedData')
+    if marker >= 0:
+        close = content.index(b'>', marker)
+        encoding = ET.fromstring(content[marker:close].rstrip(b'/') + b'/>') \
+            .get('encoding', 'raw')
+        start = content.index(b'_', close) + 1
+        appended = content[start:content.rfind(b'</AppendedData>')]
+        content = content[:marker] + b'</VTKFile>'
+    root = ET.fromstring(content)
+    header = VTK_DTYPES[root.get('header_type', 'UInt32')]
+    compressed = root.get('compressor') is not None
+    piece = root.find('UnstructuredGrid/Piece')
+
+    def _array(node):
+        dtype = VTK_DTYPES[node.get('type')]
+        ncomp = int(node.get('NumberOfComponents', 1))
+        fmt = node.get('format', 'ascii')
+        if fmt == 'ascii':
+            values = numpy.array((node.text or '').split(), dtype=dtype)
+        elif fmt == 'binary':
+            values = _decode_base64(node.text or '', dtype, header,
+                                    compressed)
+        else:
+            offset = int(node.get('offset'))
+            if encoding == 'raw':
+                values, _ = _decode_binary(memoryview(appended)[offset:],
+                                           dtype, header, compressed)
+            else:
+                values = _decode_base64(appended[offset:].decode('ascii'),
+                                        dtype, header, compressed)
+        return values.reshape(-1, ncomp) if ncomp > 1 else values
+
+    arrays = OrderedDict()
+    for section in ('Points', 'Cells', 'PointData', 'CellData'):
+        data = piece.find(section)
+        for node in (data if data is not None else ()):
+            name = node.get('Name', section)
+            if section in ('Points', 'Cells') or names is None or \
+                    name in names or name in VTK_IDS[POINTS] + VTK_IDS[CELLS]:
+                arrays[section, name] = (dict(node.attrib), _array(node))
+    return arrays
+
+
+def read_vtu(path, names=None):
+    """
+    Reads the first piece of a VTU file (see `vtu_arrays`)
+
+    Arguments:
+        path (str): Path of the VTU file.
+        names (Optional[set]): Names of the point and cell data arrays
+            to read, all if *None* (the geometry is always read).
+
+    Returns:
+        dict: 'points' (n, 3), 'connectivity', 'offsets', 'types' and
+        the data arrays by association (`POINTS`, `CELLS`): ordered
+        dicts of (name, (n, ncomp) arrays).
+    """
+    grid = {POINTS: OrderedDict(), CELLS: OrderedDict()}
+    for (section, name), (_, values) in vtu_arrays(path, names).items():
+        if section == 'Points':
+            grid['points'] = values.astype(float).reshape(-1, 3)
+        elif section == 'Cells':
+            grid[name] = values
+        else:
+            assoc = POINTS if section == 'PointData' else CELLS
+            grid[assoc][name] = values.reshape(len(values), -1)
+    return grid
+
+
+def write_vtu(path, grid, point_data=None, cell_data=None):
+    """
+    Writes a VTU file with raw appended data
+
+    Arguments:
+        path (str): Path of the VTU file.
+        grid (dict): Geometry ('points', 'connectivity', 'offsets',
+            'types', see `read_vtu`).
+        point_data (Optional[dict]): Point arrays (n, ncomp) by name.
+        cell_data (Optional[dict]): Cell arrays (n, ncomp) by name.
+    """
+    kinds = {'f': 'Float', 'i': 'Int', 'u': 'UInt'}
+    blocks, offset = [], 0
+
+    def _tag(name, array):
+        nonlocal offset
+        array = numpy.ascontiguousarray(array)
+        if array.dtype.byteorder == '>':
+            array = array.astype(array.dtype.newbyteorder('<'))
+        kind = '{}{}'.format(kinds[array.dtype.kind], 8 * array.dtype.itemsize)
+        ncomp = array.shape[1] if array.ndim > 1 else 1
+        tag = ('<DataArray type="{}" Name="{}" NumberOfComponents="{}" '
+               'format="appended" offset="{}"/>'
+               .format(kind, name, ncomp, offset))
+        blocks.append(array)
+        offset += 8 + array.nbytes
+        return tag
+
+    def _tags(data):
+        return ''.join(_tag(name, array)
+                       for name, array in (data or {}).items())
+
+    points = _tag('Points', grid['points'])
+    cells = ''.join(_tag(name, grid[name])
+                    for name in ('connectivity', 'offsets', 'types'))
+    pdata, cdata = _tags(point_data), _tags(cell_data)
+    with open(path, 'wb') as vtu:
+        vtu.write('<?xml version="1.0"?>\n<VTKFile type="UnstructuredGrid" '
+                  'version="1.0" byte_order="LittleEndian" '
+                  'header_type="UInt64">\n<UnstructuredGrid>\n'
+                  '<Piece NumberOfPoints="{}" NumberOfCells="{}">\n'
+                  '<PointData>{}</PointData>\n<CellData>{}</CellData>\n'
+                  '<Points>{}</Points>\n<Cells>{}</Cells>\n</Piece>\n'
+                  '</UnstructuredGrid>\n<AppendedData encoding="raw">\n_'
+                  .format(len(grid['points']), len(grid['types']), pdata,
+                          cdata, points, cells).encode('ascii'))
+        for array in blocks:
+            vtu.write(numpy.uint64(array.nbytes).tobytes())
+            vtu.write(array.tobytes())
+        vtu.write(b'\n</AppendedData>\n</VTKFile>\n')
+
+
+def write_pvd(path, times, files):
+    """Writes a PVD file of VTU files (relative to the PVD folder)."""
+    folder = osp.dirname(osp.abspath(path))
+    with open(path, 'w') as pvd:
+        pvd.write('<?xml version="1.0"?>\n<VTKFile type="Collection" '
+                  'version="0.1">\n<Collection>\n')
+        for value, name in zip(times, files):
+            pvd.write('<DataSet timestep="{!r}" part="0" file="{}"/>\n'
+                      .format(float(value), osp.relpath(name, folder)))
+        pvd.write('</Collection>\n</VTKFile>\n')
+
+
+def _cell_centers(points, connectivity, offsets):
+    """Returns the centers of the cells of a VTU geometry."""
+    counts = numpy.diff(numpy.concatenate(([0], offsets)))
+    starts = numpy.asarray(offsets) - counts
+    sums = numpy.add.reduceat(points[connectivity], starts, axis=0) \
+        if len(starts) else numpy.zeros((0, 3))
+    return sums / numpy.maximum(counts, 1)[:, None]
+
+
+# Series ---------------------------------------------------------------------
+
+class FieldInfo():
+    """
+    Field of a series.
+
+    Arguments:
+        name (str): Name of the field.
+        association (str): `POINTS` or `CELLS`.
+        components (list[str]): Names of the components.
+    """
+
+    def __init__(self, name, association, components):
+        self.name = name
+        self.association = association
+        self.components = components
+
+    def __repr__(self):
+        return '<{} {} {}>'.format(self.name, self.association.lower(),
+                                   len(self.components))
+
+
+class MedSeries():
+    """
+    Steps of the fields of a MED result, read with h5py.
+
+    The cell fields are averaged on the Gauss points or the nodes of
+    each cell; the entities outside a profile get NaN values.
+
+    Arguments:
+        path (str): Path of the MED file.
+    """
+
+    def __init__(self, path):
+        import h5py
+        self.path = path
+        self._med = h5py.File(path, 'r')
+        self.mesh = self._read_mesh()
+        self.fields = OrderedDict()
+        self._steps = {}
+        numbers = {}
+        for name, data in self._med['CHA'].items():
+            entities = set()
+            for key, step in data.items():
+                entities.update(step.keys())
+                value = float(step.attrs['PDT'])
+                numbers.setdefault(value, (int(step.attrs['NDT']),
+                                           int(step.attrs['NOR'])))
+                self._steps[(name, value)] = key
+            if not entities:
+                continue
+            assoc = POINTS if 'NOE' in entities else CELLS
+            ncomp = int(data.attrs['NCO'])
+            comps = _text(data.attrs['NOM'])
+            comps = [comps[16 * i:16 * i + 16].strip() for i in range(ncomp)]
+            self.fields[name] = FieldInfo(name, assoc, comps)
+        self.times = sorted(numbers)
+        self.numbers = [numbers[value] for value in self.times]
+
+    def _read_mesh(self):
+        """Reads the coordinates, the numbers and the cells of the mesh."""
+        name = next(iter(self._med['ENS_MAA']))
+        steps = self._med['ENS_MAA'][name]
+        step = steps[next(iter(steps))]
+        space = int(steps.attrs.get('ESP', 3))
+        coords = step['NOE/COO'][()].reshape(space, -1).T
+        points = numpy.zeros((len(coords), 3))
+        points[:, :space] = coords
+        numbered = set()
+        node_ids = numpy.arange(1, len(points) + 1)
+        if 'NUM' in step['NOE']:
+            node_ids = step['NOE/NUM'][()]
+            numbered.add(POINTS)
+        types, ids, centers, topology = [], [], [], []
+        start = 0
+        for kind, cell in step['MAI'].items():
+            count = int(cell['NOD'].attrs['NBR'])
+            nodes = cell['NOD'][()].reshape(-1, count).T - 1
+            types.append((kind, start, count))
+            if 'NUM' in cell:
+                ids.append(cell['NUM'][()])
+                numbered.add(CELLS)
+            else:
+                ids.append(numpy.arange(start + 1, start + count + 1))
+            centers.append(points[nodes].mean(axis=1))
+            topology.append((kind, nodes))
+            start += count
+        return {'name': name, 'points': points, 'point_ids': node_ids,
+                'types': types, 'topology': topology, 'numbered': numbered,
+                'cell_ids': numpy.concatenate(ids) if ids else
+                            numpy.zeros(0, int),
+                'cell_centers': numpy.concatenate(centers) if centers else
+                                numpy.zeros((0, 3))}
+
+    def __len__(self):
+        return len(self.times)
+
+    def close(self):
+        """Closes the MED file."""
+        self._med.close()
+
+    def coordinates(self, association):
+        """Returns the coordinates of the points or of the cell centers."""
+        return self.mesh['points' if association == POINTS
+                         else 'cell_centers']
+
+    def ids(self, association):
+        """Returns the numbers of the nodes or of the cells."""
+        return self.mesh['point_ids' if association == POINTS
+                         else 'cell_ids']
+
+    def read(self, index, names=None):
+        """
+        Reads the fields of a step
+
+        Arguments:
+            index (int): Index of the step.
+            names (Optional[list[str]]): Fields to read, all if *None*.
+
+        Returns:
+            dict: (n, ncomp) values by field name (the fields without
+            this step are missing).
+        """
+        value = self.times[index]
+        values = {}
+        for name in names or self.fields:
+            key = self._steps.get((name, value))
+            if key is None:
+                continue
+            info = self.fields[name]
+            step = self._med['CHA'][name][key]
+            if info.association == POINTS:
+                total = len(self.mesh['points'])
+                blocks = [('NOE', 0, total)]
+            else:
+                total = len(self.mesh['cell_ids'])
+                blocks = [('MAI.' + kind, start, count)
+                          for kind, start, count in self.mesh['types']]
+            array = numpy.full((total, len(info.components)), numpy.nan)
+            for entity, start, count in blocks:
+                if entity not in step:
+                    continue
+                self._read_block(step[entity], array[start:start + count])
+            values[name] = array
+        return values
+
+    def _read_block(self, entity, array):
+        """Reads the values of an entity type (profile, Gauss points)."""
+        profile = _text(entity.attrs['PFL'])
+        data = entity[profile]
+        ncomp = array.shape[1]
+        raw = data['CO'][()]
+        if profile == NO_PROFILE:
+            rows = numpy.arange(len(array))
+        else:
+            rows = self._med['PROFILS'][profile]['PFL'][()] - 1
+        ngauss = max(1, len(raw) // (ncomp * len(rows)))
+        array[rows] = raw.reshape(ncomp, len(rows), ngauss).mean(axis=2).T
+
+
+class PvdSeries():
+    """
+    Steps of the point and cell data of a PVD series (or of a single
+    VTU file), read with `read_vtu`.
+
+    The geometry is the geometry of the first step.
+
+    Arguments:
+        path (str): Path of the PVD or VTU file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if path.lower().endswith('.pvd'):
+            from .timelod import StepIndex
+            index = StepIndex(path)
+            self.times, self.files = list(index.times), list(index.files)
+        else:
+            self.times, self.files = [0.], [path]
+        self.numbers = [(i, -1) for i in range(len(self.times))]
+        grid = read_vtu(self.files[0]) if self.files else None
+        self.fields = OrderedDict()
+        self.mesh = {}
+        if grid is None:
+            return
+        self.mesh = {key: grid[key] for key in
+                     ('points', 'connectivity', 'offsets', 'types')}
+        self.mesh['cell_centers'] = _cell_centers(
+            grid['points'], grid['connectivity'], grid['offsets'])
+        self.mesh['topology'] = [('types', grid['types']),
+                                 ('connectivity', grid['connectivity'])]
+        self.mesh['numbered'] = set()
+        for assoc in (POINTS, CELLS):
+            size = len(grid['points'] if assoc == POINTS else grid['types'])
+            ids = numpy.arange(1, size + 1)
+            for name in VTK_IDS[assoc]:
+                if name in grid[assoc]:
+                    ids = grid[assoc][name][:, 0]
+                    self.mesh['numbered'].add(assoc)
+                    break
+            self.mesh['point_ids' if assoc == POINTS else 'cell_ids'] = ids
+            for name, array in grid[assoc].items():
+                if name not in VTK_IDS[assoc]:
+                    comps = [str(i) for i in range(array.shape[1])]
+                    self.fields[name] = FieldInfo(name, assoc, comps)
+
+    def __len__(self):
+        return len(self.times)
+
+    def close(self):
+        """Nothing to close: each step is read from its own file."""
+
+    def coordinates(self, association):
+        """Returns the coordinates of the points or of the cell centers."""
+        return self.mesh['points' if association == POINTS
+                         else 'cell_centers']
+
+    def ids(self, association):
+        """Returns the numbers of the points or of the cells."""
+        return self.mesh['point_ids' if association == POINTS
+                         else 'cell_ids']
+
+    def read(self, index, names=None):
+        """
+        Reads the data arrays of a step
+
+        Returns:
+            dict: (n, ncomp) float values by field name.
+        """
+        grid = read_vtu(self.files[index], set(names or self.fields))
+        values = {}
+        for name in names or self.fields:
+            info = self.fields[name]
+            if name in grid[info.association]:
+                values[name] = grid[info.association][name].astype(float)
+        return values
+
+
+def open_series(path):
+    """Returns the series of a MED, PVD or VTU file."""
+    ext = osp.splitext(path)[1].lower()
+    if ext in ('.med', '.rmed', '.mmed'):
+        return MedSeries(path)
+    if ext in ('.pvd', '.vtu'):
+        return PvdSeries(path)
+    raise ValueError('unsupported result file: {}'.format(path))
+
+
+# Alignment ------------------------------------------------------------------
+
+class IdentityMap():
+    """Same entities in the same order."""
+    kind = 'identity'
+
+    def apply(self, values):
+        """Returns the values on the reference entities."""
+        return values
+
+
+class PermutationMap():
+    """
+    Same entities numbered the same way, in another order.
+
+    Arguments:
+        ref_ids (numpy.ndarray): Numbers of the reference entities.
+        ids (numpy.ndarray): Numbers of the other entities.
+    """
+    kind = 'permutation'
+
+    def __init__(self, ref_ids, ids):
+        order = numpy.argsort(ids, kind='stable')
+        pos = numpy.searchsorted(ids, ref_ids, sorter=order)
+        pos = numpy.minimum(pos, len(ids) - 1)
+        self.rows = order[pos]
+        self.missing = ids[self.rows] != ref_ids
+
+    def apply(self, values):
+        """Returns the values on the reference entities."""
+        aligned = values[self.rows]
+        if self.missing.any():
+            aligned[self.missing] = numpy.nan
+        return aligned
+
+
+class InterpolationMap():
+    """
+    Inverse distance interpolation from the nearest entities of another
+    mesh to the entities of the reference mesh.
+
+    The sparse interpolation matrix is cached in an ``.npz`` file named
+    by the hash of both coordinates.
+
+    Arguments:
+        ref_coords (numpy.ndarray): Coordinates of the reference
+            entities (n, 3).
+        coords (numpy.ndarray): Coordinates of the other entities.
+        neighbours (Optional[int]): Number of nearest entities.
+        cache_dir (Optional[str]): Folder of the cached matrices, no
+            cache if *None*.
+    """
+    kind = 'interpolation'
+
+    def __init__(self, ref_coords, coords, neighbours=COMPARE_NEIGHBOURS,
+                 cache_dir=None):
+        self.cached = False
+        self.path = None
+        neighbours = max(1, min(neighbours, len(coords)))
+        if cache_dir:
+            self.path = osp.join(cache_dir, '.compare-{}.npz'.format(
+                self.key(ref_coords, coords, neighbours)))
+        if self.path and osp.isfile(self.path):
+            try:
+                with numpy.load(self.path) as cache:
+                    self.rows, self.weights = cache['rows'], cache['weights']
+                self.cached = True
+                return
+            except (OSError, KeyError, ValueError):
+                pass
+        self.rows, self.weights = self._build(ref_coords, coords, neighbours)
+        if self.path:
+            try:
+                tmp = self.path + '.tmp.npz'
+                numpy.savez(tmp, rows=self.rows, weights=self.weights)
+                os.replace(tmp, self.path)
+            except OSError:
+                self.path = None
+
+    @staticmethod
+    def key(ref_coords, coords, neighbours):
+        """Returns the hash of both coordinates and of the neighbours."""
+        sha = hashlib.sha1()
+        for array in (ref_coords, coords):
+            array = numpy.ascontiguousarray(array, dtype=float)
+            sha.update(str(array.shape).encode('ascii'))
+            sha.update(array.tobytes())
+        sha.update(str(neighbours).encode('ascii'))
+        return sha.hexdigest()[:16]
+
+    @staticmethod
+    def _build(ref_coords, coords, neighbours):
+        """Returns the rows and weights (n, neighbours) of the map."""
+        from scipy.spatial import cKDTree
+        tree = cKDTree(coords)
+        dist, rows = tree.query(ref_coords, k=neighbours)
+        if neighbours == 1:
+            dist, rows = dist[:, None], rows[:, None]
+        exact = dist[:, 0] <= 1e-12 * (1. + numpy.abs(ref_coords).max())
+        weights = 1. / numpy.maximum(dist, 1e-300) ** 2
+        weights[exact] = 0.
+        weights[exact, 0] = 1.
+        weights /= weights.sum(axis=1)[:, None]
+        return rows.astype(numpy.int64), weights
+
+    def apply(self, values):
+        """Returns the values interpolated on the reference entities."""
+        return numpy.einsum('nk,nkc->nc', self.weights, values[self.rows])
+
+
+def same_topology(ref, other):
+    """Returns whether two results have the same points and cells."""
+    if len(ref.mesh['points']) != len(other.mesh['points']):
+        return False
+    cells, other_cells = ref.mesh['topology'], other.mesh['topology']
+    return len(cells) == len(other_cells) and all(
+        kind == other_kind and numpy.array_equal(nodes, other_nodes)
+        for (kind, nodes), (other_kind, other_nodes) in zip(cells,
+                                                            other_cells))
+
+
+def alignment(ref, other, association, neighbours=COMPARE_NEIGHBOURS,
+              cache_dir=None):
+    """
+    Returns the map of the entities of *other* to the entities of *ref*
+
+    The entities are aligned by their numbers when both results number
+    them the same way, by their index when both results have the same
+    cells without numbers (whatever their coordinates: variants of the
+    same topology), interpolated otherwise.
+    """
+    ref_ids, ids = ref.ids(association), other.ids(association)
+    numbered = association in ref.mesh['numbered'] and \
+        association in other.mesh['numbered']
+    if len(ref_ids) == len(ids) and len(ids):
+        if numbered and numpy.array_equal(ref_ids, ids):
+            return IdentityMap()
+        if numbered and numpy.array_equal(numpy.sort(ref_ids),
+                                          numpy.sort(ids)):
+            return PermutationMap(ref_ids, ids)
+        if not numbered and same_topology(ref, other):
+            return IdentityMap()
+    return InterpolationMap(ref.coordinates(association),
+                            other.coordinates(association), neighbours,
+                            cache_dir)
+
+
+# Statistics -----------------------------------------------------------------
+
+class FieldStats():
+    """
+    Norms of the differences of a field, step by step and over all
+    steps.
+
+    Arguments:
+        name (str): Name of the field.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.steps = []
+        self.max_abs = 0.
+        self.max_time = None
+        self.max_id = None
+        self._sq_diff = 0.
+        self._sq_ref = 0.
+        self._count = 0
+
+    def add(self, value, diff, ref, ids):
+        """
+        Adds the difference of a step
+
+        Returns:
+            dict: Norms of the step ('max_abs', 'max_mag', 'rms',
+            'rel_l2').
+        """
+        valid = ~numpy.isnan(diff).any(axis=1)
+        diff, ref, ids = diff[valid], ref[valid], ids[valid]
+        absdiff = numpy.abs(diff)
+        sq_diff = float((diff * diff).sum())
+        sq_ref = float((ref * ref).sum())
+        row = {'time': value, 'entities': len(diff), 'max_abs': 0.,
+               'max_mag': 0., 'rms': 0., 'rel_l2': 0., 'id': None}
+        if len(diff):
+            pos = int(absdiff.max(axis=1).argmax())
+            row['max_abs'] = float(absdiff[pos].max())
+            row['id'] = int(ids[pos])
+            row['max_mag'] = float(numpy.sqrt((diff * diff).sum(axis=1))
+                                   .max())
+            row['rms'] = (sq_diff / diff.size) ** 0.5
+            row['rel_l2'] = (sq_diff / sq_ref) ** 0.5 if sq_ref else \
+                (0. if not sq_diff else float('inf'))
+        if row['max_abs'] >= self.max_abs and row['id'] is not None:
+            self.max_abs, self.max_time, self.max_id = \
+                row['max_abs'], value, row['id']
+        self._sq_diff += sq_diff
+        self._sq_ref += sq_ref
+        self._count += diff.size
+        self.steps.append(row)
+        return row
+
+    @property
+    def rms(self):
+        """Returns the RMS of the differences over all steps."""
+        return (self._sq_diff / self._count) ** 0.5 if self._count else 0.
+
+    @property
+    def rel_l2(self):
+        """Returns the relative L2 norm of the differences (all steps)."""
+        if not self._sq_ref:
+            return 0. if not self._sq_diff else float('inf')
+        return (self._sq_diff / self._sq_ref) ** 0.5
+
+    def as_dict(self):
+        """Returns the norms over all steps."""
+        return {'field': self.name, 'steps': len(self.steps),
+                'max_abs': self.max_abs, 'time': self.max_time,
+                'id': self.max_id, 'rms': self.rms, 'rel_l2': self.rel_l2}
+
+
+# Writers --------------------------------------------------------------------
+
+class MedDiffWriter():
+    """
+    Writes the differences on the mesh of a MED reference, as fields
+    named after the reference fields with a ``_DIFF`` suffix (the cell
+    fields are written per cell, without Gauss points).
+
+    Arguments:
+        path (str): Path of the MED file.
+        ref (MedSeries): Reference result.
+    """
+
+    def __init__(self, path, ref):
+        import h5py
+        self.ref = ref
+        self._med = h5py.File(path, 'w')
+        for key in ('INFOS_GENERALES', 'ENS_MAA', 'FAS'):
+            if key in ref._med: # pragma pylint: disable=protected-access
+                ref._med.copy(key, self._med) # pragma pylint: disable=protected-access
+        self._med.create_group('CHA')
+
+    def _field(self, name):
+        """Returns the group of a difference field (created once)."""
+        key = (name + '_DIFF')[:64]
+        if key in self._med['CHA']:
+            return self._med['CHA'][key]
+        info = self.ref.fields[name]
+        field = self._med['CHA'].create_group(key)
+        field.attrs['MAI'] = numpy.bytes_(self.ref.mesh['name'].encode())
+        field.attrs['NCO'] = numpy.int32(len(info.components))
+        field.attrs['NOM'] = numpy.bytes_(''.join(
+            comp[:16].ljust(16) for comp in info.components).encode())
+        field.attrs['TYP'] = numpy.int32(6)
+        field.attrs['UNI'] = numpy.bytes_(b' ' * 16 * len(info.components))
+        field.attrs['UNT'] = numpy.bytes_(b'')
+        return field
+
+    def write(self, index, diffs):
+        """Writes the differences (n, ncomp) by field of a step."""
+        ndt, nor = self.ref.numbers[index]
+        for name, diff in diffs.items():
+            field = self._field(name)
+            step = field.create_group('{:020d}{:020d}'.format(ndt, nor))
+            for attr, value in (('NDT', ndt), ('NOR', nor), ('RDT', -1),
+                                ('ROR', -1)):
+                step.attrs[attr] = numpy.int32(value)
+            step.attrs['PDT'] = numpy.float64(self.ref.times[index])
+            if self.ref.fields[name].association == POINTS:
+                blocks = [('NOE', 0, len(diff))]
+            else:
+                blocks = [('MAI.' + kind, start, count)
+                          for kind, start, count in self.ref.mesh['types']]
+            for entity, start, count in blocks:
+                group = step.create_group(entity)
+                group.attrs['GAU'] = numpy.bytes_(b'')
+                group.attrs['PFL'] = numpy.bytes_(NO_PROFILE.encode())
+                data = group.create_group(NO_PROFILE)
+                data.attrs['GAU'] = numpy.bytes_(b'')
+                data.attrs['NBR'] = numpy.int32(count)
+                data.attrs['NGA'] = numpy.int32(1)
+                data.create_dataset(
+                    'CO', data=diff[start:start + count].T.ravel())
+
+    def close(self):
+        """Closes the MED file."""
+        self._med.close()
+
+
+class PvdDiffWriter():
+    """
+    Writes the differences on the geometry of a PVD reference, one VTU
+    file per step, and the PVD file of the steps.
+
+    Arguments:
+        path (str): Path of the PVD file.
+        ref (PvdSeries): Reference result.
+    """
+
+    def __init__(self, path, ref):
+        self.path = path
+        self.ref = ref
+        self.folder = osp.splitext(path)[0]
+        os.makedirs(self.folder, exist_ok=True)
+        self.times, self.files = [], []
+
+    def write(self, index, diffs):
+        """Writes the differences (n, ncomp) by field of a step."""
+        data = {POINTS: {}, CELLS: {}}
+        for name, diff in diffs.items():
+            data[self.ref.fields[name].association][name + '_DIFF'] = diff
+        path = osp.join(self.folder, 'diff_{:05d}.vtu'.format(index))
+        write_vtu(path, self.ref.mesh, data[POINTS], data[CELLS])
+        self.times.append(self.ref.times[index])
+        self.files.append(path)
+
+    def close(self):
+        """Writes the PVD file."""
+        write_pvd(self.path, self.times, self.files)
+
+
+def common_fields(ref, other):
+    """
+    Returns the fields of *other* compared to the fields of *ref*
+
+    The MED fields of code_aster are named after the result (8
+    characters) and the field (``reslin__DEPL``): the fields of results
+    named differently are paired by field name.
+
+    Returns:
+        dict: Names of the fields of *other* by name of the fields of
+        *ref*.
+    """
+    def _match(info, other_info):
+        return info.association == other_info.association and \
+            len(info.components) == len(other_info.components)
+
+    pairs = OrderedDict()
+    by_field = {}
+    if isinstance(ref, MedSeries) and isinstance(other, MedSeries):
+        for name in other.fields:
+            by_field.setdefault(name[8:], []).append(name)
+    for name, info in ref.fields.items():
+        candidates = [name] if name in other.fields else \
+            by_field.get(name[8:], [])
+        if len(candidates) == 1 and _match(info, other.fields[candidates[0]]):
+            pairs[name] = candidates[0]
+    return pairs
+
+
+def diff_writer(path, ref):
+    """Returns the writer of the differences for the reference type."""
+    if isinstance(ref, MedSeries):
+        if not path.lower().endswith(('.med', '.rmed')):
+            raise ValueError('MED reference: the differences are written '
+                             'in a MED file')
+        return MedDiffWriter(path, ref)
+    if not path.lower().endswith('.pvd'):
+        raise ValueError('VTU reference: the differences are written '
+                         'in a PVD file')
+    return PvdDiffWriter(path, ref)
+
+
+# Comparison -----------------------------------------------------------------
+
+class Comparison():
+    """
+    Difference fields between two results, computed step by step.
+
+    Arguments:
+        ref (MedSeries|PvdSeries): Reference result.
+        other (MedSeries|PvdSeries): Compared result.
+        fields (Optional[list[str]]): Fields to compare, all the common
+            fields if *None*.
+        match (Optional[str]): Pairing of the steps: 'time', 'index' or
+            'auto' (by time if all the reference times are found).
+        neighbours (Optional[int]): Nearest entities of the
+            interpolation.
+        cache_dir (Optional[str]): Folder of the cached interpolation
+            maps, the folder of the reference by default, '' for none.
+    """
+
+    def __init__(self, ref, other, fields=None, match='auto',
+                 neighbours=COMPARE_NEIGHBOURS, cache_dir=None):
+        self.ref = ref
+        self.other = other
+        self.names = common_fields(ref, other)
+        self.fields = [name for name in (fields or self.names)
+                       if name in self.names]
+        if not self.fields:
+            raise ValueError('no common field to compare')
+        if cache_dir is None:
+            cache_dir = osp.dirname(osp.abspath(ref.path))
+        self.maps = {}
+        for assoc in set(ref.fields[name].association
+                         for name in self.fields):
+            self.maps[assoc] = alignment(ref, other, assoc, neighbours,
+                                         cache_dir or None)
+        self.pairs = self.pair_steps(ref.times, other.times, match)
+        self.stats = OrderedDict((name, FieldStats(name))
+                                 for name in self.fields)
+        self.timings = {'read': 0., 'align': 0., 'write': 0.}
+
+    @staticmethod
+    def pair_steps(ref_times, times, match='auto', tolerance=1e-6):
+        """
+        Returns the pairs of step indexes (reference, other)
+
+        Arguments:
+            ref_times (list[float]): Times of the reference steps.
+            times (list[float]): Times of the other steps.
+            match (str): 'time', 'index' or 'auto'.
+            tolerance (float): Relative tolerance on the times.
+        """
+        if match == 'index':
+            return [(i, i) for i in range(min(len(ref_times), len(times)))]
+        if not len(times):
+            return []
+        values = numpy.asarray(times)
+        scale = max(1., float(numpy.abs(values).max()))
+        pairs = []
+        for i, value in enumerate(ref_times):
+            j = int(numpy.abs(values - value).argmin())
+            if abs(values[j] - value) <= tolerance * scale:
+                pairs.append((i, j))
+        if match == 'auto' and len(pairs) < len(ref_times):
+            return Comparison.pair_steps(ref_times, times, 'index')
+        return pairs
+
+    def steps(self):
+        """
+        Computes the differences step by step
+
+        Yields:
+            (int, dict): Index of the reference step and the
+            differences (other - reference, on the reference entities)
+            by field.
+        """
+        for iref, iother in self.pairs:
+            start = time.perf_counter()
+            ref = self.ref.read(iref, self.fields)
+            other = self.other.read(
+                iother, [self.names[name] for name in self.fields])
+            self.timings['read'] += time.perf_counter() - start
+            start = time.perf_counter()
+            diffs = OrderedDict()
+            for name in self.fields:
+                if name not in ref or self.names[name] not in other:
+                    continue
+                assoc = self.ref.fields[name].association
+                diff = self.maps[assoc].apply(other[self.names[name]]) - \
+                    ref[name]
+                self.stats[name].add(self.ref.times[iref], diff, ref[name],
+                                     self.ref.ids(assoc))
+                diffs[name] = diff
+            self.timings['align'] += time.perf_counter() - start
+            yield iref, diffs
+
+    def run(self, output=None, callback=None):
+        """
+        Compares all the steps
+
+        Arguments:
+            output (Optional[str]): MED or PVD file of the differences.
+            callback (Optional[callable]): Called with the index of the
+                reference step after each step.
+
+        Returns:
+            list[dict]: Norms of each field over all steps.
+        """
+        writer = diff_writer(output, self.ref) if output else None
+        try:
+            for index, diffs in self.steps():
+                if writer is not None:
+                    start = time.perf_counter()
+                    writer.write(index, diffs)
+                    self.timings['write'] += time.perf_counter() - start
+                if callback is not None:
+                    callback(index)
+        finally:
+            if writer is not None:
+                writer.close()
+        return self.summary()
+
+    def summary(self):
+        """Returns the norms of each field over all steps."""
+        return [stats.as_dict() for stats in self.stats.values()]
+
+    def write_table(self, path):
+        """Writes the norms of each field and step in a CSV file."""
+        import csv
+        columns = ('field', 'time', 'entities', 'max_abs', 'id', 'max_mag',
+                   'rms', 'rel_l2')
+        with open(path, 'w', newline='') as table:
+            writer = csv.writer(table)
+            writer.writerow(columns)
+            for stats in self.stats.values():
+                for row in stats.steps:
+                    writer.writerow([stats.name] + [row[key]
+                                                    for key in columns[1:]])
+
+
+def compare(ref_path, other_path, output=None, **kwargs):
+    """
+    Compares two result files
+
+    Arguments:
+        ref_path (str): MED, PVD or VTU reference.
+        other_path (str): MED, PVD or VTU compared result.
+        output (Optional[str]): MED or PVD file of the differences.
+        **kwargs: Options of `Comparison`.
+
+    Returns:
+        Comparison: Comparison done (norms in ``stats``).
+    """
+    ref, other = open_series(ref_path), open_series(other_path)
+    try:
+        comparison = Comparison(ref, other, **kwargs)
+        comparison.run(output)
+    finally:
+        ref.close()
+        other.close()
+    return comparison
+
+
+# Benchmark ------------------------------------------------------------------
+
+def synthetic_pair(folder, steps, points, jitter=False, seed=0):
+    """
+    Writes two synthetic PVD series of hexahedra: a reference and a
+    perturbed copy (nodes renumbered in another order, or moved when
+    *jitter* is set so that the topologies differ)
+
+    Returns:
+        (str, str): Paths of the PVD files.
+    """
+    rng = numpy.random.RandomState(seed)
+    side = max(2, int(round(points ** (1. / 3))))
+    axis = numpy.linspace(0., 1., side)
+    grid = numpy.stack(numpy.meshgrid(axis, axis, axis, indexing='ij'),
+                       axis=-1).reshape(-1, 3)
+    ijk = numpy.arange(side ** 3).reshape(side, side, side)[:-1, :-1, :-1]
+    ijk = ijk.ravel()
+    dx, dy, dz = side * side, side, 1
+    hexa = numpy.stack([ijk, ijk + dx, ijk + dx + dy, ijk + dy, ijk + dz,
+                        ijk + dx + dz, ijk + dx + dy + dz, ijk + dy + dz],
+                       axis=1)
+    ref = {'points': grid, 'connectivity': hexa.ravel().astype(numpy.int64),
+           'offsets': numpy.arange(8, 8 * len(hexa) + 1, 8, dtype=numpy.int64),
+           'types': numpy.full(len(hexa), 12, dtype=numpy.uint8)}
+    ids = numpy.arange(1, len(grid) + 1, dtype=numpy.int64)
+    order = rng.permutation(len(grid))
+    inverse = numpy.argsort(order)
+    other = dict(ref, points=grid[order],
+                 connectivity=inverse[hexa].ravel().astype(numpy.int64))
+    if jitter:
+        other['points'] = other['points'] + rng.uniform(
+            -0.25, 0.25, other['points'].shape) / side
+    paths = []
+    for label, geometry, perm in (('ref', ref, None), ('other', other, order)):
+        sub = osp.join(folder, label)
+        os.makedirs(sub, exist_ok=True)
+        times, files = [], []
+        for step in range(steps):
+            value = 0.01 * step
+            xyz = geometry['points'] if perm is None else grid[perm]
+            disp = 1e-3 * value * numpy.sin(numpy.pi * xyz)
+            pressure = (xyz[:, 2] + value)[:, None]
+            if perm is not None:
+                disp = disp * 1.01
+                pressure = pressure + 1e-4 * numpy.cos(10 * value)
+            data = OrderedDict([('U', disp.astype(numpy.float32)),
+                                ('p', pressure.astype(numpy.float32))])
+            if not jitter:
+                data['GlobalNodeIds'] = ids if perm is None else ids[perm]
+            name = osp.join(sub, 'step_{:05d}.vtu'.format(step))
+            write_vtu(name, geometry, data)
+            times.append(value)
+            files.append(name)
+        paths.append(osp.join(folder, label + '.pvd'))
+        write_pvd(paths[-1], times, files)
+    return tuple(paths)
+
+
+def benchmark(folder, steps=200, points=100000, jitter=False, output=True):
+    """
+    Measures the comparison of two synthetic series
+
+    Returns:
+        dict: Elapsed times, time per step, resident memory before and
+        at most during the comparison (KB), size of a step (KB).
+    """
+    from .memory import get_client_memory
+    ref_path, other_path = synthetic_pair(folder, steps, points, jitter)
+    result = {'steps': steps, 'points': points,
+              'step_size': os.path.getsize(
+                  osp.join(folder, 'ref', 'step_00000.vtu')) // 1024}
+    for run in ('first', 'cached'):
+        memory = [get_client_memory()]
+        start = time.perf_counter()
+        ref, other = open_series(ref_path), open_series(other_path)
+        comparison = Comparison(ref, other)
+        setup = time.perf_counter() - start
+        diff = osp.join(folder, 'diff.pvd') if output else None
+        comparison.run(diff, callback=lambda _: memory.append(
+            get_client_memory()))
+        elapsed = time.perf_counter() - start
+        result[run] = {
+            'map': comparison.maps[POINTS].kind,
+            'cached': getattr(comparison.maps[POINTS], 'cached', False),
+            'setup': setup, 'elapsed': elapsed,
+            'per_step': (elapsed - setup) / max(1, len(comparison.pairs)),
+            'memory': memory[0], 'peak': max(memory),
+            'growth': max(memory[len(memory) // 10:]) -
+                      memory[len(memory) // 10],
+            'timings': dict(comparison.timings),
+            'summary': comparison.summary(),
+        }
+    return result
+
+
+def _print_summary(summary):
+    print('%-24s %6s %12s %12s %12s %10s' % (
+        'field', 'steps', 'max |diff|', 'at time', 'rms', 'rel L2'))
+    for row in summary:
+        print('%-24s %6d %12.4e %12s %12.4e %10.3e' % (
+            row['field'][:24], row['steps'], row['max_abs'],
+            '-' if row['time'] is None else '%g' % row['time'], row['rms'],
+            row['rel_l2']))
+
+
+def main(argv=None):
+    """Compare two results or measure the comparison of synthetic series."""
+    import argparse
+    import shutil
+    import tempfile
+    parser = argparse.ArgumentParser(
+        description='Difference fields between two results.')
+    sub = parser.add_subparsers(dest='command')
+    diff = sub.add_parser('diff', help='compare two MED, PVD or VTU results')
+    diff.add_argument('ref')
+    diff.add_argument('other')
+    diff.add_argument('-o', '--output', default=None,
+                      help='MED (MED reference) or PVD file of the '
+                           'differences')
+    diff.add_argument('--field', action='append', default=None)
+    diff.add_argument('--match', choices=('auto', 'time', 'index'),
+                      default='auto')
+    diff.add_argument('--neighbours', type=int, default=COMPARE_NEIGHBOURS)
+    diff.add_argument('--csv', default=None,
+                      help='norms of each field and step')
+    bench = sub.add_parser('bench', help='compare synthetic series')
+    bench.add_argument('--steps', type=int, default=200)
+    bench.add_argument('--points', type=int, default=100000)
+    bench.add_argument('--jitter', action='store_true',
+                       help='different topologies (interpolation)')
+    bench.add_argument('--no-output', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.command == 'diff':
+        start = time.perf_counter()
+        try:
+            comparison = compare(args.ref, args.other, args.output,
+                                 fields=args.field, match=args.match,
+                                 neighbours=args.neighbours)
+        except ValueError as exc:
+            print('error: {}'.format(exc))
+            return 1
+        print('%d steps compared in %.2f s (%s)' % (
+            len(comparison.pairs), time.perf_counter() - start,
+            ', '.join('%s: %s' % (assoc.lower(), mapping.kind)
+                      for assoc, mapping in sorted(comparison.maps.items()))))
+        _print_summary(comparison.summary())
+        if args.csv:
+            comparison.write_table(args.csv)
+        return 0
+    if args.command == 'bench':
+        folder = tempfile.mkdtemp(prefix='compare')
+        try:
+            res = benchmark(folder, args.steps, args.points, args.jitter,
+                            not args.no_output)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        print('%d steps of %d points, %d KB per step file' % (
+            res['steps'], res['points'], res['step_size']))
+        for run in ('first', 'cached'):
+            item = res[run]
+            print('%-6s %-13s map%s: setup %.2f s, total %.2f s, '
+                  '%.1f ms/step (read %.1f s, align %.1f s, write %.1f s)'
+                  % (run, item['map'], ' (cached)' if item['cached'] else '',
+                     item['setup'], item['elapsed'], item['per_step'] * 1e3,
+                     item['timings']['read'], item['timings']['align'],
+                     item['timings']['write']))
+            print('       memory %d KB at start, %d KB peak, %+d KB growth '
+                  'after the first steps' % (item['memory'], item['peak'],
+                                             item['growth']))
+        _print_summary(res['cached']['summary'])
+        return 0
+    parser.print_help()
+    return 1
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
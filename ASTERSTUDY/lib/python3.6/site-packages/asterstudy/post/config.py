@@ -86,3 +86,63 @@ RESULTS_PV_VIEW_NAME = str('AsterStudy Results View')
 # 开启result tab 的DEBUG信息
 # DEBUG = False
 DEBUG = True
+
+# 记录pvsimple管线操作耗时(见 tracer.py), 也可设置环境变量 ASTERSTUDY_PV_TRACE
+TRACE = False
+
+# 内存预算: 占物理内存的比例, 超出时按 MEMORY_POLICY 处理(见 memory.py)
+MEMORY_BUDGET = 0.75
+# 'warn' 仅提示; 'release' 自动释放未显示的派生/缓存数据源
+MEMORY_POLICY = 'warn'
+# 内存采样周期(毫秒)
+MEMORY_PERIOD = 5000
+
+# 流体结果快速浏览缓存(见 foamcache.py): 分解算例转换为单文件按时间索引的格式
+FOAM_CACHE = True
+# 缓存的流体场(不存在的场被忽略)
+FOAM_CACHE_FIELDS = ['alpha.water', 'p_rgh', 'p', 'U']
+
+# PVD 结果序列的时间细节层次(见 timelod.py): 播放时按目标帧率抽取时间步
+TIME_LOD = True
+# 播放的目标帧率
+TIME_LOD_FPS = 10
+# 完整序列的目标播放时长(秒), 保存动画时仍使用全部时间步
+TIME_LOD_DURATION = 30
+
+# 大网格的空间细节层次(见 spatiallod.py): 相机交互时显示简化的表面;
+# 动画播放时暂停简化(每个时间步都需重新简化), 不再显示的简化表面被删除
+SPATIAL_LOD = True
+# 超过该单元数的数据源才生成简化表面
+SPATIAL_LOD_CELLS = 500000
+# 简化表面的聚类网格在每个方向的划分数
+SPATIAL_LOD_DIVISIONS = 128
+# 相机静止多少毫秒后恢复完整分辨率
+SPATIAL_LOD_IDLE = 300
+
+# 振型动画的帧缓存(见 modecache.py): 预先计算变形后的坐标, 播放时不再重新执行 Warp
+MODE_CACHE = True
+# 每个周期的相位采样数(相同幅值的采样共享坐标)
+MODE_CACHE_PHASES = 32
+# 内存中保留的振型数(最近显示的)
+# 每个振型缓存约 17 个不同幅值的 float32 坐标: 100 万节点约 206 MB/振型
+MODE_CACHE_MODES = 2
+
+# 结果对比(见 compare.py): 网格不同时按最近的若干节点(单元中心)反距离插值
+COMPARE_NEIGHBOURS = 4
+
+# 已完成算例的归档(见 archive.py): 压缩算法 'zlib' 或 'lzma'
+ARCHIVE_CODEC = 'zlib'
+# 压缩级别
+ARCHIVE_LEVEL = 6
+# 文件分块大小(字节), 每块单独压缩以便随机读取
+ARCHIVE_CHUNK = 2 ** 20
+# 多少小时内没有文件修改的算例才视为已完成
+ARCHIVE_IDLE = 24
+
+# 网格组子集缓存(见 groupcache.py): 按(文件, 修改时间, 组)缓存子集在完整网格中的节点/单元编号, 切换场或时间步时不再重新采样
+GROUP_CACHE = True
+# 内存中保留的组子集数(最近显示的)
+GROUP_CACHE_SUBSETS = 8
+
+# 静力结果读取器的按需数组(见 arrays.py): 只加载显示用到的数组, 不再使用的数组被卸载
+LAZY_ARRAYS = True
@@ -0,0 +1,718 @@
+"""
+Fast-browse cache of the decomposed OpenFOAM results.
+
+`Results.load_ofccx_result_call` reads ``Fluid/Fluid.foam`` as a
+decomposed case: every time change re-reads the mesh and the fields of
+all the processor directories. The cache converts the internal mesh
+and the selected fields (`config.FOAM_CACHE_FIELDS`) of the written
+time steps into one file, ``Fluid/Fluid.tscache``:
+
+- the mesh topology is stored once (VTK XML, compressed),
+- each time step is a contiguous block of float32 arrays (point and
+  cell data of the fields, and the points when the mesh moves),
+- a JSON index at the end of the file gives the times and the offsets
+  of the blocks; a new time step overwrites the index, which is
+  written again after it, so that the cache can be extended while
+  the solver runs and read at the same time (a reader keeps the
+  previous index while the trailer is incomplete).
+
+The cache is built in background by this module run as a script (it
+only needs VTK, not the ParaView server manager); the Results tab
+switches to it as soon as it covers the time steps of the case. In the
+ParaView pipeline the cache is read by a ``ProgrammableSource`` whose
+scripts call `pv_request_information` and `pv_request_data`.
+
+The time-step switch latency and the disk size of the cache and of the
+decomposed case can be compared with::
+
+    python3 -m asterstudy.post.foamcache build /path/to/case
+    python3 -m asterstudy.post.foamcache bench /path/to/case
+"""
+
+import json
+import os
+import os.path as osp
+import struct
+import sys
+import time
+
+import numpy
+
+from .config import FOAM_CACHE_FIELDS
+
+
+CACHE_NAME = 'Fluid.tscache'
+
+MAGIC = b'TSCACHE1'
+
+# magic, offset and length of the JSON index
+TRAILER = struct.Struct('<8sQQ')
+
+DTYPE = numpy.dtype('<f4')
+
+# number of appended steps between two syncs of the cache to the disk
+SYNC_STEPS = 20
+
+
+class CacheError(Exception):
+    """Missing, incomplete or incompatible cache."""
+
+
+def cache_path(case):
+    """Return the path of the cache of a case."""
+    return osp.join(case, 'Fluid', CACHE_NAME)
+
+
+class CacheFile():
+    """
+    Time-indexed cache file.
+
+    Arguments:
+        path (str): Path of the cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = None
+        self._stamp = None
+        self._mesh = None
+
+    def load(self):
+        """
+        (Re)read the index if the file changed
+
+        Returns:
+            bool: *True* if a valid index is available.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        stamp = (stat.st_mtime, stat.st_size)
+        if stamp == self._stamp:
+            return self.index is not None
+        with open(self.path, 'rb') as stream:
+            index = read_index(stream)
+        if index is not None:
+            if self.index is None or \
+                    index['mesh'] != self.index['mesh']:
+                self._mesh = None
+            self.index = index
+            self._stamp = stamp
+        return self.index is not None
+
+    @property
+    def times(self):
+        """list[float]: Cached times."""
+        return [step['time'] for step in self.index['steps']]
+
+    @property
+    def fields(self):
+        """list[dict]: Name, association and components of the fields."""
+        return self.index['fields']
+
+    def nearest(self, value):
+        """Return the index of the cached time nearest to *value*."""
+        times = self.times
+        return min(range(len(times)), key=lambda i: abs(times[i] - value))
+
+    def read_step(self, index):
+        """
+        Read the arrays of a time step
+
+        Returns:
+            dict: numpy arrays by field name, and 'points' if the mesh
+            moves.
+        """
+        step = self.index['steps'][index]
+        arrays = {}
+        with open(self.path, 'rb') as stream:
+            stream.seek(step['offset'])
+            for field in self.fields:
+                count = self._count(field['association']) * \
+                    field['components']
+                values = numpy.fromfile(stream, DTYPE, count)
+                arrays[field['name'], field['association']] = \
+                    values.reshape(-1, field['components'])
+            if self.index['moving']:
+                arrays['points'] = numpy.fromfile(
+                    stream, DTYPE, 3 * self.index['npoints']).reshape(-1, 3)
+        return arrays
+
+    def read_mesh(self):
+        """Return the text of the VTK XML file of the mesh."""
+        mesh = self.index['mesh']
+        with open(self.path, 'rb') as stream:
+            stream.seek(mesh['offset'])
+            return stream.read(mesh['length']).decode('ascii')
+
+    def mesh(self):
+        """Return the mesh as a vtkUnstructuredGrid (read once)."""
+        if self._mesh is None:
+            vtk = _vtk()
+            reader = vtk.vtkXMLUnstructuredGridReader()
+            reader.ReadFromInputStringOn()
+            reader.SetInputString(self.read_mesh())
+            reader.Update()
+            self._mesh = reader.GetOutput()
+        return self._mesh
+
+    def _count(self, association):
+        return self.index['npoints' if association == 'POINTS' else 'ncells']
+
+    def step_size(self):
+        """Return the size of a time step block in bytes."""
+        values = sum(self._count(field['association']) * field['components']
+                     for field in self.fields)
+        if self.index['moving']:
+            values += 3 * self.index['npoints']
+        return values * DTYPE.itemsize
+
+
+def read_index(stream):
+    """Return the index of an open cache file, *None* if invalid."""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    if size < TRAILER.size:
+        return None
+    stream.seek(size - TRAILER.size)
+    magic, offset, length = TRAILER.unpack(stream.read(TRAILER.size))
+    if magic != MAGIC or offset + length > size - TRAILER.size:
+        return None
+    stream.seek(offset)
+    try:
+        return json.loads(stream.read(length).decode('utf-8'))
+    except ValueError:
+        return None
+
+
+class CacheWriter():
+    """
+    Append time steps to a cache file.
+
+    The file is synced to the disk every *sync* steps and by `close`.
+
+    Arguments:
+        path (str): Path of the cache.
+        sync (Optional[int]): Number of steps between two syncs.
+    """
+
+    def __init__(self, path, sync=SYNC_STEPS):
+        self.path = path
+        self.sync = sync
+        self.index = None
+        self.end = None
+        self.pending = 0
+        if osp.isfile(path):
+            with open(path, 'rb') as stream:
+                self.index = read_index(stream)
+                if self.index is not None:
+                    stream.seek(-TRAILER.size, os.SEEK_END)
+                    self.end = TRAILER.unpack(stream.read(TRAILER.size))[1]
+
+    def compatible(self, fields, npoints, ncells):
+        """Tell if the existing cache can be extended."""
+        return self.index is not None and \
+            self.index['fields'] == fields and \
+            self.index['npoints'] == npoints and \
+            self.index['ncells'] == ncells
+
+    def create(self, mesh, fields, npoints, ncells, moving, source=None):
+        """
+        Start a new cache (the previous one is overwritten)
+
+        Arguments:
+            mesh (str): VTK XML text of the mesh.
+            fields (list[dict]): Name, association ('POINTS' or
+                'CELLS') and number of components of the fields.
+            npoints (int): Number of points of the mesh.
+            ncells (int): Number of cells of the mesh.
+            moving (bool): Whether the points are stored at each step.
+            source (Optional[dict]): Description of the case.
+        """
+        data = mesh.encode('ascii')
+        self.index = {'version': 1, 'fields': fields, 'npoints': npoints,
+                      'ncells': ncells, 'moving': bool(moving),
+                      'mesh': {'offset': 0, 'length': len(data)},
+                      'steps': [], 'source': source or {}}
+        with open(self.path, 'wb') as stream:
+            stream.write(data)
+            self.end = stream.tell()
+            self._write_index(stream)
+            self._sync(stream)
+
+    def append(self, value, arrays, points=None):
+        """
+        Append a time step
+
+        Arguments:
+            value (float): Time.
+            arrays (dict): Arrays by (name, association), in the order
+                of the fields of the cache.
+            points (Optional[numpy.ndarray]): Points of the moving mesh.
+        """
+        with open(self.path, 'r+b') as stream:
+            # the new step replaces the previous index
+            stream.seek(self.end)
+            stream.truncate()
+            offset = self.end
+            for field in self.index['fields']:
+                key = field['name'], field['association']
+                numpy.ascontiguousarray(arrays[key], DTYPE).tofile(stream)
+            if self.index['moving']:
+                numpy.ascontiguousarray(points, DTYPE).tofile(stream)
+            self.index['steps'].append({'time': float(value),
+                                        'offset': offset})
+            self.end = stream.tell()
+            self._write_index(stream)
+            self.pending += 1
+            if self.pending >= self.sync:
+                self._sync(stream)
+
+    def close(self):
+        """Sync the steps appended since the last sync to the disk."""
+        if self.pending:
+            with open(self.path, 'r+b') as stream:
+                self._sync(stream)
+
+    def _write_index(self, stream):
+        data = json.dumps(self.index).encode('utf-8')
+        stream.write(data)
+        stream.write(TRAILER.pack(MAGIC, self.end, len(data)))
+        stream.flush()
+
+    def _sync(self, stream):
+        os.fsync(stream.fileno())
+        self.pending = 0
+
+
+def _vtk():
+    """Return a namespace with the VTK classes used by the cache."""
+    try:
+        from vtkmodules import vtkIOGeometry, vtkIOXML
+        from vtkmodules import vtkCommonDataModel as model
+        from vtkmodules import vtkCommonExecutionModel as execution
+        from vtkmodules import vtkCommonCore as core
+        from vtkmodules.util import numpy_support
+        modules = [vtkIOGeometry, vtkIOXML, model, execution, core]
+    except ImportError:
+        import vtk
+        from vtk.util import numpy_support
+        modules = [vtk]
+
+    class _Namespace():
+        def __getattr__(self, name):
+            for module in modules:
+                if hasattr(module, name):
+                    return getattr(module, name)
+            raise AttributeError(name)
+    namespace = _Namespace()
+    namespace.numpy_support = numpy_support
+    return namespace
+
+
+def _internal_mesh(output):
+    """Return the first unstructured grid of the reader output."""
+    if output.IsA('vtkUnstructuredGrid'):
+        return output
+    iterator = output.NewIterator()
+    iterator.InitTraversal()
+    while not iterator.IsDoneWithTraversal():
+        block = iterator.GetCurrentDataObject()
+        if block is not None and block.IsA('vtkUnstructuredGrid'):
+            return block
+        iterator.GoToNextItem()
+    return None
+
+
+def foam_reader(case, fields=None):
+    """
+    Return a vtkOpenFOAMReader of the decomposed case
+
+    Only the internal mesh and the *fields* (all if *None*) are read,
+    with the cell to point interpolation of the ParaView reader.
+    """
+    vtk = _vtk()
+    reader = vtk.vtkOpenFOAMReader()
+    reader.SetFileName(osp.join(case, 'Fluid', 'Fluid.foam'))
+    # 0: decomposed case, 1: reconstructed case
+    reader.SetCaseType(0)
+    reader.CreateCellToPointOn()
+    reader.UpdateInformation()
+    for i in range(reader.GetNumberOfPatchArrays()):
+        name = reader.GetPatchArrayName(i)
+        reader.SetPatchArrayStatus(name, int(name == 'internalMesh'))
+    if fields is not None:
+        for i in range(reader.GetNumberOfCellArrays()):
+            name = reader.GetCellArrayName(i)
+            reader.SetCellArrayStatus(name, int(name in fields))
+    return reader
+
+
+def foam_times(reader):
+    """Return the times of the case (without the initial one)."""
+    values = reader.GetTimeValues()
+    times = [values.GetValue(i) for i in range(values.GetNumberOfTuples())] \
+        if values is not None else []
+    return [value for value in times if value > 0.] or times
+
+
+def read_time(reader, value):
+    """Update the reader at *value* and return the internal mesh."""
+    vtk = _vtk()
+    if hasattr(reader, 'UpdateTimeStep'):
+        reader.UpdateTimeStep(value)
+    else:
+        info = reader.GetOutputInformation(0)
+        info.Set(vtk.vtkStreamingDemandDrivenPipeline.UPDATE_TIME_STEP(),
+                 value)
+        reader.Update()
+    return _internal_mesh(reader.GetOutput())
+
+
+def _arrays(mesh, fields):
+    """Return the arrays of *fields* of a mesh as numpy arrays."""
+    vtk = _vtk()
+    arrays = {}
+    for field in fields:
+        data = mesh.GetPointData() if field['association'] == 'POINTS' \
+            else mesh.GetCellData()
+        values = vtk.numpy_support.vtk_to_numpy(
+            data.GetArray(field['name']))
+        arrays[field['name'], field['association']] = \
+            values.reshape(-1, field['components'])
+    return arrays
+
+
+def _source(case):
+    """Describe the decomposed case (to detect a new mesh)."""
+    owner = osp.join(case, 'Fluid', 'processor0', 'constant', 'polyMesh',
+                     'owner')
+    return {'case': osp.abspath(case),
+            'mesh_mtime': osp.getmtime(owner) if osp.exists(owner) else None}
+
+
+def build_cache(case, fields=None, stride=1, progress=None):
+    """
+    Create or extend the cache of a case
+
+    The time steps already cached are kept if the mesh and the fields
+    did not change.
+
+    Arguments:
+        case (str): Case directory.
+        fields (Optional[list[str]]): Fields cached, defaults to
+            `config.FOAM_CACHE_FIELDS` (those available).
+        stride (Optional[int]): Only cache one time step out of
+            *stride*.
+        progress (Optional[callable]): Called with the time and the
+            number of cached steps after each new step.
+
+    Returns:
+        dict: Number of steps added and cached, time spent (s).
+    """
+    vtk = _vtk()
+    start = time.time()
+    reader = foam_reader(case, fields or FOAM_CACHE_FIELDS)
+    times = foam_times(reader)[::max(1, stride)]
+    path = cache_path(case)
+    writer = CacheWriter(path)
+    if not times:
+        return {'added': 0, 'cached': 0, 'elapsed': 0.}
+
+    mesh = read_time(reader, times[0])
+    specs = []
+    for association, data in (('POINTS', mesh.GetPointData()),
+                              ('CELLS', mesh.GetCellData())):
+        for i in range(data.GetNumberOfArrays()):
+            array = data.GetArray(i)
+            if array is None or array.GetName() in ('vtkOriginalCellIds',):
+                continue
+            specs.append({'name': array.GetName(),
+                          'association': association,
+                          'components': array.GetNumberOfComponents()})
+    source = _source(case)
+    if not writer.compatible(specs, mesh.GetNumberOfPoints(),
+                             mesh.GetNumberOfCells()) or \
+            writer.index['source'] != source:
+        structure = vtk.vtkUnstructuredGrid()
+        structure.CopyStructure(mesh)
+        xml = vtk.vtkXMLUnstructuredGridWriter()
+        xml.SetInputData(structure)
+        xml.WriteToOutputStringOn()
+        xml.SetDataModeToBinary()
+        xml.SetCompressorTypeToZLib()
+        xml.Write()
+        # the points move if the mesh motion is solved
+        moving = osp.isfile(osp.join(case, 'Fluid', 'constant',
+                                     'dynamicMeshDict'))
+        writer.create(xml.GetOutputString(), specs, mesh.GetNumberOfPoints(),
+                      mesh.GetNumberOfCells(), moving, source)
+
+    cached = set(step['time'] for step in writer.index['steps'])
+    added = 0
+    try:
+        for value in times:
+            if value in cached:
+                continue
+            mesh = read_time(reader, value)
+            points = None
+            if writer.index['moving']:
+                points = vtk.numpy_support.vtk_to_numpy(
+                    mesh.GetPoints().GetData())
+            writer.append(value, _arrays(mesh, specs), points)
+            added += 1
+            if progress is not None:
+                progress(value, len(writer.index['steps']))
+    finally:
+        writer.close()
+    return {'added': added, 'cached': len(writer.index['steps']),
+            'elapsed': time.time() - start}
+
+
+def cache_ready(case):
+    """
+    Tell if the cache covers the written time steps of the case
+
+    Only the directories of the first processor are listed, the case
+    is not read.
+    """
+    cache = CacheFile(cache_path(case))
+    if not cache.load() or not cache.index['steps']:
+        return False
+    if cache.index['source'] != _source(case):
+        return False
+    proc = osp.join(case, 'Fluid', 'processor0')
+    try:
+        written = [float(name) for name in os.listdir(proc)
+                   if _is_number(name) and float(name) > 0.]
+    except OSError:
+        return True
+    return not written or max(written) <= max(cache.times) + 1e-9
+
+
+def _is_number(name):
+    try:
+        float(name)
+    except ValueError:
+        return False
+    return True
+
+
+_CACHES = {}
+
+
+def _cache(path):
+    cache = _CACHES.get(path)
+    if cache is None:
+        cache = _CACHES[path] = CacheFile(path)
+    if not cache.load():
+        raise CacheError('no valid cache: {}'.format(path))
+    return cache
+
+
+def pv_request_information(algorithm, path):
+    """RequestInformation of the ProgrammableSource reading a cache."""
+    vtk = _vtk()
+    cache = _cache(path)
+    info = algorithm.GetOutputInformation(0)
+    sddp = vtk.vtkStreamingDemandDrivenPipeline
+    info.Remove(sddp.TIME_STEPS())
+    info.Remove(sddp.TIME_RANGE())
+    times = cache.times
+    for value in times:
+        info.Append(sddp.TIME_STEPS(), value)
+    if times:
+        info.Append(sddp.TIME_RANGE(), times[0])
+        info.Append(sddp.TIME_RANGE(), times[-1])
+
+
+def pv_request_data(algorithm, path):
+    """RequestData of the ProgrammableSource reading a cache."""
+    vtk = _vtk()
+    cache = _cache(path)
+    info = algorithm.GetOutputInformation(0)
+    sddp = vtk.vtkStreamingDemandDrivenPipeline
+    value = info.Get(sddp.UPDATE_TIME_STEP()) \
+        if info.Has(sddp.UPDATE_TIME_STEP()) else cache.times[0]
+    index = cache.nearest(value)
+    output = algorithm.GetOutput()
+    output.ShallowCopy(cache.mesh())
+    arrays = cache.read_step(index)
+    if 'points' in arrays:
+        points = vtk.vtkPoints()
+        points.SetData(vtk.numpy_support.numpy_to_vtk(arrays.pop('points'),
+                                                      deep=1))
+        output.SetPoints(points)
+    for (name, association), values in arrays.items():
+        array = vtk.numpy_support.numpy_to_vtk(values, deep=1)
+        array.SetName(name)
+        data = output.GetPointData() if association == 'POINTS' \
+            else output.GetCellData()
+        data.AddArray(array)
+    output.GetInformation().Set(vtk.vtkDataObject.DATA_TIME_STEP(),
+                                cache.times[index])
+
+
+_SCRIPT = """from asterstudy.post.foamcache import pv_request_{}
+pv_request_{}(self, {!r})
+"""
+
+
+def pv_cache_source(case):
+    """Return a ProgrammableSource reading the cache of a case."""
+    import pvsimple as pvs
+    path = cache_path(case)
+    source = pvs.ProgrammableSource()
+    source.OutputDataSetType = 'vtkUnstructuredGrid'
+    source.ScriptRequestInformation = _SCRIPT.format('information',
+                                                     'information', path)
+    source.Script = _SCRIPT.format('data', 'data', path)
+    source.UpdatePipelineInformation()
+    return source
+
+
+def cache_fields(case):
+    """Return the names of the cached fields (as the reader CellArrays)."""
+    cache = CacheFile(cache_path(case))
+    if not cache.load():
+        return []
+    return [field['name'] for field in cache.fields
+            if field['association'] == 'CELLS']
+
+
+def disk_size(path):
+    """Return the size of a file or of a directory tree in bytes."""
+    if osp.isfile(path):
+        return osp.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(osp.getsize(osp.join(root, name)) for name in files
+                     if not osp.islink(osp.join(root, name)))
+    return total
+
+
+def decomposed_size(case):
+    """Return the size of the processor directories of a case."""
+    fluid = osp.join(case, 'Fluid')
+    return sum(disk_size(osp.join(fluid, name)) for name in os.listdir(fluid)
+               if name.startswith('processor'))
+
+
+def benchmark(case, switches=10, fields=None):
+    """
+    Compare the time-step switch latency of the decomposed case and of
+    the cache
+
+    Arguments:
+        case (str): Case directory with an up to date cache.
+        switches (Optional[int]): Number of time changes measured.
+        fields (Optional[list[str]]): Fields read from the case.
+
+    Returns:
+        dict: For 'decomposed' and 'cache': median and maximum latency
+        (s) and disk size (bytes).
+    """
+    cache = CacheFile(cache_path(case))
+    if not cache.load():
+        raise CacheError('no valid cache: {}'.format(cache.path))
+    times = cache.times
+    picks = [times[int(i)] for i in
+             numpy.linspace(len(times) - 1, 0, min(switches, len(times)))]
+
+    def _measure(read):
+        latencies = []
+        for value in picks:
+            start = time.perf_counter()
+            read(value)
+            latencies.append(time.perf_counter() - start)
+        return {'median': float(numpy.median(latencies)),
+                'max': float(max(latencies))}
+
+    reader = foam_reader(case, fields or [field['name']
+                                          for field in cache.fields])
+    result = {'decomposed': _measure(lambda value: read_time(reader, value)),
+              'cache': _measure(lambda value: (cache.mesh(), cache.read_step(
+                  cache.nearest(value))))}
+    result['decomposed']['size'] = decomposed_size(case)
+    result['cache']['size'] = disk_size(cache.path)
+    result['steps'] = len(times)
+    return result
+
+
+def main(argv=None):
+    """Build the cache of a case or compare it with the decomposed case."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Fast-browse cache of the decomposed fluid results.')
+    subparsers = parser.add_subparsers(dest='action')
+    build = subparsers.add_parser('build', help='create or extend the cache')
+    build.add_argument('case', help='case directory')
+    build.add_argument('--fields', nargs='+', default=None)
+    build.add_argument('--stride', type=int, default=1)
+    build.add_argument('--follow', type=float, default=0.,
+                       help='extend the cache every FOLLOW seconds while '
+                            'the solver runs')
+    bench = subparsers.add_parser('bench', help='compare the latencies')
+    bench.add_argument('case', help='case directory')
+    bench.add_argument('--switches', type=int, default=10)
+    info = subparsers.add_parser('info', help='show the cached steps')
+    info.add_argument('case', help='case directory')
+    args = parser.parse_args(argv)
+
+    if args.action == 'build':
+        while True:
+            res = build_cache(args.case, args.fields, args.stride,
+                              lambda value, count: print(
+                                  'cached t=%g (%d steps)' % (value, count),
+                                  flush=True))
+            print('%d steps added, %d cached, %.1f s'
+                  % (res['added'], res['cached'], res['elapsed']), flush=True)
+            if not args.follow or _solver_ended(args.case):
+                break
+            time.sleep(args.follow)
+    elif args.action == 'bench':
+        res = benchmark(args.case, args.switches)
+        for name in ('decomposed', 'cache'):
+            print('%-10s switch median %7.3f s, max %7.3f s, size %8.1f MB'
+                  % (name, res[name]['median'], res[name]['max'],
+                     res[name]['size'] / 2. ** 20))
+        print('%d steps, speedup %.1f, size ratio %.2f'
+              % (res['steps'], res['decomposed']['median'] /
+                 max(res['cache']['median'], 1e-9),
+                 res['cache']['size'] / max(res['decomposed']['size'], 1)))
+    elif args.action == 'info':
+        cache = CacheFile(cache_path(args.case))
+        if not cache.load():
+            print('no valid cache')
+            return 1
+        print('%d points, %d cells, moving mesh: %s'
+              % (cache.index['npoints'], cache.index['ncells'],
+                 cache.index['moving']))
+        print('fields: ' + ', '.join('%s (%s, %d)' % (
+            field['name'], field['association'], field['components'])
+                                     for field in cache.fields))
+        print('times: ' + ' '.join('%g' % value for value in cache.times))
+        print('up to date: %s' % cache_ready(args.case))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+def _solver_ended(case):
+    """Tell if the fluid solver has written the end time of the case."""
+    if osp.isfile(osp.join(case, 'log.job.fluid.json')):
+        # accounting of the local executor, written at the end of the job
+        return True
+    try:
+        with open(osp.join(case, 'savedata.json')) as stream:
+            end = float(json.load(stream)['couple']['Runtimesh'])
+        names = os.listdir(osp.join(case, 'Fluid', 'processor0'))
+    except (OSError, ValueError, KeyError):
+        return True
+    return any(_is_number(name) and float(name) >= end - 1e-9
+               for name in names)
+
+if __name__ == '__main__':
+    sys.exit(main())
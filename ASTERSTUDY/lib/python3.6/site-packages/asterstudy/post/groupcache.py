@@ -0,0 +1,469 @@
+"""
+Cached subsets of the mesh groups.
+
+`ResultFile.filter_groups` used to show the groups of a result through a
+``ResampleWithDataset`` filter probing the full result on the output of
+an ``ExtractGroup`` filter: every change of field or of time step
+located the points of the groups in the full mesh again, and
+`ResultFile.parse_mesh_groups` read the groups of the mesh again for
+each result opened.
+
+`GroupSubsets` memoizes, per (file, modification time, groups), the
+index of the points and of the cells of the subset in the full mesh:
+the points are matched on their coordinates (the subset is a copy of the
+mesh of the result, they are identical) and the cells on their type and
+points. The index is computed the first time the groups are shown; then
+a change of field or of time step only gathers the arrays of the full
+result (`take`). The least recently shown subsets are forgotten beyond
+`config.GROUP_CACHE_SUBSETS`. The groups of a mesh are memoized per
+(file, modification time) too.
+
+In the pipeline, the subset is served by a ``ProgrammableFilter``
+(`group_subset_source`) in place of the resampling. Its input is the
+full result only: the ``ExtractGroup`` filter is connected as a second
+input when the groups are not cached, the filter then keeps the
+geometry of the subset with its index, and `ResultFile.filter_groups`
+disconnects and deletes the extraction. The subset shown by a result is
+held (`GroupSubsets.hold`), it is not forgotten while shown. The points
+or cells not found are marked by a ``vtkValidPointMask``
+(``vtkValidCellMask``) array, as the resampling did.
+
+The latencies can be compared on a synthetic mesh::
+
+    python3 -m asterstudy.post.groupcache --nodes 1000000
+"""
+
+import os.path as osp
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import GROUP_CACHE_SUBSETS
+from .utils import dbg_print
+from . import vtkdata
+
+
+def subset_key(path, groups):
+    """Returns the key of the subset of some groups of a result file."""
+    mtime = osp.getmtime(path) if osp.exists(path) else 0.
+    return (path, mtime, tuple(sorted(groups)))
+
+
+def match_rows(reference, rows):
+    """
+    Returns the index in *reference* of each row of *rows* (exact
+    comparison), -1 for the rows not found.
+    """
+    both = np.concatenate([reference, rows])
+    order = np.lexsort(both.T[::-1])
+    ranked = both[order]
+    start = np.ones(len(both), dtype=bool)
+    start[1:] = (ranked[1:] != ranked[:-1]).any(axis=1)
+    # the sort is stable: the reference row of a run of equal rows
+    # comes first
+    first = order[np.flatnonzero(start)][np.cumsum(start) - 1]
+    found = np.empty(len(both), dtype=np.int64)
+    found[order] = np.where(first < len(reference), first, -1)
+    return found[len(reference):]
+
+
+def cell_rows(types, offsets, connectivity, width, point_ids=None):
+    """
+    Returns the cells as rows of integers: the cell type then the sorted
+    point ids, padded with -1
+
+    Arguments:
+        types (numpy.ndarray): Cell types.
+        offsets (numpy.ndarray): Offsets of the cells in the
+            connectivity (number of cells + 1).
+        connectivity (numpy.ndarray): Point ids of the cells.
+        width (int): Maximum number of points per cell.
+        point_ids (Optional[numpy.ndarray]): Renumbering of the points.
+    """
+    sizes = np.diff(offsets)
+    ids = connectivity if point_ids is None else point_ids[connectivity]
+    rows = np.full((len(sizes), width + 1), -1, dtype=np.int64)
+    rows[:, 0] = types
+    cell = np.repeat(np.arange(len(sizes)), sizes)
+    column = np.arange(len(ids)) - np.repeat(offsets[:-1], sizes)
+    rows[cell, column + 1] = ids
+    rows[:, 1:].sort(axis=1)
+    return rows
+
+
+def subset_index(full_points, sub_points, full_cells=None, sub_cells=None):
+    """
+    Returns the index of a subset in the full mesh
+
+    Arguments:
+        full_points (numpy.ndarray): Coordinates of the full mesh.
+        sub_points (numpy.ndarray): Coordinates of the subset.
+        full_cells (Optional[tuple]): Types, offsets and connectivity of
+            the cells of the full mesh.
+        sub_cells (Optional[tuple]): Same for the subset.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): Point ids and cell ids in the
+        full mesh, -1 if not found (cell ids are None without cells).
+    """
+    point_ids = match_rows(full_points, sub_points)
+    if full_cells is None or sub_cells is None:
+        return point_ids, None
+    width = int(np.diff(full_cells[1]).max()) if len(full_cells[0]) else 0
+    full = cell_rows(full_cells[0], full_cells[1], full_cells[2], width)
+    # only the cells with all their points in the subset are candidates
+    inside = np.zeros(len(full_points) + 1, dtype=bool)
+    inside[point_ids] = True
+    inside[-1] = True
+    candidates = np.flatnonzero(inside[full[:, 1:]].all(axis=1))
+    sub = cell_rows(sub_cells[0], sub_cells[1], sub_cells[2], width,
+                    point_ids)
+    found = match_rows(full[candidates], sub)
+    cell_ids = np.where(found < 0, -1, candidates[found])
+    return point_ids, cell_ids
+
+
+def take(values, ids):
+    """Returns the values of the subset (the first value if not found)."""
+    return values[np.maximum(ids, 0)]
+
+
+class GroupSubsets():
+    """
+    Memoized index of the subsets of mesh groups.
+
+    Arguments:
+        subsets (Optional[int]): Number of subsets kept in memory.
+    """
+
+    def __init__(self, subsets=GROUP_CACHE_SUBSETS):
+        self.subsets = subsets
+        self._entries = OrderedDict()
+        self._groups = {}
+        self._held = {}
+        self.hits = 0
+        self.misses = 0
+
+    def index(self, key, sizes, loader):
+        """
+        Returns the index of a subset in the full mesh
+
+        Arguments:
+            key (tuple): Identifier of the subset (see `subset_key`).
+            sizes (tuple): Sizes of the full mesh, the index is computed
+                again if they changed.
+            loader (callable): Returns the index of each block of the
+                subset (see `subset_index`) and the geometry of the
+                subset, only called the first time the subset is shown.
+
+        Returns:
+            dict: Full block index, point ids and cell ids per subset
+            block index.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry['sizes'] == sizes:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry['blocks']
+        self.misses += 1
+        blocks, geometry = loader()
+        entry = self._entries[key] = {'sizes': sizes, 'blocks': blocks,
+                                      'geometry': geometry}
+        self._entries.move_to_end(key)
+        held = set(self._held.values())
+        held.add(key)
+        for item in list(self._entries):
+            if len(self._entries) <= self.subsets:
+                break
+            if item not in held:
+                del self._entries[item]
+        return entry['blocks']
+
+    def cached(self, key):
+        """Tells if a subset is indexed."""
+        return key in self._entries
+
+    def geometry(self, key):
+        """Returns the geometry of a subset, *None* if not indexed."""
+        entry = self._entries.get(key)
+        return entry['geometry'] if entry is not None else None
+
+    def hold(self, owner, key):
+        """
+        Keeps the subset shown by *owner* (a result file) in memory, the
+        subset held before by *owner* may be forgotten
+        (*key* is *None* when no group is shown).
+        """
+        if key is None:
+            self._held.pop(owner, None)
+        else:
+            self._held[owner] = key
+
+    def groups(self, path, loader):
+        """
+        Returns the groups of a mesh file, read by *loader* if the file
+        is not known or changed.
+        """
+        key = (path, osp.getmtime(path) if osp.exists(path) else 0.)
+        if key not in self._groups:
+            self._groups[key] = loader()
+        return self._groups[key]
+
+    def nbytes(self, key=None):
+        """Returns the memory of a subset (of all the subsets by default)."""
+        keys = list(self._entries) if key is None else [key]
+        total = 0
+        for item in keys:
+            entry = self._entries.get(item)
+            if entry is None:
+                continue
+            for _, point_ids, cell_ids in entry['blocks'].values():
+                total += point_ids.nbytes
+                if cell_ids is not None:
+                    total += cell_ids.nbytes
+        return total
+
+    def clear(self):
+        """Forgets all the subsets and groups."""
+        self._entries.clear()
+        self._groups.clear()
+        self._held.clear()
+
+
+SUBSETS = GroupSubsets()
+
+
+def _cells(block):
+    """Returns the cell types, offsets and connectivity of a block."""
+    if not block.IsA('vtkUnstructuredGrid'):
+        return None
+    support = vtkdata.numpy_support()
+    types = support.vtk_to_numpy(block.GetCellTypesArray())
+    cells = block.GetCells()
+    if hasattr(cells, 'GetOffsetsArray'):
+        offsets = support.vtk_to_numpy(cells.GetOffsetsArray())
+        connectivity = support.vtk_to_numpy(cells.GetConnectivityArray())
+    else:
+        # legacy layout: (size, ids...) per cell
+        legacy = support.vtk_to_numpy(cells.GetData())
+        locations = support.vtk_to_numpy(block.GetCellLocationsArray())
+        offsets = np.concatenate([[0], np.cumsum(legacy[locations])])
+        keep = np.ones(len(legacy), dtype=bool)
+        keep[locations] = False
+        connectivity = legacy[keep]
+    return types, offsets, connectivity
+
+
+def _gather(support, source, target, ids, mask):
+    """Adds the arrays of *source* taken at *ids* to *target*."""
+    for i in range(source.GetNumberOfArrays()):
+        array = source.GetArray(i)
+        if array is None:
+            continue
+        values = take(support.vtk_to_numpy(array), ids)
+        result = support.numpy_to_vtk(values, deep=0,
+                                      array_type=array.GetDataType())
+        result.SetName(array.GetName())
+        target.AddArray(result)
+    valid = support.numpy_to_vtk((ids >= 0).astype(np.int8), deep=0)
+    valid.SetName(mask)
+    target.AddArray(valid)
+
+
+def pv_request_data(algorithm, key):
+    """
+    RequestData of the ProgrammableFilter serving a group subset, the
+    ExtractGroup output is the second input when the subset is not
+    indexed
+    """
+    support = vtkdata.numpy_support()
+    source = algorithm.GetInputDataObject(0, 0)
+    output = algorithm.GetOutputDataObject(0)
+    full = [(index, block) for index, block in vtkdata.blocks(source)
+            if block is not None and block.GetNumberOfPoints()]
+    subset = None
+    if algorithm.GetNumberOfInputConnections(0) > 1:
+        subset = algorithm.GetInputDataObject(0, 1)
+
+    def _loader():
+        if subset is None:
+            raise ValueError('group subset {} is not indexed'.format(key[2]))
+        parts = [(index, block) for index, block in vtkdata.blocks(subset)
+                 if block is not None and block.GetNumberOfPoints()]
+        start = time.perf_counter()
+        blocks = {}
+        for index, part in parts:
+            sub_points = support.vtk_to_numpy(part.GetPoints().GetData())
+            best = None
+            for findex, block in full:
+                points = support.vtk_to_numpy(block.GetPoints().GetData())
+                point_ids = match_rows(points, sub_points)
+                found = np.count_nonzero(point_ids >= 0)
+                if best is None or found > best[0]:
+                    best = (found, findex, block)
+            if best is None:
+                continue
+            point_ids, cell_ids = subset_index(
+                support.vtk_to_numpy(best[2].GetPoints().GetData()),
+                sub_points, _cells(best[2]), _cells(part))
+            blocks[index] = (best[1], point_ids, cell_ids)
+        dbg_print('Group subset {}: indexed in {:.2f} s'.format(
+            key[2], time.perf_counter() - start))
+        # the geometry outlives the extraction (its arrays are dropped
+        # from the output)
+        geometry = subset.NewInstance()
+        geometry.ShallowCopy(subset)
+        return blocks, geometry
+
+    sizes = tuple((block.GetNumberOfPoints(), block.GetNumberOfCells())
+                  for _, block in full)
+    try:
+        blocks = SUBSETS.index(key, sizes, _loader)
+    except ValueError as exc:
+        dbg_print(str(exc))
+        return
+    geometry = SUBSETS.geometry(key)
+    full = dict(full)
+    output.ShallowCopy(geometry)
+    output.GetFieldData().ShallowCopy(source.GetFieldData())
+    if geometry.IsA('vtkCompositeDataSet'):
+        # the blocks are shared with the input after the shallow copy
+        targets = []
+        iterator = output.NewIterator()
+        iterator.InitTraversal()
+        while not iterator.IsDoneWithTraversal():
+            index = iterator.GetCurrentFlatIndex()
+            if index in blocks:
+                block = iterator.GetCurrentDataObject().NewInstance()
+                block.ShallowCopy(iterator.GetCurrentDataObject())
+                output.SetDataSet(iterator, block)
+                targets.append((index, block))
+            iterator.GoToNextItem()
+    else:
+        targets = [(index, output) for index in blocks]
+    for index, block in targets:
+        findex, point_ids, cell_ids = blocks[index]
+        reference = full[findex]
+        block.GetPointData().Initialize()
+        block.GetCellData().Initialize()
+        _gather(support, reference.GetPointData(), block.GetPointData(),
+                point_ids, 'vtkValidPointMask')
+        if cell_ids is not None:
+            _gather(support, reference.GetCellData(), block.GetCellData(),
+                    cell_ids, 'vtkValidCellMask')
+
+
+_SCRIPT = """from asterstudy.post.groupcache import pv_request_data
+pv_request_data(self, key)
+"""
+
+
+def group_subset_source(source):
+    """
+    Returns the filter serving the group subset of a source, used in
+    place of a ResampleWithDataset filter
+
+    Arguments:
+        source (Proxy): Full result.
+    """
+    import pvsimple as pvs
+    subset = pvs.ProgrammableFilter(Input=source)
+    subset.Script = _SCRIPT
+    subset.CopyArrays = False
+    subset.Parameters = ['key', repr(None)]
+    return subset
+
+
+def set_subset(subset, key):
+    """Sets the key of the subset shown by the filter."""
+    if list(subset.Parameters) != ['key', repr(key)]:
+        subset.Parameters = ['key', repr(key)]
+
+
+def synthetic_subset(nodes, fraction=0.2):
+    """
+    Returns a box mesh and the subset of its cells below a plane, numbered
+    as an ExtractGroup output (points in the order of the cells).
+    """
+    from ..common.synthetic import box_mesh
+    xyz, hexa = box_mesh(nodes)
+    centers = xyz[hexa].mean(axis=1)
+    cells = np.flatnonzero(centers[:, 0] < fraction)
+    used, renumber = np.unique(hexa[cells], return_inverse=True)
+    sub_xyz = xyz[used]
+    sub_hexa = renumber.reshape(-1, 8)
+
+    def _cells(conn):
+        return (np.full(len(conn), 12), np.arange(len(conn) + 1) * 8,
+                conn.ravel())
+    return xyz, _cells(hexa), sub_xyz, _cells(sub_hexa), cells
+
+
+def benchmark(nodes, fields=10):
+    """
+    Compares the resampling of a group subset with the cached index, for
+    a change of groups and for changes of field on the filtered view
+
+    Returns:
+        dict: Latencies in seconds ('resample' per group or field change,
+        'index' to index new groups, 'hit' to show known groups, 'take'
+        per field change) and memory of the index ('nbytes').
+    """
+    from scipy.spatial import cKDTree
+    xyz, full_cells, sub_xyz, sub_cells, expected = synthetic_subset(nodes)
+    rng = np.random.RandomState(0)
+    values = [rng.standard_normal((len(xyz), 6)) for _ in range(fields)]
+
+    # ResampleWithDataset: the points are located again at each change
+    # (a nearest point lookup, a lower bound of the probe)
+    start = time.perf_counter()
+    for field in values:
+        _, point_ids = cKDTree(xyz).query(sub_xyz)
+        probed = field[point_ids]
+    resample = (time.perf_counter() - start) / fields
+    del probed
+
+    cache = GroupSubsets(subsets=1)
+    key = ('synthetic', 0., ('SLAB',))
+    sizes = ((len(xyz), len(full_cells[0])),)
+    start = time.perf_counter()
+    blocks = cache.index(key, sizes, lambda: ({0: (0,) + subset_index(
+        xyz, sub_xyz, full_cells, sub_cells)}, None))
+    index = time.perf_counter() - start
+    assert (blocks[0][2] == expected).all()
+    start = time.perf_counter()
+    for _ in range(fields):
+        blocks = cache.index(key, sizes, None)
+    hit = (time.perf_counter() - start) / fields
+    start = time.perf_counter()
+    for field in values:
+        taken = take(field, blocks[0][1])
+    cached = (time.perf_counter() - start) / fields
+    assert np.array_equal(taken, values[-1][blocks[0][1]])
+    return {'nodes': len(xyz), 'subset': len(sub_xyz),
+            'resample': resample, 'index': index, 'hit': hit,
+            'take': cached, 'nbytes': cache.nbytes(key)}
+
+
+def main():
+    """Measure the group filter on a synthetic mesh."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Latencies of the resampled and cached group subsets.')
+    parser.add_argument('--nodes', type=int, default=1000000)
+    parser.add_argument('--fields', type=int, default=10)
+    args = parser.parse_args()
+
+    res = benchmark(args.nodes, args.fields)
+    print('%d nodes, subset of %d nodes' % (res['nodes'], res['subset']))
+    print('resample  %8.1f ms per group or field change' % (
+        res['resample'] * 1e3))
+    print('cached    %8.1f ms to index new groups, %.3f ms for known '
+          'groups, %.1f MB' % (res['index'] * 1e3, res['hit'] * 1e3,
+                               res['nbytes'] / 2. ** 20))
+    print('          %8.1f ms per field change' % (res['take'] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+"""
+Memory budget of the ParaView session.
+
+The tank PVD series, the decomposed OpenFOAM cases and the MED results
+can be loaded together in the Results tab: `MemoryBudget` samples the
+memory of the client and of the data server periodically, attributes
+it to the registered pipeline sources and, when the configured budget
+(`config.MEMORY_BUDGET`) is exceeded, warns or releases the cached and
+derived sources (extracts, resamples, warps...) that are not displayed.
+
+Sources are registered with `MEMORY.register()`: readers are only
+accounted, derived and cached sources can be released, the largest
+first, until the memory goes back below the budget.
+
+The behaviour can be checked with a stress test that loads sources
+until the budget triggers (synthetic arrays when pvsimple is not
+available)::
+
+    python3 -m asterstudy.post.memory --budget 400 --step 50
+"""
+
+import os
+import time
+
+from PyQt5 import Qt as Q
+
+from .config import MEMORY_BUDGET, MEMORY_PERIOD, MEMORY_POLICY
+from .utils import dbg_print, get_pv_mem_use, get_total_memory
+
+
+# Kinds of sources that may be released when the budget is exceeded
+RELEASABLE = ('derived', 'cache')
+
+# Releasing stops below this fraction of the budget
+HYSTERESIS = 0.9
+
+
+def get_client_memory():
+    """
+    Returns the resident memory of the current process in kilobytes
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            resident = int(statm.read().split()[1])
+        return resident * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def get_pv_server_memory():
+    """
+    Returns the largest memory used by the paraview data and render
+    server processes in kilobytes
+    """
+    import paraview.benchmark as bm
+    # ['CL[0] 619044 / 8387368', 'DS_RS[0] 619044 / 8387368', ...]
+    used = [int(line.split()[1]) for line in bm.logbase.get_memuse()
+            if not line.startswith('CL')]
+    return max(used) if used else get_pv_mem_use()[0]
+
+
+def pv_sampler():
+    """
+    Returns the client and data server memory in kilobytes, the
+    server memory is *None* if it cannot be read from paraview
+    """
+    client = get_client_memory()
+    try:
+        server = get_pv_server_memory()
+    except Exception: # pragma pylint: disable=broad-except
+        server = None
+    return client, server
+
+
+def pv_source_size(source):
+    """
+    Returns the size of the data produced by a source in kilobytes
+    """
+    try:
+        return source.GetDataInformation().DataInformation.GetMemorySize()
+    except Exception: # pragma pylint: disable=broad-except
+        return 0
+
+
+def pv_in_use(source):
+    """
+    Returns whether a source, or a source computed from it, is
+    visible in a view
+    """
+    try:
+        return _sm_in_use(source.SMProxy, set())
+    except AttributeError:
+        return False
+
+
+def _sm_in_use(smproxy, seen):
+    if smproxy in seen:
+        return False
+    seen.add(smproxy)
+    for i in range(smproxy.GetNumberOfConsumers()):
+        consumer = smproxy.GetConsumerProxy(i)
+        if consumer.IsA('vtkSMRepresentationProxy'):
+            visibility = consumer.GetProperty('Visibility')
+            if visibility is not None and visibility.GetElement(0):
+                return True
+        elif consumer.IsA('vtkSMSourceProxy'):
+            if _sm_in_use(consumer, seen):
+                return True
+    return False
+
+
+def pv_release(source):
+    """
+    Deletes a source from the paraview pipeline
+    """
+    import pvsimple as pvs
+    pvs.Delete(source)
+
+
+class SourceEntry():
+    """Pipeline source accounted by `MemoryBudget`."""
+
+    def __init__(self, source, kind, label, release):
+        self.source = source
+        self.kind = kind
+        self.label = label
+        self.release = release
+        self.size = 0
+        self.created = time.time()
+
+
+class MemoryBudget(Q.QObject):
+    """
+    Periodic memory sampling with a budget.
+
+    Arguments:
+        budget (Optional[int]): Budget in kilobytes, defaults to
+            `config.MEMORY_BUDGET` times the total memory.
+        policy (Optional[str]): 'warn' or 'release'.
+        period (Optional[int]): Sampling period in milliseconds.
+        sampler (Optional[callable]): Returns the client and server
+            memory in kilobytes (see `pv_sampler`).
+        sizer (Optional[callable]): Returns the size of a source in
+            kilobytes (see `pv_source_size`).
+        in_use (Optional[callable]): Tells if a source is displayed
+            (see `pv_in_use`).
+    """
+
+    sampled = Q.pyqtSignal(dict)
+    """Signal: emitted after each sample with the memory report."""
+
+    budgetExceeded = Q.pyqtSignal(int, int)
+    """
+    Signal: emitted when the memory used goes over the budget.
+
+    Arguments:
+        used (int): Memory used in kilobytes.
+        budget (int): Budget in kilobytes.
+    """
+
+    def __init__(self, budget=None, policy=MEMORY_POLICY,
+                 period=MEMORY_PERIOD, sampler=pv_sampler,
+                 sizer=pv_source_size, in_use=pv_in_use, parent=None):
+        super().__init__(parent)
+        self.budget = budget or int(MEMORY_BUDGET * get_total_memory())
+        self.policy = policy
+        self.sampler = sampler
+        self.sizer = sizer
+        self.in_use = in_use
+        self.entries = []
+        self.released = []
+        self.last = {}
+        self._exceeded = False
+        self._timer = Q.QTimer(self)
+        self._timer.setInterval(period)
+        self._timer.timeout.connect(self.check)
+
+    def start(self):
+        """Start the periodic sampling."""
+        self._timer.start()
+
+    def stop(self):
+        """Stop the periodic sampling."""
+        self._timer.stop()
+
+    def register(self, source, kind='derived', label=None, release=None):
+        """
+        Registers a source so that its memory is accounted
+
+        Arguments:
+            source (Proxy): Pipeline source.
+            kind (Optional[str]): 'reader' (never released), 'derived'
+                (filter output) or 'cache' (duplicated reader...).
+            label (Optional[str]): Name used in the reports.
+            release (Optional[callable]): Called with the source to
+                release it, defaults to deleting it from the pipeline;
+                returns *False* if the source is still needed.
+        """
+        if source is None or self._find(source) is not None:
+            return
+        label = label or type(source).__name__
+        self.entries.append(SourceEntry(source, kind, label,
+                                        release or pv_release))
+
+    def forget(self, source):
+        """Unregisters a source (when it is deleted elsewhere)."""
+        entry = self._find(source)
+        if entry is not None:
+            self.entries.remove(entry)
+
+    def clear(self):
+        """Unregisters all the sources."""
+        self.entries = []
+
+    def _find(self, source):
+        for entry in self.entries:
+            if entry.source is source:
+                return entry
+        return None
+
+    def sample(self):
+        """
+        Samples the memory and attributes it to the sources
+
+        Returns:
+            dict: Client, server and used memory, budget, attributed
+            and unattributed memory (kilobytes) and the sources as
+            (label, kind, size) sorted by decreasing size.
+        """
+        client, server = self.sampler()
+        used = max(client, server or 0)
+        for entry in self.entries:
+            entry.size = self.sizer(entry.source) or 0
+        attributed = sum(entry.size for entry in self.entries)
+        report = {'client': client, 'server': server, 'used': used,
+                  'budget': self.budget, 'attributed': attributed,
+                  'unattributed': max(0, used - attributed),
+                  'sources': [(entry.label, entry.kind, entry.size)
+                              for entry in sorted(self.entries,
+                                                  key=lambda e: -e.size)]}
+        self.last = report
+        return report
+
+    def check(self):
+        """
+        Samples the memory and applies the policy if over budget
+
+        Returns:
+            dict: Memory report (see `sample`).
+        """
+        report = self.sample()
+        if report['used'] <= self.budget:
+            self._exceeded = False
+        else:
+            if not self._exceeded:
+                dbg_print("Memory budget exceeded: {} MB used / {} MB"
+                          .format(report['used'] // 1024,
+                                  self.budget // 1024))
+                self.budgetExceeded.emit(report['used'], self.budget)
+            self._exceeded = True
+            if self.policy == 'release':
+                if self.release(report['used'] - int(HYSTERESIS *
+                                                     self.budget)):
+                    report = self.sample()
+                    self._exceeded = report['used'] > self.budget
+        self.sampled.emit(report)
+        return report
+
+    def candidates(self):
+        """Returns the entries that can be released, largest first."""
+        return sorted([entry for entry in self.entries
+                       if entry.kind in RELEASABLE
+                       and not self.in_use(entry.source)],
+                      key=lambda entry: (-entry.size, entry.created))
+
+    def release(self, amount):
+        """
+        Releases sources until *amount* kilobytes are freed
+
+        Returns:
+            list[str]: Labels of the released sources.
+        """
+        released = []
+        for entry in self.candidates():
+            if amount <= 0:
+                break
+            try:
+                if entry.release(entry.source) is False:
+                    continue
+            except Exception as exc: # pragma pylint: disable=broad-except
+                dbg_print("Cannot release {}: {}".format(entry.label, exc))
+                continue
+            # the release callback may have forgotten the entry already
+            if entry in self.entries:
+                self.entries.remove(entry)
+            amount -= entry.size
+            released.append(entry.label)
+            dbg_print("Released {} ({} MB)".format(entry.label,
+                                                   entry.size // 1024))
+        self.released.extend(released)
+        return released
+
+
+MEMORY = MemoryBudget()
+
+
+def stress_test(budget_mb=400, step_mb=50, max_sources=40, policy='release'):
+    """
+    Loads sources until the budget triggers
+
+    With pvsimple, each step creates a Wavelet source of about
+    *step_mb* and a derived Calculator on it; otherwise synthetic
+    arrays are allocated and accounted in the same way.
+
+    Returns:
+        list[dict]: Memory report after each step, with the released
+        sources.
+    """
+    try:
+        import pvsimple as pvs
+    except ImportError:
+        pvs = None
+
+    baseline = get_client_memory()
+    if pvs is None:
+        import numpy
+        monitor = MemoryBudget(
+            budget=baseline + budget_mb * 1024, policy=policy,
+            sizer=lambda src: src.nbytes // 1024 if src is not None else 0,
+            in_use=lambda src: False)
+        make = lambda i: (numpy.ones(step_mb * 2 ** 17), None)
+        release = lambda src: src.resize(0, refcheck=False)
+    else:
+        monitor = MemoryBudget(budget=baseline + budget_mb * 1024,
+                               policy=policy)
+        # about 8 bytes per point for the RTData array and its copy
+        size = int((step_mb * 2 ** 20 / 16) ** (1. / 3) / 2)
+
+        def make(i):
+            reader = pvs.Wavelet(WholeExtent=[-size, size] * 3)
+            reader.UpdatePipeline()
+            derived = pvs.Calculator(Input=reader, Function='RTData*%d' % i)
+            derived.UpdatePipeline()
+            return reader, derived
+        release = None
+
+    reports = []
+    for i in range(max_sources):
+        reader, derived = make(i)
+        if pvs is None:
+            monitor.register(reader, 'derived', 'array %d' % i, release)
+        else:
+            monitor.register(reader, 'reader', 'Wavelet %d' % i)
+            monitor.register(derived, 'derived', 'Calculator %d' % i)
+        before = len(monitor.released)
+        report = monitor.check()
+        report['step'] = i
+        report['released'] = monitor.released[before:]
+        reports.append(report)
+        if report['used'] > monitor.budget:
+            # nothing more can be released
+            break
+    return reports
+
+
+def main():
+    """Run the stress test and print the memory after each step."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Load sources until the memory budget triggers.')
+    parser.add_argument('--budget', type=int, default=400,
+                        help='budget above the initial memory, in MB')
+    parser.add_argument('--step', type=int, default=50,
+                        help='memory added at each step, in MB')
+    parser.add_argument('--policy', default='release',
+                        choices=('warn', 'release'))
+    args = parser.parse_args()
+
+    for report in stress_test(args.budget, args.step, policy=args.policy):
+        print('step %2d: used %6d MB, budget %6d MB, sources %3d%s'
+              % (report['step'], report['used'] // 1024,
+                 report['budget'] // 1024, len(report['sources']),
+                 ', released: ' + ', '.join(report['released'])
+                 if report['released'] else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+"""
+Precomputed frames of the mode-shape animation.
+
+`ModesRep` used to animate a mode by keyframing the ``ScaleFactor`` of a
+``WarpByVector`` filter: each frame of the animation executed the warp
+again on the full mesh, and `ModesRep.update_modes` scanned the array
+names of the modal result at each update.
+
+`ModeIndex` parses the array names once and maps each mode to its
+arrays. `ModeFrames` memoizes the warped point coordinates of a mode
+for `config.MODE_CACHE_PHASES` phase samples of a period: a frame only
+depends on the amplitude ``sin(phase)``, the samples with the same
+amplitude share their coordinates (float32) and are computed the first
+time they are shown. The least recently shown modes are forgotten
+beyond `config.MODE_CACHE_MODES` modes.
+
+In the pipeline, the frames are served by a ``ProgrammableFilter``
+(`mode_frames_source`) replacing the warp, and the animation scene
+drives the phase through a ``PythonAnimationCue`` (`mode_cue`), so that
+playing, pausing and saving movies are unchanged. The frame rate of the
+last playback is printed in debug mode with the memory of the mode.
+
+The cost of a frame (warped coordinates or cached lookup) and, when
+pvsimple is available, the frame rates of the playback (cue update and
+render) can be compared on a synthetic model::
+
+    python3 -m asterstudy.post.modecache --nodes 1000000
+"""
+
+import math
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import MODE_CACHE_MODES, MODE_CACHE_PHASES
+from .utils import dbg_print
+from . import vtkdata
+
+
+class ModeIndex():
+    """
+    Arrays of the modes of a modal result.
+
+    Arguments:
+        names (list[str]): Point array names of the result.
+        aident (str): Identifier of the field in the array names.
+    """
+
+    def __init__(self, names, aident):
+        look = re.compile(r"{} \[0*(\d+)\]\s".format(re.escape(aident)))
+        self.arrays = {}
+        for name in names:
+            match = look.match(name)
+            if match:
+                self.arrays.setdefault(int(match.group(1)), []).append(name)
+
+    def __len__(self):
+        return len(self.arrays)
+
+    def lookup(self, mode, vector=False):
+        """
+        Returns the array of a mode, '' if the mode is not found
+
+        Arguments:
+            mode (int): Index of the mode (from 0).
+            vector (Optional[bool]): Look for the translational vector
+                array of a field with more than 3 components.
+        """
+        names = self.arrays.get(mode, [])
+        if vector:
+            for name in names:
+                if 'Vector' in name:
+                    return name
+        return names[0] if names else ''
+
+
+def amplitude(sample, phases=MODE_CACHE_PHASES):
+    """Returns the amplitude of a phase sample of a period."""
+    return round(math.sin(2. * math.pi * (sample % phases) / phases), 12)
+
+
+class ModeFrames():
+    """
+    Memoized warped coordinates of the modes.
+
+    Arguments:
+        modes (Optional[int]): Number of modes kept in memory.
+    """
+
+    def __init__(self, modes=MODE_CACHE_MODES):
+        self.modes = modes
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def frame(self, key, amp, loader):
+        """
+        Returns the coordinates of a mode warped with an amplitude
+
+        Arguments:
+            key (tuple): Identifier of the mode (array, scale, data...).
+            amp (float): Amplitude, scale factor included.
+            loader (callable): Returns the lists of the reference
+                coordinates and of the mode vectors (one per block),
+                only called the first time the mode is shown.
+
+        Returns:
+            list[numpy.ndarray]: Coordinates of each block.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            points, vectors = loader()
+            entry = self._entries[key] = {
+                'points': [np.asarray(pts, dtype=np.float32) for pts in points],
+                'vectors': [np.asarray(vec, dtype=np.float32)[:, :3]
+                            for vec in vectors],
+                'frames': {}}
+            while len(self._entries) > self.modes:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+        amp = round(amp, 12)
+        frames = entry['frames'].get(amp)
+        if frames is not None:
+            self.hits += 1
+            return frames
+        self.misses += 1
+        if amp == 0.:
+            frames = entry['points']
+        else:
+            frames = [pts + np.float32(amp) * vec for pts, vec in
+                      zip(entry['points'], entry['vectors'])]
+        entry['frames'][amp] = frames
+        return frames
+
+    def nbytes(self, key=None):
+        """Returns the memory of a mode (of all the modes by default)."""
+        keys = list(self._entries) if key is None else [key]
+        total = 0
+        for item in keys:
+            entry = self._entries.get(item)
+            if entry is None:
+                continue
+            arrays = entry['points'] + entry['vectors']
+            for amp, frames in entry['frames'].items():
+                if amp != 0.:
+                    arrays += frames
+            total += sum(array.nbytes for array in arrays)
+        return total
+
+    def clear(self):
+        """Forgets all the modes."""
+        self._entries.clear()
+
+
+FRAMES = ModeFrames()
+
+
+def pv_request_data(algorithm, label, array, scale, amp):
+    """RequestData of the ProgrammableFilter serving the mode frames."""
+    support = vtkdata.numpy_support()
+    source = algorithm.GetInputDataObject(0, 0)
+    output = algorithm.GetOutputDataObject(0)
+    blocks = [(index, block) for index, block in vtkdata.blocks(source)
+              if block is not None and block.GetNumberOfPoints()
+              and block.GetPointData().GetArray(array) is not None]
+
+    def _loader():
+        return ([support.vtk_to_numpy(block.GetPoints().GetData())
+                 for _, block in blocks],
+                [support.vtk_to_numpy(block.GetPointData().GetArray(array))
+                 for _, block in blocks])
+
+    key = (label, array, scale, source.GetMTime())
+    frames = FRAMES.frame(key, scale * amp, _loader)
+    output.ShallowCopy(source)
+    indices = [index for index, _ in blocks]
+    targets = []
+    if source.IsA('vtkCompositeDataSet'):
+        # the blocks are shared with the input after the shallow copy
+        iterator = output.NewIterator()
+        iterator.InitTraversal()
+        while not iterator.IsDoneWithTraversal():
+            if iterator.GetCurrentFlatIndex() in indices:
+                block = iterator.GetCurrentDataObject().NewInstance()
+                block.ShallowCopy(iterator.GetCurrentDataObject())
+                output.SetDataSet(iterator, block)
+                targets.append(block)
+            iterator.GoToNextItem()
+    else:
+        targets = [output]
+    for block, coords in zip(targets, frames):
+        points = block.GetPoints().NewInstance()
+        points.SetData(support.numpy_to_vtk(coords, deep=0))
+        block.SetPoints(points)
+
+
+_SCRIPT = """from asterstudy.post.modecache import pv_request_data
+pv_request_data(self, {!r}, array, scale, amplitude)
+"""
+
+
+def mode_frames_source(source, label):
+    """
+    Returns the filter serving the mode frames of a source (created
+    once), used in place of a WarpByVector filter
+
+    Arguments:
+        source (Proxy): Modal result.
+        label (str): Label of the filter, identifies its frames.
+    """
+    from .representation import BaseRep
+    frames = BaseRep.register_source('ProgrammableFilter', source,
+                                     Script=_SCRIPT.format(label),
+                                     label=label)
+    if not frames.Parameters:
+        frames.Parameters = ['array', repr(''), 'scale', '0.0',
+                             'amplitude', '1.0']
+    return frames
+
+
+def set_mode(frames, array=None, scale=None, amp=None):
+    """Sets the array, the scale or the amplitude shown by the filter."""
+    params = list(frames.Parameters)
+    values = {'array': array, 'scale': scale, 'amplitude': amp}
+    changed = False
+    for i in range(0, len(params), 2):
+        value = values.get(params[i])
+        if value is not None and params[i + 1] != repr(value):
+            params[i + 1] = repr(value)
+            changed = True
+    if changed:
+        frames.Parameters = params
+
+
+class ModeCue():
+    """
+    Phase of the mode animation, driven by the animation time.
+
+    Arguments:
+        frames (Proxy): Filter serving the frames.
+        periods (int): Number of periods during the animation.
+        phases (Optional[int]): Phase samples per period.
+    """
+
+    def __init__(self, frames, periods, phases=MODE_CACHE_PHASES):
+        self.frames = frames
+        self.periods = periods
+        self.phases = phases
+        self.shown = 0
+        self._started = None
+
+    def start(self):
+        """Starts a playback."""
+        self.shown = 0
+        self._started = time.perf_counter()
+
+    def tick(self, atime):
+        """Shows the phase of a normalized animation time."""
+        sample = int(atime * self.periods * self.phases)
+        set_mode(self.frames, amp=amplitude(sample, self.phases))
+        self.shown += 1
+
+    def end(self):
+        """Ends a playback, the mode is shown at its full amplitude."""
+        set_mode(self.frames, amp=1.0)
+        if self._started is not None and self.shown:
+            elapsed = time.perf_counter() - self._started
+            dbg_print('Mode animation: {} frames, {:.1f} fps, {:.1f} MB '
+                      'cached'.format(self.shown, self.shown / elapsed,
+                                      FRAMES.nbytes() / 2. ** 20))
+        self._started = None
+
+
+_CUES = {}
+
+_CUE_SCRIPT = """from asterstudy.post.modecache import pv_cue
+def start_cue(self):
+    pv_cue({0!r}, 'start')
+def tick(self):
+    pv_cue({0!r}, 'tick', self.GetAnimationTime())
+def end_cue(self):
+    pv_cue({0!r}, 'end')
+"""
+
+
+def pv_cue(label, event, *args):
+    """Event of the PythonAnimationCue of a mode animation."""
+    cue = _CUES.get(label)
+    if cue is not None:
+        getattr(cue, event)(*args)
+
+
+def mode_cue(frames, label, periods):
+    """
+    Returns the animation cue playing the frames of a mode
+
+    Arguments:
+        frames (Proxy): Filter serving the frames.
+        label (str): Label of the filter.
+        periods (int): Number of periods during the animation.
+    """
+    import pvsimple as pvs
+    _CUES[label] = ModeCue(frames, periods)
+    cue = pvs.PythonAnimationCue()
+    cue.Script = _CUE_SCRIPT.format(label)
+    return cue
+
+
+def synthetic_mode(nodes):
+    """Returns the coordinates and a bending mode of a beam-like grid."""
+    side = max(2, int(round((nodes / 10.) ** 0.5)))
+    length = max(2, nodes // (side * side))
+    i, j, k = np.meshgrid(np.arange(length), np.arange(side),
+                          np.arange(side), indexing='ij')
+    points = np.stack([i.ravel() * 10. / length, j.ravel() / side,
+                       k.ravel() / side], axis=1)
+    vector = np.zeros_like(points)
+    vector[:, 2] = np.sin(np.pi * points[:, 0] / points[:, 0].max())
+    return points, vector
+
+
+def benchmark(nodes, phases=MODE_CACHE_PHASES, frames=300):
+    """
+    Compares the computation of the warped coordinates of every frame
+    with the lookup of the frames cached for a mode (neither the
+    update of the pipeline nor the render, see `pv_benchmark`)
+
+    Returns:
+        dict: Time per frame in seconds ('warp', 'cached'), memory of
+        the mode ('nbytes'), time to fill the cache ('fill') and frame
+        rates of the playback ('pv', see `pv_benchmark`).
+    """
+    points, vector = synthetic_mode(nodes)
+    scale = 0.1
+    # WarpByVector: the coordinates are computed again at each frame
+    start = time.perf_counter()
+    for sample in range(frames):
+        warped = points + (scale * amplitude(sample, phases)) * vector
+    warp = (time.perf_counter() - start) / frames
+    del warped
+
+    cache = ModeFrames(modes=1)
+    key = ('synthetic', 'DEPL', scale)
+    start = time.perf_counter()
+    for sample in range(phases):
+        cache.frame(key, scale * amplitude(sample, phases),
+                    lambda: ([points], [vector]))
+    fill = time.perf_counter() - start
+    start = time.perf_counter()
+    for sample in range(frames):
+        cache.frame(key, scale * amplitude(sample, phases), None)
+    cached = (time.perf_counter() - start) / frames
+    return {'nodes': len(points), 'warp': warp, 'cached': cached,
+            'fill': fill, 'nbytes': cache.nbytes(key),
+            'frames': len(cache._entries[key]['frames']),
+            'pv': pv_benchmark(nodes, phases, frames)}
+
+
+def pv_benchmark(nodes, phases=MODE_CACHE_PHASES, frames=300):
+    """
+    Measures the playback of a mode, cue update and render, with a
+    WarpByVector filter and with the cached frames, *None* without
+    pvsimple
+
+    Returns:
+        dict: Frame rates ('warp', 'cached').
+    """
+    try:
+        import pvsimple as pvs
+    except ImportError:
+        return None
+    side = max(2, int(round(nodes ** (1. / 3.))))
+    grid = pvs.MergeBlocks(Input=pvs.Wavelet(WholeExtent=[0, side - 1] * 3))
+    mode = pvs.Calculator(Input=grid, ResultArrayName='DEPL',
+                          Function='sin(coordsX*{})*kHat'.format(
+                              math.pi / side))
+    view = pvs.CreateRenderView()
+    scale = 0.1
+    res = {}
+    warp = pvs.WarpByVector(Input=mode, Vectors=['POINTS', 'DEPL'])
+    pvs.Show(warp, view)
+    start = time.perf_counter()
+    for sample in range(frames):
+        warp.ScaleFactor = scale * amplitude(sample, phases)
+        pvs.Render(view)
+    res['warp'] = frames / (time.perf_counter() - start)
+    pvs.Delete(warp)
+
+    label = '<MODE BENCHMARK>'
+    cached = mode_frames_source(mode, label)
+    set_mode(cached, array='DEPL', scale=scale)
+    pvs.Show(cached, view)
+    cue = ModeCue(cached, periods=1, phases=phases)
+    cue.start()
+    start = time.perf_counter()
+    for sample in range(frames):
+        cue.tick((sample % phases) / float(phases))
+        pvs.Render(view)
+    res['cached'] = frames / (time.perf_counter() - start)
+    FRAMES.clear()
+    for proxy in (cached, mode, grid):
+        pvs.Delete(proxy)
+    pvs.Delete(view)
+    return res
+
+
+def main():
+    """Measure the mode animation on a synthetic model."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Frame rates of the warped and cached mode frames.')
+    parser.add_argument('--nodes', type=int, default=1000000)
+    parser.add_argument('--phases', type=int, default=MODE_CACHE_PHASES)
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    res = benchmark(args.nodes, args.phases, args.frames)
+    print('%d nodes, %d phase samples (%d distinct frames)' % (
+        res['nodes'], args.phases, res['frames']))
+    print('warp      %8.3f ms per frame (coordinates)' % (res['warp'] * 1e3))
+    print('cached    %8.3f ms per frame (lookup), filled in %.2f s, '
+          '%.1f MB per mode' % (res['cached'] * 1e3, res['fill'],
+                                res['nbytes'] / 2. ** 20))
+    if res['pv'] is None:
+        print('playback not measured (pvsimple not available)')
+    else:
+        print('playback  %8.1f fps warp, %.1f fps cached (cue update and '
+              'render)' % (res['pv']['warp'], res['pv']['cached']))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,6 @@ probes in asterstudy post processor
 from PyQt5 import Qt as Q
 import numpy as np
 
-from .graph_canvas import GraphCanvas
 from .table import (CustomTable, GenericTableModel,
                     TableParams, ok_validator)
 
@@ -68,6 +67,8 @@ class PlotWindow(Q.QWidget):
         model = GenericTableModel(params, modeldata)
         table.setModel(model)
 
+        # matplotlib is only loaded when a plot is displayed
+        from .graph_canvas import GraphCanvas
         graph = GraphCanvas(parent=self)
         graph.update_axes(data[:, 0], data[:, 1], 'Time (s)', variable)
 
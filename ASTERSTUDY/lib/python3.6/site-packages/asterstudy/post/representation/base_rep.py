@@ -2,8 +2,12 @@
 BaseRep: parent class for all post-processing representations
 """
 
+import weakref
+
 from ..config import DISPLAY_PROPS_DEFAULTS
 from ..utils import dbg_print
+from ..tracer import trace_methods
+from ..memory import MEMORY
 
 ########################################################################
 #  Main structure of the BaseRep Class
@@ -60,6 +64,7 @@ class BaseRep():
 
     # Class reserved attributes
     _sources = {}      # Register database of all added sources
+    _live = weakref.WeakSet()  # Representations not yet collected
     # Tuple (source, display) of reference surface representation
     _reference = None
     _refdisp = True    # Flag criterion whether reference is allowed or not
@@ -70,6 +75,16 @@ class BaseRep():
 
     pickable = True  # Allow probing and plotting on the current representation
 
+    # Methods recorded by the pipeline tracer (see tracer.py)
+    traced_methods = ('__init__', 'update_', 'represent', 'update', 'redraw',
+                      'customize_source', 'update_source', 'update_colorbar',
+                      'update_slice', 'update_contours', 'update_glyphs',
+                      'update_modes', 'update_display_props', 'animate')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        trace_methods(cls, cls.traced_methods)
+
     def __init__(self, field, **opts):
         """
         Create a new representation based on a given field
@@ -94,6 +109,7 @@ class BaseRep():
         dbg_print("#" * 70)
 
         import pvsimple as pvs
+        BaseRep._live.add(self)
         self.field = field
         self.source = field.concept.result.source
         self.array = field.info['pv-aident']
@@ -266,10 +282,15 @@ class BaseRep():
                 for i, av_filter in enumerate(av_filters):
                     if not av_filter['PVKey'] in available_keys:
                         to_remove.append(i)
+                        # Deleted sources are no longer accounted
+                        MEMORY.forget(av_filter['PVSource'])
                 src = cls._sources[root][filter_name] + []
                 cls._sources[root][filter_name] = [src[i] for i in range(len(src))
                                                    if not i in to_remove]
         for root in to_pop:
+            for av_filters in cls._sources[root].values():
+                for av_filter in av_filters:
+                    MEMORY.forget(av_filter['PVSource'])
             cls._sources.pop(root, None)
 
     @classmethod
@@ -332,8 +353,40 @@ class BaseRep():
                 break
         params['PVKey'] = key
 
+        # Derived sources may be released if the memory budget is exceeded
+        MEMORY.register(newsource, 'derived', label or filter_name,
+                        release=cls.release_source)
+
         return newsource
 
+    @classmethod
+    def release_source(cls, source):
+        """
+        Deletes a registered source from the Paraview pipeline
+        (used by the memory budget) and removes it from the registry,
+        unless a representation still references it (returns False)
+        """
+        import pvsimple as pvs
+        if cls.is_referenced(source):
+            return False
+        pvs.Delete(source)
+        cls.refresh_available_sources()
+        return True
+
+    @classmethod
+    def is_referenced(cls, source):
+        """
+        Returns whether a representation still holds a source (even if
+        it is hidden)
+        """
+        for rep in list(cls._live):
+            for value in vars(rep).values():
+                values = value if isinstance(value, (list, tuple)) \
+                    else [value]
+                if any(item is source for item in values):
+                    return True
+        return False
+
     @classmethod
     def is_available_source(cls, filter_name, root, params):
         """
@@ -363,6 +416,7 @@ class BaseRep():
                 av_filters = cls._sources[root][filter_name]
                 for av_filter in av_filters:
                     pv_source = av_filter['PVSource']
+                    MEMORY.forget(pv_source)
                     pvs.Delete(pv_source)
                     del pv_source
                 av_filters = []
@@ -546,3 +600,6 @@ class BaseRep():
 
         if play:
             self.scene.Play()
+
+
+trace_methods(BaseRep, BaseRep.traced_methods)
@@ -6,7 +6,8 @@ ModesRep: modes representation and animation for displacement vector fields
 
 import os.path as osp
 
-from ..config import TRANSLATIONAL_COMPS
+from ..config import MODE_CACHE, TRANSLATIONAL_COMPS
+from ..modecache import ModeIndex, mode_cue, mode_frames_source, set_mode
 from ..utils import default_scale, dbg_print
 from .base_rep import BaseRep
 from .color_rep import ColorRep
@@ -19,6 +20,8 @@ class ModesRep(ColorRep):
 
     pickable = False
     mod_source = None
+    mode_index = None
+    label = None
 
     def defaults(self):
         """
@@ -95,12 +98,18 @@ class ModesRep(ColorRep):
             self.source.MarkBlankPointsAndCells = True
             self.source.UpdatePipeline()
 
-        # Note that the scale factor is intentially not registered
-        # so as to avoid new warps are created each time the scale is
-        # changed by the user !
-        self.source = BaseRep.register_source('WarpByVector', self.source,
-                                              label='<{}:{}> MODES ANIMATION'.format(
-                                                  self.field.concept.name, self.field.name))
+        self.label = '<{}:{}> MODES ANIMATION'.format(self.field.concept.name,
+                                                      self.field.name)
+        if MODE_CACHE:
+            # Precomputed frames (see modecache.py), the warp is not
+            # executed again at each frame of the animation
+            self.source = mode_frames_source(self.source, self.label)
+        else:
+            # Note that the scale factor is intentially not registered
+            # so as to avoid new warps are created each time the scale is
+            # changed by the user !
+            self.source = BaseRep.register_source('WarpByVector', self.source,
+                                                  label=self.label)
 
         # self.source = BaseRep.register_source('Normalmodesanimationreal',
         #     self.mod_source, label='<{}:{}> MODES ANIMATION'.format(
@@ -154,7 +163,6 @@ class ModesRep(ColorRep):
         """
         Updates glyphs by changing the scale of the representation
         """
-        import re
         import pvsimple as pvs
 
         # Search for the array name corresponding to the selected mode
@@ -167,30 +175,25 @@ class ModesRep(ColorRep):
             dbg_print(
                 'Error finding frequency {} Hz, selecting first mode'.format(mode_freq))
 
-        arrname = ''
-        nbarr = self.mod_source.PointData.NumberOfArrays
-        look = re.compile(
-            r"{} \[0*{}\]\s".format(self.field.info['pv-aident'], mode_ind))
-        for i in range(nbarr):
-            arrname = self.mod_source.PointData.GetArray(i).Name
-            if look.match(arrname):
-                if len(self.field.info['components']) > 3:
-                    if self.opts[
-                            'Component'] in TRANSLATIONAL_COMPS + ['Magnitude']:
-                        if 'Vector' in arrname:
-                            break
-                    else:
-                        break
-                else:
-                    break
+        # The array names of the modes are only parsed once
+        if self.mode_index is None:
+            names = [self.mod_source.PointData.GetArray(i).Name
+                     for i in range(self.mod_source.PointData.NumberOfArrays)]
+            self.mode_index = ModeIndex(names, self.field.info['pv-aident'])
+        vector = len(self.field.info['components']) > 3 and \
+            self.opts['Component'] in TRANSLATIONAL_COMPS + ['Magnitude']
+        arrname = self.mode_index.lookup(mode_ind, vector)
 
         if not arrname:
             dbg_print(
                 'Error encountered finding the array name for the mode animation')
 
         self.array = arrname
-        self.source.Vectors = [None, arrname]
-        self.source.ScaleFactor = self.opts['ScaleFactor']
+        if MODE_CACHE:
+            set_mode(self.source, arrname, float(self.opts['ScaleFactor']), 1.0)
+        else:
+            self.source.Vectors = [None, arrname]
+            self.source.ScaleFactor = self.opts['ScaleFactor']
 
         # self.source.ModeArraySelection = ['POINTS', arrname]
         self.source.UpdatePipeline()
@@ -234,8 +237,13 @@ class ModesRep(ColorRep):
             self.scene = pvs.servermanager.animation.AnimationScene()
         self.scene.ViewModules = [self.ren_view]
 
+        nb_periods = self.opts['NbPeriods']
+
         # Create a cue to animate the AnimationTime property
-        if glob:
+        if MODE_CACHE:
+            # The phase selects a precomputed frame (see modecache.py)
+            cue = mode_cue(self.source, self.label, nb_periods)
+        elif glob:
             cue = pvs.GetAnimationTrack('ScaleFactor', index=0,
                                         proxy=self.source)
         else:
@@ -245,21 +253,21 @@ class ModesRep(ColorRep):
 
         # Create keyframes for this animation track
         kfs = []
-        nb_periods = self.opts['NbPeriods']
         # for i in range(nb_periods+1):
         #     kfs.append(pvs.CompositeKeyFrame())
         #     kfs[-1].KeyTime = float(i)/nb_periods
         #     kfs[-1].KeyValues = [self.opts['ScaleFactor']]
         #     kfs[-1].Interpolation = 'Sinusoid'
 
-        for i in range(2 * nb_periods + 1):
-            kfs.append(pvs.CompositeKeyFrame())
-            kfs[-1].KeyTime = (0.5 * i) / (nb_periods)
-            kfs[-1].KeyValues = [(-2. * (i % 2) + 1) *
-                                 self.opts['ScaleFactor']]
-            kfs[-1].Interpolation = 'Ramp'
+        if not MODE_CACHE:
+            for i in range(2 * nb_periods + 1):
+                kfs.append(pvs.CompositeKeyFrame())
+                kfs[-1].KeyTime = (0.5 * i) / (nb_periods)
+                kfs[-1].KeyValues = [(-2. * (i % 2) + 1) *
+                                     self.opts['ScaleFactor']]
+                kfs[-1].Interpolation = 'Ramp'
+            cue.KeyFrames = kfs
 
-        cue.KeyFrames = kfs
         cue.Enabled = 1
 
         self.scene.Cues = [cue]
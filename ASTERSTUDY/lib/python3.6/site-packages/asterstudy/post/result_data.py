@@ -10,7 +10,9 @@ results in the Results tab of AsterStudy GUI.
 """
 
 from .utils import parse_file, mesh_dims_nbno
-from .config import TRANSLATIONAL_COMPS
+from .config import GROUP_CACHE, TRANSLATIONAL_COMPS
+from .groupcache import SUBSETS, group_subset_source, set_subset, subset_key
+from .memory import MEMORY
 
 class ResultFile():
     """ResultFile implementation."""
@@ -63,6 +65,8 @@ class ResultFile():
         # Paraview filters
         # self.shell3d_quad = 0 if ((2, 9) in self.dims_nbno) else None
 
+        MEMORY.register(self.full_source, 'reader', osp.basename(path))
+
         self.parse_mesh_groups()
 
         self.source = self.full_source
@@ -119,6 +123,9 @@ class ResultFile():
                     osp.basename(
                         self.path)),
                 self.dup_source)
+            MEMORY.register(self.dup_source, 'cache',
+                            '<{}> DUPLICATED'.format(osp.basename(self.path)),
+                            release=self.release_cached)
         return self.dup_source
 
     def mesh_source(self):
@@ -150,9 +157,29 @@ class ResultFile():
                     osp.basename(
                         self.path)),
                 self.mode_source)
+            MEMORY.register(self.mode_source, 'cache',
+                            '<{}> AS MODE'.format(osp.basename(self.path)),
+                            release=self.release_cached)
 
         return self.mode_source
 
+    def release_cached(self, source):
+        """
+        Deletes a duplicated or mode reader (used by the memory budget),
+        it is read again on the next request. The reader is kept while
+        a filter, a display or a representation uses it (returns False)
+        """
+        import pvsimple as pvs
+        from .representation import BaseRep
+        if source.SMProxy.GetNumberOfConsumers() or \
+                BaseRep.is_referenced(source):
+            return False
+        pvs.Delete(source)
+        for attr in ('dup_source', 'mode_source'):
+            if getattr(self, attr) is source:
+                setattr(self, attr, None)
+        return True
+
     def toggle_shell3d(self):
         """
         Toggles the self.shell3d_quad flag upon user choice
@@ -166,50 +193,81 @@ class ResultFile():
         """
         self.groups = [['Mesh information not available', False]]
         if hasattr(self, 'mesh'):
-            import pvsimple as pvs
-            # Retrieve the list of available mesh groups and their types
-            mesh_source = self.mesh_source()
-            keys = mesh_source.GetProperty("FieldsTreeInfo")[::2]
-            self.mesh = keys[0]
-            mesh_source.AllArrays = [self.mesh]
-
-            extract = pvs.ExtractGroup(Input=mesh_source)
-            # brut_groups contains groups and families, this needs to be
-            # parsed further.
-            # Note: the use of extract.AllGroups would only work in GUI mode
-            # and thus breaks all unit tests
-            brut_groups = extract.GetProperty("GroupsFlagsInfo")[::2]
-            pvs.Show(extract)
-
-            # Properly remove the extract filter, this may seem redundant
-            # but at times partial cleaning may cause memory corruption
-            # with paraview
-            extract.AllGroups = []
-            extract.UpdatePipeline()
-            extract.UpdatePipelineInformation()
-            pvs.HideAll()
-            pvs.Delete(extract)
-
-            sep = mesh_source.GetProperty('Separator').GetData()
-
-            # These are the actual group names, we still need to determine
-            # their types by reading the family information
-            names = [gr[4:] for gr in brut_groups if gr[:4] == 'GRP_']
-
-            self.groups = []
-            for grname in names:
-                supp = None
-                for grfam in brut_groups:
-                    if not grfam[:4] == 'FAM_':
-                        continue
-                    if grname in grfam:
-                        supp = grfam.split(sep)[-1]
-                        break
-                if supp:
-                    self.groups.append([grname, supp])
-
+            # The groups are read once per mesh file (see groupcache.py)
+            if GROUP_CACHE:
+                self.mesh, groups = SUBSETS.groups(self.path,
+                                                   self._read_mesh_groups)
+            else:
+                self.mesh, groups = self._read_mesh_groups()
+            self.groups = [list(group) for group in groups]
             self.group_filter = []
 
+    def _read_mesh_groups(self):
+        """
+        Reads the mesh name and the groups (name, support) of the mesh
+        """
+        import pvsimple as pvs
+        # Retrieve the list of available mesh groups and their types
+        mesh_source = self.mesh_source()
+        keys = mesh_source.GetProperty("FieldsTreeInfo")[::2]
+        mesh = keys[0]
+        mesh_source.AllArrays = [mesh]
+
+        extract = pvs.ExtractGroup(Input=mesh_source)
+        # brut_groups contains groups and families, this needs to be
+        # parsed further.
+        # Note: the use of extract.AllGroups would only work in GUI mode
+        # and thus breaks all unit tests
+        brut_groups = extract.GetProperty("GroupsFlagsInfo")[::2]
+        pvs.Show(extract)
+
+        # Properly remove the extract filter, this may seem redundant
+        # but at times partial cleaning may cause memory corruption
+        # with paraview
+        extract.AllGroups = []
+        extract.UpdatePipeline()
+        extract.UpdatePipelineInformation()
+        pvs.HideAll()
+        pvs.Delete(extract)
+
+        sep = mesh_source.GetProperty('Separator').GetData()
+
+        # These are the actual group names, we still need to determine
+        # their types by reading the family information
+        names = [gr[4:] for gr in brut_groups if gr[:4] == 'GRP_']
+
+        groups = []
+        for grname in names:
+            supp = None
+            for grfam in brut_groups:
+                if not grfam[:4] == 'FAM_':
+                    continue
+                if grname in grfam:
+                    supp = grfam.split(sep)[-1]
+                    break
+            if supp:
+                groups.append((grname, supp))
+        return mesh, groups
+
+    def extract_groups(self, group_filter):
+        """
+        Extracts the requested groups from the mesh of the result
+        """
+        import pvsimple as pvs
+        mesh_source = self.mesh_source()
+        mesh_source.AllArrays = [self.mesh]
+        if not self.extract_source:
+            self.extract_source = pvs.ExtractGroup(mesh_source)
+            pvs.RenameSource(
+                '<GROUP EXTRACTION FROM MESH>',
+                self.extract_source)
+
+        pvs.SetActiveSource(self.extract_source)
+        self.extract_source.AllGroups = \
+            ['GRP_{}'.format(gr) for gr in group_filter]
+        self.extract_source.UpdatePipeline()
+        self.extract_source.UpdatePipelineInformation()
+
     def filter_groups(self, group_filter, input_source=None):
         """
         Reads and filters the results source on the requested groups
@@ -224,26 +282,36 @@ class ResultFile():
             self.source = self.full_source
             pvs.SetActiveSource(self.source)
             self.group_filter = []
+            if GROUP_CACHE:
+                SUBSETS.hold(self.path, None)
             return self.full_source
 
         # This allows applying filter on the mode source for example
         source = input_source if input_source else self.full_source
 
-        mesh_source = self.mesh_source()
-        mesh_source.AllArrays = [self.mesh]
-        if not self.extract_source:
-            self.extract_source = pvs.ExtractGroup(mesh_source)
-            pvs.RenameSource(
-                '<GROUP EXTRACTION FROM MESH>',
-                self.extract_source)
-
-        pvs.SetActiveSource(self.extract_source)
-        self.extract_source.AllGroups = \
-            ['GRP_{}'.format(gr) for gr in group_filter]
-        self.extract_source.UpdatePipeline()
-        self.extract_source.UpdatePipelineInformation()
-
-        if not self.filter_source:
+        key = subset_key(self.path, group_filter)
+        if GROUP_CACHE:
+            SUBSETS.hold(self.path, key)
+        if not GROUP_CACHE or not SUBSETS.cached(key):
+            self.extract_groups(group_filter)
+
+        if GROUP_CACHE:
+            # The subset is indexed once per groups, the fields are then
+            # taken from the source without resampling (see groupcache.py)
+            if not self.filter_source:
+                self.filter_source = group_subset_source(source)
+            set_subset(self.filter_source, key)
+            if self.extract_source:
+                self.filter_source.Input = [source, self.extract_source]
+                self.filter_source.UpdatePipeline()
+                # the subset is indexed with its geometry, the extraction
+                # is no longer needed
+                self.filter_source.Input = source
+                pvs.Delete(self.extract_source)
+                self.extract_source = None
+            else:
+                self.filter_source.Input = source
+        elif not self.filter_source:
             self.filter_source = pvs.ResampleWithDataset()
             self.filter_source.MarkBlankPointsAndCells = True
             # self.filter_source.ComputeTolerance = True
@@ -252,12 +320,14 @@ class ResultFile():
             # self.filter_source.PassPointArrays = True
 
         pvs.SetActiveSource(source)
-        self.filter_source.Input = source
-        self.filter_source.Source = self.extract_source
+        if not GROUP_CACHE:
+            self.filter_source.Input = source
+            self.filter_source.Source = self.extract_source
 
         self.filter_source.UpdatePipeline()
         self.filter_source.UpdatePipelineInformation()
-        pvs.RenameSource('<RESAMPLING ON GROUP>', self.filter_source)
+        pvs.RenameSource('<SUBSET OF GROUP>' if GROUP_CACHE else
+                         '<RESAMPLING ON GROUP>', self.filter_source)
         pvs.Render()
 
         if not input_source:
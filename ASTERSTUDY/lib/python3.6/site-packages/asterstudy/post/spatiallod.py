@@ -0,0 +1,309 @@
+"""
+Spatial level of detail of the large meshes of the Results tab.
+
+The tank and bridge meshes can have millions of cells: rendering their
+full resolution surface at each camera move drops the interaction to a
+few frames per second.
+
+`SurfaceLOD` tracks the displays of a render view. For each source with
+more than `config.SPATIAL_LOD_CELLS` cells, a decimated surface is
+precomputed (surface extraction and quadric clustering on a grid of
+`config.SPATIAL_LOD_DIVISIONS` divisions, input points and cell data
+kept, so that the same arrays color it). The decimated proxies are
+registered with `BaseRep.register_source`, hence cached per source,
+and deleted when their display is no longer tracked.
+
+During a camera interaction the decimated surfaces replace the full
+ones; the full resolution is restored when the camera is idle for
+`config.SPATIAL_LOD_IDLE` milliseconds. The decimation depends on the
+time step, it is suspended during the animations (it would run again
+at each step). The render times of both modes are measured
+(`SurfaceLOD.stats`).
+
+The frame rates can be compared on a synthetic mesh::
+
+    python3 -m asterstudy.post.spatiallod --resolution 2000
+"""
+
+import time
+
+from PyQt5 import Qt as Q
+
+from .config import SPATIAL_LOD_CELLS, SPATIAL_LOD_DIVISIONS, SPATIAL_LOD_IDLE
+from .utils import dbg_print, nb_points_cells
+
+# Display properties copied from the full display to the decimated one
+COPIED_PROPS = ('ColorArrayName', 'LookupTable', 'Representation',
+                'Opacity', 'DiffuseColor', 'AmbientColor', 'Ambient',
+                'LineWidth', 'PointSize')
+
+
+def lod_source(source, divisions=SPATIAL_LOD_DIVISIONS):
+    """
+    Returns the decimated surface of a source (created once)
+
+    Arguments:
+        source (Proxy): Pipeline source.
+        divisions (Optional[int]): Divisions of the clustering grid in
+            each direction.
+    """
+    from .representation import BaseRep
+    surface = BaseRep.register_source('ExtractSurface', source,
+                                      label='<LOD SURFACE>')
+    return BaseRep.register_source(
+        'QuadricClustering', surface,
+        NumberofDimensions=[divisions] * 3, UseInputPoints=1,
+        CopyCellData=1, label='<LOD {}>'.format(divisions))
+
+
+def release_lod(lod):
+    """
+    Deletes a decimated surface (see `lod_source`) that no display
+    shows, and its surface extraction if nothing else uses it
+    """
+    from .representation import BaseRep
+    if lod.SMProxy.GetNumberOfConsumers():
+        return
+    surface = lod.Input
+    if BaseRep.release_source(lod) and \
+            not surface.SMProxy.GetNumberOfConsumers():
+        BaseRep.release_source(surface)
+
+
+class SurfaceLOD(Q.QObject):
+    """
+    Decimated surfaces of the displays of a render view.
+
+    Arguments:
+        view (Proxy): Render view.
+        cells (Optional[int]): Number of cells above which a source is
+            decimated.
+        divisions (Optional[int]): Divisions of the clustering grid.
+        idle (Optional[int]): Delay (ms) after the last interaction
+            before the full resolution is restored.
+    """
+
+    def __init__(self, view, cells=SPATIAL_LOD_CELLS,
+                 divisions=SPATIAL_LOD_DIVISIONS, idle=SPATIAL_LOD_IDLE,
+                 parent=None):
+        super().__init__(parent)
+        self.view = view
+        self.cells = cells
+        self.divisions = divisions
+        self.pairs = []
+        self.coarse = False
+        self.suspended = False
+        self.frames = {True: [], False: []}
+        self._busy = 0
+        self._render_start = None
+        self._idle = Q.QTimer(self)
+        self._idle.setSingleShot(True)
+        self._idle.setInterval(idle)
+        self._idle.timeout.connect(self._restore)
+        self._observers = []
+        self._observe()
+
+    def _observe(self):
+        """Observes the interactions and the renders of the view."""
+        try:
+            interactor = self.view.GetInteractor()
+            window = self.view.GetRenderWindow()
+        except AttributeError:
+            return
+        if interactor is not None:
+            self._observers.append((interactor, interactor.AddObserver(
+                'StartInteractionEvent', lambda *_: self.begin())))
+            self._observers.append((interactor, interactor.AddObserver(
+                'EndInteractionEvent', lambda *_: self.end())))
+        if window is not None:
+            self._observers.append((window, window.AddObserver(
+                'StartEvent', lambda *_: self._render_started())))
+            self._observers.append((window, window.AddObserver(
+                'EndEvent', lambda *_: self._render_ended())))
+
+    def close(self):
+        """Removes the observers and the tracked displays."""
+        for obj, tag in self._observers:
+            obj.RemoveObserver(tag)
+        self._observers = []
+        self.clear()
+
+    def _render_started(self):
+        self._render_start = time.perf_counter()
+
+    def _render_ended(self):
+        if self._render_start is not None:
+            self.frames[self.coarse].append(
+                time.perf_counter() - self._render_start)
+            del self.frames[self.coarse][:-500]
+            self._render_start = None
+
+    def track(self, display, source):
+        """
+        Tracks a display of the view, its decimated surface is
+        precomputed if the source is large enough
+
+        Returns:
+            bool: *True* if the display has a decimated surface.
+        """
+        for pair in self.pairs:
+            if pair[0] is display and pair[2] is source:
+                return True
+        self.untrack(display)
+        _, ncells = nb_points_cells(source)
+        if ncells < self.cells:
+            return False
+        lod = lod_source(source, self.divisions)
+        lod_display = self._lod_display(lod)
+        self.pairs.append((display, lod_display, source, lod))
+        dbg_print('LOD of {}: {} -> {} cells'.format(
+            source.GetXMLLabel(), ncells, nb_points_cells(lod)[1]))
+        if self.coarse:
+            self._swap(display, lod_display)
+        return True
+
+    def _lod_display(self, lod):
+        """Returns the (hidden) display of a decimated surface."""
+        import pvsimple as pvs
+        lod.UpdatePipeline()
+        lod_display = pvs.Show(lod, self.view)
+        lod_display.Visibility = 0
+        lod_display.Pickable = 0
+        return lod_display
+
+    def untrack(self, display):
+        """Stops tracking a display, its decimated surface is deleted."""
+        import pvsimple as pvs
+        for pair in list(self.pairs):
+            if pair[0] is display:
+                if self.coarse:
+                    self._swap(pair[1], pair[0], copy=False)
+                self.pairs.remove(pair)
+                try:
+                    pvs.Delete(pair[1])
+                    release_lod(pair[3])
+                except RuntimeError:
+                    # already deleted with the pipeline
+                    pass
+
+    def clear(self):
+        """Stops tracking all the displays."""
+        for pair in list(self.pairs):
+            self.untrack(pair[0])
+
+    def begin(self):
+        """
+        Starts an interaction or an animation: the decimated surfaces
+        replace the full ones (calls may be nested)
+        """
+        self._busy += 1
+        self._idle.stop()
+        if self.coarse or self.suspended or not self.pairs:
+            return
+        self.coarse = True
+        for i, (display, lod_display, source, lod) in enumerate(self.pairs):
+            current = lod_source(source, self.divisions)
+            if current is not lod:
+                # released by the memory budget (see memory.py)
+                lod_display = self._lod_display(current)
+                self.pairs[i] = (display, lod_display, source, current)
+            self._swap(display, lod_display)
+
+    def end(self):
+        """Ends an interaction, the full resolution is restored when idle."""
+        self._busy = max(0, self._busy - 1)
+        if not self._busy:
+            self._idle.start()
+
+    def suspend(self):
+        """
+        Suspends the decimated surfaces during an animation, the full
+        ones are shown at once
+        """
+        self.suspended = True
+        self._idle.stop()
+        self._restore(force=True)
+
+    def resume(self):
+        """Ends the suspension of the decimated surfaces."""
+        self.suspended = False
+
+    def _restore(self, force=False):
+        if self._busy and not force or not self.coarse:
+            return
+        self.coarse = False
+        for display, lod_display, _, _ in self.pairs:
+            self._swap(lod_display, display, copy=False)
+        import pvsimple as pvs
+        pvs.Render(self.view)
+        stats = self.stats()
+        dbg_print('LOD frame rates: {lod:.1f} fps decimated, '
+                  '{full:.1f} fps full'.format(**stats))
+
+    def _swap(self, shown, hidden, copy=True):
+        """Hides *shown* and shows *hidden* (with the same coloring)."""
+        if not shown.Visibility:
+            return
+        if copy:
+            for prop in COPIED_PROPS:
+                try:
+                    setattr(hidden, prop, getattr(shown, prop))
+                except AttributeError:
+                    continue
+        shown.Visibility = 0
+        hidden.Visibility = 1
+
+    def stats(self):
+        """
+        Returns the mean frame rates of the renders with the decimated
+        ('lod') and the full ('full') surfaces
+        """
+        def _fps(frames):
+            return len(frames) / sum(frames) if frames and sum(frames) else 0.
+        return {'lod': _fps(self.frames[True]),
+                'full': _fps(self.frames[False]),
+                'frames': len(self.frames[True]) + len(self.frames[False])}
+
+
+def main():
+    """Compare the frame rates of a camera orbit around a large sphere."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Frame rates of the full and decimated surfaces.')
+    parser.add_argument('--resolution', type=int, default=2000,
+                        help='resolution of the sphere (2 r^2 triangles)')
+    parser.add_argument('--divisions', type=int,
+                        default=SPATIAL_LOD_DIVISIONS)
+    parser.add_argument('--frames', type=int, default=72)
+    args = parser.parse_args()
+
+    import pvsimple as pvs
+    sphere = pvs.Sphere(ThetaResolution=args.resolution,
+                        PhiResolution=args.resolution)
+    elevation = pvs.Elevation(Input=sphere)
+    view = pvs.CreateRenderView()
+    view.ViewSize = [1024, 768]
+    display = pvs.Show(elevation, view)
+    pvs.ColorBy(display, ('POINTS', 'Elevation'))
+    pvs.Render(view)
+    lod = SurfaceLOD(view, cells=0, divisions=args.divisions)
+    lod.track(display, elevation)
+    print('%d cells, decimated: %d cells' % (
+        nb_points_cells(elevation)[1],
+        nb_points_cells(lod_source(elevation, args.divisions))[1]))
+    camera = view.GetActiveCamera()
+    for coarse in (False, True):
+        if coarse:
+            lod.begin()
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            camera.Azimuth(360. / args.frames)
+            pvs.Render(view)
+        elapsed = time.perf_counter() - start
+        print('%-9s %d frames in %.2f s: %.1f fps' % (
+            'decimated' if coarse else 'full', args.frames, elapsed,
+            args.frames / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,473 @@
+"""
+Temporal level of detail of the PVD result series.
+
+A tank run writes hundreds to thousands of VTU steps in ``tank.pvd``
+(``tanksim.pvd`` lists the same steps, it is only read for the
+screenshots): playing the series step by step loads every step and the
+playback lasts as long as the loading of the whole series.
+
+`StepIndex` indexes the times and the sizes of the steps of a PVD file.
+`TemporalLOD` predicts the cost of a frame from the step sizes and the
+frames already shown (`FrameCostModel`) and serves a decimated subset
+of the steps, sized so that the series plays in `config.TIME_LOD_DURATION`
+seconds at `config.TIME_LOD_FPS` frames per second at most. `LodPlayer`
+plays this subset in the Results tab when the shown source is read
+from ``tank.pvd``; stepping, the last frame shown when the playback
+stops and the saved movies use all the steps.
+
+The playback rate of the full and of the decimated series can be
+measured on a synthetic series (ParaView is used when available)::
+
+    python3 -m asterstudy.post.timelod --steps 1000
+"""
+
+import os
+import os.path as osp
+import time
+import xml.etree.ElementTree as ET
+
+from PyQt5 import Qt as Q
+
+from .config import TIME_LOD_DURATION, TIME_LOD_FPS
+
+
+class StepIndex():
+    """
+    Times, files and sizes of the steps of a PVD file.
+
+    Arguments:
+        path (str): Path of the PVD file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.times = []
+        self.files = []
+        self.sizes = []
+        self._mtime = None
+        self.update()
+
+    def __len__(self):
+        return len(self.times)
+
+    def update(self):
+        """
+        Reads the PVD file again if it changed
+
+        Returns:
+            bool: *True* if the steps changed.
+        """
+        try:
+            mtime = osp.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        root = ET.parse(self.path).getroot()
+        folder = osp.dirname(self.path)
+        steps = []
+        for dataset in root.iter('DataSet'):
+            path = osp.join(folder, dataset.attrib['file'])
+            try:
+                size = osp.getsize(path)
+            except OSError:
+                size = 0
+            steps.append((float(dataset.attrib['timestep']), path, size))
+        steps.sort(key=lambda step: step[0])
+        self.times = [step[0] for step in steps]
+        self.files = [step[1] for step in steps]
+        self.sizes = [step[2] for step in steps]
+        self._mtime = mtime
+        return True
+
+    def nearest(self, value):
+        """Returns the index of the step nearest to *value*."""
+        if not self.times:
+            return None
+        import bisect
+        pos = bisect.bisect_left(self.times, value)
+        if pos == len(self.times):
+            return pos - 1
+        if pos and value - self.times[pos - 1] <= self.times[pos] - value:
+            return pos - 1
+        return pos
+
+
+class FrameCostModel():
+    """
+    Cost of a frame as a linear function of the size of its step,
+    fitted on the frames already shown.
+
+    Arguments:
+        default (float): Cost (s) predicted before any measurement.
+        history (Optional[int]): Number of measurements kept.
+    """
+
+    def __init__(self, default, history=200):
+        self.default = default
+        self.history = history
+        self.samples = []
+
+    def record(self, size, seconds):
+        """Adds the measured cost of a frame."""
+        self.samples.append((size, seconds))
+        del self.samples[:-self.history]
+
+    def coefficients(self):
+        """Returns the fixed cost (s) and the cost per byte (s)."""
+        if not self.samples:
+            return self.default, 0.
+        count = len(self.samples)
+        msize = sum(size for size, _ in self.samples) / count
+        mcost = sum(cost for _, cost in self.samples) / count
+        var = sum((size - msize) ** 2 for size, _ in self.samples)
+        if var <= 0.:
+            return mcost, 0.
+        slope = sum((size - msize) * (cost - mcost)
+                    for size, cost in self.samples) / var
+        slope = max(0., slope)
+        return max(0., mcost - slope * msize), slope
+
+    def predict(self, size):
+        """Returns the predicted cost (s) of a step of *size* bytes."""
+        fixed, slope = self.coefficients()
+        return fixed + slope * size
+
+
+class TemporalLOD():
+    """
+    Decimated subsets of the steps of a PVD series.
+
+    Arguments:
+        index (StepIndex): Steps of the series.
+        fps (Optional[float]): Target frame rate of the playback.
+        duration (Optional[float]): Target duration (s) of the playback
+            of the whole series.
+    """
+
+    def __init__(self, index, fps=TIME_LOD_FPS, duration=TIME_LOD_DURATION):
+        self.index = index
+        self.fps = fps
+        self.duration = duration
+        self.model = FrameCostModel(1. / fps)
+
+    def frame_cost(self):
+        """Returns the predicted mean cost (s) of a frame."""
+        sizes = self.index.sizes
+        if not sizes:
+            return self.model.default
+        return self.model.predict(sum(sizes) / len(sizes))
+
+    def count(self):
+        """
+        Returns the number of steps played: as many steps as can be
+        shown in the target duration, at the target frame rate at most
+        """
+        interval = max(1. / self.fps, self.frame_cost())
+        frames = int(self.duration / interval)
+        return max(2, min(len(self.index), frames))
+
+    def plan(self):
+        """
+        Returns the indices of the steps played, evenly spread over
+        the times of the series (first and last step included)
+        """
+        times = self.index.times
+        count = self.count()
+        if count >= len(times):
+            return list(range(len(times)))
+        first, last = times[0], times[-1]
+        plan = []
+        for i in range(count):
+            step = self.index.nearest(first + (last - first) * i / (count - 1))
+            if not plan or step > plan[-1]:
+                plan.append(step)
+        return plan
+
+    def snap(self, value):
+        """Returns the time of the played step nearest to *value*."""
+        plan = self.plan()
+        times = [self.index.times[i] for i in plan]
+        return min(times, key=lambda time_: abs(time_ - value))
+
+    def record(self, step, seconds):
+        """Records the measured cost of showing a step."""
+        self.model.record(self.index.sizes[step], seconds)
+
+
+def pv_show(value):
+    """Shows the time *value* in all the views and renders them."""
+    import pvsimple as pvs
+    scene = pvs.GetAnimationScene()
+    scene.AnimationTime = value
+    for view in pvs.GetRenderViews():
+        pvs.Render(view)
+
+
+class LodPlayer(Q.QObject):
+    """
+    Playback of the decimated subset of a series.
+
+    The subset is planned again after each frame with the measured
+    frame costs, so that the playback keeps the target rate when the
+    loading is slower or faster than predicted.
+
+    Arguments:
+        lod (TemporalLOD): Level of detail of the series.
+        show (Optional[callable]): Shows a time (see `pv_show`).
+    """
+
+    finished = Q.pyqtSignal(dict)
+    """Signal: emitted at the end of the playback with `stats()`."""
+
+    def __init__(self, lod, show=pv_show, parent=None):
+        super().__init__(parent)
+        self.lod = lod
+        self.show = show
+        self.position = 0
+        self.frames = []
+        self.elapsed = 0.
+        self._start = None
+        self._timer = Q.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._next)
+
+    def playing(self):
+        """Tells if the playback is running."""
+        return self._start is not None
+
+    def covers(self, source):
+        """Tells if *source* is the reader of the series or a filter of it."""
+        path = osp.realpath(self.lod.index.path)
+        while source is not None:
+            name = getattr(source, 'FileName', None)
+            if name and osp.realpath(str(name)) == path:
+                return True
+            inputs = getattr(source, 'Input', None)
+            if isinstance(inputs, (list, tuple)):
+                inputs = inputs[0] if inputs else None
+            # an output port gives its proxy
+            source = getattr(inputs, 'Proxy', inputs)
+        return False
+
+    def play(self, current=None):
+        """
+        Starts the playback
+
+        Arguments:
+            current (Optional[float]): Time shown, the playback starts
+                from the following step (from the first one if *None*
+                or at the end).
+        """
+        self.lod.index.update()
+        self.position = 0
+        if current is not None:
+            step = self.lod.index.nearest(current)
+            if step is not None and step < len(self.lod.index) - 1:
+                self.position = step
+        self.frames = []
+        self._start = time.perf_counter()
+        self._timer.start(0)
+
+    def stop(self):
+        """Stops the playback (the last frame shown is an exact step)."""
+        if not self.playing():
+            return
+        self._timer.stop()
+        self.elapsed = time.perf_counter() - self._start
+        self._start = None
+        self.finished.emit(self.stats())
+
+    def _next(self):
+        plan = self.lod.plan()
+        upcoming = [step for step in plan if step >= self.position]
+        if not upcoming:
+            self.stop()
+            return
+        step = upcoming[0]
+        start = time.perf_counter()
+        self.show(self.lod.index.times[step])
+        cost = time.perf_counter() - start
+        self.lod.record(step, cost)
+        self.frames.append(cost)
+        self.position = step + 1
+        if self.position >= len(self.lod.index):
+            self.stop()
+            return
+        wait = max(0., 1. / self.lod.fps - cost)
+        self._timer.start(int(wait * 1000))
+
+    def stats(self):
+        """
+        Returns the statistics of the last playback: number of frames,
+        elapsed time (s), frame rate and mean frame cost (s)
+        """
+        elapsed = self.elapsed if self._start is None \
+            else time.perf_counter() - self._start
+        return _stats(self.frames, elapsed)
+
+
+def _stats(frames, elapsed):
+    """Returns the statistics of a playback."""
+    return {'frames': len(frames), 'elapsed': elapsed,
+            'fps': len(frames) / elapsed if elapsed > 0. else 0.,
+            'cost': sum(frames) / len(frames) if frames else 0.}
+
+
+def playback(lod, show, full=False):
+    """
+    Plays a series synchronously, as `LodPlayer` does
+
+    Arguments:
+        lod (TemporalLOD): Level of detail of the series.
+        show (callable): Shows a time.
+        full (Optional[bool]): Play all the steps at the target rate
+            instead of the decimated subset.
+
+    Returns:
+        dict: Number of frames, elapsed time (s), frame rate and mean
+        frame cost (s).
+    """
+    frames = []
+    position = 0
+    start = time.perf_counter()
+    while position < len(lod.index):
+        if full:
+            step = position
+        else:
+            step = next(step for step in lod.plan() if step >= position)
+        begin = time.perf_counter()
+        show(lod.index.times[step])
+        cost = time.perf_counter() - begin
+        lod.record(step, cost)
+        frames.append(cost)
+        position = step + 1
+        if position < len(lod.index):
+            time.sleep(max(0., 1. / lod.fps - cost))
+    return _stats(frames, time.perf_counter() - start)
+
+
+def synthetic_series(folder, steps, points):
+    """
+    Writes a series of *steps* binary VTU files of *points* points
+    (one vertex per point, one scalar and one vector field)
+
+    Returns:
+        str: Path of the PVD file.
+    """
+    import numpy
+    os.makedirs(folder, exist_ok=True)
+    rng = numpy.random.RandomState(0)
+    coords = rng.rand(points, 3).astype('<f4')
+    conn = numpy.arange(points, dtype='<i4')
+    types = numpy.ones(points, dtype='u1')
+    arrays = [coords, conn, conn + 1, types, None, None]
+    with open(osp.join(folder, 'series.pvd'), 'w') as pvd:
+        pvd.write('<?xml version="1.0"?>\n<VTKFile type="Collection" '
+                  'version="0.1" byte_order="LittleEndian">\n'
+                  '\t<Collection>\n')
+        for step in range(steps):
+            arrays[4] = (numpy.sin(coords[:, 0] + step * 0.01)).astype('<f4')
+            arrays[5] = (coords * step * 1e-3).astype('<f4')
+            name = 'series.{}.vtu'.format(step + 1)
+            _write_vtu(osp.join(folder, name), points, arrays)
+            pvd.write('\t\t<DataSet timestep="{}" file="{}"/>\n'
+                      .format(step * 0.01, name))
+        pvd.write('\t</Collection>\n</VTKFile>')
+    return osp.join(folder, 'series.pvd')
+
+
+def _write_vtu(path, points, arrays):
+    """Writes a VTU file with raw appended data."""
+    import numpy
+    specs = [('Points', 'Float32', 3), ('connectivity', 'Int32', 1),
+             ('offsets', 'Int32', 1), ('types', 'UInt8', 1),
+             ('scalar', 'Float32', 1), ('vector', 'Float32', 3)]
+    offset, tags = 0, []
+    for (name, kind, ncomp), array in zip(specs, arrays):
+        tags.append('<DataArray type="{}" Name="{}" NumberOfComponents="{}" '
+                    'format="appended" offset="{}"/>'
+                    .format(kind, name, ncomp, offset))
+        offset += 4 + array.nbytes
+    with open(path, 'wb') as vtu:
+        vtu.write('<?xml version="1.0"?>\n<VTKFile type="UnstructuredGrid" '
+                  'version="0.1" byte_order="LittleEndian" '
+                  'header_type="UInt32">\n<UnstructuredGrid>\n'
+                  '<Piece NumberOfPoints="{0}" NumberOfCells="{0}">\n'
+                  '<PointData>{5}{6}</PointData>\n<Points>{1}</Points>\n'
+                  '<Cells>{2}{3}{4}</Cells>\n</Piece>\n</UnstructuredGrid>\n'
+                  '<AppendedData encoding="raw">\n_'
+                  .format(points, *tags).encode('ascii'))
+        for array in arrays:
+            vtu.write(numpy.uint32(array.nbytes).tobytes())
+            vtu.write(numpy.ascontiguousarray(array).tobytes())
+        vtu.write(b'\n</AppendedData>\n</VTKFile>\n')
+
+
+def file_show(index):
+    """
+    Returns a function showing a time by reading its VTU file (used
+    when ParaView is not available)
+    """
+    def _show(value):
+        with open(index.files[index.nearest(value)], 'rb') as vtu:
+            vtu.read()
+    return _show
+
+
+def pv_file_show(path):
+    """Returns a function showing a time of the PVD file with ParaView."""
+    import pvsimple as pvs
+    reader = pvs.PVDReader(FileName=path)
+    view = pvs.CreateRenderView()
+    pvs.Show(reader, view)
+
+    def _show(value):
+        view.ViewTime = value
+        pvs.Render(view)
+    return _show
+
+
+def main():
+    """Measure the playback of a synthetic series."""
+    import argparse
+    import shutil
+    import tempfile
+    parser = argparse.ArgumentParser(
+        description='Playback rate of the full and decimated series.')
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--fps', type=float, default=TIME_LOD_FPS)
+    parser.add_argument('--duration', type=float, default=TIME_LOD_DURATION)
+    parser.add_argument('--pvd', default=None,
+                        help='existing PVD file instead of a synthetic one')
+    args = parser.parse_args()
+
+    folder = None
+    path = args.pvd
+    if path is None:
+        folder = tempfile.mkdtemp(prefix='timelod')
+        path = synthetic_series(folder, args.steps, args.points)
+    try:
+        index = StepIndex(path)
+        try:
+            show = pv_file_show(path)
+            backend = 'paraview'
+        except ImportError:
+            show = file_show(index)
+            backend = 'file read'
+        print('%d steps, %.1f MB, %s' % (len(index), sum(index.sizes) / 2**20,
+                                        backend))
+        for full in (True, False):
+            lod = TemporalLOD(index, args.fps, args.duration)
+            res = playback(lod, show, full=full)
+            print('%-9s %5d frames in %7.2f s: %6.1f fps, %6.1f ms/frame'
+                  % ('full' if full else 'decimated', res['frames'],
+                     res['elapsed'], res['fps'], res['cost'] * 1e3))
+    finally:
+        if folder:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
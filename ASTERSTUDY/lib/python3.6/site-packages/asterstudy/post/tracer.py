@@ -0,0 +1,296 @@
+"""
+Opt-in tracer of the pvsimple pipeline operations.
+
+When enabled (``config.TRACE`` or the environment variable
+``ASTERSTUDY_PV_TRACE``), the post-processing actions (`pvcontrol`,
+representation methods...) and the underlying pipeline updates,
+renders and data transfers to the client are recorded with their
+duration, the name of the proxy and the size of its data.
+
+The events can be exported in the Chrome trace-event format (open the
+file in chrome://tracing or https://ui.perfetto.dev) and the slowest
+operations are summarized with `dbg_print`.
+
+If ``ASTERSTUDY_PV_TRACE`` gives a file name, the trace is written to
+it when the application exits.
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from .config import TRACE
+
+
+TRACE_ENV = 'ASTERSTUDY_PV_TRACE'
+
+# Maximum number of events kept in memory
+MAX_EVENTS = 200000
+
+# pvsimple functions and methods instrumented when tracing is enabled:
+# (module or class path, attribute, category)
+PATCHES = [('pvsimple', 'Render', 'render'),
+           ('pvsimple', 'SaveScreenshot', 'render'),
+           ('paraview.servermanager.SourceProxy', 'UpdatePipeline', 'update'),
+           ('paraview.servermanager.ViewProxy', 'Update', 'update'),
+           ('paraview.servermanager', 'Fetch', 'transfer')]
+
+
+class PipelineTracer():
+    """Recorder of timed pipeline events."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = deque(maxlen=MAX_EVENTS)
+        self._origin = time.perf_counter()
+        self._patched = []
+        self._pending = False
+
+    def enable(self, flag=True):
+        """Start (or stop) recording.
+
+        pvsimple is instrumented as soon as it has been imported by the
+        application (it is never imported by the tracer itself).
+        """
+        if flag and not self.enabled:
+            self._pending = True
+            self._patch()
+        elif not flag and self.enabled:
+            self._pending = False
+            self._unpatch()
+        self.enabled = flag
+
+    def clear(self):
+        """Forget the recorded events."""
+        self.events.clear()
+
+    def add(self, category, name, start, duration, **args):
+        """Record an event, times are given in seconds."""
+        self.events.append({'cat': category, 'name': name,
+                            'ts': (start - self._origin) * 1.e6,
+                            'dur': duration * 1.e6,
+                            'tid': threading.get_ident(),
+                            'args': args})
+
+    def span(self, category, name, proxy=None, func=None, *args, **kwargs):
+        """Call *func* and record its duration.
+
+        Arguments:
+            category (str): Category of the event ('action', 'update',
+                'render', 'transfer'...).
+            name (str): Name of the event.
+            proxy (Optional[Proxy]): Pipeline proxy concerned.
+            func (callable): Function called with *args* and *kwargs*.
+
+        Returns:
+            misc: Value returned by *func*.
+        """
+        self.instrument()
+        start = time.perf_counter()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            self.done(category, name, start, proxy, result)
+        return result
+
+    def done(self, category, name, start, proxy=None, result=None):
+        """Record an operation started at *start* (`time.perf_counter()`)."""
+        duration = time.perf_counter() - start
+        if category == 'transfer':
+            size = data_size(result)
+        else:
+            size = proxy_size(proxy)
+        self.add(category, name, start, duration,
+                 proxy=proxy_label(proxy), size_kb=size)
+
+    def summary(self, top=10):
+        """Return the slowest operations.
+
+        Arguments:
+            top (Optional[int]): Number of operations returned.
+
+        Returns:
+            list[dict]: Category, name, number of calls, total and
+            maximum durations (ms) of the operations sorted by
+            decreasing total duration.
+        """
+        stats = {}
+        for event in list(self.events):
+            key = (event['cat'], event['name'])
+            stat = stats.setdefault(key, {'cat': key[0], 'name': key[1],
+                                          'count': 0, 'total': 0.,
+                                          'max': 0.})
+            stat['count'] += 1
+            stat['total'] += event['dur'] / 1000.
+            stat['max'] = max(stat['max'], event['dur'] / 1000.)
+        return sorted(stats.values(), key=lambda stat: -stat['total'])[:top]
+
+    def print_summary(self, top=10):
+        """Print the slowest operations with `dbg_print`."""
+        from .utils import dbg_print
+        dbg_print("#" * 70)
+        dbg_print("Slowest pipeline operations ({} events)"
+                  .format(len(self.events)))
+        dbg_print("{:>10} {:>10} {:>6}  {}".format('total ms', 'max ms',
+                                                  'calls', 'operation'))
+        for stat in self.summary(top):
+            dbg_print("{:10.1f} {:10.1f} {:6d}  {}: {}".format(
+                stat['total'], stat['max'], stat['count'],
+                stat['cat'], stat['name']))
+        dbg_print("#" * 70)
+
+    def export(self, filename):
+        """Write the events in the Chrome trace-event format."""
+        pid = os.getpid()
+        events = [{'name': event['name'], 'cat': event['cat'], 'ph': 'X',
+                   'ts': event['ts'], 'dur': event['dur'], 'pid': pid,
+                   'tid': event['tid'], 'args': event['args']}
+                  for event in list(self.events)]
+        with open(filename, 'w') as trace:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'},
+                      trace)
+
+    def instrument(self):
+        """Instrument pvsimple if it has been imported since enabling."""
+        if self._pending:
+            self._patch()
+
+    def _patch(self):
+        """Instrument the pvsimple functions listed in `PATCHES`."""
+        if 'pvsimple' not in sys.modules:
+            return
+        self._pending = False
+        for path, attr, category in PATCHES:
+            owner = _resolve(path)
+            if owner is None or not hasattr(owner, attr):
+                continue
+            original = getattr(owner, attr)
+            setattr(owner, attr, _instrument(self, original, category))
+            self._patched.append((owner, attr, original))
+
+    def _unpatch(self):
+        """Restore the original pvsimple functions."""
+        while self._patched:
+            owner, attr, original = self._patched.pop()
+            setattr(owner, attr, original)
+
+
+def _resolve(path):
+    """Return the loaded module or class designated by *path*."""
+    parts = path.split('.')
+    for index in range(len(parts), 0, -1):
+        obj = sys.modules.get('.'.join(parts[:index]))
+        if obj is None:
+            continue
+        for part in parts[index:]:
+            obj = getattr(obj, part, None)
+        return obj
+    return None
+
+
+def _instrument(tracer, func, category):
+    """Wrap a pvsimple function or method."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        """Traced pvsimple call"""
+        # the proxy (or view) is the first argument, or *self*
+        proxy = args[0] if args else kwargs.get('proxy')
+        return tracer.span(category, name, proxy, func, *args, **kwargs)
+    return wrapper
+
+
+def proxy_label(proxy):
+    """Return a readable name for a pipeline proxy."""
+    if proxy is None or isinstance(proxy, (str, int, float)):
+        return None
+    try:
+        import pvsimple as pvs
+        for group in ('sources', 'views'):
+            label = pvs.servermanager.ProxyManager().GetProxyName(group,
+                                                                  proxy)
+            if label:
+                return label
+    except Exception: # pragma pylint: disable=broad-except
+        pass
+    try:
+        return proxy.GetXMLLabel()
+    except Exception: # pragma pylint: disable=broad-except
+        return type(proxy).__name__
+
+
+def proxy_size(proxy):
+    """Return the size of the data produced by a source proxy (kB)."""
+    try:
+        return proxy.GetDataInformation().DataInformation.GetMemorySize()
+    except Exception: # pragma pylint: disable=broad-except
+        return None
+
+
+def data_size(data):
+    """Return the size of a data object transferred to the client (kB)."""
+    try:
+        return data.GetActualMemorySize()
+    except Exception: # pragma pylint: disable=broad-except
+        return None
+
+
+TRACER = PipelineTracer()
+
+
+def traced(category='action', label=None):
+    """Decorator recording the calls of a function when tracing.
+
+    Arguments:
+        category (Optional[str]): Category of the events.
+        label (Optional[callable]): Returns the name of the event from
+            the arguments of the call, defaults to the qualified name of
+            the function.
+    """
+    def decorator(func):
+        """Decorator"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            """Wrapper"""
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            name = label(*args, **kwargs) if label else func.__qualname__
+            TRACER.instrument()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # representations create their source while running
+                proxy = getattr(args[0], 'source', None) if args else None
+                TRACER.done(category, name, start, proxy)
+        wrapper.traced = True
+        return wrapper
+    return decorator
+
+
+def trace_methods(cls, names, category='action'):
+    """Trace the methods *names* defined by the class *cls*."""
+    for name in names:
+        method = cls.__dict__.get(name)
+        if callable(method) and not getattr(method, 'traced', False):
+            setattr(cls, name, traced(category)(method))
+
+
+def _write_at_exit(filename):
+    """Export the trace and print the summary at exit."""
+    if TRACER.events:
+        TRACER.export(filename)
+        TRACER.print_summary()
+
+
+if TRACE or os.getenv(TRACE_ENV):
+    TRACER.enable()
+    if os.getenv(TRACE_ENV):
+        atexit.register(_write_at_exit, os.getenv(TRACE_ENV))
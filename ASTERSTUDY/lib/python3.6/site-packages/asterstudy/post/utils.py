@@ -6,6 +6,7 @@ concept in AsterStudy application.
 """
 
 from .config import FIELD_LABELS, DEBUG
+from .tracer import traced
 
 
 def parse_file(source, aster=True):
@@ -358,6 +359,7 @@ def get_array_values(source, arrname, comp, atype='point', fetched=None):
 # pragma pylint: disable=too-many-branches,too-many-statements
 
 
+@traced(label=lambda results, request: 'pvcontrol: ' + request)
 def pvcontrol(results, request):
     """
     Main pvsimple view control for common actions available in the
@@ -437,12 +439,27 @@ def pvcontrol(results, request):
 
         # results.shown.animate(play=True)
         scene = pvs.GetAnimationScene()
+        # No decimated surfaces during the animation (see spatiallod.py)
+        spatiallod = getattr(results, 'spatiallod', {}).values()
+        for lod in spatiallod:
+            lod.suspend()
+        player = getattr(results, 'timelod', None)
+        if player is not None and player.covers(pvs.GetActiveSource()):
+            # Decimated playback (see timelod.py), the buttons are
+            # restored when the player finishes
+            player.play(scene.AnimationTime)
+            return
         scene.Play()
+        for lod in spatiallod:
+            lod.resume()
         results.update_infobar()
         results.play_btn.setVisible(True)
         results.pause_btn.setVisible(False)
 
     elif request == 'pause':
+        player = getattr(results, 'timelod', None)
+        if player is not None and player.playing():
+            player.stop()
         scene = pvs.GetAnimationScene()
         scene.Stop()
         results.play_btn.setVisible(True)
@@ -564,6 +581,7 @@ def save_movie_callback(fpath, view, scene, frate=1):
     wait_cursor(False)
 
 
+@traced()
 def save_shot_movie(results,ren_view, movie=False):
     """
     Callback to the save screenshot or movie button
@@ -609,6 +627,7 @@ def save_shot_movie(results,ren_view, movie=False):
 # pragma pylint: disable=too-many-locals
 
 
+@traced()
 def show_min_max(shown, override_opacity=False):
     """
     Shows minimum and maximum values using a sphere representation
@@ -705,6 +724,7 @@ def get_active_selection(source):
 # pragma pylint: disable=too-many-locals,no-member
 
 
+@traced()
 def selection_plot(results):
     """
     Extract data for a single point or cell over time and
@@ -785,6 +805,7 @@ def selection_plot(results):
     results.plot(data, variable)
 
 
+@traced()
 def selection_probe(results):
     """
     Shows minimum and maximum values using a sphere representation
@@ -876,6 +897,7 @@ def default_scale(source, array, ratio=0.05):
     return ratio * box_dim_max / abs_max
 
 
+@traced()
 def save_animation(filename, view_or_layout=None, scene=None, **params):
     """
     Reimplemented paraview SaveAnimation function as there seems to
@@ -0,0 +1,27 @@
+"""
+Helpers on the VTK data objects handled in the ProgrammableFilter
+scripts of the post-processing (see modecache.py and groupcache.py).
+"""
+
+
+def numpy_support():
+    """Returns the VTK/numpy conversion module."""
+    try:
+        from vtkmodules.util import numpy_support as support
+    except ImportError:
+        from vtk.util import numpy_support as support
+    return support
+
+
+def blocks(data):
+    """Returns the (flat index, dataset) pairs of a dataset."""
+    if not data.IsA('vtkCompositeDataSet'):
+        return [(0, data)]
+    pairs = []
+    iterator = data.NewIterator()
+    iterator.InitTraversal()
+    while not iterator.IsDoneWithTraversal():
+        pairs.append((iterator.GetCurrentFlatIndex(),
+                      iterator.GetCurrentDataObject()))
+        iterator.GoToNextItem()
+    return pairs
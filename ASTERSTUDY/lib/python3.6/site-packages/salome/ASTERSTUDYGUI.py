@@ -24,8 +24,14 @@ Implementation of SALOME ASTERSTUDY module.
 """
 
 
+import os
 import traceback
 
+if os.getenv('ASTERSTUDY_IMPORT_PROFILE'):
+    # record the import cost tree until the first interactive window
+    from asterstudy.common.importprofile import enable_import_profile
+    enable_import_profile()
+
 from asterstudy.common import debug_message, info_message
 from asterstudy.gui.salomegui import AsterSalomeGui, get_aster_view_type
 